@@ -3,6 +3,7 @@
 import time
 import re
 import json
+import hashlib
 from datetime import datetime
 import logging
 from typing import Optional, Dict, Any, List, Set, Callable, Tuple
@@ -15,6 +16,7 @@ from tasks.helpers import parse_series_title_and_season, process_subscription_it
 from database.connection import get_db_connection
 from database import media_db, request_db, actor_db
 import constants
+import metrics
 import utils
 
 logger = logging.getLogger(__name__)
@@ -40,6 +42,9 @@ class ActorSubscriptionProcessor:
         self.subscribe_delay_sec = config.get(constants.CONFIG_OPTION_RESUBSCRIBE_DELAY_SECONDS, 1.5)
         self._stop_event = threading.Event()
         self._quota_warning_logged = False
+        # 单次调度内跨演员共享的作品解析缓存 (多个订阅演员出演同一部剧时只请求一次)
+        self._shared_work_cache: Optional[Dict[Tuple[str, str], Any]] = None
+        self._shared_work_lock = threading.Lock()
 
     def signal_stop(self):
         self._stop_event.set()
@@ -53,6 +58,23 @@ class ActorSubscriptionProcessor:
     def close(self):
         logger.trace("ActorSubscriptionProcessor closed.")
 
+    def _resolve_shared(self, kind: str, key: str, loader: Callable[[], Any]) -> Any:
+        """
+        在一次调度内按 (类型, 键) 共享作品解析结果。
+        不在调度中 (如手动刷新单个演员) 时直接调用 loader。
+        """
+        cache = self._shared_work_cache
+        if cache is None:
+            return loader()
+        cache_key = (kind, key)
+        with self._shared_work_lock:
+            if cache_key in cache:
+                return cache[cache_key]
+        value = loader()
+        with self._shared_work_lock:
+            cache.setdefault(cache_key, value)
+        return value
+
     def run_scheduled_task(self, update_status_callback: Optional[Callable] = None):
         """
         - 演员订阅扫描任务。
@@ -103,6 +125,7 @@ class ActorSubscriptionProcessor:
 
         # --- 步骤 3: ★★★ 使用线程池并发执行所有演员的扫描任务 ★★★ ---
         processed_count = 0
+        self._shared_work_cache = {}
         # 使用较少的 workers (如5) 可以避免因并发过高而触发 TMDb 的 API 速率限制
         with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
             
@@ -123,6 +146,7 @@ class ActorSubscriptionProcessor:
                     # 尝试取消尚未开始的任务
                     for f in future_to_sub_id: f.cancel()
                     break
+                metrics.record_items_processed()
                 
                 processed_count += 1
                 progress = int(10 + (processed_count / total_subs) * 90)
@@ -134,7 +158,11 @@ class ActorSubscriptionProcessor:
                 except Exception as exc:
                     sub_id = future_to_sub_id[future]
                     logger.error(f"  ➜ 订阅ID {sub_id} 的扫描任务在线程内发生异常: {exc}", exc_info=True)
-                
+
+        shared_count = len(self._shared_work_cache)
+        self._shared_work_cache = None
+        logger.debug(f"  ➜ 本次调度共解析 {shared_count} 个共享作品条目。")
+
         # --- 步骤 4: 任务结束 ---
         if not self.is_stop_requested():
             logger.info("--- 演员订阅任务 (并发调度模式) 执行完毕 ---")
@@ -173,7 +201,9 @@ class ActorSubscriptionProcessor:
             if media_type == MediaType.SERIES.value:
                 # 检查是否为不规范的单季条目 (如 "xx之xx")
                 title = enriched_work.get('name', '')
-                base_name, season_num_parsed = parse_series_title_and_season(title, self.tmdb_api_key)
+                base_name, season_num_parsed = self._resolve_shared(
+                    'title_season', title, lambda: parse_series_title_and_season(title, self.tmdb_api_key)
+                )
                 if base_name and season_num_parsed:
                     logger.info(f"  ➜ 作品 '{title}' 被识别为不规范的分季条目，跳过。")
                     return []
@@ -205,6 +235,42 @@ class ActorSubscriptionProcessor:
             logger.error(f"  ➜ (线程内) 处理作品 '{item_name}' 时发生错误: {e}", exc_info=True)
             return []
 
+    @staticmethod
+    def _credit_fingerprint(work: Dict[str, Any], sub_config: Dict[str, Any]) -> str:
+        """
+        为单条作品计算指纹，只包含会影响筛选结果的字段。
+        评分与评价人数换算为“是否满足阈值”，避免日常投票波动导致重复评估。
+        """
+        release_date = work.get('release_date') or work.get('first_air_date') or ''
+        min_rating = sub_config.get('config_min_rating') or 0
+        rating_ok = True
+        if min_rating > 0:
+            vote_average = work.get('vote_average', 0.0) or 0.0
+            vote_count = work.get('vote_count', 0) or 0
+            exempted = vote_count < sub_config.get('config_min_vote_count', 10) or vote_average == 0.0
+            rating_ok = exempted or vote_average >= min_rating
+        signature = [
+            work.get('media_type'),
+            work.get('title') or work.get('name') or '',
+            release_date[:4],
+            sorted(work.get('genre_ids') or []),
+            rating_ok,
+            work.get('order', 999) if work.get('media_type') == 'movie' else None,
+        ]
+        return hashlib.md5(json.dumps(signature, ensure_ascii=False).encode('utf-8')).hexdigest()[:12]
+
+    @staticmethod
+    def _credit_set_hash(credit_fingerprints: Dict[str, str], sub_config: Dict[str, Any]) -> str:
+        """作品指纹集合 + 订阅筛选配置 的整体哈希，用于整体跳过无变化的演员。"""
+        config_signature = [
+            sub_config.get('config_start_year'), sub_config.get('config_media_types'),
+            sub_config.get('config_genres_include_json'), sub_config.get('config_genres_exclude_json'),
+            sub_config.get('config_min_rating'), sub_config.get('config_main_role_only'),
+            sub_config.get('config_min_vote_count'),
+        ]
+        raw = json.dumps([sorted(credit_fingerprints.items()), config_signature], ensure_ascii=False, default=str)
+        return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
     def run_full_scan_for_actor(self, subscription_id: int, emby_media_map: Dict[str, str]):
         """
         - 采用并发模型处理所有新增作品。
@@ -223,6 +289,7 @@ class ActorSubscriptionProcessor:
                     logger.info(f"--- 开始为演员 '{actor_name_for_log}' 执行作品扫描 ---")
                     
                     last_scanned_ids = set(sub.get('last_scanned_tmdb_ids_json') or [])
+                    last_fingerprints: Optional[Dict[str, str]] = sub.get('last_scanned_credits_json')
                     subscription_source = {
                         "type": "actor_subscription", 
                         "id": subscription_id, 
@@ -235,27 +302,52 @@ class ActorSubscriptionProcessor:
                     all_works = self._get_and_clean_actor_works(sub['tmdb_person_id'], self.tmdb_api_key)
                     if self.is_stop_requested(): return
                     if not all_works:
-                        cursor.execute("UPDATE actor_subscriptions SET last_scanned_tmdb_ids_json = '[]' WHERE id = %s", (subscription_id,))
+                        cursor.execute("""
+                            UPDATE actor_subscriptions
+                            SET last_scanned_tmdb_ids_json = '[]', last_scanned_credits_json = '{}', last_scanned_credits_hash = NULL
+                            WHERE id = %s
+                        """, (subscription_id,))
                         return
 
-                    # --- 步骤 3: 计算差量 ---
-                    current_work_ids = {str(w.get('id')) for w in all_works if w.get('id')}
+                    # --- 步骤 3: 计算差量 (按作品指纹) ---
+                    current_fingerprints = {
+                        str(w.get('id')): self._credit_fingerprint(w, sub) for w in all_works if w.get('id')
+                    }
+                    credits_hash = self._credit_set_hash(current_fingerprints, sub)
+                    if sub.get('last_scanned_tmdb_ids_json') is not None and credits_hash == sub.get('last_scanned_credits_hash'):
+                        logger.info(f"  ➜ 演员 '{sub['actor_name']}' 的作品指纹无变化，跳过。")
+                        return
+
+                    current_work_ids = set(current_fingerprints.keys())
                     new_work_ids = current_work_ids - last_scanned_ids
                     removed_work_ids = last_scanned_ids - current_work_ids
+                    # 旧版本没有保存指纹时，已扫描过的作品视为未变化，只把本次指纹作为基线写入
+                    changed_work_ids = set()
+                    if last_fingerprints:
+                        changed_work_ids = {
+                            wid for wid in current_work_ids & last_scanned_ids
+                            if last_fingerprints.get(wid) != current_fingerprints[wid]
+                        }
+                    ids_to_process = new_work_ids | changed_work_ids
                     
-                    works_to_process = [w for w in all_works if str(w.get('id')) in new_work_ids]
+                    works_to_process = [w for w in all_works if str(w.get('id')) in ids_to_process]
                     
-                    logger.info(f"  ➜ [阶段 1/3] 差量计算完成：发现 {len(new_work_ids)} 部新作品，{len(removed_work_ids)} 部作品已从TMDb移除。")
+                    logger.info(f"  ➜ [阶段 1/3] 差量计算完成：发现 {len(new_work_ids)} 部新作品，{len(changed_work_ids)} 部作品信息有变化，{len(removed_work_ids)} 部作品已从TMDb移除。")
 
                     if not works_to_process and not removed_work_ids:
-                        logger.info(f"  ➜ 演员 '{sub['actor_name']}' 的作品列表无变化，跳过。")
+                        logger.info(f"  ➜ 演员 '{sub['actor_name']}' 的作品列表无实质变化，仅更新指纹。")
+                        cursor.execute(
+                            "UPDATE actor_subscriptions SET last_scanned_credits_json = %s, last_scanned_credits_hash = %s WHERE id = %s",
+                            (json.dumps(current_fingerprints), credits_hash, subscription_id)
+                        )
+                        conn.commit()
                         return
 
                     # --- 步骤 4: 并发筛选作品 ---
                     tmdb_items_to_subscribe = []
                     
                     if works_to_process:
-                        logger.info(f"  ➜ [阶段 2/3] 正在并发筛选 {len(works_to_process)} 部新作品 (检查题材、番位等)...")
+                        logger.info(f"  ➜ [阶段 2/3] 正在并发筛选 {len(works_to_process)} 部新增/变化作品 (检查题材、番位等)...")
                         with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
                             future_to_work = {
                                 executor.submit(self._process_single_work, work, sub): work 
@@ -296,9 +388,14 @@ class ActorSubscriptionProcessor:
                                 request_db.remove_subscription_source(tmdb_id_to_clean, item_info['item_type'], subscription_source)
 
                     # --- 步骤 7: 更新扫描记录 ---
+                    if self.is_stop_requested(): return
                     cursor.execute(
-                        "UPDATE actor_subscriptions SET last_scanned_tmdb_ids_json = %s WHERE id = %s",
-                        (json.dumps(list(current_work_ids)), subscription_id)
+                        """
+                        UPDATE actor_subscriptions
+                        SET last_scanned_tmdb_ids_json = %s, last_scanned_credits_json = %s, last_scanned_credits_hash = %s
+                        WHERE id = %s
+                        """,
+                        (json.dumps(list(current_work_ids)), json.dumps(current_fingerprints), credits_hash, subscription_id)
                     )
                     
                     conn.commit()
@@ -459,8 +556,10 @@ class ActorSubscriptionProcessor:
         if not media_id:
             return None
         
-        details = tmdb.get_tv_details(media_id, api_key, append_to_response="credits")
-        return details
+        return self._resolve_shared(
+            'tv_credits', str(media_id),
+            lambda: tmdb.get_tv_details(media_id, api_key, append_to_response="credits")
+        )
         
     def _get_and_clean_actor_works(self, tmdb_person_id: int, api_key: str) -> List[Dict[str, Any]]:
         """
@@ -3,12 +3,13 @@ import threading
 import concurrent.futures
 import time
 import psycopg2
+from psycopg2.extras import execute_values
 import constants
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from typing import Optional, Dict, Any, List, Callable
 # 导入底层工具箱和日志
 import logging
-from database import connection
+from database import connection, settings_db
 from database.actor_db import ActorDBManager
 import utils
 import handler.tmdb as tmdb
@@ -343,6 +344,129 @@ def fetch_tmdb_details_for_actor(actor_info: Dict, tmdb_api_key: str) -> Optiona
 
 # --- 演员数据补充 ---
 
+# 断点续跑进度 (app_settings)：{mode, cutoff, last_map_id, started_at}
+ENRICH_PROGRESS_SETTING_KEY = 'actor_enrichment_progress'
+ENRICH_PROGRESS_MAX_AGE_DAYS = 7
+ENRICH_CHUNK_SIZE = 200
+MAX_TMDB_WORKERS = 5
+
+def _load_enrichment_progress(mode: str, sync_interval_days: int) -> Dict[str, Any]:
+    """读取上次未完成的进度；模式不同或进度过旧时重新开始。"""
+    now = datetime.now(timezone.utc)
+    try:
+        progress = settings_db.get_setting(ENRICH_PROGRESS_SETTING_KEY)
+    except Exception:
+        progress = None
+    if progress and progress.get('mode') == mode:
+        try:
+            started_at = datetime.fromisoformat(progress['started_at'])
+            if now - started_at < timedelta(days=ENRICH_PROGRESS_MAX_AGE_DAYS):
+                logger.info(f"  ➜ 检测到未完成的演员补充进度，将从 map_id > {progress.get('last_map_id', 0)} 处继续。")
+                return progress
+        except (KeyError, TypeError, ValueError):
+            pass
+    # 刷新期限：深度模式下本轮开始前更新过的都要刷新；标准模式为冷却期之前
+    cutoff = now if mode == 'full' else now - timedelta(days=sync_interval_days)
+    return {'mode': mode, 'cutoff': cutoff.isoformat(), 'last_map_id': 0, 'started_at': now.isoformat()}
+
+def _merge_actor_on_imdb_conflict(cursor, imdb_id: str, tmdb_id: Any):
+    """
+    IMDb ID 已被另一条记录占用时，把当前记录的各个 ID 安全地合并到占用者身上，并删除当前记录。
+    合并前会预先检查每个待合并的 ID，若已存在于第三方记录则先从旧记录中剥离。
+    """
+    logger.warning(f"  ➜ [合并逻辑] 检测到 IMDb ID '{imdb_id}' (来自TMDb: {tmdb_id}) 冲突。")
+
+    cursor.execute("SELECT * FROM person_identity_map WHERE imdb_id = %s", (imdb_id,))
+    target_actor = cursor.fetchone()
+    cursor.execute("SELECT * FROM person_identity_map WHERE tmdb_person_id = %s", (tmdb_id,))
+    source_actor = cursor.fetchone()
+
+    if not target_actor or not source_actor or source_actor['map_id'] == target_actor['map_id']:
+        logger.warning(f"  🚫 合并中止：源或目标记录不存在，或它们本就是同一条记录。")
+        return
+
+    target_map_id = target_actor['map_id']
+    source_map_id = source_actor['map_id']
+    logger.info(f"  ➜ 准备合并：源(map_id:{source_map_id}, tmdb:{tmdb_id}) -> 目标(map_id:{target_map_id}, imdb:{imdb_id})")
+
+    def safe_merge_id(id_field_name: str, id_value: Any):
+        if not id_value or target_actor.get(id_field_name):
+            return # 如果源ID为空，或目标已有同类ID，则不合并
+
+        # 预检查：这个ID是否已存在于其他记录中？
+        cursor.execute(f"SELECT map_id FROM person_identity_map WHERE {id_field_name} = %s", (id_value,))
+        conflicting_record = cursor.fetchone()
+
+        if conflicting_record and conflicting_record['map_id'] != target_map_id:
+            # 存在冲突！这个ID属于另一个记录。我们需要先把它从旧记录上剥离。
+            logger.warning(f"  ➜ 检测到 {id_field_name} '{id_value}' 存在于第三方记录 (map_id: {conflicting_record['map_id']})。将从旧记录中移除。")
+            cursor.execute(f"UPDATE person_identity_map SET {id_field_name} = NULL WHERE map_id = %s", (conflicting_record['map_id'],))
+
+        # 现在可以安全地更新到目标记录了
+        logger.info(f"  ➜ 正在将 {id_field_name} '{id_value}' 合并到目标记录 (map_id: {target_map_id})。")
+        cursor.execute(f"UPDATE person_identity_map SET {id_field_name} = %s WHERE map_id = %s", (id_value, target_map_id))
+
+    # 依次安全地合并各个ID：TMDb、豆瓣、Emby
+    safe_merge_id('tmdb_person_id', source_actor.get('tmdb_person_id'))
+    safe_merge_id('douban_celebrity_id', source_actor.get('douban_celebrity_id'))
+    safe_merge_id('emby_person_id', source_actor.get('emby_person_id'))
+
+    # 最后，删除现在已经为空壳的源记录
+    logger.info(f"  ➜ 所有ID合并完成，准备删除源记录 (map_id: {source_map_id})。")
+    cursor.execute("DELETE FROM person_identity_map WHERE map_id = %s", (source_map_id,))
+    logger.info(f"  ➜ 成功将记录 (map_id:{source_map_id}) 合并到 (map_id:{target_map_id})。")
+
+def _write_imdb_updates(cursor, imdb_updates: List[tuple]):
+    """
+    批量写入 IMDb ID：无冲突的部分用一条集合式 UPDATE 写入，
+    与现有记录 (或同批次内) 冲突的部分逐条走合并逻辑。
+    """
+    if not imdb_updates:
+        return
+    cursor.execute(
+        "SELECT imdb_id, tmdb_person_id FROM person_identity_map WHERE imdb_id = ANY(%s)",
+        ([imdb_id for imdb_id, _ in imdb_updates],)
+    )
+    owners = {row['imdb_id']: row['tmdb_person_id'] for row in cursor.fetchall()}
+
+    clean_updates, conflicts, seen = [], [], set()
+    for imdb_id, tmdb_id in imdb_updates:
+        owner = owners.get(imdb_id)
+        if owner is not None and str(owner) == str(tmdb_id):
+            continue # 已经是这个 IMDb ID，无需更新
+        if owner is not None or imdb_id in seen:
+            conflicts.append((imdb_id, tmdb_id))
+            continue
+        seen.add(imdb_id)
+        clean_updates.append((imdb_id, int(tmdb_id)))
+
+    if clean_updates:
+        try:
+            cursor.execute("SAVEPOINT imdb_bulk_savepoint")
+            execute_values(cursor, """
+                UPDATE person_identity_map AS p SET imdb_id = v.imdb_id
+                FROM (VALUES %s) AS v(imdb_id, tmdb_person_id)
+                WHERE p.tmdb_person_id = v.tmdb_person_id
+            """, clean_updates, page_size=500)
+            cursor.execute("RELEASE SAVEPOINT imdb_bulk_savepoint")
+        except psycopg2.IntegrityError:
+            # 并发写入导致新冲突时，整批退回到逐条处理
+            cursor.execute("ROLLBACK TO SAVEPOINT imdb_bulk_savepoint")
+            conflicts = clean_updates + conflicts
+
+    for imdb_id, tmdb_id in conflicts:
+        try:
+            cursor.execute("SAVEPOINT imdb_update_savepoint")
+            cursor.execute("UPDATE person_identity_map SET imdb_id = %s WHERE tmdb_person_id = %s", (imdb_id, tmdb_id))
+            cursor.execute("RELEASE SAVEPOINT imdb_update_savepoint")
+        except psycopg2.IntegrityError as ie:
+            cursor.execute("ROLLBACK TO SAVEPOINT imdb_update_savepoint")
+            if "violates unique constraint" in str(ie) and "imdb_id" in str(ie):
+                _merge_actor_on_imdb_conflict(cursor, imdb_id, tmdb_id)
+            else:
+                # 如果是其他类型的唯一键冲突，则重新抛出异常
+                raise ie
+
 def enrich_all_actor_aliases_task(
     tmdb_api_key: str, 
     run_duration_minutes: int,
@@ -352,10 +476,10 @@ def enrich_all_actor_aliases_task(
     force_full_update: bool = False
 ):
     """
-    - 解决了在合并IMDb冲突记录时，由于emby_person_id等其他ID已存在于第三方记录而导致的二次唯一键冲突。
-    - 合并逻辑现在会预先检查每个待合并的ID，如果发现新冲突，会尝试将冲突的ID从其旧记录中剥离，再赋给新记录。
-    - 增强了日志记录，清晰地展示了每一步合并决策。
-    - 保持了原有的三阶段处理（TMDb元数据、豆瓣IMDb、豆瓣头像）。
+    - 只刷新“过期”的演员：标准模式为冷却期之前更新过的，深度模式为本轮开始前更新过的。
+    - 按 map_id 分页扫描，每批并发请求 TMDb，结果以集合式批量语句写入并与进度一起提交；
+      中断后再次运行会从上次提交的位置继续，而不是从头开始。
+    - 合并 IMDb 冲突记录时，会预先检查每个待合并的 ID，若已存在于第三方记录则先剥离再转移。
     """
     task_mode = "(全量)" if force_full_update else "(增量)"
     logger.trace(f"--- 开始执行“演员数据补充”计划任务 [{task_mode}] ---")
@@ -377,6 +501,7 @@ def enrich_all_actor_aliases_task(
     douban_api = None
     try:
         douban_api = DoubanApi()
+        progress_state = _load_enrichment_progress('full' if force_full_update else 'incremental', sync_interval_days)
 
         with connection.get_db_connection() as conn:
             # --- 阶段一：从 TMDb 补充元数据 (并发执行) ---
@@ -384,45 +509,48 @@ def enrich_all_actor_aliases_task(
             cursor = conn.cursor()
             
             if force_full_update:
-                logger.info("  ➜ 深度模式已激活：将扫描所有演员，无视现有数据。")
-                sql_find_actors = """
-                    SELECT p.* FROM person_identity_map p
-                    LEFT JOIN actor_metadata m ON p.tmdb_person_id = m.tmdb_id
+                logger.info("  ➜ 深度模式已激活：将扫描所有本轮尚未刷新的演员，无视现有数据。")
+                sql_where = """
                     WHERE p.tmdb_person_id IS NOT NULL
-                    ORDER BY m.last_updated_at ASC NULLS FIRST
+                    AND (m.last_updated_at IS NULL OR m.last_updated_at < %(cutoff)s)
                 """
             else:
                 logger.info(f"  ➜ 标准模式：将仅扫描需要补充数据且冷却期已过的演员 (冷却期: {sync_interval_days} 天)。")
-                sql_find_actors = f"""
-                    SELECT p.* FROM person_identity_map p
-                    LEFT JOIN actor_metadata m ON p.tmdb_person_id = m.tmdb_id
+                sql_where = """
                     WHERE p.tmdb_person_id IS NOT NULL AND (p.imdb_id IS NULL OR m.tmdb_id IS NULL OR m.profile_path IS NULL OR m.gender IS NULL OR m.original_name IS NULL)
-                    AND (m.last_updated_at IS NULL OR m.last_updated_at < NOW() - INTERVAL '{sync_interval_days} days')
-                    ORDER BY m.last_updated_at ASC
+                    AND (m.last_updated_at IS NULL OR m.last_updated_at < %(cutoff)s)
                 """
+            sql_from = "FROM person_identity_map p LEFT JOIN actor_metadata m ON p.tmdb_person_id = m.tmdb_id"
+            query_params = {'cutoff': progress_state['cutoff'], 'last_map_id': progress_state['last_map_id'], 'limit': ENRICH_CHUNK_SIZE}
+
+            cursor.execute(f"SELECT COUNT(*) AS total {sql_from} {sql_where} AND p.map_id > %(last_map_id)s", query_params)
+            total_tmdb = cursor.fetchone()['total']
             
-            cursor.execute(sql_find_actors)
-            actors_for_tmdb = cursor.fetchall()
-            
-            if actors_for_tmdb:
-                total_tmdb = len(actors_for_tmdb)
+            if total_tmdb:
                 logger.info(f"  ➜ 找到 {total_tmdb} 位演员需要从 TMDb 补充元数据。")
-                
-                CHUNK_SIZE = 200
-                MAX_TMDB_WORKERS = 5
+                total_chunks = (total_tmdb + ENRICH_CHUNK_SIZE - 1) // ENRICH_CHUNK_SIZE
+                processed = 0
+                chunk_num = 0
+                finished = False
 
-                for i in range(0, total_tmdb, CHUNK_SIZE):
+                while True:
                     if (stop_event and stop_event.is_set()) or (time.time() >= end_time):
-                        logger.info("  🚫 达到运行时长或收到停止信号，在 TMDb 下批次开始前结束。")
+                        logger.info("  🚫 达到运行时长或收到停止信号，在 TMDb 下批次开始前结束 (进度已保存)。")
                         break
 
-                    progress = int((i / total_tmdb) * 100)
-                    chunk_num = i//CHUNK_SIZE + 1
-                    total_chunks = (total_tmdb + CHUNK_SIZE - 1) // CHUNK_SIZE
-                    if update_status_callback:
-                        update_status_callback(progress, f"处理批次 {chunk_num}/{total_chunks}")
+                    cursor.execute(
+                        f"SELECT p.* {sql_from} {sql_where} AND p.map_id > %(last_map_id)s ORDER BY p.map_id LIMIT %(limit)s",
+                        query_params
+                    )
+                    chunk = cursor.fetchall()
+                    if not chunk:
+                        finished = True
+                        break
 
-                    chunk = actors_for_tmdb[i:i + CHUNK_SIZE]
+                    chunk_num += 1
+                    progress = int((processed / total_tmdb) * 100)
+                    if update_status_callback:
+                        update_status_callback(min(progress, 99), f"处理批次 {chunk_num}/{total_chunks}")
                     logger.info(f"  ➜ 开始处理 TMDb 第 {chunk_num} 批次，共 {len(chunk)} 个演员 ---")
 
                     imdb_updates_to_commit = []
@@ -459,15 +587,10 @@ def enrich_all_actor_aliases_task(
                                 elif details.get("original_name") and not contains_chinese(details.get("original_name")):
                                     best_original_name = details.get("original_name")
                                 
-                                metadata_entry = {
-                                    "tmdb_id": tmdb_id,
-                                    "profile_path": details.get("profile_path"),
-                                    "gender": details.get("gender"),
-                                    "adult": details.get("adult", False),
-                                    "popularity": details.get("popularity"),
-                                    "original_name": best_original_name
-                                }
-                                metadata_to_commit.append(metadata_entry)
+                                metadata_to_commit.append((
+                                    tmdb_id, details.get("profile_path"), details.get("gender"),
+                                    details.get("adult", False), details.get("popularity"), best_original_name
+                                ))
                                 metadata_added_count += 1
                             
                             elif status == "not_found":
@@ -479,94 +602,48 @@ def enrich_all_actor_aliases_task(
                         f"成功获取({tmdb_success_count}), 新增IMDb({imdb_found_count}), "
                         f"新增元数据({metadata_added_count}), 未找到({not_found_count})."
                     )
-                    
-                    if imdb_updates_to_commit or metadata_to_commit or invalid_tmdb_ids:
-                        try:
-                            logger.info(f"  ➜ 批次完成，准备写入数据库...")
-
-                            if metadata_to_commit:
-                                cols = metadata_to_commit[0].keys()
-                                cols_str = ", ".join(cols)
-                                placeholders_str = ", ".join([f"%({k})s" for k in cols])
-                                update_cols = [f"{col} = EXCLUDED.{col}" for col in cols if col != 'tmdb_id']
-                                update_str = ", ".join(update_cols)
-                                
-                                sql_upsert_metadata = f"""
-                                    INSERT INTO actor_metadata ({cols_str}, last_updated_at)
-                                    VALUES ({placeholders_str}, NOW())
-                                    ON CONFLICT (tmdb_id) DO UPDATE SET {update_str}, last_updated_at = NOW()
-                                """
-                                cursor.executemany(sql_upsert_metadata, metadata_to_commit)
-                                logger.trace(f"  ➜ 成功批量写入 {len(metadata_to_commit)} 条演员元数据。")
-
-                            for imdb_id, tmdb_id in imdb_updates_to_commit:
-                                try:
-                                    cursor.execute("SAVEPOINT imdb_update_savepoint")
-                                    cursor.execute("UPDATE person_identity_map SET imdb_id = %s WHERE tmdb_person_id = %s", (imdb_id, tmdb_id))
-                                    cursor.execute("RELEASE SAVEPOINT imdb_update_savepoint")
-                                except psycopg2.IntegrityError as ie:
-                                    cursor.execute("ROLLBACK TO SAVEPOINT imdb_update_savepoint")
-                                    if "violates unique constraint" in str(ie) and "imdb_id" in str(ie):
-                                        logger.warning(f"  ➜ [合并逻辑] 检测到 IMDb ID '{imdb_id}' (来自TMDb: {tmdb_id}) 冲突。")
-                                        
-                                        cursor.execute("SELECT * FROM person_identity_map WHERE imdb_id = %s", (imdb_id,))
-                                        target_actor = cursor.fetchone()
-                                        cursor.execute("SELECT * FROM person_identity_map WHERE tmdb_person_id = %s", (tmdb_id,))
-                                        source_actor = cursor.fetchone()
-
-                                        if not target_actor or not source_actor or source_actor['map_id'] == target_actor['map_id']:
-                                            logger.warning(f"  🚫 合并中止：源或目标记录不存在，或它们本就是同一条记录。")
-                                            continue
-
-                                        target_map_id = target_actor['map_id']
-                                        source_map_id = source_actor['map_id']
-                                        logger.info(f"  ➜ 准备合并：源(map_id:{source_map_id}, tmdb:{tmdb_id}) -> 目标(map_id:{target_map_id}, imdb:{imdb_id})")
-
-                                        # --- 定义一个可重用的、安全的ID合并函数 ---
-                                        def safe_merge_id(id_field_name: str, id_value: Any, source_id: int, target_id: int):
-                                            if not id_value or target_actor.get(id_field_name):
-                                                return # 如果源ID为空，或目标已有同类ID，则不合并
-
-                                            # 预检查：这个ID是否已存在于其他记录中？
-                                            cursor.execute(f"SELECT map_id FROM person_identity_map WHERE {id_field_name} = %s", (id_value,))
-                                            conflicting_record = cursor.fetchone()
-                                            
-                                            if conflicting_record and conflicting_record['map_id'] != target_id:
-                                                # 存在冲突！这个ID属于另一个记录。我们需要先把它从旧记录上剥离。
-                                                logger.warning(f"  ➜ 检测到 {id_field_name} '{id_value}' 存在于第三方记录 (map_id: {conflicting_record['map_id']})。将从旧记录中移除。")
-                                                cursor.execute(f"UPDATE person_identity_map SET {id_field_name} = NULL WHERE map_id = %s", (conflicting_record['map_id'],))
-
-                                            # 现在可以安全地更新到目标记录了
-                                            logger.info(f"  ➜ 正在将 {id_field_name} '{id_value}' 合并到目标记录 (map_id: {target_id})。")
-                                            cursor.execute(f"UPDATE person_identity_map SET {id_field_name} = %s WHERE map_id = %s", (id_value, target_id))
-
-                                        # --- 依次安全地合并各个ID ---
-                                        # 1. 合并 TMDb ID
-                                        safe_merge_id('tmdb_person_id', source_actor.get('tmdb_person_id'), source_map_id, target_map_id)
-                                        # 2. 合并 Douban ID
-                                        safe_merge_id('douban_celebrity_id', source_actor.get('douban_celebrity_id'), source_map_id, target_map_id)
-                                        # 3. 合并 Emby ID
-                                        safe_merge_id('emby_person_id', source_actor.get('emby_person_id'), source_map_id, target_map_id)
-
-                                        # 4. 最后，删除现在已经为空壳的源记录
-                                        logger.info(f"  ➜ 所有ID合并完成，准备删除源记录 (map_id: {source_map_id})。")
-                                        cursor.execute("DELETE FROM person_identity_map WHERE map_id = %s", (source_map_id,))
-                                        logger.info(f"  ➜ 成功将记录 (map_id:{source_map_id}) 合并到 (map_id:{target_map_id})。")
-                                    else:
-                                        # 如果是其他类型的唯一键冲突，则重新抛出异常
-                                        raise ie
-
-                            if invalid_tmdb_ids:
-                                cursor.executemany("UPDATE person_identity_map SET tmdb_person_id = NULL WHERE tmdb_person_id = %s", [(tid,) for tid in invalid_tmdb_ids])
-
-                            conn.commit()
-                            logger.info("  ✅ 数据库更改已成功提交。")
-
-                        except Exception as db_e:
-                            logger.error(f"  ➜ 数据库操作失败: {db_e}", exc_info=True)
-                            conn.rollback()
+
+                    processed += len(chunk)
+                    progress_state['last_map_id'] = max(actor['map_id'] for actor in chunk)
+                    query_params['last_map_id'] = progress_state['last_map_id']
+
+                    try:
+                        if metadata_to_commit:
+                            execute_values(cursor, """
+                                INSERT INTO actor_metadata (tmdb_id, profile_path, gender, adult, popularity, original_name, last_updated_at)
+                                VALUES %s
+                                ON CONFLICT (tmdb_id) DO UPDATE SET
+                                    profile_path = EXCLUDED.profile_path, gender = EXCLUDED.gender, adult = EXCLUDED.adult,
+                                    popularity = EXCLUDED.popularity, original_name = EXCLUDED.original_name,
+                                    last_updated_at = NOW()
+                            """, metadata_to_commit, template="(%s, %s, %s, %s, %s, %s, NOW())", page_size=500)
+                            logger.trace(f"  ➜ 成功批量写入 {len(metadata_to_commit)} 条演员元数据。")
+
+                        _write_imdb_updates(cursor, imdb_updates_to_commit)
+
+                        if invalid_tmdb_ids:
+                            cursor.execute(
+                                "UPDATE person_identity_map SET tmdb_person_id = NULL WHERE tmdb_person_id = ANY(%s)",
+                                ([int(tid) for tid in invalid_tmdb_ids],)
+                            )
+
+                        # 进度与本批次数据在同一事务中提交
+                        settings_db._save_setting_with_cursor(cursor, ENRICH_PROGRESS_SETTING_KEY, progress_state)
+                        conn.commit()
+                        logger.info("  ✅ 数据库更改已成功提交。")
+
+                    except Exception as db_e:
+                        logger.error(f"  ➜ 数据库操作失败: {db_e}", exc_info=True)
+                        conn.rollback()
+
+                if finished:
+                    cursor.execute("DELETE FROM app_settings WHERE setting_key = %s", (ENRICH_PROGRESS_SETTING_KEY,))
+                    conn.commit()
+                    logger.info(f"  ✅ 本轮演员元数据补充已全部完成，共处理 {processed} 位演员。")
             else:
                 logger.info("  ➜ 没有需要从 TMDb 补充或清理的演员。")
+                cursor.execute("DELETE FROM app_settings WHERE setting_key = %s", (ENRICH_PROGRESS_SETTING_KEY,))
+                conn.commit()
 
     except InterruptedError:
         logger.info("  🚫 演员数据补充任务被中止。")
@@ -0,0 +1,38 @@
+# atomic_io.py
+"""
+原子文件写入：先写同目录下唯一命名的临时文件，写完后再原子替换目标文件。
+并发写入同一路径、或写入中途失败时，都不会留下半截文件。
+"""
+import os
+import json
+import tempfile
+from typing import Any, BinaryIO, Callable, Optional
+
+# mkstemp 创建的临时文件只有属主可读写，替换前改为常规权限，Emby 等以其它用户身份运行的程序才能读取
+FILE_MODE = 0o644
+
+def replace_atomically(path: str, write_func: Callable[[BinaryIO], Optional[bool]], suffix: str = ".tmp") -> bool:
+    """
+    调用 write_func 把内容写入临时文件后替换 path。
+    write_func 返回 False 时放弃本次写入 (删除临时文件，目标文件保持不变)；返回是否已替换。
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or '.', suffix=suffix)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            keep = write_func(f)
+        if keep is False:
+            os.remove(tmp_path)
+            return False
+        os.chmod(tmp_path, FILE_MODE)
+        os.replace(tmp_path, path)
+        return True
+    except BaseException:
+        try: os.remove(tmp_path)
+        except OSError: pass
+        raise
+
+def write_bytes_atomic(path: str, payload: bytes):
+    replace_atomically(path, lambda f: f.write(payload))
+
+def write_json_atomic(path: str, data: Any, indent: Optional[int] = 2):
+    write_bytes_atomic(path, json.dumps(data, ensure_ascii=False, indent=indent).encode('utf-8'))
@@ -0,0 +1,68 @@
+# boot_snapshot.py
+"""
+启动预热快照：把启动时需要全量加载的内存缓存 (向量矩阵、已处理记录) 保存到本地二进制文件。
+
+- 每个快照由若干 NumPy 数组文件 (.npy，读取时以内存映射方式打开) 和一个索引文件 (.json) 组成；
+- 索引文件记录生成快照时数据库中对应数据的校验值，加载时校验值不一致即视为过期，由调用方回退到数据库全量加载；
+- 索引文件最后写入，充当提交标记；数组文件名带校验值，多个进程同时读写时互不覆盖。
+"""
+import os
+import json
+import hashlib
+import logging
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+import config_manager
+from atomic_io import replace_atomically
+
+logger = logging.getLogger(__name__)
+
+def _snapshot_dir() -> str:
+    return os.path.join(config_manager.PERSISTENT_DATA_PATH, 'cache', 'boot_snapshot')
+
+def save_snapshot(name: str, checksum: str, arrays: Dict[str, np.ndarray], index: Dict[str, Any]):
+    """保存快照。失败只记录日志，下次启动会回退到数据库加载。"""
+    snapshot_dir = _snapshot_dir()
+    try:
+        os.makedirs(snapshot_dir, exist_ok=True)
+        array_files = {}
+        # 校验值的前缀可能相同 (例如 "条数-时间戳")，文件名改用其摘要
+        version = hashlib.md5(checksum.encode('utf-8')).hexdigest()[:16]
+        for key, array in arrays.items():
+            filename = f"{name}-{version}.{key}.npy"
+            replace_atomically(os.path.join(snapshot_dir, filename), lambda f, a=array: np.save(f, np.ascontiguousarray(a), allow_pickle=False))
+            array_files[key] = filename
+
+        meta = {"checksum": checksum, "arrays": array_files, "index": index}
+        replace_atomically(os.path.join(snapshot_dir, f"{name}.json"), lambda f: f.write(json.dumps(meta, ensure_ascii=False).encode('utf-8')))
+
+        # 清理旧版本的数组文件 (已打开的内存映射在 Linux 下不受影响)
+        for filename in os.listdir(snapshot_dir):
+            if filename.startswith(f"{name}-") and filename.endswith(".npy") and filename not in array_files.values():
+                try: os.remove(os.path.join(snapshot_dir, filename))
+                except OSError: pass
+        logger.debug(f"  ➜ [启动快照] 已保存快照 '{name}'。")
+    except Exception as e:
+        logger.warning(f"  ➜ [启动快照] 保存快照 '{name}' 失败: {e}")
+
+def load_snapshot(name: str, checksum: str) -> Optional[Tuple[Dict[str, np.ndarray], Dict[str, Any]]]:
+    """校验值一致时返回 (数组字典, 索引)，数组为只读内存映射；快照不存在或已过期返回 None。"""
+    meta_path = os.path.join(_snapshot_dir(), f"{name}.json")
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        if meta.get("checksum") != checksum:
+            logger.debug(f"  ➜ [启动快照] 快照 '{name}' 与数据库不一致，需要重新加载。")
+            return None
+        arrays = {
+            key: np.load(os.path.join(_snapshot_dir(), filename), mmap_mode='r', allow_pickle=False)
+            for key, filename in meta.get("arrays", {}).items()
+        }
+        return arrays, meta.get("index") or {}
+    except Exception as e:
+        logger.warning(f"  ➜ [启动快照] 读取快照 '{name}' 失败，回退到数据库加载: {e}")
+        return None
@@ -0,0 +1,180 @@
+# cache_events.py
+"""
+跨进程的缓存失效广播 (基于 PostgreSQL LISTEN / NOTIFY)。
+
+反代工作进程、任务工作进程与管理后台各自持有内存缓存 (主页视图、最新条目、封面版本号等)，
+任何一方修改了数据后调用 publish()，其它进程中通过 subscribe() 注册的处理函数会收到同一事件。
+- 处理函数签名为 handler(payload)；payload 为 None 表示“全部失效” (监听连接断线重连后会补发，防止漏掉期间的事件)。
+- 发布方自己的缓存由调用方直接处理，本进程发出的事件不会再回调一次；notify() 会先在本进程执行处理函数再广播。
+- 反代视图、最新条目、封面版本号、仪表盘统计等缓存的失效统一通过文件末尾的函数触发，
+  调用方不需要导入持有缓存的模块 (reverse_proxy / routes.user_portal)。
+- 批量任务中逐条变化的 ID 用 publish_batched() 合并，短时间内只广播一次，避免每次写入都占用一个数据库连接。
+"""
+import json
+import uuid
+import hashlib
+import time
+import select
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+from database.connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "etk_cache_events"
+_RECONNECT_DELAY_SECONDS = 5
+# 合并广播的等待时间，以及单条通知携带的 ID 数量上限 (pg_notify 的消息不能超过 8000 字节)
+BATCH_INTERVAL_SECONDS = 1.0
+_BATCH_CHUNK_SIZE = 100
+
+_ORIGIN = uuid.uuid4().hex # 每个进程独立，用于过滤自己发出的事件
+_handlers: Dict[str, List[Callable[[Optional[Dict[str, Any]]], None]]] = {}
+_handlers_lock = threading.Lock()
+_listener_started = False
+_pending: Dict[str, Dict[str, set]] = {}
+_pending_lock = threading.Lock()
+_flush_scheduled = False
+
+def subscribe(kind: str, handler: Callable[[Optional[Dict[str, Any]]], None]):
+    """注册某类事件的处理函数。"""
+    with _handlers_lock:
+        _handlers.setdefault(kind, []).append(handler)
+
+def publish(kind: str, payload: Optional[Dict[str, Any]] = None):
+    """向所有进程广播一个事件。广播失败只记录日志，不影响调用方的主流程。"""
+    message = json.dumps({"origin": _ORIGIN, "kind": kind, "payload": payload}, ensure_ascii=False)
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_notify(%s, %s)", (CHANNEL, message))
+    except Exception as e:
+        logger.warning(f"  ➜ 广播缓存事件 '{kind}' 失败: {e}")
+
+def notify(kind: str, payload: Optional[Dict[str, Any]] = None):
+    """先执行本进程中注册的处理函数，再广播给其它进程。"""
+    _dispatch(kind, payload)
+    publish(kind, payload)
+
+def publish_batched(kind: str, group: str, ids):
+    """
+    把一批 ID 并入待广播的事件，BATCH_INTERVAL_SECONDS 内的多次调用合并为一次广播，
+    payload 形如 {group: [ID, ...]}。同一 ID 只保留最后一次所属的分组 (例如先新增后删除只广播删除)。
+    """
+    ids = {str(i) for i in ids if i}
+    if not ids:
+        return
+    global _flush_scheduled
+    with _pending_lock:
+        groups = _pending.setdefault(kind, {})
+        for other_group, other_ids in groups.items():
+            if other_group != group:
+                other_ids -= ids
+        groups.setdefault(group, set()).update(ids)
+        schedule = not _flush_scheduled
+        _flush_scheduled = True
+    if schedule:
+        timer = threading.Timer(BATCH_INTERVAL_SECONDS, flush_batched)
+        timer.daemon = True
+        timer.start()
+
+def flush_batched():
+    """立即广播所有待合并的事件 (进程即将退出时也应调用一次)。"""
+    global _pending, _flush_scheduled
+    with _pending_lock:
+        pending, _pending = _pending, {}
+        _flush_scheduled = False
+    for kind, groups in pending.items():
+        for group, ids in groups.items():
+            ids = sorted(ids)
+            for start in range(0, len(ids), _BATCH_CHUNK_SIZE):
+                publish(kind, {group: ids[start:start + _BATCH_CHUNK_SIZE]})
+
+def _dispatch(kind: str, payload: Optional[Dict[str, Any]]):
+    with _handlers_lock:
+        handlers = list(_handlers.get(kind, []))
+    for handler in handlers:
+        try:
+            handler(payload)
+        except Exception as e:
+            logger.error(f"  ➜ 处理缓存事件 '{kind}' 时出错: {e}", exc_info=True)
+
+def _dispatch_reset_all():
+    with _handlers_lock:
+        kinds = list(_handlers.keys())
+    for kind in kinds:
+        _dispatch(kind, None)
+
+def _listen_forever():
+    connected_before = False
+    while True:
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            if connected_before:
+                # 断线期间可能漏掉了事件，全部缓存按失效处理
+                _dispatch_reset_all()
+            connected_before = True
+            logger.debug(f"  ➜ 已开始监听缓存失效事件 (频道: {CHANNEL})。")
+
+            while True:
+                # gevent 下 select 已被 patch，等待期间不会阻塞其它 greenlet
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        message = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    if message.get("origin") == _ORIGIN:
+                        continue
+                    _dispatch(message.get("kind"), message.get("payload"))
+        except Exception as e:
+            logger.warning(f"  ➜ 缓存事件监听连接中断，{_RECONNECT_DELAY_SECONDS} 秒后重连: {e}")
+        finally:
+            if conn is not None:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        time.sleep(_RECONNECT_DELAY_SECONDS)
+
+def start_listener():
+    """在后台启动监听 (每个进程只需调用一次)。"""
+    global _listener_started
+    with _handlers_lock:
+        if _listener_started:
+            return
+        _listener_started = True
+    threading.Thread(target=_listen_forever, name="cache-events-listener", daemon=True).start()
+
+# ======================================================================
+# 常用缓存的失效入口 (处理函数由持有缓存的模块在导入时 subscribe)
+# ======================================================================
+
+def invalidate_views_cache():
+    """合集增删改、封面重新生成或用户权限变化时调用，清空所有用户的反代主页视图缓存。"""
+    notify('views')
+
+def invalidate_latest_feed_cache():
+    """新媒体入库 / 删除或合集变动时调用，清空所有用户的反代全局最新缓存。"""
+    notify('latest_feed')
+
+def record_cover_image_version(item_id, image_data: bytes):
+    """封面上传成功后记录其内容哈希，作为虚拟库封面的 Tag。"""
+    if not item_id or not image_data: return
+    notify('cover_version', {'item_id': item_id, 'version': hashlib.md5(image_data).hexdigest()[:16]})
+
+def forget_cover_image_version(item_id):
+    """封面在 Emby 侧被外部修改时调用，下次构建视图时重新读取 Emby 的图片 Tag。"""
+    notify('cover_version', {'item_id': item_id, 'version': None})
+
+def invalidate_dashboard_cache():
+    """播放流水有新数据入库时调用，清空仪表盘统计缓存。"""
+    notify('playback_stats')
@@ -52,6 +52,7 @@ BOOTSTRAP_CONFIG_DEF = {
     # [Authentication]
     constants.CONFIG_OPTION_AUTH_ENABLED: (constants.CONFIG_SECTION_AUTH, 'boolean', False),
     constants.CONFIG_OPTION_AUTH_USERNAME: (constants.CONFIG_SECTION_AUTH, 'string', constants.DEFAULT_USERNAME),
+    constants.CONFIG_OPTION_METRICS_TOKEN: (constants.CONFIG_SECTION_AUTH, 'string', ""),
 }
 
 # ✨✨✨ “配置清单” - 这是配置模块的核心 ✨✨✨
@@ -74,6 +75,7 @@ DYNAMIC_CONFIG_DEF = {
     constants.CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER: (constants.CONFIG_SECTION_REVERSE_PROXY, 'str', 'before'),
     constants.CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER: (constants.CONFIG_SECTION_REVERSE_PROXY, 'str', 'before'),
     constants.CONFIG_OPTION_PROXY_SHOW_MISSING_PLACEHOLDERS: (constants.CONFIG_SECTION_REVERSE_PROXY, 'boolean', False),
+    constants.CONFIG_OPTION_PROXY_WORKER_PROCESSES: (constants.CONFIG_SECTION_REVERSE_PROXY, 'int', 1),
 
     # [TMDB]
     constants.CONFIG_OPTION_TMDB_API_KEY: (constants.CONFIG_SECTION_TMDB, 'string', ""),
@@ -162,6 +164,8 @@ DYNAMIC_CONFIG_DEF = {
     constants.CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_CRON: (constants.CONFIG_SECTION_SCHEDULER, 'string', "0 5 * * 0"),
     constants.CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_SEQUENCE: (constants.CONFIG_SECTION_SCHEDULER, 'list', []),
     constants.CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_MAX_RUNTIME_MINUTES: (constants.CONFIG_SECTION_SCHEDULER, 'int', 0),
+    constants.CONFIG_OPTION_TASK_PROCESS_ISOLATION: (constants.CONFIG_SECTION_SCHEDULER, 'boolean', True),
+    constants.CONFIG_OPTION_PLAYBACK_HISTORY_SYNC_INTERVAL: (constants.CONFIG_SECTION_SCHEDULER, 'int', 15),
     
     # [Actor]
     constants.CONFIG_OPTION_ACTOR_ROLE_ADD_PREFIX: (constants.CONFIG_SECTION_ACTOR, 'boolean', False),
@@ -312,6 +316,10 @@ def save_config(new_config: Dict[str, Any]):
         # 步骤 5: 更新内存中的全局配置以立即生效
         APP_CONFIG.update(dynamic_config_to_save)
         logger.info("  ➜ 动态应用配置已成功合并保存到数据库，内存中的配置已同步。")
+
+        # 步骤 6: 通知反代工作进程等其它进程重新加载配置
+        import cache_events # cache_events 依赖的 database.connection 在导入时需要本模块
+        cache_events.publish('config')
         
     except Exception as e:
         logger.error(f"  ➜ 保存动态配置到数据库时失败: {e}", exc_info=True)
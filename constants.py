@@ -77,6 +77,7 @@ CONFIG_OPTION_PROXY_MERGE_NATIVE = "proxy_merge_native_libraries"
 CONFIG_OPTION_PROXY_NATIVE_VIEW_SELECTION = "proxy_native_view_selection"  # List[str]
 CONFIG_OPTION_PROXY_NATIVE_VIEW_ORDER = "proxy_native_view_order"  # str, 'before' or 'after'
 CONFIG_OPTION_PROXY_SHOW_MISSING_PLACEHOLDERS = "proxy_show_missing_placeholders"
+CONFIG_OPTION_PROXY_WORKER_PROCESSES = "proxy_worker_processes"  # int, 反代工作进程数，1 表示在主进程内运行
 
 # ==============================================================================
 # ✨ Emby 服务器连接配置 (Emby Connection)
@@ -176,6 +177,12 @@ CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_CRON = "task_chain_low_freq_cron"
 CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_SEQUENCE = "task_chain_low_freq_sequence"
 CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_MAX_RUNTIME_MINUTES = "task_chain_low_freq_max_runtime_minutes"
 
+# --- CPU 密集型任务在独立工作进程中执行 (避免占用 GIL 拖慢反代) ---
+CONFIG_OPTION_TASK_PROCESS_ISOLATION = "task_process_isolation"
+
+# --- 播放统计：定时增量导入 Playback Reporting 插件流水的间隔 (分钟)，0 表示关闭 ---
+CONFIG_OPTION_PLAYBACK_HISTORY_SYNC_INTERVAL = "playback_history_sync_interval_minutes"
+
 
 
 # --- 演员前缀 ---
@@ -190,6 +197,8 @@ CONFIG_OPTION_LOG_ROTATION_SIZE_MB = "log_rotation_size_mb"
 CONFIG_OPTION_LOG_ROTATION_BACKUPS = "log_rotation_backup_count"
 DEFAULT_LOG_ROTATION_SIZE_MB = 5
 DEFAULT_LOG_ROTATION_BACKUPS = 10
+# 前端实时日志环形缓冲区的容量 (按消息大小计，而不是行数)
+FRONTEND_LOG_BUFFER_SIZE_MB = 4
 # ==============================================================================
 # ✨ 内部常量与映射 (Internal Constants & Mappings)
 # ==============================================================================
@@ -197,6 +206,8 @@ DEFAULT_LOG_ROTATION_BACKUPS = 10
 CONFIG_SECTION_AUTH = "Authentication"
 CONFIG_OPTION_AUTH_ENABLED = "auth_enabled"
 CONFIG_OPTION_AUTH_USERNAME = "username"
+# /metrics 抓取令牌：Prometheus 等采集器无法使用登录会话，以 "Authorization: Bearer <令牌>" 访问
+CONFIG_OPTION_METRICS_TOKEN = "metrics_token"
 DEFAULT_USERNAME = "admin"
 
 # --- 语言代码 ---
@@ -6,6 +6,9 @@ import time
 import re
 import copy
 import random
+import shutil
+import hashlib
+import concurrent.futures
 from typing import Dict, List, Optional, Any, Tuple
 from collections import defaultdict
 import threading
@@ -22,6 +25,12 @@ import handler.tmdb as tmdb
 from tasks.helpers import parse_full_asset_details, calculate_ancestor_ids, construct_metadata_payload, translate_tmdb_metadata_recursively
 import utils
 import constants
+import metrics
+import boot_snapshot
+import atomic_io
+import cache_events
+import extensions
+from processed_items_cache import ProcessedItemsCache, build_digest_array
 import logging
 import actor_utils
 from database.actor_db import ActorDBManager
@@ -43,6 +52,162 @@ except ImportError:
         def get_acting(self, *args, **kwargs): return {}
         def close(self): pass
 
+# --- 图片并发下载 ---
+IMAGE_DOWNLOAD_MAX_WORKERS = 4
+IMAGE_DOWNLOAD_TIMEOUT = 15
+
+def _stream_to_file_atomic(session, url: str, save_path: str, timeout: int = IMAGE_DOWNLOAD_TIMEOUT, **request_kwargs) -> bool:
+    """流式下载到同目录下的临时文件，完整写入后再原子替换为目标文件，避免留下半截图片。"""
+    with session.get(url, timeout=timeout, stream=True, **request_kwargs) as resp:
+        if resp.status_code != 200:
+            return False
+
+        def write(f) -> bool:
+            written = 0
+            for chunk in resp.iter_content(chunk_size=65536):
+                if chunk:
+                    f.write(chunk)
+                    written += len(chunk)
+            return written > 0 # 空响应不替换目标文件
+
+        return atomic_io.replace_atomically(save_path, write, suffix=".part")
+
+def _link_or_copy(src_path: str, dst_path: str):
+    """同一来源的图片只下载一次，其余目标优先硬链接，不支持时退回复制。"""
+    try:
+        if os.path.exists(dst_path):
+            os.remove(dst_path)
+        os.link(src_path, dst_path)
+    except OSError:
+        shutil.copyfile(src_path, dst_path)
+
+def _download_images_concurrently(downloads: List[Tuple[str, str]], target_dir: str, log_prefix: str = "[图片下载]",
+                                  overwrite: bool = False, session=None, max_workers: int = IMAGE_DOWNLOAD_MAX_WORKERS,
+                                  **request_kwargs) -> int:
+    """
+    并发下载一组图片 [(url, 本地文件名)] 到 target_dir，返回成功落盘的文件数。
+    - 相同 url 只下载一次，其他文件名通过硬链接/复制生成；
+    - overwrite=False 时跳过已存在的非空文件；
+    - 共用一个 Session 复用连接，并发数受 max_workers 限制。
+    """
+    targets_by_url: Dict[str, List[str]] = defaultdict(list)
+    for url, local_name in downloads:
+        if url and local_name not in targets_by_url[url]:
+            targets_by_url[url].append(local_name)
+
+    def _exists(name):
+        path = os.path.join(target_dir, name)
+        return os.path.exists(path) and os.path.getsize(path) > 0
+
+    jobs = []
+    for url, names in targets_by_url.items():
+        missing = names if overwrite else [n for n in names if not _exists(n)]
+        if missing:
+            existing = [n for n in names if n not in missing]
+            jobs.append((url, missing, existing[0] if existing else None))
+    if not jobs:
+        return 0
+
+    own_session = session is None
+    if own_session:
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+
+    def _run_job(job):
+        url, missing_names, existing_name = job
+        if existing_name:
+            source_path = os.path.join(target_dir, existing_name)
+            remaining = missing_names
+            done = 0
+        else:
+            source_path = os.path.join(target_dir, missing_names[0])
+            if not _stream_to_file_atomic(session, url, source_path, **request_kwargs):
+                logger.warning(f"  ➜ {log_prefix} 下载图片失败 {missing_names[0]}")
+                return 0
+            remaining = missing_names[1:]
+            done = 1
+        for name in remaining:
+            try:
+                _link_or_copy(source_path, os.path.join(target_dir, name))
+                done += 1
+            except Exception as e:
+                logger.warning(f"  ➜ {log_prefix} 复制图片 {name} 失败: {e}")
+        return done
+
+    success_count = 0
+    try:
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_run_job, job) for job in jobs]
+            for future in concurrent.futures.as_completed(futures):
+                try:
+                    success_count += future.result()
+                except Exception as e:
+                    logger.warning(f"  ➜ {log_prefix} 下载图片时发生错误: {e}")
+    finally:
+        if own_session:
+            session.close()
+    return success_count
+
+# --- 图片标签清单 (记录已备份图片对应的 Emby ImageTag，标签未变则跳过下载) ---
+IMAGE_TAG_MANIFEST_FILENAME = ".image_tags.json"
+
+def _load_image_tag_manifest(image_dir: str) -> Dict[str, Dict[str, Any]]:
+    manifest_path = os.path.join(image_dir, IMAGE_TAG_MANIFEST_FILENAME)
+    if not os.path.exists(manifest_path):
+        return {}
+    try:
+        with open(manifest_path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return data if isinstance(data, dict) else {}
+    except Exception as e:
+        logger.warning(f"  ➜ 读取图片标签清单失败，将视为全部需要下载: {e}")
+        return {}
+
+def _save_image_tag_manifest(image_dir: str, manifest: Dict[str, Dict[str, Any]]):
+    manifest_path = os.path.join(image_dir, IMAGE_TAG_MANIFEST_FILENAME)
+    try:
+        atomic_io.write_bytes_atomic(manifest_path, json.dumps(manifest, ensure_ascii=False, indent=2, sort_keys=True).encode('utf-8'))
+    except Exception as e:
+        logger.warning(f"  ➜ 保存图片标签清单失败: {e}")
+
+# 已处理记录的启动快照名称 (见 boot_snapshot)
+PROCESSED_LOG_SNAPSHOT_NAME = 'processed_items'
+
+# --- 季/集 override 文件批量写入 ---
+OVERRIDE_FILE_IO_MAX_WORKERS = 8
+
+def _json_content_digest(data: Any) -> str:
+    """与排版、键顺序无关的内容哈希，用于判断文件内容是否真正变化。"""
+    canonical = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+def _load_json_with_digest(file_path: str) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """读取已有的 JSON 文件并计算内容哈希 (必须在调用方修改数据之前计算)。"""
+    if not os.path.exists(file_path):
+        return None, None
+    data = _read_local_json(file_path)
+    if data is None:
+        return None, None
+    return data, _json_content_digest(data)
+
+def _get_emby_image_tag(item: Dict[str, Any], image_type: str) -> Optional[str]:
+    """
+    取 Emby 项目某类图片的 Tag。
+    返回 None 表示数据中没有标签信息 (无法判断，需要下载)；返回空字符串表示 Emby 中确定没有这张图。
+    """
+    if image_type == "Backdrop":
+        if "BackdropImageTags" not in item:
+            return None
+        backdrop_tags = item.get("BackdropImageTags") or []
+        return backdrop_tags[0] if backdrop_tags else ""
+    if "ImageTags" not in item:
+        return None
+    return (item.get("ImageTags") or {}).get(image_type) or ""
+
 def extract_tag_names(item_data):
     """
     兼容新旧版 Emby API 提取标签名。
@@ -107,6 +272,28 @@ def _aggregate_series_cast_from_tmdb_data(series_data: Dict[str, Any], all_episo
     
     logger.info(f"  ➜ 共为 '{series_data.get('name')}' 聚合了 {len(full_aggregated_cast)} 位独立演员。")
     return full_aggregated_cast
+
+# 已处理记录的跨进程同步：任务工作进程标记 / 移除的项目要同步到管理后台的内存缓存 (Webhook 依赖它判断是否为追更)
+PROCESSED_ITEMS_EVENT = 'processed_items'
+
+def _apply_processed_items_event(payload: Optional[Dict[str, Any]]):
+    """payload 为 None (清空记录或监听重连) 时丢弃内存缓存，下次使用时重新加载。"""
+    processor = extensions.media_processor_instance
+    if processor is None:
+        return
+    if payload is None:
+        processor.reset_processed_items_cache()
+        return
+    cache = processor._processed_items_cache
+    if cache is None:
+        return # 尚未加载，之后加载时会直接读到最新记录
+    for item_id in payload.get('added') or []:
+        cache.add(item_id)
+    for item_id in payload.get('removed') or []:
+        cache.discard(item_id)
+
+cache_events.subscribe(PROCESSED_ITEMS_EVENT, _apply_processed_items_event)
+
 class MediaProcessor:
     def __init__(self, config: Dict[str, Any], ai_translator=None, douban_api=None):
         # ★★★ 然后，从这个 config 字典里，解析出所有需要的属性 ★★★
@@ -126,12 +313,31 @@ class MediaProcessor:
         self.ai_translator = ai_translator
         
         self._stop_event = threading.Event()
-        self.processed_items_cache = self._load_processed_log_from_db()
+        self._processed_items_cache: Optional[ProcessedItemsCache] = None
+        self._processed_items_cache_lock = threading.Lock()
         self.manual_edit_cache = TTLCache(maxsize=10, ttl=600)
         self._global_lib_guid_map = {}
         self._last_lib_map_update = 0
         logger.trace("核心处理器初始化完成。")
 
+    @property
+    def processed_items_cache(self) -> ProcessedItemsCache:
+        """已处理记录在第一次使用时才加载 (任务工作进程中的多数任务用不到它)。"""
+        if self._processed_items_cache is None:
+            with self._processed_items_cache_lock:
+                if self._processed_items_cache is None:
+                    self._processed_items_cache = self._load_processed_log_from_db()
+        return self._processed_items_cache
+
+    def reset_processed_items_cache(self):
+        with self._processed_items_cache_lock:
+            self._processed_items_cache = None
+
+    def forget_processed_item(self, item_id: str):
+        """从内存中的已处理记录移除一个项目，并同步给其它进程。"""
+        self.processed_items_cache.discard(item_id)
+        cache_events.publish_batched(PROCESSED_ITEMS_EVENT, 'removed', [item_id])
+
     # --- [优化版] 实时监控文件逻辑 (增加缓存跳过 & 支持批量延迟刷新) ---
     def process_file_actively(self, file_path: str, skip_refresh: bool = False) -> Optional[str]:
         """
@@ -632,7 +838,8 @@ class MediaProcessor:
                 # 5: 下载图片
                 self.download_images_from_tmdb(
                     tmdb_id=tmdb_id,
-                    item_type=item_type
+                    item_type=item_type,
+                    original_language=details.get('original_language')
                 )
 
             else:
@@ -1293,8 +1500,9 @@ class MediaProcessor:
         # 1. 更新数据库
         self.log_db_manager.save_to_processed_log(cursor, item_id, item_name, score=score)
         
-        # 2. 实时更新内存缓存
-        self.processed_items_cache[item_id] = item_name
+        # 2. 实时更新内存缓存 (并同步给其它进程)
+        self.processed_items_cache.add(item_id)
+        cache_events.publish_batched(PROCESSED_ITEMS_EVENT, 'added', [item_id])
         
         logger.debug(f"  ➜ 已将 '{item_name}' 标记为已处理 (数据库 & 内存)。")
     # --- 清除已处理记录 ---
@@ -1314,8 +1522,9 @@ class MediaProcessor:
             
             logger.info("  ➜ 数据库中的已处理记录已清除。")
 
-            # 2. 清空内存缓存
+            # 2. 清空内存缓存 (其它进程收到事件后重新加载)
             self.processed_items_cache.clear()
+            cache_events.publish(PROCESSED_ITEMS_EVENT, None)
             logger.info("  ➜ 内存中的已处理记录缓存已清除。")
 
         except Exception as e:
@@ -1356,54 +1565,40 @@ class MediaProcessor:
     def is_stop_requested(self) -> bool:
         return self._stop_event.is_set()
 
-    def _load_processed_log_from_db(self) -> Dict[str, str]:
-        log_dict = {}
+    def _load_processed_log_from_db(self) -> ProcessedItemsCache:
         try:
             # 1. ★★★ 使用 with 语句和中央函数 ★★★
             with get_central_db_connection() as conn:
                 cursor = conn.cursor()
                 
-                # 2. 执行查询
-                cursor.execute("SELECT item_id, item_name FROM processed_log")
-                rows = cursor.fetchall()
-                
-                # 3. 处理结果
-                for row in rows:
-                    if row['item_id'] and row['item_name']:
-                        log_dict[row['item_id']] = row['item_name']
+                # 2. 先用行数 + 最近处理时间校验本地快照，一致时直接内存映射快照中的摘要数组
+                #    (写入都会刷新 processed_at，删除会改变行数)
+                cursor.execute("SELECT COUNT(*) AS row_count, MAX(processed_at) AS latest FROM processed_log")
+                checksum_row = cursor.fetchone()
+                checksum = f"{checksum_row['row_count']}-{checksum_row['latest'].isoformat() if checksum_row['latest'] else ''}"
+                snapshot = boot_snapshot.load_snapshot(PROCESSED_LOG_SNAPSHOT_NAME, checksum)
+                if snapshot and 'digests' in snapshot[0]:
+                    digests = snapshot[0]['digests']
+                    logger.debug(f"  ➜ 已从本地快照加载 {len(digests)} 条已处理记录。")
+                    return ProcessedItemsCache(digests)
+
+                # 3. 执行查询 (只取 ID，名称在需要时再按需读取)
+                cursor.execute("SELECT item_id FROM processed_log WHERE item_id IS NOT NULL AND item_name IS NOT NULL AND item_name <> ''")
+                digests = build_digest_array(row['item_id'] for row in cursor.fetchall())
             
             # 4. with 语句会自动处理所有事情，代码干净利落！
+            boot_snapshot.save_snapshot(PROCESSED_LOG_SNAPSHOT_NAME, checksum, {'digests': digests}, {})
+            return ProcessedItemsCache(digests)
 
         except Exception as e:
             # 5. ★★★ 记录更详细的异常信息 ★★★
             logger.error(f"从数据库读取已处理记录失败: {e}", exc_info=True)
-        return log_dict
+        return ProcessedItemsCache()
 
     # 在本地缓存中查找豆瓣JSON文件
     def _find_local_douban_json(self, imdb_id: Optional[str], douban_id: Optional[str], douban_cache_dir: str) -> Optional[str]:
-        """根据 IMDb ID 或 豆瓣 ID 在本地缓存目录中查找对应的豆瓣JSON文件。"""
-        if not os.path.exists(douban_cache_dir):
-            return None
-        
-        # 优先使用 IMDb ID 匹配，更准确
-        if imdb_id:
-            for dirname in os.listdir(douban_cache_dir):
-                if dirname.startswith('0_'): continue
-                if imdb_id in dirname:
-                    dir_path = os.path.join(douban_cache_dir, dirname)
-                    for filename in os.listdir(dir_path):
-                        if filename.endswith('.json'):
-                            return os.path.join(dir_path, filename)
-                            
-        # 其次使用豆瓣 ID 匹配
-        if douban_id:
-            for dirname in os.listdir(douban_cache_dir):
-                if dirname.startswith(f"{douban_id}_"):
-                    dir_path = os.path.join(douban_cache_dir, dirname)
-                    for filename in os.listdir(dir_path):
-                        if filename.endswith('.json'):
-                            return os.path.join(dir_path, filename)
-        return None
+        """根据 IMDb ID 或 豆瓣 ID 在本地缓存目录中查找对应的豆瓣JSON文件 (查找规则与 DoubanApi 的本地缓存一致)。"""
+        return DoubanApi.find_local_subject_file(douban_cache_dir, douban_id=douban_id, imdb_id=imdb_id)
 
     # ✨ 封装了“优先本地缓存，失败则在线获取”的逻辑
     def _get_douban_data_with_local_cache(self, media_info: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], Optional[float]]:
@@ -1427,7 +1622,12 @@ class MediaProcessor:
         if local_json_path:
             logger.debug(f"  ➜ 发现本地豆瓣缓存文件，将直接使用: {local_json_path}")
             douban_data = _read_local_json(local_json_path)
-            if douban_data:
+            if douban_data and 'actors' not in douban_data:
+                # 只有匹配/详情信息、尚未拿到演职员的残缺文件，按未命中处理
+                logger.debug(f"  ➜ 本地豆瓣缓存文件 '{local_json_path}' 缺少演职员信息，将回退到在线API。")
+            elif douban_data and not DoubanApi.is_local_subject_fresh(douban_data):
+                logger.debug(f"  ➜ 本地豆瓣缓存文件 '{local_json_path}' 中的演职员信息已过期，将回退到在线API。")
+            elif douban_data:
                 cast = douban_data.get('actors', [])
                 rating_str = douban_data.get("rating", {}).get("value")
                 rating_float = None
@@ -1590,10 +1790,8 @@ class MediaProcessor:
         
         with get_central_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("SELECT item_id, item_name FROM processed_log")
-            processed_log_entries = cursor.fetchall()
-            
-            processed_ids_in_db = {entry['item_id'] for entry in processed_log_entries}
+            cursor.execute("SELECT item_id FROM processed_log")
+            processed_ids_in_db = {entry['item_id'] for entry in cursor.fetchall()}
             emby_ids_in_library = {item.get('Id') for item in all_items if item.get('Id')}
             
             # 找出在 processed_log 中但不在 Emby 媒体库中的项目
@@ -1605,8 +1803,7 @@ class MediaProcessor:
                     self.log_db_manager.remove_from_processed_log(cursor, deleted_item_id)
                     self.log_db_manager.remove_from_failed_log(cursor, deleted_item_id)
                     # 同时从内存缓存中移除
-                    if deleted_item_id in self.processed_items_cache:
-                        del self.processed_items_cache[deleted_item_id]
+                    self.forget_processed_item(deleted_item_id)
                     logger.debug(f"  ➜ 已从 '已处理' 中移除 ItemID: {deleted_item_id}")
                 conn.commit()
                 logger.info("  ➜ 已删除媒体项的清理工作完成。")
@@ -1655,8 +1852,7 @@ class MediaProcessor:
         """
         # 1. 除非强制，否则跳过已处理的
         if not force_full_update and not specific_episode_ids and emby_item_id in self.processed_items_cache:
-            item_name_from_cache = self.processed_items_cache.get(emby_item_id, f"ID:{emby_item_id}")
-            logger.info(f"媒体 '{item_name_from_cache}' 跳过已处理记录。")
+            logger.info(f"媒体 (ID: {emby_item_id}) 跳过已处理记录。")
             return True
 
         # 2. 检查停止信号
@@ -1687,11 +1883,13 @@ class MediaProcessor:
                 logger.warning(f"  ➜ 无法确定 '{item_details.get('Name')}' 所属的媒体库ID。")
 
         # 4. 将任务交给核心处理函数
-        return self._process_item_core_logic(
+        result = self._process_item_core_logic(
             item_details_from_emby=item_details,
             force_full_update=force_full_update,
             specific_episode_ids=specific_episode_ids
         )
+        metrics.record_items_processed()
+        return result
 
     # ---核心处理流程 ---
     def _process_item_core_logic(self, item_details_from_emby: Dict[str, Any], force_full_update: bool = False, specific_episode_ids: Optional[List[str]] = None):
@@ -3493,20 +3691,21 @@ class MediaProcessor:
                 logger.trace(f"  ➜ {log_prefix} 未提供更新描述，将同步所有类型的图片。")
                 images_to_sync = full_image_map
 
-            # --- 执行下载 ---
+            # --- 汇总下载任务: (来源项目ID, 图片类型, 文件名, Emby 图片标签) ---
+            image_jobs = []
             if not episode_ids_to_sync:
-                logger.info(f"  ➜ {log_prefix} 开始为 '{item_name_for_log}' 下载 {len(images_to_sync)} 张主图片至覆盖缓存")
                 for image_type, filename in images_to_sync.items():
-                    if self.is_stop_requested():
-                        logger.warning(f"  🚫 {log_prefix} 收到停止信号，中止图片下载。")
-                        return False
-                    emby.download_emby_image(item_id, image_type, os.path.join(image_override_dir, filename), self.emby_url, self.emby_api_key)
+                    image_jobs.append((item_id, image_type, filename, _get_emby_image_tag(item_details, image_type)))
             
             # --- 分集图片逻辑 ---
             if item_type == "Series" and self.config.get(constants.CONFIG_OPTION_BACKUP_EPISODE_IMAGE, False):
                 children_to_process = []
-                # 获取所有子项信息，用于查找
-                all_children = emby.get_series_children(item_id, self.emby_url, self.emby_api_key, self.emby_user_id, series_name_for_log=item_name_for_log) or []
+                # 获取所有子项信息 (带上 ImageTags，用于判断图片是否变化)
+                all_children = emby.get_series_children(
+                    item_id, self.emby_url, self.emby_api_key, self.emby_user_id,
+                    series_name_for_log=item_name_for_log,
+                    fields="Id,Name,ParentIndexNumber,IndexNumber,ImageTags"
+                ) or []
                 
                 if episode_ids_to_sync:
                     # 模式一：只处理指定的分集
@@ -3518,19 +3717,68 @@ class MediaProcessor:
                     children_to_process = all_children
 
                 for child in children_to_process:
-                    if self.is_stop_requested():
-                        logger.warning(f"  🚫 {log_prefix} 收到停止信号，中止子项目图片下载。")
-                        return False
                     child_type, child_id = child.get("Type"), child.get("Id")
                     if child_type == "Season":
                         season_number = child.get("IndexNumber")
                         if season_number is not None:
-                            emby.download_emby_image(child_id, "Primary", os.path.join(image_override_dir, f"season-{season_number}.jpg"), self.emby_url, self.emby_api_key)
+                            image_jobs.append((child_id, "Primary", f"season-{season_number}.jpg", _get_emby_image_tag(child, "Primary")))
                     elif child_type == "Episode":
                         season_number, episode_number = child.get("ParentIndexNumber"), child.get("IndexNumber")
                         if season_number is not None and episode_number is not None:
-                            emby.download_emby_image(child_id, "Primary", os.path.join(image_override_dir, f"season-{season_number}-episode-{episode_number}.jpg"), self.emby_url, self.emby_api_key)
-            
+                            image_jobs.append((child_id, "Primary", f"season-{season_number}-episode-{episode_number}.jpg", _get_emby_image_tag(child, "Primary")))
+
+            # --- 对比标签清单，只下载有变化的图片 ---
+            manifest = _load_image_tag_manifest(image_override_dir)
+            jobs_to_fetch = []
+            skipped_count, skipped_bytes, absent_count = 0, 0, 0
+            for source_id, image_type, filename, image_tag in image_jobs:
+                if image_tag == "":
+                    # Emby 中没有这张图，不必发请求
+                    absent_count += 1
+                    continue
+                save_path = os.path.join(image_override_dir, filename)
+                entry = manifest.get(filename) or {}
+                if image_tag and entry.get("tag") == image_tag and entry.get("source") == source_id \
+                        and os.path.exists(save_path) and os.path.getsize(save_path) > 0:
+                    skipped_count += 1
+                    skipped_bytes += os.path.getsize(save_path)
+                    continue
+                jobs_to_fetch.append((source_id, image_type, filename, image_tag))
+
+            logger.info(f"  ➜ {log_prefix} '{item_name_for_log}' 共 {len(image_jobs)} 张图片，需下载 {len(jobs_to_fetch)} 张，未变化跳过 {skipped_count} 张。")
+
+            def _fetch_image(job):
+                source_id, image_type, filename, image_tag = job
+                if self.is_stop_requested():
+                    return job, False
+                ok = emby.download_emby_image(source_id, image_type, os.path.join(image_override_dir, filename),
+                                              self.emby_url, self.emby_api_key, image_tag=image_tag)
+                return job, ok
+
+            fetched_count, fetched_bytes, failed_count = 0, 0, 0
+            if jobs_to_fetch:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=IMAGE_DOWNLOAD_MAX_WORKERS) as executor:
+                    for future in concurrent.futures.as_completed([executor.submit(_fetch_image, job) for job in jobs_to_fetch]):
+                        (source_id, image_type, filename, image_tag), ok = future.result()
+                        if not ok:
+                            failed_count += 1
+                            continue
+                        fetched_count += 1
+                        fetched_bytes += os.path.getsize(os.path.join(image_override_dir, filename))
+                        if image_tag:
+                            manifest[filename] = {"source": source_id, "type": image_type, "tag": image_tag}
+                        else:
+                            manifest.pop(filename, None)
+                _save_image_tag_manifest(image_override_dir, manifest)
+
+            if self.is_stop_requested():
+                logger.warning(f"  🚫 {log_prefix} 收到停止信号，图片下载已中止。")
+                return False
+
+            logger.info(
+                f"  ➜ {log_prefix} '{item_name_for_log}' 图片备份完成: 下载 {fetched_count} 张 ({fetched_bytes / 1024:.1f} KB)，"
+                f"跳过 {skipped_count} 张 ({skipped_bytes / 1024:.1f} KB)，Emby 无图 {absent_count} 张，失败 {failed_count} 张。"
+            )
             logger.trace(f"  ➜ {log_prefix} 成功完成 '{item_name_for_log}' 的覆盖缓存-图片备份。")
             return True
         except Exception as e:
@@ -3538,9 +3786,10 @@ class MediaProcessor:
             return False
     
     # --- 从 TMDb 直接下载图片 (用于实时监控/预处理) ---
-    def download_images_from_tmdb(self, tmdb_id: str, item_type: str) -> bool:
+    def download_images_from_tmdb(self, tmdb_id: str, item_type: str, original_language: Optional[str] = None) -> bool:
         """
         直接从 TMDb API 获取并下载图片到本地 override 目录。
+        只请求一次 TMDb (合并所有候选语言)，在本地按语言偏好排序选图，再并发下载。
         """
         if not tmdb_id or not self.local_data_path:
             logger.error(f"  ➜ [TMDb图片下载] 缺少 TMDb ID 或本地路径配置，无法下载。")
@@ -3555,143 +3804,101 @@ class MediaProcessor:
             image_override_dir = os.path.join(base_override_dir, "images")
             os.makedirs(image_override_dir, exist_ok=True)
 
-            # 先获取基础信息以确定原语言
-            orig_lang = "en" # 默认兜底
-            try:
-                # 发起一个轻量级请求（不带 append_to_response），只为拿 original_language
-                if item_type == "Movie":
-                    base_info = tmdb.get_movie_details(int(tmdb_id), self.tmdb_api_key, append_to_response="")
-                elif item_type == "Series":
-                    base_info = tmdb.get_tv_details(int(tmdb_id), self.tmdb_api_key, append_to_response="")
-
-                if base_info:
-                    orig_lang = base_info.get("original_language", "en")
-            except Exception as e:
-                logger.warning(f"  ➜ {log_prefix} 获取原语言失败，将默认使用 en: {e}")
+            # 原语言优先用调用方传入的，其次查本地数据库，都没有时由请求结果补全
+            orig_lang = original_language
+            if not orig_lang:
+                db_record = media_db.get_media_details(str(tmdb_id), item_type)
+                orig_lang = (db_record or {}).get("original_language")
 
-            # 2. 确定搜索策略
+            # 2. 确定语言优先级，所有候选语言合并为一次请求
             lang_pref = self.config.get(constants.CONFIG_OPTION_TMDB_IMAGE_LANGUAGE_PREFERENCE, 'zh')
+            request_langs = ["zh", "en", "null"]
+            if orig_lang and orig_lang not in request_langs:
+                request_langs.append(orig_lang)
+            elif not orig_lang:
+                # 原语言未知时顺带请求最常见的原语言，避免为此再发一次请求
+                request_langs.extend(["ja", "ko"])
+
+            tmdb_data = tmdb.get_details_with_images(int(tmdb_id), item_type, self.tmdb_api_key, ",".join(request_langs))
+            if not tmdb_data:
+                logger.error(f"  ➜ {log_prefix} 未获取到图片数据。")
+                return False
+            orig_lang = orig_lang or tmdb_data.get("original_language") or "en"
 
-            search_strategies = []
-            
+            # 语言分档：数字越小越优先，不在分档内的图片不采用
             if lang_pref == 'zh':
-                # 策略 A: 严格中文优先
-                search_strategies.append(("zh-CN", "简体中文"))
-                search_strategies.append(("zh,zh-TW", "繁体中文"))
-                search_strategies.append(("en,null", "英文/无文字"))
+                # 策略 A: 严格中文优先 (简体 > 繁体 > 英文/无文字)
+                def lang_rank(image):
+                    lang = image.get("iso_639_1")
+                    if lang == "zh":
+                        return 0 if image.get("iso_3166_1") in (None, "CN", "SG") else 1
+                    if lang in ("en", None):
+                        return 2
+                    return None
             else:
-                # 策略 B: 原语言优先
-                # 例如：韩国电影(ko)，这里就会先找 ko 的海报
-                if orig_lang != 'en':
-                    search_strategies.append((orig_lang, f"原语言({orig_lang})"))
-
-                # 2. 第二顺位：英文/无文字 (高质量通用图)
-                # 如果原语言就是英语(en)，这一步自然就覆盖了原语言
-                search_strategies.append(("en,null", "英文/无文字"))
-
-                # 3. 第三顺位：中文兜底
-                search_strategies.append(("zh-CN,zh-TW,zh", "中文兜底"))
-
-            tmdb_data = None
-            used_strategy = ""
-
-            # 3. 执行分步请求
-            for lang_param, desc in search_strategies:
-                logger.debug(f"  ➜ {log_prefix} 尝试获取图片，策略: {desc} ...")
-
-                try:
-                    if item_type == "Movie":
-                        data = tmdb.get_movie_details(
-                            int(tmdb_id),
-                            self.tmdb_api_key,
-                            append_to_response="images",
-                            include_image_language=lang_param
-                        )
-                    elif item_type == "Series":
-                        data = tmdb.get_tv_details(
-                            int(tmdb_id),
-                            self.tmdb_api_key,
-                            append_to_response="images,seasons",
-                            include_image_language=lang_param
-                        )
-
-                    if data and data.get("images", {}).get("posters"):
-                        tmdb_data = data
-                        used_strategy = desc
-                        logger.info(f"  ➜ {log_prefix} 成功通过策略 [{desc}] 获取到 {len(data['images']['posters'])} 张海报。")
-                        break
-                    else:
-                        logger.debug(f"  ➜ {log_prefix} 策略 [{desc}] 未返回有效海报，尝试下一策略...")
-
-                except Exception as e:
-                    logger.warning(f"  ➜ {log_prefix} 策略 [{desc}] 请求失败: {e}")
+                # 策略 B: 原语言优先 (原语言 > 英文/无文字 > 中文兜底)
+                def lang_rank(image):
+                    lang = image.get("iso_639_1")
+                    if lang == orig_lang and orig_lang != "en":
+                        return 0
+                    if lang in ("en", None):
+                        return 1
+                    if lang == "zh":
+                        return 2
+                    return None
 
-            if not tmdb_data:
-                logger.error(f"  ➜ {log_prefix} 所有策略均未获取到图片数据。")
-                return False
+            def pick_best(images):
+                ranked = [(lang_rank(img), idx, img) for idx, img in enumerate(images or []) if img.get("file_path")]
+                ranked = [entry for entry in ranked if entry[0] is not None]
+                # 同档内保持 TMDb 返回的顺序 (已按评分排序)
+                return min(ranked, key=lambda entry: (entry[0], entry[1]))[2] if ranked else None
 
             # =========================================================
-            # 4. 图片选择逻辑
+            # 3. 图片选择逻辑
             # =========================================================
             downloads = []
             images_node = tmdb_data.get("images", {})
 
             # --- A. 海报 (Poster) ---
-            posters_list = images_node.get("posters", [])
-            if posters_list:
-                selected_poster = posters_list[0]["file_path"]
-                downloads.append((selected_poster, "poster.jpg"))
-                logger.info(f"  ➜ {log_prefix} 选中海报: {selected_poster} (评分: {posters_list[0].get('vote_average')})")
+            best_poster = pick_best(images_node.get("posters"))
+            if best_poster:
+                downloads.append((best_poster["file_path"], "poster.jpg"))
+                logger.info(f"  ➜ {log_prefix} 选中海报: {best_poster['file_path']} (语言: {best_poster.get('iso_639_1')}, 评分: {best_poster.get('vote_average')})")
+            elif tmdb_data.get("poster_path"):
+                downloads.append((tmdb_data["poster_path"], "poster.jpg"))
 
             # --- B. 背景 (Backdrop) ---
-            backdrops_list = images_node.get("backdrops", [])
-            selected_backdrop = None
-            if backdrops_list:
-                selected_backdrop = backdrops_list[0]["file_path"]
-
-            if not selected_backdrop:
-                selected_backdrop = tmdb_data.get("backdrop_path")
-
+            best_backdrop = pick_best(images_node.get("backdrops"))
+            selected_backdrop = best_backdrop["file_path"] if best_backdrop else tmdb_data.get("backdrop_path")
             if selected_backdrop:
+                # 同一张背景图只下载一次，landscape.jpg 由下载器硬链接/复制生成
                 downloads.append((selected_backdrop, "fanart.jpg"))
                 downloads.append((selected_backdrop, "landscape.jpg"))
 
             # --- C. Logo ---
-            logos_list = images_node.get("logos", [])
-            if logos_list:
-                downloads.append((logos_list[0]["file_path"], "clearlogo.png"))
+            best_logo = pick_best(images_node.get("logos"))
+            if best_logo:
+                downloads.append((best_logo["file_path"], "clearlogo.png"))
 
             # --- D. 剧集季海报 ---
             if item_type == "Series":
-                seasons = tmdb_data.get("seasons", [])
-                for season in seasons:
+                for season in tmdb_data.get("seasons", []):
                     s_num = season.get("season_number")
                     s_poster = season.get("poster_path")
                     if s_num is not None and s_poster:
                         downloads.append((s_poster, f"season-{s_num}.jpg"))
 
-            # 4. 执行下载
-            base_image_url = "https://wsrv.nl/?url=https://image.tmdb.org/t/p/original"
-            success_count = 0
-            import requests
-            
-            for tmdb_path, local_name in downloads:
-                if not tmdb_path: continue
-                full_url = f"{base_image_url}{tmdb_path}"
-                save_path = os.path.join(image_override_dir, local_name)
-
-                if os.path.exists(save_path) and os.path.getsize(save_path) > 0:
-                    continue
+            if not downloads:
+                logger.error(f"  ➜ {log_prefix} 没有符合语言偏好的图片。")
+                return False
 
-                try:
-                    resp = requests.get(full_url, timeout=15)
-                    if resp.status_code == 200:
-                        with open(save_path, 'wb') as f:
-                            f.write(resp.content)
-                        success_count += 1
-                        time_module.sleep(0.1)
-                except Exception as e:
-                    logger.warning(f"  ➜ 下载图片失败 {local_name}: {e}")
+            # 4. 并发下载
+            base_image_url = "https://wsrv.nl/?url=https://image.tmdb.org/t/p/original"
+            success_count = _download_images_concurrently(
+                [(f"{base_image_url}{tmdb_path}", local_name) for tmdb_path, local_name in downloads if tmdb_path],
+                image_override_dir,
+                log_prefix=log_prefix
+            )
 
             logger.info(f"  ➜ {log_prefix} 共下载 {success_count} 张图片。")
             return True
@@ -3893,8 +4100,7 @@ class MediaProcessor:
                     # E. 写入 tags.json (如果存在映射结果)
                     tags_json_path = os.path.join(target_override_dir, "tags.json")
                     if final_tags:
-                        with open(tags_json_path, 'w', encoding='utf-8') as f:
-                            json.dump({"tags": list(final_tags)}, f, ensure_ascii=False, indent=2)
+                        atomic_io.write_json_atomic(tags_json_path, {"tags": list(final_tags)})
                         logger.info(f"  ➜ {log_prefix} 已根据映射表生成 tags.json，包含 {len(final_tags)} 个中文标签。")
                     else:
                         # 如果没有匹配的标签，且存在旧文件，则删除旧文件以保持干净
@@ -3912,8 +4118,7 @@ class MediaProcessor:
                     del data_to_write[k]
 
             # 3. 写入净化后的数据
-            with open(main_json_path, 'w', encoding='utf-8') as f:
-                json.dump(data_to_write, f, ensure_ascii=False, indent=2)
+            atomic_io.write_json_atomic(main_json_path, data_to_write)
 
         if final_cast_override is not None:
             # --- 角色一：主体精装修 ---
@@ -3931,8 +4136,7 @@ class MediaProcessor:
             if 'casts' in data: data['casts']['cast'] = perfect_cast_for_injection
             else: data.setdefault('credits', {})['cast'] = perfect_cast_for_injection
             
-            with open(main_json_path, 'w', encoding='utf-8') as f:
-                json.dump(data, f, ensure_ascii=False, indent=2)
+            atomic_io.write_json_atomic(main_json_path, data)
         else:
             # --- 角色二：零活处理 (追更) ---
             if os.path.exists(main_json_path):
@@ -3973,6 +4177,8 @@ class MediaProcessor:
         辅助函数：将演员表注入剧集的季/集JSON文件。
         【修复版】支持主动监控模式 (ID='pending')，此时仅基于 TMDb 数据生成文件，不请求 Emby。
         【新增】严格校验 tmdb_id 和 season_number，防止生成无效文件。
+        【批量写入】已有文件并发读取；内容哈希未变化的文件不再重写，其余以紧凑 JSON 并发原子写入。
+        返回本次的统计 {"written": 写入数, "skipped": 跳过数, "failed": 失败数}。
         """
         log_prefix = "[覆盖缓存-元数据写入]"
         if cast_list is not None:
@@ -4109,7 +4315,7 @@ class MediaProcessor:
             if key: 
                 child_data_map[key] = child
 
-        updated_children_count = 0
+        stats = {"written": 0, "skipped": 0, "failed": 0}
         try:
             files_to_process = set() 
             if episode_ids_to_sync and not is_pending: # 只有非 pending 状态才支持按 ID 过滤
@@ -4137,8 +4343,15 @@ class MediaProcessor:
             # 确保目标目录存在
             os.makedirs(target_dir, exist_ok=True)
 
+            # 并发读取已有文件，同时记录修改前的内容哈希
+            with concurrent.futures.ThreadPoolExecutor(max_workers=OVERRIDE_FILE_IO_MAX_WORKERS) as io_executor:
+                existing_files = dict(zip(
+                    sorted_files_to_process,
+                    io_executor.map(lambda name: _load_json_with_digest(os.path.join(target_dir, name)), sorted_files_to_process)
+                ))
+
+            pending_writes = [] # [(文件名, 紧凑 JSON 字节)]
             for filename in sorted_files_to_process:
-                child_json_path = os.path.join(target_dir, filename)
                 
                 is_season_file = filename.startswith("season-") and "-episode-" not in filename
                 is_episode_file = "-episode-" in filename
@@ -4151,16 +4364,8 @@ class MediaProcessor:
                 else:
                     continue
 
-                # ★★★ 步骤 B: 加载数据源 (优先 Override，其次 Source) ★★★
-                data_source = None
-                if os.path.exists(child_json_path):
-                    data_source = _read_local_json(child_json_path)
-                    if data_source:
-                        for key in child_data.keys():
-                            if key == 'credits' and 'casts' in data_source and 'credits' not in data_source:
-                                 child_data['credits'] = data_source['casts']
-                            elif key in data_source:
-                                child_data[key] = data_source[key]
+                # ★★★ 步骤 B: 加载数据源 (已有的 Override 文件) ★★★
+                data_source, existing_digest = existing_files.get(filename, (None, None))
                 
                 # ★★★ 步骤 C: 填充骨架 ★★★
                 if data_source:
@@ -4302,18 +4507,32 @@ class MediaProcessor:
                     if fresh_emby_data.get('CommunityRating'):
                         child_data['vote_average'] = fresh_emby_data.get('CommunityRating')
 
-                # 步骤 F: 写入文件 
+                # 步骤 F: 内容没有变化的文件直接跳过，其余排队写入 (紧凑格式)
+                if existing_digest and existing_digest == _json_content_digest(child_data):
+                    stats["skipped"] += 1
+                    continue
+                pending_writes.append((filename, json.dumps(child_data, ensure_ascii=False, separators=(',', ':')).encode('utf-8')))
+
+            def write_child_file(entry):
+                filename, payload = entry
                 try:
-                    with open(child_json_path, 'w', encoding='utf-8') as f_child:
-                        json.dump(child_data, f_child, ensure_ascii=False, indent=2)
-                        updated_children_count += 1
+                    atomic_io.write_bytes_atomic(os.path.join(target_dir, filename), payload)
+                    return True
                 except Exception as e_child:
                     logger.warning(f"  ➜ 写入子文件 '{filename}' 时失败: {e_child}")
+                    return False
+
+            if pending_writes:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=OVERRIDE_FILE_IO_MAX_WORKERS) as io_executor:
+                    for ok in io_executor.map(write_child_file, pending_writes):
+                        stats["written" if ok else "failed"] += 1
             
-            logger.info(f"  ➜ {log_prefix} 成功智能同步了 {updated_children_count} 个季/集文件。")
+            logger.info(f"  ➜ {log_prefix} 季/集文件同步完成：写入 {stats['written']} 个，内容未变跳过 {stats['skipped']} 个。")
         except Exception as e_list:
             logger.error(f"  ➜ {log_prefix} 遍历并更新季/集文件时发生错误: {e_list}", exc_info=True)
 
+        return stats
+
     # 提取标签
     def extract_tag_names(item_data):
         """
@@ -702,7 +702,11 @@ def update_actor_subscription(subscription_id: int, data: dict) -> bool:
                     logger.info(f"  ➜ 检测到订阅ID {subscription_id} 的筛选配置发生变更，将重置检查时间并清理历史忽略记录...")
                     
                     #  重置扫描缓存 
-                    cursor.execute("UPDATE actor_subscriptions SET last_scanned_tmdb_ids_json = NULL WHERE id = %s", (subscription_id,))
+                    cursor.execute("""
+                        UPDATE actor_subscriptions
+                        SET last_scanned_tmdb_ids_json = NULL, last_scanned_credits_json = NULL, last_scanned_credits_hash = NULL
+                        WHERE id = %s
+                    """, (subscription_id,))
 
                     # 清理旧的忽略记录 
                     source_to_remove = {"type": "actor_subscription", "id": subscription_id}
@@ -117,4 +117,26 @@ def clear_pending_cleanup_tasks():
                 conn.commit()
                 logger.info("  ➜ 已清空所有待处理的媒体清理索引。")
     except Exception as e:
-        logger.error(f"清空待处理的媒体清理索引时失败: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"清空待处理的媒体清理索引时失败: {e}", exc_info=True)
+
+def batch_update_asset_rank_keys(updates: List[tuple]):
+    """
+    回写重新计算过版本排序键的 asset_details_json。
+    updates: [(tmdb_id, item_type, 原 asset_details_json 的 md5, 新 asset_details_json), ...]
+    仅当资产详情在此期间未被其它任务修改时才写入 (以 md5 作乐观锁)。
+    """
+    if not updates: return
+    data = [(tmdb_id, item_type, asset_hash, Json(assets)) for tmdb_id, item_type, asset_hash, assets in updates]
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                execute_values(cursor, """
+                    UPDATE media_metadata AS m
+                    SET asset_details_json = v.assets
+                    FROM (VALUES %s) AS v(tmdb_id, item_type, asset_hash, assets)
+                    WHERE m.tmdb_id = v.tmdb_id AND m.item_type = v.item_type
+                      AND md5(m.asset_details_json::text) = v.asset_hash
+                """, data, template="(%s, %s, %s, %s::jsonb)", page_size=500)
+                conn.commit()
+    except Exception as e:
+        logger.error(f"DB: 回写版本排序键时失败: {e}", exc_info=True)
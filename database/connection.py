@@ -1,13 +1,78 @@
 # database/connection.py
+import sys
+import time
+import json
+import hashlib
+import inspect
 import psycopg2
 from psycopg2.extras import RealDictCursor
 import logging
 
 import config_manager
 import constants
+import metrics
 
 logger = logging.getLogger(__name__)
 
+class InstrumentedCursor(RealDictCursor):
+    """带耗时统计的 RealDictCursor，按发起查询的函数记录到 /metrics。"""
+    def execute(self, query, vars=None):
+        start = time.perf_counter()
+        try:
+            return super().execute(query, vars)
+        finally:
+            metrics.observe_db_query(sys._getframe(1), time.perf_counter() - start)
+
+    def executemany(self, query, vars_list):
+        start = time.perf_counter()
+        try:
+            return super().executemany(query, vars_list)
+        finally:
+            metrics.observe_db_query(sys._getframe(1), time.perf_counter() - start)
+
+# ======================================================================
+# 模块: 协作式 (green) 数据库 I/O
+# ======================================================================
+
+_green_io_enabled = False
+
+def _gevent_wait_callback(conn, timeout=None):
+    """
+    psycopg2 的等待回调：把 libpq 的阻塞等待交给 gevent 的事件循环，
+    查询执行期间其它 greenlet (反代 302、WebSocket 转发等) 可以继续运行。
+    """
+    from gevent.socket import wait_read, wait_write
+    while True:
+        state = conn.poll()
+        if state == psycopg2.extensions.POLL_OK:
+            break
+        elif state == psycopg2.extensions.POLL_READ:
+            wait_read(conn.fileno(), timeout=timeout)
+        elif state == psycopg2.extensions.POLL_WRITE:
+            wait_write(conn.fileno(), timeout=timeout)
+        else:
+            raise psycopg2.OperationalError(f"Bad result from poll: {state!r}")
+
+def enable_green_io() -> bool:
+    """
+    在 gevent 已 monkey patch 的进程中启用协作式数据库 I/O。
+    psycopg2 是 C 扩展，其 socket 等待不受 monkey patch 影响，不启用时每条查询都会冻结整个事件循环。
+    """
+    global _green_io_enabled
+    if _green_io_enabled:
+        return True
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    if not monkey.is_module_patched('socket'):
+        logger.debug("  ➜ gevent 未 patch socket，保持 psycopg2 的阻塞模式。")
+        return False
+    psycopg2.extensions.set_wait_callback(_gevent_wait_callback)
+    _green_io_enabled = True
+    logger.info("  ➜ 已启用协作式数据库 I/O (psycopg2 + gevent)。")
+    return True
+
 # ======================================================================
 # 模块: 中央数据访问 
 # ======================================================================
@@ -26,18 +91,20 @@ def get_db_connection() -> psycopg2.extensions.connection:
             user=cfg.get(constants.CONFIG_OPTION_DB_USER),
             password=cfg.get(constants.CONFIG_OPTION_DB_PASSWORD),
             dbname=cfg.get(constants.CONFIG_OPTION_DB_NAME),
-            cursor_factory=RealDictCursor
+            cursor_factory=InstrumentedCursor
         )
         return conn
     except psycopg2.Error as e:
         logger.error(f"获取 PostgreSQL 数据库连接失败: {e}", exc_info=True)
         raise
 
-def init_db():
+def init_db() -> bool:
     """
     【PostgreSQL版】初始化数据库，创建所有表的最终结构。
+    返回是否全部成功：升级字段、索引、废弃对象清理等步骤出错只记录日志并返回 False。
     """
     logger.debug("  ➜ 正在初始化 PostgreSQL 数据库，创建/验证所有表的结构...")
+    all_steps_ok = True
     
     try:
         with get_db_connection() as conn:
@@ -76,6 +143,23 @@ def init_db():
                     )
                 """)
 
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS title_match_memo (
+                        normalized_title TEXT NOT NULL,
+                        year TEXT NOT NULL DEFAULT '',
+                        item_type TEXT NOT NULL,
+                        season_hint INTEGER NOT NULL DEFAULT 0,  -- 标题中解析出的季号，0 表示未指定
+                        tmdb_id TEXT,                            -- NULL 表示负缓存 (未匹配到)
+                        matched_type TEXT,
+                        season_number INTEGER,
+                        confidence TEXT NOT NULL,                -- exact / partial / fallback / none
+                        expires_at TIMESTAMP WITH TIME ZONE NOT NULL,
+                        last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                        PRIMARY KEY (normalized_title, year, item_type, season_hint)
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_title_match_memo_tmdb_id ON title_match_memo (tmdb_id);")
+
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS app_settings (
                         setting_key TEXT PRIMARY KEY,
@@ -93,7 +177,8 @@ def init_db():
                         last_seen_at TIMESTAMP WITH TIME ZONE, 
                         profile_image_tag TEXT,
                         policy_json JSONB, 
-                        last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                        last_updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                        user_data_synced_at TIMESTAMP WITH TIME ZONE
                     )
                 """)
 
@@ -140,7 +225,8 @@ def init_db():
                         item_type TEXT,
                         in_library_count INTEGER DEFAULT 0,
                         generated_media_info_json JSONB,
-                        sort_order INTEGER NOT NULL DEFAULT 0
+                        sort_order INTEGER NOT NULL DEFAULT 0,
+                        source_fingerprint TEXT
                     )
                 """)
 
@@ -258,6 +344,8 @@ def init_db():
                         config_genres_exclude_json JSONB,
                         status TEXT DEFAULT 'active',
                         last_scanned_tmdb_ids_json JSONB,
+                        last_scanned_credits_json JSONB,
+                        last_scanned_credits_hash TEXT,
                         last_checked_at TIMESTAMP WITH TIME ZONE,
                         added_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
                         config_min_rating REAL DEFAULT 6.0,
@@ -326,6 +414,21 @@ def init_db():
                     )
                 """)
 
+                logger.trace("  ➜ 正在创建 'resubscribe_eval_cache' 表 (洗版增量判定缓存)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS resubscribe_eval_cache (
+                        tmdb_id TEXT NOT NULL,
+                        item_type TEXT NOT NULL,
+                        season_number INTEGER NOT NULL DEFAULT -1,
+                        input_hash TEXT NOT NULL,      -- 规则指纹 + 资产内容 + 相关元数据 的哈希
+                        matched_rule_id INTEGER,
+                        needs_action BOOLEAN NOT NULL DEFAULT FALSE,
+                        reason TEXT,
+                        evaluated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+                        PRIMARY KEY (tmdb_id, item_type, season_number)
+                    )
+                """)
+
                 logger.trace("  ➜ 正在创建 'cleanup_index' 表 ...")
                 cursor.execute("""
                     CREATE TABLE IF NOT EXISTS cleanup_index (
@@ -414,6 +517,70 @@ def init_db():
                     )
                 """)
 
+                logger.trace("  ➜ 正在创建 'playback_events' 表 (播放流水仓库)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS playback_events (
+                        event_key TEXT PRIMARY KEY,        -- 播放时间 + 用户 + 条目 的哈希，增量导入去重用
+                        played_at TIMESTAMP NOT NULL,      -- Playback Reporting 插件记录的服务器本地时间
+                        play_date DATE NOT NULL,
+                        play_hour SMALLINT NOT NULL,
+                        emby_user_id TEXT,
+                        user_name TEXT NOT NULL,
+                        emby_item_id TEXT,
+                        item_name TEXT,
+                        item_type TEXT NOT NULL,
+                        duration_sec INTEGER NOT NULL DEFAULT 0,
+                        -- 聚合目标 (电影自身 / 分集所属剧集)，导入时解析一次
+                        target_tmdb_id TEXT,
+                        target_type TEXT,
+                        target_name TEXT,
+                        target_poster_path TEXT,
+                        target_emby_id TEXT,
+                        ingested_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+                    )
+                """)
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_playback_events_play_date ON playback_events (play_date);")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_playback_events_user_played_at ON playback_events (emby_user_id, played_at DESC);")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_playback_events_target ON playback_events (target_tmdb_id, target_type);")
+                cursor.execute("CREATE INDEX IF NOT EXISTS idx_playback_events_unresolved ON playback_events (play_date) WHERE target_tmdb_id IS NULL;")
+
+                # 预聚合表：只统计电影与分集，按天 (及小时) 汇总，仪表盘直接读取
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS playback_rollup_daily_user (
+                        play_date DATE NOT NULL,
+                        user_name TEXT NOT NULL,
+                        plays INTEGER NOT NULL,
+                        duration_sec BIGINT NOT NULL,
+                        PRIMARY KEY (play_date, user_name)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS playback_rollup_daily_media (
+                        play_date DATE NOT NULL,
+                        target_tmdb_id TEXT NOT NULL,
+                        target_type TEXT NOT NULL,
+                        plays INTEGER NOT NULL,
+                        PRIMARY KEY (play_date, target_tmdb_id, target_type)
+                    )
+                """)
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS playback_rollup_hourly (
+                        play_date DATE NOT NULL,
+                        play_hour SMALLINT NOT NULL,
+                        plays INTEGER NOT NULL,
+                        PRIMARY KEY (play_date, play_hour)
+                    )
+                """)
+
+                logger.trace("  ➜ 正在创建 'p115_download_url_cache' 表 (直链缓存)...")
+                cursor.execute("""
+                    CREATE TABLE IF NOT EXISTS p115_download_url_cache (
+                        cache_key TEXT PRIMARY KEY,    -- pick_code + User-Agent + 客户端 IP 的哈希
+                        url TEXT NOT NULL,             -- 115 CDN 直链
+                        expires_at TIMESTAMP WITH TIME ZONE NOT NULL
+                    )
+                """)
+
                 # ======================================================================
                 # ★★★ 数据库平滑升级 (START) ★★★
                 # 此处代码用于新增在新版本中添加的列。
@@ -434,11 +601,15 @@ def init_db():
 
                     schema_upgrades = {
                         'emby_users': {
-                            "policy_json": "JSONB"  
+                            "policy_json": "JSONB",
+                            "user_data_synced_at": "TIMESTAMP WITH TIME ZONE"
                         },
                         'cleanup_index': {
                             "best_version_json": "JSONB"
                         },
+                        'custom_collections': {
+                            "source_fingerprint": "TEXT"
+                        },
                         'media_metadata': {
                             "original_language": "TEXT",
                             "last_air_date": "DATE",
@@ -468,7 +639,9 @@ def init_db():
                         'actor_subscriptions': {
                             "config_main_role_only": "BOOLEAN NOT NULL DEFAULT FALSE",
                             "config_min_vote_count": "INTEGER NOT NULL DEFAULT 10",
-                            "last_scanned_tmdb_ids_json": "JSONB"
+                            "last_scanned_tmdb_ids_json": "JSONB",
+                            "last_scanned_credits_json": "JSONB",
+                            "last_scanned_credits_hash": "TEXT"
                         }
                     }
 
@@ -486,6 +659,7 @@ def init_db():
                             logger.warning(f"    ➜ [数据库升级] 检查表 '{table}' 时发现该表不存在，跳过升级。")
 
                 except Exception as e_alter:
+                    all_steps_ok = False
                     logger.error(f"  ➜ [数据库升级] 检查或添加新字段时出错: {e_alter}", exc_info=True)
                 
                 # ======================================================================
@@ -552,6 +726,7 @@ def init_db():
                     cursor.execute("CREATE INDEX IF NOT EXISTS idx_p115_name ON p115_filesystem_cache (name);")
 
                 except Exception as e_index:
+                    all_steps_ok = False
                     logger.error(f"  ➜ 创建索引时出错: {e_index}", exc_info=True)
                 logger.trace("  ➜ 数据库升级检查完成。")
 
@@ -601,15 +776,69 @@ def init_db():
                     logger.trace("  ➜ [数据库清理] 废弃对象清理完成。")
 
                 except Exception as e_cleanup:
+                    all_steps_ok = False
                     logger.error(f"  ➜ [数据库清理] 清理废弃对象时发生错误: {e_cleanup}", exc_info=True)
                 # ======================================================================
 
             conn.commit()
             logger.info("  ➜ PostgreSQL 数据库初始化完成，所有表结构已创建/验证。")
+        return all_steps_ok
 
     except psycopg2.Error as e_pg:
         logger.error(f"数据库初始化时发生 PostgreSQL 错误: {e_pg}", exc_info=True)
         raise
     except Exception as e_global:
         logger.error(f"数据库初始化时发生未知错误: {e_global}", exc_info=True)
-        raise
\ No newline at end of file
+        raise
+
+# ======================================================================
+# 模块: 启动时的表结构检查
+# ======================================================================
+
+SCHEMA_FINGERPRINT_SETTING_KEY = "db_schema_fingerprint"
+# 表结构版本：修改 init_db 中的表、字段、索引或清理补丁时递增
+SCHEMA_VERSION = 1
+
+def _schema_fingerprint() -> str:
+    """结构版本号 + init_db 源码的哈希 (忘记递增版本号时，源码变化同样会触发一次完整的建表/升级流程)。"""
+    try:
+        source_digest = hashlib.md5(inspect.getsource(init_db).encode('utf-8')).hexdigest()
+    except (OSError, TypeError):
+        source_digest = "nosource" # 拿不到源码时 (例如只有 .pyc)，只按版本号判断
+    return f"v{SCHEMA_VERSION}-{source_digest}"
+
+def _get_stored_schema_fingerprint():
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT value_json FROM app_settings WHERE setting_key = %s", (SCHEMA_FINGERPRINT_SETTING_KEY,))
+                row = cursor.fetchone()
+        return (row['value_json'] or {}).get('fingerprint') if row else None
+    except psycopg2.Error:
+        return None # 全新数据库，app_settings 尚不存在
+
+def ensure_db_schema():
+    """
+    启动时的建表入口。
+    数据库中记录的结构指纹与当前代码一致时，跳过 init_db 中全部的 DDL (数百条 CREATE / ALTER / 索引检查)。
+    """
+    fingerprint = _schema_fingerprint()
+    if _get_stored_schema_fingerprint() == fingerprint:
+        logger.info("  ➜ 数据库表结构与当前版本一致，跳过建表/升级检查。")
+        return
+
+    if not init_db():
+        logger.warning("  ➜ 部分建表/升级步骤失败，不记录结构指纹，下次启动会重新检查表结构。")
+        return
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                    INSERT INTO app_settings (setting_key, value_json, last_updated_at)
+                    VALUES (%s, %s, NOW())
+                    ON CONFLICT (setting_key) DO UPDATE SET
+                        value_json = EXCLUDED.value_json,
+                        last_updated_at = NOW()
+                """, (SCHEMA_FINGERPRINT_SETTING_KEY, json.dumps({"fingerprint": fingerprint, "app_version": constants.APP_VERSION})))
+    except psycopg2.Error as e:
+        logger.warning(f"  ➜ 记录数据库结构指纹失败 (下次启动会重新检查表结构): {e}")
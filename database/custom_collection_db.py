@@ -626,4 +626,108 @@ def get_active_collection_ids_for_latest_view() -> List[int]:
             return active_ids
     except psycopg2.Error as e:
         logger.error(f"获取最新视图合集ID列表时出错: {e}", exc_info=True)
-        return []
\ No newline at end of file
+        return []
+
+def get_active_collections_for_latest_view() -> List[Dict[str, Any]]:
+    """
+    一次性获取所有开启了“显示在最新媒体”的活跃合集 (含定义、权限与榜单内容)。
+    供全局最新视图直接编译查询，避免按 ID 逐个回查。
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT id, type, definition_json, allowed_user_ids, generated_media_info_json
+                FROM custom_collections
+                WHERE status = 'active'
+                  AND COALESCE(definition_json->'show_in_latest', 'true'::jsonb)
+                      NOT IN ('false'::jsonb, 'null'::jsonb, '0'::jsonb, '""'::jsonb)
+                ORDER BY sort_order ASC, id ASC
+            """)
+            return [dict(row) for row in cursor.fetchall()]
+    except psycopg2.Error as e:
+        logger.error(f"获取最新视图合集列表时出错: {e}", exc_info=True)
+        return []
+
+# ======================================================================
+# 标题 -> TMDb 匹配记忆 (title_match_memo)
+# ======================================================================
+
+def get_title_match_memo(normalized_title: str, year: str, item_type: str, season_hint: int) -> Optional[Dict[str, Any]]:
+    """ 读取未过期的标题匹配记忆。返回 None 表示没有可用记忆 (需重新搜索)。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT tmdb_id, matched_type, season_number, confidence
+                FROM title_match_memo
+                WHERE normalized_title = %s AND year = %s AND item_type = %s AND season_hint = %s
+                  AND expires_at > NOW()
+            """, (normalized_title, year, item_type, season_hint))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+    except psycopg2.Error as e:
+        logger.warning(f"读取标题匹配记忆时出错: {e}")
+        return None
+
+def save_title_match_memo(normalized_title: str, year: str, item_type: str, season_hint: int,
+                          tmdb_id: Optional[str], matched_type: Optional[str], season_number: Optional[int],
+                          confidence: str, ttl_seconds: int):
+    """ 写入 (或覆盖) 一条标题匹配记忆。tmdb_id 为 None 时即为负缓存。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO title_match_memo
+                    (normalized_title, year, item_type, season_hint, tmdb_id, matched_type, season_number, confidence, expires_at, last_updated_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s, NOW() + make_interval(secs => %s), NOW())
+                ON CONFLICT (normalized_title, year, item_type, season_hint) DO UPDATE SET
+                    tmdb_id = EXCLUDED.tmdb_id,
+                    matched_type = EXCLUDED.matched_type,
+                    season_number = EXCLUDED.season_number,
+                    confidence = EXCLUDED.confidence,
+                    expires_at = EXCLUDED.expires_at,
+                    last_updated_at = NOW()
+            """, (normalized_title, year, item_type, season_hint, tmdb_id, matched_type, season_number, confidence, ttl_seconds))
+    except psycopg2.Error as e:
+        logger.warning(f"写入标题匹配记忆时出错: {e}")
+
+def invalidate_title_match_memos(tmdb_id: Optional[str] = None, normalized_title: Optional[str] = None,
+                                 item_type: Optional[str] = None, expired_only: bool = False,
+                                 clear_all: bool = False) -> int:
+    """
+    删除标题匹配记忆，返回删除条数。
+    - tmdb_id: 删除所有指向该 TMDb ID 的记忆 (修正错误匹配)；
+    - normalized_title (+ item_type): 删除某个标题的记忆；
+    - expired_only: 仅清理已过期条目；
+    - clear_all: 清空全部。
+    """
+    conditions, params = [], []
+    if not clear_all:
+        if tmdb_id:
+            conditions.append("tmdb_id = %s")
+            params.append(str(tmdb_id))
+        if normalized_title:
+            conditions.append("normalized_title = %s")
+            params.append(normalized_title)
+        if item_type:
+            conditions.append("item_type = %s")
+            params.append(item_type)
+        if expired_only:
+            conditions.append("expires_at <= NOW()")
+        if not conditions:
+            return 0
+
+    sql = "DELETE FROM title_match_memo"
+    if conditions:
+        sql += " WHERE " + " AND ".join(conditions)
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, tuple(params))
+            deleted = cursor.rowcount
+            logger.info(f"  ➜ 已清除 {deleted} 条标题匹配记忆。")
+            return deleted
+    except psycopg2.Error as e:
+        logger.error(f"清除标题匹配记忆时出错: {e}", exc_info=True)
+        raise
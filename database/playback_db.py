@@ -0,0 +1,239 @@
+# database/playback_db.py
+import logging
+from datetime import date
+from typing import List, Dict, Any, Optional, Set, Iterable
+from psycopg2.extras import execute_values
+
+from .connection import get_db_connection
+
+logger = logging.getLogger(__name__)
+
+# 只有电影与分集计入仪表盘统计 (与插件原始流水中的音乐、视频等区分)
+DASHBOARD_ITEM_TYPES = ['Movie', 'Episode']
+
+# ======================================================================
+# 模块: 播放流水仓库 (Playback Reporting 插件数据的本地副本)
+# ======================================================================
+
+def upsert_playback_events(events: List[Dict[str, Any]]) -> Set[date]:
+    """
+    批量写入播放流水。已存在的记录只在时长变化时更新 (插件会在播放过程中刷新时长)。
+    返回实际发生变化的日期集合，用于重算这些日期的预聚合数据。
+    """
+    if not events:
+        return set()
+
+    sql = """
+        INSERT INTO playback_events (
+            event_key, played_at, play_date, play_hour, emby_user_id, user_name,
+            emby_item_id, item_name, item_type, duration_sec
+        ) VALUES %s
+        ON CONFLICT (event_key) DO UPDATE SET
+            duration_sec = EXCLUDED.duration_sec,
+            emby_user_id = COALESCE(playback_events.emby_user_id, EXCLUDED.emby_user_id)
+        WHERE playback_events.duration_sec IS DISTINCT FROM EXCLUDED.duration_sec
+           OR (playback_events.emby_user_id IS NULL AND EXCLUDED.emby_user_id IS NOT NULL)
+        RETURNING play_date;
+    """
+    values = [(
+        e['event_key'], e['played_at'], e['played_at'].date(), e['played_at'].hour,
+        e.get('emby_user_id'), e['user_name'], e.get('emby_item_id'), e.get('item_name'),
+        e['item_type'], e['duration_sec']
+    ) for e in events]
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            changed_rows = execute_values(cursor, sql, values, page_size=1000, fetch=True)
+            conn.commit()
+            return {row['play_date'] for row in changed_rows}
+    except Exception as e:
+        logger.error(f"DB: 批量写入播放流水失败: {e}", exc_info=True)
+        raise
+
+def get_unresolved_item_ids(since_date: date) -> List[str]:
+    """获取指定日期以来尚未解析到 TMDb 聚合目标的电影 / 分集 Emby ID。"""
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT DISTINCT emby_item_id
+                FROM playback_events
+                WHERE target_tmdb_id IS NULL
+                  AND emby_item_id IS NOT NULL
+                  AND item_type = ANY(%s)
+                  AND play_date >= %s
+            """, (DASHBOARD_ITEM_TYPES, since_date))
+            return [row['emby_item_id'] for row in cursor.fetchall()]
+    except Exception as e:
+        logger.error(f"DB: 获取待解析的播放流水失败: {e}", exc_info=True)
+        return []
+
+def apply_item_resolutions(resolution_map: Dict[str, Dict[str, Any]]) -> Set[date]:
+    """
+    把 media_db.get_dashboard_aggregation_map 的解析结果写回流水。
+    返回受影响的日期集合。
+    """
+    if not resolution_map:
+        return set()
+
+    sql = """
+        UPDATE playback_events AS e SET
+            target_tmdb_id = v.tmdb_id,
+            target_type = v.target_type,
+            target_name = v.name,
+            target_poster_path = v.poster_path,
+            target_emby_id = v.target_emby_id
+        FROM (VALUES %s) AS v(emby_item_id, tmdb_id, target_type, name, poster_path, target_emby_id)
+        WHERE e.emby_item_id = v.emby_item_id AND e.target_tmdb_id IS NULL
+        RETURNING e.play_date;
+    """
+    values = [
+        (emby_id, str(info['id']), info['type'], info.get('name'), info.get('poster_path'), info.get('emby_id'))
+        for emby_id, info in resolution_map.items()
+    ]
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            changed_rows = execute_values(cursor, sql, values, page_size=1000, fetch=True)
+            conn.commit()
+            return {row['play_date'] for row in changed_rows}
+    except Exception as e:
+        logger.error(f"DB: 回写播放流水的聚合目标失败: {e}", exc_info=True)
+        raise
+
+def rebuild_rollups(dates: Iterable[date]):
+    """按日期重算预聚合表 (先删后插，与流水保持严格一致)。"""
+    dates = sorted(set(dates))
+    if not dates:
+        return
+
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            for table in ('playback_rollup_daily_user', 'playback_rollup_daily_media', 'playback_rollup_hourly'):
+                cursor.execute(f"DELETE FROM {table} WHERE play_date = ANY(%s::date[])", (dates,))
+
+            cursor.execute("""
+                INSERT INTO playback_rollup_daily_user (play_date, user_name, plays, duration_sec)
+                SELECT play_date, user_name, COUNT(*), COALESCE(SUM(duration_sec), 0)
+                FROM playback_events
+                WHERE play_date = ANY(%s::date[]) AND item_type = ANY(%s)
+                GROUP BY play_date, user_name
+            """, (dates, DASHBOARD_ITEM_TYPES))
+            cursor.execute("""
+                INSERT INTO playback_rollup_daily_media (play_date, target_tmdb_id, target_type, plays)
+                SELECT play_date, target_tmdb_id, target_type, COUNT(*)
+                FROM playback_events
+                WHERE play_date = ANY(%s::date[]) AND item_type = ANY(%s) AND target_tmdb_id IS NOT NULL
+                GROUP BY play_date, target_tmdb_id, target_type
+            """, (dates, DASHBOARD_ITEM_TYPES))
+            cursor.execute("""
+                INSERT INTO playback_rollup_hourly (play_date, play_hour, plays)
+                SELECT play_date, play_hour, COUNT(*)
+                FROM playback_events
+                WHERE play_date = ANY(%s::date[]) AND item_type = ANY(%s)
+                GROUP BY play_date, play_hour
+            """, (dates, DASHBOARD_ITEM_TYPES))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"DB: 重算播放统计预聚合数据失败: {e}", exc_info=True)
+        raise
+
+def get_dashboard_rollups(start_date: date, user_limit: int = 10, media_limit: int = 20) -> Dict[str, Any]:
+    """从预聚合表读取仪表盘所需的全部统计。"""
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT COALESCE(SUM(plays), 0) AS total_plays,
+                   COALESCE(SUM(duration_sec), 0) AS total_duration_sec,
+                   COUNT(DISTINCT user_name) FILTER (WHERE user_name <> 'Unknown') AS active_users
+            FROM playback_rollup_daily_user
+            WHERE play_date >= %s
+        """, (start_date,))
+        totals = cursor.fetchone()
+
+        cursor.execute("""
+            SELECT play_date, SUM(plays) AS plays, SUM(duration_sec) AS duration_sec
+            FROM playback_rollup_daily_user
+            WHERE play_date >= %s
+            GROUP BY play_date
+            ORDER BY play_date
+        """, (start_date,))
+        trend = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT user_name, SUM(duration_sec) AS duration_sec
+            FROM playback_rollup_daily_user
+            WHERE play_date >= %s AND user_name <> 'Unknown'
+            GROUP BY user_name
+            ORDER BY duration_sec DESC
+            LIMIT %s
+        """, (start_date, user_limit))
+        users = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT COUNT(DISTINCT (target_tmdb_id, target_type)) AS watched_items
+            FROM playback_rollup_daily_media
+            WHERE play_date >= %s
+        """, (start_date,))
+        watched_items = cursor.fetchone()['watched_items']
+
+        # 排行榜的展示信息取该目标最近一次播放时解析到的元数据
+        cursor.execute("""
+            WITH ranked AS (
+                SELECT target_tmdb_id, target_type, SUM(plays) AS plays
+                FROM playback_rollup_daily_media
+                WHERE play_date >= %s
+                GROUP BY target_tmdb_id, target_type
+                ORDER BY plays DESC
+                LIMIT %s
+            )
+            SELECT r.target_tmdb_id, r.target_type, r.plays, meta.target_name, meta.target_poster_path, meta.target_emby_id
+            FROM ranked r
+            LEFT JOIN LATERAL (
+                SELECT e.target_name, e.target_poster_path, e.target_emby_id
+                FROM playback_events e
+                WHERE e.target_tmdb_id = r.target_tmdb_id AND e.target_type = r.target_type
+                ORDER BY e.played_at DESC
+                LIMIT 1
+            ) meta ON TRUE
+            ORDER BY r.plays DESC
+        """, (start_date, media_limit))
+        media = cursor.fetchall()
+
+        cursor.execute("""
+            SELECT play_hour, SUM(plays) AS plays
+            FROM playback_rollup_hourly
+            WHERE play_date >= %s
+            GROUP BY play_hour
+            ORDER BY play_hour
+        """, (start_date,))
+        hourly = cursor.fetchall()
+
+    return {
+        "totals": totals, "trend": trend, "users": users,
+        "watched_items": watched_items, "media": media, "hourly": hourly
+    }
+
+def get_user_playback_history(emby_user_id: str, start_date: date, item_type: Optional[str] = None, limit: int = 20) -> Dict[str, Any]:
+    """读取单个用户的播放流水汇总与最近记录。"""
+    type_clause = "AND item_type = %(item_type)s" if item_type else ""
+    params = {"user_id": emby_user_id, "start_date": start_date, "item_type": item_type, "limit": limit}
+    with get_db_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*) AS total_count, COALESCE(SUM(duration_sec / 60), 0) AS total_minutes
+            FROM playback_events
+            WHERE emby_user_id = %(user_id)s AND play_date >= %(start_date)s {type_clause}
+        """, params)
+        summary = cursor.fetchone()
+        cursor.execute(f"""
+            SELECT emby_item_id, item_name, item_type, played_at, duration_sec
+            FROM playback_events
+            WHERE emby_user_id = %(user_id)s AND play_date >= %(start_date)s {type_clause}
+            ORDER BY played_at DESC
+            LIMIT %(limit)s
+        """, params)
+        recent = cursor.fetchall()
+    return {"total_count": summary['total_count'], "total_minutes": int(summary['total_minutes']), "recent": recent}
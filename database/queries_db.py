@@ -135,55 +135,20 @@ def _build_rating_value_sql(rating_expr: str) -> str:
 
     return f"CASE {chr(10).join(whens)} ELSE {else_logic} END"
 
-def query_virtual_library_items(
-    rules: List[Dict[str, Any]], 
-    logic: str, 
-    user_id: Optional[str],
-    limit: int = 50, 
-    offset: int = 0,
-    sort_by: str = 'DateCreated',
-    sort_order: str = 'Descending',
+def _build_collection_filter_clauses(
+    rules: List[Dict[str, Any]],
+    logic: str,
     item_types: List[str] = None,
     target_library_ids: List[str] = None,
-    tmdb_ids: List[str] = None,
-    max_rating_override: Optional[int] = None  
-) -> Tuple[List[Dict[str, Any]], int]:
+    tmdb_ids: List[str] = None
+) -> Tuple[List[str], List[Any]]:
     """
-    【核心函数】根据筛选规则 + 用户实时权限，查询媒体项。
+    构建"合集范围"相关的 WHERE 子句 (类型、榜单 ID、媒体库、筛选规则)。
+    与用户无关，因此可以被多个合集拼接成一条 OR 查询。
+    返回 (子句列表, 按顺序对应的参数列表)。
     """
-    
-    # 1. 基础 SQL 结构
-    if user_id:
-        base_select = """
-            SELECT 
-                m.emby_item_ids_json->>0 as emby_id,
-                m.tmdb_id
-            FROM media_metadata m
-            JOIN emby_users u ON u.id = %s
-        """
-        base_count = """
-            SELECT COUNT(*) 
-            FROM media_metadata m
-            JOIN emby_users u ON u.id = %s
-        """
-        params = [user_id]
-    else:
-        base_select = """
-            SELECT 
-                m.emby_item_ids_json->>0 as emby_id,
-                m.tmdb_id
-            FROM media_metadata m
-        """
-        base_count = """
-            SELECT COUNT(*) 
-            FROM media_metadata m
-        """
-        params = []
-
     where_clauses = []
-
-    # 2. 必须在库中
-    where_clauses.append("m.in_library = TRUE")
+    params = []
 
     # 3. 类型过滤
     if item_types:
@@ -206,101 +171,6 @@ def query_virtual_library_items(
         where_clauses.append(lib_filter_sql)
         params.append(target_library_ids)
 
-    # ======================================================================
-    # ★★★ 4. 权限控制 (精简版) ★★★
-    # ======================================================================
-    
-    # 逻辑：
-    # 1. 优先取 m.custom_rating (如果非空)
-    # 2. 其次取 m.official_rating_json->>'US' (这是入库时归一化后的标准分级)
-    
-    rating_expr = "COALESCE(NULLIF(m.custom_rating, ''), m.official_rating_json->>'US')"
-
-    # --- A. 处理分级数值限制 (Rating Value Limit) ---
-    
-    limit_value_sql = None
-    
-    if max_rating_override is not None:
-        limit_value_sql = str(max_rating_override)
-    elif user_id:
-        limit_value_sql = "(u.policy_json->>'MaxParentalRating')::int"
-    
-    if limit_value_sql:
-        rating_value_calc_sql = _build_rating_value_sql(rating_expr)
-        
-        rating_limit_sql = f"""
-        (
-            ({limit_value_sql} IS NULL)
-            OR
-            (({rating_value_calc_sql}) <= {limit_value_sql})
-        )
-        """
-        where_clauses.append(rating_limit_sql)
-
-    # --- B. 处理用户专属逻辑 (依赖 emby_users 表) ---
-    if user_id:
-        # 1. 文件夹/库权限 (保持原样)
-        folder_perm_sql = """
-        EXISTS (
-            SELECT 1 
-            FROM jsonb_array_elements(COALESCE(m.asset_details_json, '[]'::jsonb)) AS asset
-            WHERE 
-                (
-                    (u.policy_json->'EnableAllFolders' = 'true'::jsonb)
-                    OR
-                    COALESCE(asset->'ancestor_ids', '[]'::jsonb) ?| ARRAY(
-                        SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'EnabledFolders', '[]'::jsonb))
-                    )
-                    OR
-                    (asset->>'source_library_id') = ANY(
-                        ARRAY(SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'EnabledFolders', '[]'::jsonb)))
-                    )
-                )
-                AND NOT (
-                    COALESCE(asset->'ancestor_ids', '[]'::jsonb) ?| ARRAY(
-                        SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'ExcludedSubFolders', '[]'::jsonb))
-                    )
-                )
-        )
-        """
-        where_clauses.append(folder_perm_sql)
-
-        # 2. 标签屏蔽 (保持原样)
-        tag_block_sql = """
-        NOT (
-            COALESCE(m.tags_json, '[]'::jsonb) ?| ARRAY(
-                SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'BlockedTags', '[]'::jsonb))
-            )
-        )
-        """
-        where_clauses.append(tag_block_sql)
-
-        # 3. 屏蔽未分级内容 (BlockUnratedItems)
-        # ★ 注意：这个逻辑必须放在 if user_id 里，因为它依赖 u.policy_json
-        block_unrated_sql = f"""
-        NOT (
-            (
-                jsonb_typeof(u.policy_json->'BlockUnratedItems') = 'array'
-                AND
-                u.policy_json->'BlockUnratedItems' @> to_jsonb(m.item_type)
-            )
-            AND
-            (
-                {rating_expr} IS NULL 
-                OR {rating_expr} = '' 
-                OR {rating_expr} IN ('NR', 'UR', 'Unrated', 'Not Rated')
-                OR (
-                    {rating_expr} NOT IN (
-                        'G','PG','PG-13','R','NC-17','X','XXX','AO',
-                        'TV-Y','TV-Y7','TV-G','TV-PG','TV-14','TV-MA'
-                    )
-                    AND REGEXP_REPLACE({rating_expr}, '[^0-9]', '', 'g') = ''
-                )
-            )
-        )
-        """
-        where_clauses.append(block_unrated_sql)
-
     # ======================================================================
     # 5. 动态构建筛选规则 SQL
     # ======================================================================
@@ -672,10 +542,176 @@ def query_virtual_library_items(
         combined_rules = f"({join_op.join(rule_clauses)})"
         where_clauses.append(combined_rules)
 
-    # 7. 最终 WHERE 组装
+    return where_clauses, params
+
+def _build_permission_clauses(user_id: Optional[str], max_rating_override: Optional[int] = None) -> List[str]:
+    """
+    构建用户权限相关的 WHERE 子句 (分级上限、文件夹权限、标签屏蔽、未分级屏蔽)。
+    依赖查询中以别名 u 关联的 emby_users 表；这些子句不带参数占位符。
+    """
+    where_clauses = []
+
+    # ======================================================================
+    # ★★★ 4. 权限控制 (精简版) ★★★
+    # ======================================================================
+    
+    # 逻辑：
+    # 1. 优先取 m.custom_rating (如果非空)
+    # 2. 其次取 m.official_rating_json->>'US' (这是入库时归一化后的标准分级)
+    
+    rating_expr = "COALESCE(NULLIF(m.custom_rating, ''), m.official_rating_json->>'US')"
+
+    # --- A. 处理分级数值限制 (Rating Value Limit) ---
+    
+    limit_value_sql = None
+    
+    if max_rating_override is not None:
+        limit_value_sql = str(max_rating_override)
+    elif user_id:
+        limit_value_sql = "(u.policy_json->>'MaxParentalRating')::int"
+    
+    if limit_value_sql:
+        rating_value_calc_sql = _build_rating_value_sql(rating_expr)
+        
+        rating_limit_sql = f"""
+        (
+            ({limit_value_sql} IS NULL)
+            OR
+            (({rating_value_calc_sql}) <= {limit_value_sql})
+        )
+        """
+        where_clauses.append(rating_limit_sql)
+
+    # --- B. 处理用户专属逻辑 (依赖 emby_users 表) ---
+    if user_id:
+        # 1. 文件夹/库权限 (保持原样)
+        folder_perm_sql = """
+        EXISTS (
+            SELECT 1 
+            FROM jsonb_array_elements(COALESCE(m.asset_details_json, '[]'::jsonb)) AS asset
+            WHERE 
+                (
+                    (u.policy_json->'EnableAllFolders' = 'true'::jsonb)
+                    OR
+                    COALESCE(asset->'ancestor_ids', '[]'::jsonb) ?| ARRAY(
+                        SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'EnabledFolders', '[]'::jsonb))
+                    )
+                    OR
+                    (asset->>'source_library_id') = ANY(
+                        ARRAY(SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'EnabledFolders', '[]'::jsonb)))
+                    )
+                )
+                AND NOT (
+                    COALESCE(asset->'ancestor_ids', '[]'::jsonb) ?| ARRAY(
+                        SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'ExcludedSubFolders', '[]'::jsonb))
+                    )
+                )
+        )
+        """
+        where_clauses.append(folder_perm_sql)
+
+        # 2. 标签屏蔽 (保持原样)
+        tag_block_sql = """
+        NOT (
+            COALESCE(m.tags_json, '[]'::jsonb) ?| ARRAY(
+                SELECT jsonb_array_elements_text(COALESCE(u.policy_json->'BlockedTags', '[]'::jsonb))
+            )
+        )
+        """
+        where_clauses.append(tag_block_sql)
+
+        # 3. 屏蔽未分级内容 (BlockUnratedItems)
+        # ★ 注意：这个逻辑必须放在 if user_id 里，因为它依赖 u.policy_json
+        block_unrated_sql = f"""
+        NOT (
+            (
+                jsonb_typeof(u.policy_json->'BlockUnratedItems') = 'array'
+                AND
+                u.policy_json->'BlockUnratedItems' @> to_jsonb(m.item_type)
+            )
+            AND
+            (
+                {rating_expr} IS NULL 
+                OR {rating_expr} = '' 
+                OR {rating_expr} IN ('NR', 'UR', 'Unrated', 'Not Rated')
+                OR (
+                    {rating_expr} NOT IN (
+                        'G','PG','PG-13','R','NC-17','X','XXX','AO',
+                        'TV-Y','TV-Y7','TV-G','TV-PG','TV-14','TV-MA'
+                    )
+                    AND REGEXP_REPLACE({rating_expr}, '[^0-9]', '', 'g') = ''
+                )
+            )
+        )
+        """
+        where_clauses.append(block_unrated_sql)
+
+    return where_clauses
+
+def query_virtual_library_items(
+    rules: List[Dict[str, Any]], 
+    logic: str, 
+    user_id: Optional[str],
+    limit: int = 50, 
+    offset: int = 0,
+    sort_by: str = 'DateCreated',
+    sort_order: str = 'Descending',
+    item_types: List[str] = None,
+    target_library_ids: List[str] = None,
+    tmdb_ids: List[str] = None,
+    max_rating_override: Optional[int] = None  
+) -> Tuple[List[Dict[str, Any]], int]:
+    """
+    【核心函数】根据筛选规则 + 用户实时权限，查询媒体项。
+    """
+    
+    # 1. 基础 SQL 结构
+    if user_id:
+        base_select = """
+            SELECT 
+                m.emby_item_ids_json->>0 as emby_id,
+                m.tmdb_id
+            FROM media_metadata m
+            JOIN emby_users u ON u.id = %s
+        """
+        base_count = """
+            SELECT COUNT(*) 
+            FROM media_metadata m
+            JOIN emby_users u ON u.id = %s
+        """
+        params = [user_id]
+    else:
+        base_select = """
+            SELECT 
+                m.emby_item_ids_json->>0 as emby_id,
+                m.tmdb_id
+            FROM media_metadata m
+        """
+        base_count = """
+            SELECT COUNT(*) 
+            FROM media_metadata m
+        """
+        params = []
+
+    where_clauses = []
+
+    # 2. 必须在库中
+    where_clauses.append("m.in_library = TRUE")
+
+    # 3. 合集范围过滤 (类型 / 榜单 / 媒体库 / 筛选规则)
+    scope_clauses, scope_params = _build_collection_filter_clauses(
+        rules, logic, item_types=item_types, target_library_ids=target_library_ids, tmdb_ids=tmdb_ids
+    )
+    where_clauses.extend(scope_clauses)
+    params.extend(scope_params)
+
+    # 4. 权限控制
+    where_clauses.extend(_build_permission_clauses(user_id, max_rating_override))
+
+    # 5. 最终 WHERE 组装
     full_where = " AND ".join(where_clauses)
     
-    # 8. 排序映射
+    # 6. 排序映射
     sort_map = {
         'DateCreated': 'm.date_added',
         'DatePlayed': 'm.date_added',
@@ -692,7 +728,7 @@ def query_virtual_library_items(
     else:
         db_sort_dir = "DESC" if sort_order == 'Descending' else "ASC"
 
-    # 9. 执行查询
+    # 7. 执行查询
     try:
         with get_db_connection() as conn:
             with conn.cursor() as cursor:
@@ -729,6 +765,56 @@ def query_virtual_library_items(
         logger.error(f"实时筛选查询失败: {e}", exc_info=True)
         return [], 0
 
+def query_latest_items_across_collections(
+    collection_scopes: List[Dict[str, Any]],
+    user_id: str,
+    limit: int = 20
+) -> List[Dict[str, Any]]:
+    """
+    【全局最新】把多个合集的筛选范围编译成一条 OR 查询，按入库时间倒序取前 limit 个。
+    collection_scopes 中每项包含: rules, logic, item_types, target_library_ids, tmdb_ids。
+    用户权限子句只拼接一次，整个"最新"行只需一次数据库往返。
+    """
+    if not collection_scopes or not user_id:
+        return []
+
+    params: List[Any] = [user_id]
+    scope_sqls = []
+    for scope in collection_scopes:
+        clauses, scope_params = _build_collection_filter_clauses(
+            scope.get('rules') or [],
+            scope.get('logic', 'AND'),
+            item_types=scope.get('item_types'),
+            target_library_ids=scope.get('target_library_ids'),
+            tmdb_ids=scope.get('tmdb_ids')
+        )
+        scope_sqls.append(f"({' AND '.join(clauses)})" if clauses else "TRUE")
+        params.extend(scope_params)
+
+    where_clauses = ["m.in_library = TRUE", f"({' OR '.join(scope_sqls)})"]
+    where_clauses.extend(_build_permission_clauses(user_id))
+
+    sql = f"""
+        SELECT 
+            m.emby_item_ids_json->>0 as emby_id,
+            m.tmdb_id
+        FROM media_metadata m
+        JOIN emby_users u ON u.id = %s
+        WHERE {" AND ".join(where_clauses)}
+        ORDER BY m.date_added DESC NULLS LAST
+        LIMIT %s
+    """
+    params.append(limit)
+
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(sql, tuple(params))
+                return [{'Id': row['emby_id'], 'tmdb_id': row['tmdb_id']} for row in cursor.fetchall() if row['emby_id']]
+    except Exception as e:
+        logger.error(f"全局最新聚合查询失败: {e}", exc_info=True)
+        return []
+
 def get_sorted_and_paginated_ids(
     item_ids: List[str], 
     sort_by: str, 
@@ -415,15 +415,16 @@ def get_current_index_statuses() -> Dict[Tuple[str, str, int], str]:
 
 def fetch_all_active_movies_for_analysis() -> List[Dict[str, Any]]:
     """
-    获取所有在库电影及其资产详情，用于本地洗版计算。
-    返回字段: tmdb_id, title, item_type, asset_details_json, original_language, emby_item_ids_json, rating
+    获取所有在库电影的摘要信息，用于本地洗版计算。
+    资产详情只返回其内容哈希 (asset_hash)，完整的 asset_details_json 按需通过 fetch_movie_assets_batch 获取。
+    返回字段: tmdb_id, title, item_type, asset_hash, original_language, emby_item_ids_json, rating
     """
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            # ★★★ 修改点：增加了 rating 字段 ★★★
             cursor.execute("""
-                SELECT tmdb_id, title, item_type, asset_details_json, original_language, emby_item_ids_json, rating
+                SELECT tmdb_id, title, item_type, md5(asset_details_json::text) AS asset_hash,
+                       original_language, emby_item_ids_json, rating
                 FROM media_metadata 
                 WHERE item_type = 'Movie' AND in_library = TRUE
             """)
@@ -432,6 +433,22 @@ def fetch_all_active_movies_for_analysis() -> List[Dict[str, Any]]:
         logger.error(f"  ➜ 获取所有在库电影进行分析时失败: {e}", exc_info=True)
         return []
 
+def fetch_movie_assets_batch(tmdb_ids: List[str]) -> Dict[str, Any]:
+    """批量获取指定电影的 asset_details_json，返回 {tmdb_id: asset_details_json}。"""
+    if not tmdb_ids: return {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT tmdb_id, asset_details_json
+                FROM media_metadata
+                WHERE item_type = 'Movie' AND in_library = TRUE AND tmdb_id = ANY(%s)
+            """, (tmdb_ids,))
+            return {str(row['tmdb_id']): row['asset_details_json'] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"  ➜ 批量获取电影资产详情时失败: {e}", exc_info=True)
+        return {}
+
 def fetch_all_active_series_for_analysis() -> List[Dict[str, Any]]:
     """
     获取所有在库剧集基本信息。
@@ -483,6 +500,49 @@ def fetch_episodes_simple_batch(series_tmdb_ids: List[str]) -> List[Dict[str, An
         logger.error(f"  ➜ 批量获取分集信息时失败: {e}", exc_info=True)
         return []
     
+def fetch_season_digests_batch(series_tmdb_ids: List[str]) -> Dict[Tuple[str, int], str]:
+    """
+    在数据库侧为每个在库季计算内容摘要 (分集号 + 各集资产详情 + 版本数 + 季ID)。
+    摘要不变说明该季的判定输入没有变化，无需取回分集资产详情。
+    返回: {(parent_series_tmdb_id, season_number): content_hash}
+    """
+    if not series_tmdb_ids: return {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT 
+                    e.parent_series_tmdb_id,
+                    e.season_number,
+                    md5(
+                        COALESCE(MAX(s.tmdb_id), '') || '|' ||
+                        string_agg(
+                            COALESCE(e.episode_number::text, '') || ':' ||
+                            COALESCE(md5(e.asset_details_json::text), '') || ':' ||
+                            COALESCE(md5(e.emby_item_ids_json::text), ''),
+                            ',' ORDER BY e.episode_number NULLS FIRST, e.tmdb_id
+                        )
+                    ) AS content_hash
+                FROM media_metadata e
+                LEFT JOIN media_metadata s ON (
+                    s.parent_series_tmdb_id = e.parent_series_tmdb_id 
+                    AND s.season_number = e.season_number 
+                    AND s.item_type = 'Season'
+                )
+                WHERE e.item_type = 'Episode' 
+                  AND e.in_library = TRUE
+                  AND e.parent_series_tmdb_id = ANY(%s)
+                  AND e.season_number IS NOT NULL
+                GROUP BY e.parent_series_tmdb_id, e.season_number
+            """, (series_tmdb_ids,))
+            return {
+                (str(row['parent_series_tmdb_id']), int(row['season_number'])): row['content_hash']
+                for row in cursor.fetchall()
+            }
+    except Exception as e:
+        logger.error(f"  ➜ 批量计算季内容摘要时失败: {e}", exc_info=True)
+        return {}
+
 def get_episode_ids_for_season(parent_tmdb_id: str, season_number: int) -> List[str]:
     """
     【删除专用】获取指定季下的所有分集的 Emby ID。
@@ -532,4 +592,53 @@ def batch_update_missing_info(updates: Dict[str, List[int]]):
                 
                 conn.commit()
     except Exception as e:
-        logger.error(f"  ➜ 批量更新缺集信息失败: {e}", exc_info=True)
\ No newline at end of file
+        logger.error(f"  ➜ 批量更新缺集信息失败: {e}", exc_info=True)
+
+# ======================================================================
+# ★★★ 洗版增量判定缓存 ★★★
+# ======================================================================
+
+def get_resubscribe_eval_cache() -> Dict[Tuple[str, str, int], Dict[str, Any]]:
+    """获取所有项目上次的判定结果及其输入哈希。"""
+    sql = "SELECT tmdb_id, item_type, season_number, input_hash, needs_action, reason FROM resubscribe_eval_cache;"
+    cache = {}
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql)
+            for row in cursor.fetchall():
+                key = (str(row['tmdb_id']), row['item_type'], int(row['season_number']))
+                cache[key] = {'input_hash': row['input_hash'], 'needs_action': row['needs_action'], 'reason': row['reason']}
+        return cache
+    except Exception as e:
+        logger.error(f"  ➜ 获取洗版判定缓存时失败: {e}", exc_info=True)
+        return {}
+
+def upsert_resubscribe_eval_cache_batch(items_data: List[Dict[str, Any]]):
+    """批量写入判定结果。items_data 需包含 tmdb_id, item_type, season_number, input_hash, matched_rule_id, needs_action, reason。"""
+    if not items_data: return
+    sql = """
+        INSERT INTO resubscribe_eval_cache (tmdb_id, item_type, season_number, input_hash, matched_rule_id, needs_action, reason, evaluated_at)
+        VALUES (%(tmdb_id)s, %(item_type)s, %(season_number)s, %(input_hash)s, %(matched_rule_id)s, %(needs_action)s, %(reason)s, NOW())
+        ON CONFLICT (tmdb_id, item_type, season_number) DO UPDATE SET
+            input_hash = EXCLUDED.input_hash, matched_rule_id = EXCLUDED.matched_rule_id,
+            needs_action = EXCLUDED.needs_action, reason = EXCLUDED.reason, evaluated_at = NOW();
+    """
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                from psycopg2.extras import execute_batch
+                execute_batch(cursor, sql, items_data, page_size=500)
+            conn.commit()
+    except Exception as e:
+        logger.error(f"  ➜ 批量写入洗版判定缓存失败: {e}", exc_info=True)
+
+def clear_resubscribe_eval_cache():
+    """清空判定缓存，下次刷新将全量重新判定。"""
+    try:
+        with get_db_connection() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("DELETE FROM resubscribe_eval_cache;")
+            conn.commit()
+    except Exception as e:
+        logger.error(f"  ➜ 清空洗版判定缓存失败: {e}", exc_info=True)
@@ -66,11 +66,15 @@ def upsert_user_media_data(data: Dict[str, Any]):
         logger.error(f"DB: 更新用户媒体数据失败 for user {user_id}, item {item_id}: {e}", exc_info=True)
         raise
 
-def upsert_user_media_data_batch(user_id: str, items_data: List[Dict[str, Any]]):
-    """【V1】为一个指定用户，批量更新或插入其所有媒体的状态。"""
+def upsert_user_media_data_batch(user_id: str, items_data: List[Dict[str, Any]]) -> int:
+    """
+    【V2 - 差量写入版】为一个指定用户，批量更新或插入其媒体状态。
+    - 冲突更新时只在状态真正变化时才改写行 (IS DISTINCT FROM)，未变化的行不会产生新的行版本。
+    - 返回实际插入或更新的行数。
+    """
     
     if not user_id or not items_data:
-        return
+        return 0
 
     sql = """
         INSERT INTO user_media_data (
@@ -83,7 +87,15 @@ def upsert_user_media_data_batch(user_id: str, items_data: List[Dict[str, Any]])
             playback_position_ticks = EXCLUDED.playback_position_ticks,
             play_count = EXCLUDED.play_count,
             last_played_date = EXCLUDED.last_played_date,
-            last_updated_at = EXCLUDED.last_updated_at;
+            last_updated_at = EXCLUDED.last_updated_at
+        WHERE (
+            user_media_data.is_favorite, user_media_data.played, user_media_data.playback_position_ticks,
+            user_media_data.play_count, user_media_data.last_played_date
+        ) IS DISTINCT FROM (
+            EXCLUDED.is_favorite, EXCLUDED.played, EXCLUDED.playback_position_ticks,
+            EXCLUDED.play_count, EXCLUDED.last_played_date
+        )
+        RETURNING item_id;
     """
     
     values_to_insert = []
@@ -105,12 +117,61 @@ def upsert_user_media_data_batch(user_id: str, items_data: List[Dict[str, Any]])
     try:
         with get_db_connection() as conn:
             cursor = conn.cursor()
-            execute_values(cursor, sql, values_to_insert, page_size=1000)
+            changed_rows = execute_values(cursor, sql, values_to_insert, page_size=1000, fetch=True)
             conn.commit()
+            return len(changed_rows)
     except Exception as e:
         logger.error(f"DB: 批量更新用户 {user_id} 的媒体数据时失败: {e}", exc_info=True)
         raise
 
+def reset_user_media_data_not_in(user_id: str, active_item_ids: List[str]) -> int:
+    """
+    全量同步时使用：把不在 Emby 当前"有状态"集合里的记录重置为未收藏、未播放、无进度。
+    播放次数和最后播放时间作为历史保留。返回被重置的行数。
+    """
+    if not user_id:
+        return 0
+
+    sql = """
+        UPDATE user_media_data
+        SET is_favorite = FALSE, played = FALSE, playback_position_ticks = 0, last_updated_at = NOW()
+        WHERE user_id = %s
+          AND NOT (item_id = ANY(%s))
+          AND (is_favorite OR played OR playback_position_ticks > 0)
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (user_id, list(active_item_ids)))
+            conn.commit()
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"DB: 重置用户 {user_id} 的过期媒体状态时失败: {e}", exc_info=True)
+        raise
+
+def get_user_data_sync_watermarks() -> Dict[str, datetime]:
+    """获取所有用户上次成功同步媒体状态的时间 {user_id: synced_at}。"""
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT id, user_data_synced_at FROM emby_users WHERE user_data_synced_at IS NOT NULL")
+            return {row['id']: row['user_data_synced_at'] for row in cursor.fetchall()}
+    except Exception as e:
+        logger.error(f"DB: 获取用户同步水位线失败: {e}", exc_info=True)
+        return {}
+
+def update_user_data_sync_watermark(user_id: str, synced_at: datetime):
+    """记录用户媒体状态的同步水位线 (本次同步开始的时间)。"""
+    
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute("UPDATE emby_users SET user_data_synced_at = %s WHERE id = %s", (synced_at, user_id))
+            conn.commit()
+    except Exception as e:
+        logger.error(f"DB: 更新用户 {user_id} 的同步水位线失败: {e}", exc_info=True)
+
 def get_all_emby_users() -> List[Dict[str, Any]]:
     """获取本地缓存的所有Emby用户信息。"""
     
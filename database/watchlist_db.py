@@ -3,6 +3,7 @@ import psycopg2
 import logging
 import json
 from typing import List, Dict, Any, Optional
+from datetime import datetime
 
 from .connection import get_db_connection
 
@@ -846,7 +847,9 @@ def get_series_by_dynamic_condition(condition_sql: str = None, library_ids: Opti
             watchlist_missing_info_json AS missing_info_json,
             subscription_status,
             total_episodes,
-            total_episodes_locked
+            total_episodes_locked,
+            watchlist_next_episode_json AS next_episode_to_air_json,
+            watchlist_last_checked_at AS last_checked_at
         FROM media_metadata
         WHERE item_type = 'Series'
     """
@@ -881,6 +884,28 @@ def get_series_by_dynamic_condition(condition_sql: str = None, library_ids: Opti
         logger.error(f"  ➜ 根据动态条件获取剧集时出错: {e}", exc_info=True)
         return []
     
+def touch_series_last_checked(tmdb_ids: List[str], checked_at: Optional[datetime] = None) -> int:
+    """
+    批量推进剧集的 watchlist_last_checked_at 水位线。
+    用于 TMDb 变更检测确认"自上次检查以来无变化"的剧集，不改动其它任何字段。
+    """
+    if not tmdb_ids:
+        return 0
+    sql = """
+        UPDATE media_metadata
+        SET watchlist_last_checked_at = COALESCE(%s, NOW())
+        WHERE tmdb_id = ANY(%s) AND item_type = 'Series'
+    """
+    try:
+        with get_db_connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(sql, (checked_at, list(tmdb_ids)))
+            conn.commit()
+            return cursor.rowcount
+    except Exception as e:
+        logger.error(f"  ➜ 批量更新剧集检查时间失败: {e}", exc_info=True)
+        return 0
+
 def get_series_seasons_lock_info(parent_tmdb_id: str) -> Dict[int, Dict[str, Any]]:
     """
     获取指定剧集所有季的锁定状态信息。
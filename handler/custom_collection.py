@@ -10,6 +10,7 @@ import numpy as np
 import sys
 from typing import List, Dict, Any, Optional, Tuple
 import json
+import hashlib
 from datetime import datetime, timedelta
 from concurrent.futures import ThreadPoolExecutor
 from bs4 import BeautifulSoup
@@ -17,8 +18,9 @@ from gevent import subprocess, Timeout
 from urllib.parse import urlparse, parse_qs, unquote
 import handler.tmdb as tmdb
 import config_manager
-from tasks.helpers import parse_series_title_and_season
-from database import media_db, connection
+import boot_snapshot
+from tasks.helpers import parse_series_title_and_season, normalize_full_width_chars
+from database import media_db, connection, custom_collection_db
 from handler.douban import DoubanApi
 from handler.tmdb import search_media
 from ai_translator import AITranslator
@@ -26,6 +28,33 @@ from ai_translator import AITranslator
 logger = logging.getLogger(__name__)
 
 
+# --- 标题匹配记忆 ---
+# 不同置信度的记忆有效期 (秒)：精确匹配最久，回退匹配次之，未匹配 (负缓存) 最短
+TITLE_MATCH_MEMO_TTL = {
+    'exact': 30 * 86400,
+    'partial': 14 * 86400,
+    'fallback': 3 * 86400,
+    'none': 86400,
+}
+
+def normalize_title_for_memo(title: str) -> str:
+    """ 记忆键使用的标题规范化：全角转半角、合并空白、小写。"""
+    if not title:
+        return ""
+    return re.sub(r'\s+', ' ', normalize_full_width_chars(title)).strip().lower()
+
+def _build_title_memo_key(title: str, item_type: str, year: Optional[str]) -> Optional[Tuple[str, str, str, int]]:
+    normalized_title = normalize_title_for_memo(title)
+    if not normalized_title or not item_type:
+        return None
+    season_hint = 0
+    if item_type == 'Series':
+        # 不带 api_key 时只做本地解析，不会发起网络请求
+        _, parsed_season = parse_series_title_and_season(title)
+        season_hint = parsed_season or 0
+    return normalized_title, str(year or ''), item_type, season_hint
+
+
 class ListImporter:
     """
     (V9.1 - 最终异步版)
@@ -426,6 +455,55 @@ class ListImporter:
         return items, source_type
 
     def _match_title_to_tmdb(self, title: str, item_type: str, year: Optional[str] = None) -> Optional[Tuple[str, str, Optional[int]]]:
+        """
+        标题 -> TMDb 匹配 (带持久化记忆)。
+        同一个 "标题 (年份)" 会在不同榜单、不同日期反复出现，命中记忆时直接复用，不再发起搜索。
+        """
+        memo_key = _build_title_memo_key(title, item_type, year)
+        if memo_key:
+            memo = custom_collection_db.get_title_match_memo(*memo_key)
+            if memo is not None:
+                if not memo.get('tmdb_id'):
+                    logger.debug(f"  ➜ 标题 '{title}' 命中负缓存，跳过 TMDb 搜索。")
+                    return None
+                logger.debug(f"  ➜ 标题 '{title}' 命中匹配记忆: {memo['tmdb_id']} ({memo.get('confidence')})")
+                return memo['tmdb_id'], memo['matched_type'], memo.get('season_number')
+
+        result, confidence = self._search_title_on_tmdb(title, item_type, year)
+
+        if memo_key and confidence != 'error':
+            tmdb_id, matched_type, season_number = result if result else (None, None, None)
+            custom_collection_db.save_title_match_memo(
+                *memo_key,
+                tmdb_id=str(tmdb_id) if tmdb_id else None,
+                matched_type=matched_type,
+                season_number=season_number,
+                confidence=confidence,
+                ttl_seconds=TITLE_MATCH_MEMO_TTL.get(confidence, TITLE_MATCH_MEMO_TTL['none'])
+            )
+        return result
+
+    def _search_title_on_tmdb(self, title: str, item_type: str, year: Optional[str] = None) -> Tuple[Optional[Tuple[str, str, Optional[int]]], str]:
+        """
+        实际执行 TMDb 搜索匹配，返回 (匹配结果, 置信度)。
+        请求失败 (网络 / HTTP 错误) 导致的未匹配返回置信度 'error'，调用方不会把它记成负缓存。
+        """
+        search_failed = False
+
+        def mark_failed():
+            nonlocal search_failed
+            search_failed = True
+
+        def search(query: str, media_type: str, year: Optional[str] = None):
+            # search_media 出错时返回 None，没有结果时返回空列表
+            results = search_media(query, self.tmdb_api_key, media_type, year=year)
+            if results is None:
+                mark_failed()
+            return results
+
+        def failure_confidence() -> str:
+            return 'error' if search_failed else 'none'
+
         def normalize_string(s: str) -> str:
             if not s: return ""
             return re.sub(r'[\s:：·\-*\'!,?.。]+', '', s).lower()
@@ -457,7 +535,7 @@ class ListImporter:
             for title_variation in final_titles:
                 if not title_variation: continue
                 
-                results = search_media(title_variation, self.tmdb_api_key, 'Movie', year=year)
+                results = search(title_variation, 'Movie', year=year)
                 
                 if first_search_results is None:
                     first_search_results = results
@@ -474,7 +552,7 @@ class ListImporter:
                     if norm_variation == norm_title or norm_variation == norm_original_title:
                         tmdb_id = str(result.get('id'))
                         logger.info(f"  ➜ 电影标题 '{title}'{year_info} 通过【精确规范匹配】(使用'{title_variation}') 成功匹配到: {result.get('title')} (ID: {tmdb_id})")
-                        return tmdb_id, 'Movie', None
+                        return (tmdb_id, 'Movie', None), 'exact'
                 
                 for result in results:
                     norm_title = normalize_string(result.get('title'))
@@ -483,31 +561,31 @@ class ListImporter:
                     if norm_variation in norm_title or norm_variation in norm_original_title:
                         tmdb_id = str(result.get('id'))
                         logger.info(f"  ➜ 电影标题 '{title}'{year_info} 通过【包含匹配】(使用'{title_variation}') 成功匹配到: {result.get('title')} (ID: {tmdb_id})")
-                        return tmdb_id, 'Movie', None
+                        return (tmdb_id, 'Movie', None), 'partial'
 
             if first_search_results:
                 first_result = first_search_results[0]
                 tmdb_id = str(first_result.get('id'))
                 logger.warning(f"  ➜ 电影标题 '{title}'{year_info} 所有精确匹配和包含匹配均失败。将【回退使用】最相关的搜索结果: {first_result.get('title')} (ID: {tmdb_id})")
-                return tmdb_id, 'Movie', None
+                return (tmdb_id, 'Movie', None), 'fallback'
 
             logger.error(f"  ➜ 电影标题 '{title}'{year_info} 未能在TMDb上找到任何搜索结果。")
-            return None
+            return None, failure_confidence()
         
         elif item_type == 'Series':
             show_name_parsed, season_number_to_validate = parse_series_title_and_season(title, api_key=self.tmdb_api_key)
             show_name = show_name_parsed if show_name_parsed else title
             
-            results = search_media(show_name, self.tmdb_api_key, 'Series', year=year)
+            results = search(show_name, 'Series', year=year)
 
             if not results and year and season_number_to_validate is not None:
                 logger.debug(f"  ➜ 带年份 '{year}' 搜索剧集 '{show_name}' 未找到结果，可能是后续季。尝试不带年份进行回退搜索...")
-                results = search_media(show_name, self.tmdb_api_key, 'Series', year=None)
+                results = search(show_name, 'Series', year=None)
 
             if not results:
                 year_info = f" (年份: {year})" if year else ""
                 logger.warning(f"  ➜ 剧集标题 '{title}' (搜索词: '{show_name}'){year_info} 未能在TMDb上找到匹配项。")
-                return None
+                return None, failure_confidence()
             
             if season_number_to_validate is None:
                 series_result = None
@@ -519,11 +597,13 @@ class ListImporter:
                         logger.debug(f"  ➜ 剧集 '{show_name}' 通过【精确规范匹配】找到了: {result.get('name')} (ID: {result.get('id')})")
                         break 
                 
+                confidence = 'exact'
                 if not series_result:
                     series_result = results[0]
+                    confidence = 'fallback'
                     logger.warning(f"  ➜ 剧集 '{show_name}' 未找到精确匹配，使用首个结果: {series_result.get('name')} (ID: {series_result.get('id')})")
 
-                return str(series_result.get('id')), 'Series', None
+                return (str(series_result.get('id')), 'Series', None), confidence
 
             else:
                 def verify_season_in_results(candidates_list, source_desc=""):
@@ -540,6 +620,8 @@ class ListImporter:
                         candidate_name = candidate.get('name')
                         
                         series_details = tmdb.get_tv_details(int(candidate_id), self.tmdb_api_key, append_to_response="seasons")
+                        if series_details is None:
+                            mark_failed()
                         
                         if series_details and 'seasons' in series_details:
                             has_season = False
@@ -557,11 +639,11 @@ class ListImporter:
 
                 matched_id = verify_season_in_results(results[:5])
                 if matched_id:
-                    return matched_id, 'Series', season_number_to_validate
+                    return (matched_id, 'Series', season_number_to_validate), 'exact'
 
                 if year:
                     logger.info(f"  ➜ 剧集 '{show_name}' 带年份 ({year}) 搜索结果中未找到第 {season_number_to_validate} 季，尝试移除年份重搜...")
-                    results_no_year = search_media(show_name, self.tmdb_api_key, 'Series', year=None)
+                    results_no_year = search(show_name, 'Series', year=None)
                     
                     if results_no_year:
                         checked_ids = set(str(r.get('id')) for r in results[:5])
@@ -570,50 +652,82 @@ class ListImporter:
                         if candidates_no_year:
                             matched_id = verify_season_in_results(candidates_no_year, source_desc=" (无年份重搜)")
                             if matched_id:
-                                return matched_id, 'Series', season_number_to_validate
+                                return (matched_id, 'Series', season_number_to_validate), 'exact'
 
                 logger.warning(f"  ➜ 验证失败！在 '{show_name}' 的所有搜索结果中，均未找到第 {season_number_to_validate} 季。")
                     
                 if show_name != title:
                     logger.info(f"  ➜ [兜底机制] 尝试使用原始标题 '{title}' 进行回退搜索...")
-                    fallback_results = search_media(title, self.tmdb_api_key, 'Series', year=None)
+                    fallback_results = search(title, 'Series', year=None)
                     
                     if fallback_results:
                         best_match = fallback_results[0]
                         logger.info(f"  ➜ [兜底成功] 原始标题 '{title}' 匹配到了: {best_match.get('name')} (ID: {best_match.get('id')})")
-                        return str(best_match.get('id')), 'Series', None
+                        return (str(best_match.get('id')), 'Series', None), 'fallback'
             
-            return None
+            return None, failure_confidence()
                 
-        return None
+        return None, failure_confidence()
 
     def process(self, definition: Dict) -> Tuple[List[Dict[str, str]], str]:
+        return self.match_sources(definition, self.fetch_sources(definition))
+
+    def fetch_sources(self, definition: Dict) -> List[Dict[str, Any]]:
+        """
+        第一阶段：只抓取各榜单源的原始条目 (不做 TMDb 匹配)。
+        返回 [{'url', 'items', 'source_type', 'matched'}]，matched=True 表示条目已自带 TMDb ID。
+        """
         raw_url = definition.get('url')
         urls = []
         if isinstance(raw_url, list):
             urls = [u for u in raw_url if u]
         elif isinstance(raw_url, str) and raw_url:
             urls = [raw_url]
-            
-        if not urls: return [], 'empty'
-        
-        collected_lists = [] 
-        last_source_type = 'mixed'
-        
+
+        fetched_sources = []
         total_urls = len(urls)
         for i, url in enumerate(urls):
             temp_def = definition.copy()
             temp_def['url'] = url
-            
-            items, source_type = self._process_single_url(url, temp_def)
-            
-            collected_lists.append(items)
-            last_source_type = source_type
-            
+
+            items, source_type, matched = self._fetch_single_url(url, temp_def)
+            fetched_sources.append({'url': url, 'items': items, 'source_type': source_type, 'matched': matched})
+
             if isinstance(url, str) and url.startswith('maoyan://'):
                 if i < total_urls - 1:
                     logger.info(f"  ➜ [防封控] 单个猫眼榜单采集完毕，为安全起见，强制休眠 10 秒后再采集下一个...")
                     time.sleep(10)
+
+        return fetched_sources
+
+    @staticmethod
+    def fingerprint_sources(definition: Dict, fetched_sources: List[Dict[str, Any]]) -> str:
+        """
+        计算榜单源内容指纹：各源的有序条目 + 合集定义 (含ID修正等)。
+        指纹与上次一致说明上游榜单和定义都没有变化，可以直接复用上次的匹配结果。
+        """
+        payload = {
+            'definition': definition,
+            'sources': [[src['url'], src['items']] for src in fetched_sources]
+        }
+        raw = json.dumps(payload, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+    def match_sources(self, definition: Dict, fetched_sources: List[Dict[str, Any]]) -> Tuple[List[Dict[str, str]], str]:
+        """第二阶段：把抓取到的原始条目匹配为 TMDb 项目，并交叉合并、去重。"""
+        if not fetched_sources: return [], 'empty'
+
+        collected_lists = []
+        last_source_type = 'mixed'
+        for src in fetched_sources:
+            temp_def = definition.copy()
+            temp_def['url'] = src['url']
+            if src['matched']:
+                items = src['items']
+            else:
+                items = self._match_items(src['items'], temp_def)
+            collected_lists.append(items)
+            last_source_type = src['source_type']
         
         all_items = []
         if collected_lists:
@@ -648,37 +762,40 @@ class ListImporter:
             
         return unique_items, last_source_type
 
-    def _process_single_url(self, url: str, definition: Dict) -> Tuple[List[Dict[str, str]], str]:
+    def _fetch_single_url(self, url: str, definition: Dict) -> Tuple[List[Dict[str, str]], str, bool]:
         definition = definition.copy()
         definition['url'] = url
         source_type = 'list_rss'
         
         if not url:
-            return [], source_type
+            return [], source_type, True
             
         if url.startswith('maoyan://'):
             source_type = 'list_maoyan'
             logger.info(f"  ➜ 检测到猫眼榜单，将启动异步后台脚本...")
             greenlet = gevent.spawn(self._execute_maoyan_fetch, definition)
             tmdb_items = greenlet.get()
-            return tmdb_items, source_type
+            return tmdb_items, source_type, True
 
-        item_types = definition.get('item_type', ['Movie'])
-        if isinstance(item_types, str): item_types = [item_types]
         limit = definition.get('limit')
         
         items, source_type = self._get_titles_and_imdbids_from_url(url)
         
-        if not items: return [], source_type
+        if not items: return [], source_type, True
         
         if items and 'id' in items[0] and 'type' in items[0]:
             logger.info(f"  ➜ 检测到来自TMDb源 ({source_type}) 的预匹配ID，将跳过标题匹配。")
             if limit and isinstance(limit, int) and limit > 0:
                 items = items[:limit]
-            return items, source_type
+            return items, source_type, True
 
         if limit and isinstance(limit, int) and limit > 0:
             items = items[:limit]
+        return items, source_type, False
+
+    def _match_items(self, items: List[Dict[str, str]], definition: Dict) -> List[Dict[str, str]]:
+        item_types = definition.get('item_type', ['Movie'])
+        if isinstance(item_types, str): item_types = [item_types]
         
         tmdb_items = []
         douban_api = DoubanApi()
@@ -790,7 +907,7 @@ class ListImporter:
                 
         logger.info(f"  ➜ 去重后剩余 {len(unique_items)} 个有效项目。")
 
-        return unique_items, source_type
+        return unique_items
 
 
 class RecommendationEngine:
@@ -803,7 +920,14 @@ class RecommendationEngine:
     _cache_ids = None
     _cache_titles = None
     _cache_types = None
+    _cache_checksum = None
     _REFRESH_INTERVAL = 14400
+    _SNAPSHOT_NAME = 'vectors'
+    _VECTOR_FILTER_SQL = """
+        WHERE overview_embedding IS NOT NULL
+          AND item_type IN ('Movie', 'Series')
+          AND in_library = TRUE
+    """
     _is_refreshing_loop_running = False 
 
     def __init__(self, tmdb_api_key: str):
@@ -821,12 +945,34 @@ class RecommendationEngine:
         try:
             with connection.get_db_connection() as conn:
                 cursor = conn.cursor()
-                cursor.execute("""
+                # 校验值由数据库逐行计算 (向量本身只参与哈希，不传回应用)，与本地快照比对
+                cursor.execute(f"""
+                    SELECT COUNT(*) AS row_count,
+                           md5(string_agg(tmdb_id || '|' || item_type || '|' || COALESCE(title, '') || '|' || md5(overview_embedding::text), ',' ORDER BY tmdb_id, item_type)) AS checksum
+                    FROM media_metadata
+                    {cls._VECTOR_FILTER_SQL}
+                """)
+                checksum_row = cursor.fetchone()
+                checksum = f"{checksum_row['row_count']}-{checksum_row['checksum'] or ''}"
+                if checksum == cls._cache_checksum:
+                    logger.info("  ✅ [向量引擎] 向量数据未变化，保留当前缓存。")
+                    return
+
+                snapshot = boot_snapshot.load_snapshot(cls._SNAPSHOT_NAME, checksum)
+                if snapshot:
+                    arrays, index = snapshot
+                    cls._cache_matrix = arrays['matrix']
+                    cls._cache_ids = index['ids']
+                    cls._cache_titles = index['titles']
+                    cls._cache_types = index['types']
+                    cls._cache_checksum = checksum
+                    logger.info(f"  ✅ [向量引擎] 已从本地快照加载向量缓存。共 {len(cls._cache_ids)} 条，耗时 {time.time() - start_t:.2f}s。")
+                    return
+
+                cursor.execute(f"""
                     SELECT tmdb_id, title, item_type, overview_embedding 
                     FROM media_metadata 
-                    WHERE overview_embedding IS NOT NULL
-                      AND item_type IN ('Movie', 'Series')
-                      AND in_library = TRUE
+                    {cls._VECTOR_FILTER_SQL}
                 """)
                 all_data = cursor.fetchall()
             
@@ -854,8 +1000,10 @@ class RecommendationEngine:
             cls._cache_ids = ids
             cls._cache_titles = titles
             cls._cache_types = types
+            cls._cache_checksum = checksum
             
             logger.info(f"  ✅ [向量引擎] 缓存刷新完成。共 {len(ids)} 条，耗时 {time.time() - start_t:.2f}s。")
+            boot_snapshot.save_snapshot(cls._SNAPSHOT_NAME, checksum, {'matrix': matrix}, {'ids': ids, 'titles': titles, 'types': types})
 
         except Exception as e:
             logger.error(f"  ❌ [向量引擎] 刷新缓存失败: {e}", exc_info=True)
@@ -10,7 +10,9 @@ import base64
 import hashlib
 import hmac
 import time
+import os
 from utils import clean_character_name_static
+import atomic_io
 from urllib import parse
 from datetime import datetime
 from random import choice
@@ -20,14 +22,220 @@ import threading
 logger = logging.getLogger(__name__)
 
 
+class _AdaptiveTokenBucket:
+    """
+    自适应令牌桶限速器 (进程内共享)。
+    - 采用“预约”方式取令牌：锁内只做计算，等待在锁外进行，多个线程不会排队持锁睡眠；
+    - 触发豆瓣 1080 速率限制时速率减半并进入退避期，之后连续成功再逐步恢复 (AIMD)。
+    """
+    MIN_RATE = 1.0 / 30          # 最低 30 秒一个请求
+    BURST = 2.0                  # 允许的瞬时突发
+    RECOVER_EVERY = 20           # 每连续成功 N 次提升一次速率
+    MAX_BACKOFF_SECONDS = 300
+
+    def __init__(self, interval_seconds: float):
+        self._lock = threading.Lock()
+        self.configure(interval_seconds)
+
+    def configure(self, interval_seconds: float):
+        with self._lock:
+            self.base_rate = 1.0 / max(interval_seconds, 0.1)
+            self.max_rate = self.base_rate * 2
+            self.rate = self.base_rate
+            self.tokens = 1.0
+            self.updated_at = time.monotonic()
+            self.penalty_until = 0.0
+            self.success_streak = 0
+            self.limit_streak = 0
+
+    def acquire(self):
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.BURST, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1.0
+            wait = 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+            wait = max(wait, self.penalty_until - now)
+        if wait > 0:
+            logger.trace(f"豆瓣 API 限速中... 等待 {wait:.2f} 秒。")
+            time.sleep(wait)
+
+    def on_success(self):
+        with self._lock:
+            self.limit_streak = 0
+            self.success_streak += 1
+            if self.success_streak >= self.RECOVER_EVERY and self.rate < self.max_rate:
+                self.success_streak = 0
+                self.rate = min(self.max_rate, self.rate + self.base_rate * 0.1)
+
+    def on_rate_limited(self):
+        with self._lock:
+            self.success_streak = 0
+            self.limit_streak += 1
+            self.rate = max(self.MIN_RATE, self.rate / 2)
+            backoff = min(self.MAX_BACKOFF_SECONDS, 10 * (2 ** (self.limit_streak - 1)))
+            self.penalty_until = time.monotonic() + backoff
+            self.tokens = 0.0
+            self.updated_at = time.monotonic()
+        logger.warning(f"  ➜ 豆瓣 API 触发速率限制，降速至每 {1 / self.rate:.1f} 秒一个请求，暂停 {backoff} 秒。")
+
+
+class _DoubanResponseCache:
+    """
+    豆瓣响应的本地持久化缓存，目录结构与本地豆瓣数据一致：
+      cache/douban-movies|douban-tv/{豆瓣ID}_{IMDb ID}/*.json
+      cache/douban-celebrities/{名人ID}.json
+    在线查询的结果写回这里，之后的处理可直接命中本地缓存。
+    """
+    TTL_SECONDS = 30 * 86400
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.root: Optional[str] = None
+        # {条目目录: (目录 mtime, {豆瓣ID: 目录名}, {IMDb ID: 目录名})}
+        self._indexes: Dict[str, Any] = {}
+
+    def set_root(self, local_data_path: Optional[str]):
+        with self._lock:
+            self.root = os.path.join(local_data_path, "cache") if local_data_path else None
+            self._indexes = {}
+
+    @staticmethod
+    def _subject_dir_name(mtype: Optional[str]) -> str:
+        return "douban-tv" if mtype and mtype.lower() in ('tv', 'series') else "douban-movies"
+
+    def _get_index(self, base: str):
+        """豆瓣ID 为 0 (外部工具未匹配到豆瓣条目) 的目录只能按 IMDb ID 查到。"""
+        try:
+            mtime = os.stat(base).st_mtime
+        except OSError:
+            return {}, {}
+        with self._lock:
+            cached = self._indexes.get(base)
+            if cached and cached[0] == mtime:
+                return cached[1], cached[2]
+        by_douban, by_imdb = {}, {}
+        for dirname in os.listdir(base):
+            douban_part, _, imdb_part = dirname.partition('_')
+            if douban_part and douban_part != '0':
+                by_douban.setdefault(douban_part, dirname)
+            if imdb_part:
+                by_imdb.setdefault(imdb_part, dirname)
+        with self._lock:
+            self._indexes[base] = (mtime, by_douban, by_imdb)
+        return by_douban, by_imdb
+
+    def _find_subject_file(self, mtype, douban_id=None, imdb_id=None) -> Optional[str]:
+        if not self.root:
+            return None
+        return self.find_subject_file_in(os.path.join(self.root, self._subject_dir_name(mtype)), douban_id, imdb_id)
+
+    def find_subject_file_in(self, base: str, douban_id=None, imdb_id=None) -> Optional[str]:
+        """在指定的条目目录 (douban-movies / douban-tv) 下查找条目文件，IMDb ID 优先。"""
+        by_douban, by_imdb = self._get_index(base)
+        dirname = (by_imdb.get(imdb_id) if imdb_id else None) or (by_douban.get(str(douban_id)) if douban_id else None)
+        if not dirname:
+            return None
+        dir_path = os.path.join(base, dirname)
+        try:
+            for filename in sorted(os.listdir(dir_path)):
+                if filename.endswith('.json'):
+                    return os.path.join(dir_path, filename)
+        except OSError:
+            pass
+        return None
+
+    @staticmethod
+    def _read_json(path: Optional[str]) -> Optional[Dict[str, Any]]:
+        if not path:
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            return data if isinstance(data, dict) else None
+        except Exception:
+            return None
+
+    @staticmethod
+    def _write_json_atomic(path: str, data: Dict[str, Any]):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        atomic_io.write_json_atomic(path, data, indent=None)
+
+    def is_fresh(self, data: Optional[Dict[str, Any]], section: str) -> bool:
+        """外部工具生成的文件没有 _cache_meta，视为完整且长期有效。"""
+        if not data:
+            return False
+        meta = data.get('_cache_meta')
+        if meta is None:
+            return True
+        ts = meta.get(section)
+        return bool(ts) and (time.time() - ts) < self.TTL_SECONDS
+
+    def read_subject(self, mtype, douban_id=None, imdb_id=None) -> Optional[Dict[str, Any]]:
+        return self._read_json(self._find_subject_file(mtype, douban_id, imdb_id))
+
+    def update_subject(self, mtype, douban_id: str, imdb_id: Optional[str], section: str, fields: Dict[str, Any]):
+        """
+        把在线结果合并进条目缓存文件。
+        - 核心处理器按目录直接读取 all.json 中的 actors，所以只有带 actors 的结果才会新建文件，
+          只有匹配/详情信息时只合并进已有文件；
+        - 外部工具生成的文件 (没有 _cache_meta) 只补充缺失的字段，不覆盖已有内容，也不打时间戳。
+        """
+        if not self.root or not douban_id:
+            return
+        try:
+            path = self._find_subject_file(mtype, douban_id, imdb_id)
+            if not path:
+                if 'actors' not in fields:
+                    return
+                sub_dir = self._subject_dir_name(mtype)
+                path = os.path.join(self.root, sub_dir, f"{douban_id}_{imdb_id or ''}", "all.json")
+            with self._lock:
+                data = self._read_json(path)
+                if data is not None and '_cache_meta' not in data:
+                    missing = {k: v for k, v in fields.items() if k not in data}
+                    if not missing:
+                        return
+                    data.update(missing)
+                else:
+                    data = data or {}
+                    data.update(fields)
+                    meta = data.get('_cache_meta') or {}
+                    meta[section] = time.time()
+                    data['_cache_meta'] = meta
+                data.setdefault('id', str(douban_id))
+                self._write_json_atomic(path, data)
+        except Exception as e:
+            logger.debug(f"写入豆瓣本地缓存失败 (ID: {douban_id}): {e}")
+
+    def read_celebrity(self, celebrity_id: str) -> Optional[Dict[str, Any]]:
+        if not self.root:
+            return None
+        data = self._read_json(os.path.join(self.root, "douban-celebrities", f"{celebrity_id}.json"))
+        return data if self.is_fresh(data, 'detail') else None
+
+    def write_celebrity(self, celebrity_id: str, data: Dict[str, Any]):
+        if not self.root:
+            return
+        try:
+            payload = dict(data)
+            payload['_cache_meta'] = {'detail': time.time()}
+            self._write_json_atomic(os.path.join(self.root, "douban-celebrities", f"{celebrity_id}.json"), payload)
+        except Exception as e:
+            logger.debug(f"写入豆瓣名人缓存失败 (ID: {celebrity_id}): {e}")
+
+    @staticmethod
+    def strip_meta(data: Dict[str, Any]) -> Dict[str, Any]:
+        return {k: v for k, v in data.items() if k != '_cache_meta'}
+
+
 class DoubanApi:
     _session: Optional[requests.Session] = None
     _session_lock = threading.Lock()
-    # --- ✨ 新增的冷却相关属性 ✨ ---
-    _cooldown_seconds: float = 1.5  # 默认冷却时间（秒），可以设置一个安全值
-    _last_request_time: float = 0.0 # 上次请求的时间戳
-    _cooldown_lock = threading.Lock() # 用于冷却计时的线程锁，防止多线程下计时错乱
-    # --- ✨ 新增属性结束 ✨ ---
+    # --- 限速与缓存 ---
+    _cooldown_seconds: float = 1.5  # 基准请求间隔（秒），限速器会在此基础上自适应调整
+    _limiter = _AdaptiveTokenBucket(1.5)
+    _cache = _DoubanResponseCache()
     _user_cookie: Optional[str] = None
 
     _urls = {
@@ -48,7 +256,8 @@ class DoubanApi:
     _default_timeout = 15 # 稍微增加超时
     
 
-    def __init__(self, cooldown_seconds: Optional[float] = None, user_cookie: Optional[str] = None):
+    def __init__(self, cooldown_seconds: Optional[float] = None, user_cookie: Optional[str] = None,
+                 local_data_path: Optional[str] = None):
         if DoubanApi._session is None:
             with DoubanApi._session_lock:
                 if DoubanApi._session is None:
@@ -57,24 +266,29 @@ class DoubanApi:
         
         if cooldown_seconds is not None and cooldown_seconds > 0:
             DoubanApi._cooldown_seconds = cooldown_seconds
+            DoubanApi._limiter.configure(cooldown_seconds)
             logger.trace(f"豆瓣Api 已设置请求冷却时间为: {DoubanApi._cooldown_seconds} 秒。")
         if user_cookie:
             DoubanApi._user_cookie = user_cookie
             logger.trace("DoubanApi 已加载用户登录 Cookie。")
+        if local_data_path:
+            DoubanApi._cache.set_root(local_data_path)
+            logger.trace("DoubanApi 已启用本地响应缓存。")
+
+    @classmethod
+    def find_local_subject_file(cls, cache_dir: str, douban_id: Optional[str] = None, imdb_id: Optional[str] = None) -> Optional[str]:
+        """按与在线缓存相同的规则，在本地豆瓣数据目录中查找条目文件。"""
+        return cls._cache.find_subject_file_in(cache_dir, douban_id, imdb_id)
+
+    @classmethod
+    def is_local_subject_fresh(cls, data: Optional[Dict[str, Any]], section: str = 'celebrities') -> bool:
+        """本程序写入的条目缓存超过有效期后视为过期；外部工具生成的文件长期有效。"""
+        return cls._cache.is_fresh(data, section)
+
     @classmethod
     def _apply_cooldown(cls):
-        """在每次API请求前应用冷却等待，线程安全。"""
-        with cls._cooldown_lock:
-            now = time.time()
-            elapsed = now - cls._last_request_time
-            
-            if elapsed < cls._cooldown_seconds:
-                wait_time = cls._cooldown_seconds - elapsed
-                logger.trace(f"豆瓣 API 冷却中... 等待 {wait_time:.2f} 秒。")
-                time.sleep(wait_time)
-            
-            # 无论是否等待，都更新最后请求时间为当前时间
-            cls._last_request_time = time.time()
+        """在每次API请求前向限速器申请令牌 (等待在锁外进行)，线程安全。"""
+        cls._limiter.acquire()
 
     @classmethod
     def _ensure_session(cls):
@@ -117,7 +331,9 @@ class DoubanApi:
             if response_json.get("code") == 1080:
                 msg = response_json.get('msg', "豆瓣API速率限制")
                 logger.warning(f"GET触发豆瓣速率限制: {msg}")
+                DoubanApi._limiter.on_rate_limited()
                 return self._make_error_dict("rate_limit", msg, response_json)
+            DoubanApi._limiter.on_success()
             return response_json
         except requests.exceptions.HTTPError as e:
             msg = str(e)
@@ -159,7 +375,9 @@ class DoubanApi:
             if response_json.get("code") == 1080:
                 msg = response_json.get('msg', "豆瓣API速率限制")
                 logger.warning(f"POST触发豆瓣速率限制: {msg}")
+                DoubanApi._limiter.on_rate_limited()
                 return self._make_error_dict("rate_limit", msg, response_json)
+            DoubanApi._limiter.on_success()
             return response_json
         except requests.exceptions.HTTPError as e:
             # ▼▼▼ 核心修改在这里 ▼▼▼
@@ -207,17 +425,30 @@ class DoubanApi:
         url_key = f"{subject_type}_detail"
         if url_key not in DoubanApi._urls:
             return self._make_error_dict("invalid_param", f"未知的 subject_type for detail: {subject_type}")
+        cached = DoubanApi._cache.read_subject(subject_type, douban_id=subject_id)
+        if DoubanApi._cache.is_fresh(cached, 'detail') and cached.get("title"):
+            logger.debug(f"  ➜ 豆瓣ID {subject_id} ({subject_type}) 详情命中本地缓存。")
+            return DoubanApi._cache.strip_meta(cached)
         detail_url = DoubanApi._urls[url_key] + subject_id
         logger.info(f"  ➜ 通过豆瓣ID获取详情: {detail_url}")
         details = self.__invoke(detail_url)
         if details.get("error"): # __invoke 返回了错误
             logger.warning(f"获取豆瓣ID {subject_id} ({subject_type}) 详情失败: {details.get('message')}")
+        else:
+            DoubanApi._cache.update_subject(subject_type, subject_id, None, 'detail', details)
         return details # 直接返回 __invoke 的结果 (成功或错误字典)
 
     def match_info(self, name: str, imdbid: Optional[str] = None, mtype: Optional[str] = None,
                year: Optional[str] = None, season: Optional[int] = None) -> Dict[str, Any]:
         if imdbid and imdbid.strip().startswith("tt"):
             actual_imdbid = imdbid.strip()
+            final_mtype = 'tv' if mtype and mtype.lower() in ['series', 'tv'] else 'movie'
+            cached = DoubanApi._cache.read_subject(final_mtype, imdb_id=actual_imdbid)
+            if cached and str(cached.get("id", "")).isdigit():
+                logger.trace(f"IMDBID '{actual_imdbid}' 命中本地缓存 -> 豆瓣ID: {cached.get('id')}")
+                return {"id": str(cached.get("id")), "title": cached.get("title", name),
+                        "original_title": cached.get("original_title"),
+                        "year": str(cached.get("year") or year or ""), "type": final_mtype, "source": "local_cache"}
             logger.trace(f"尝试通过IMDBID {actual_imdbid} (使用统一接口) 查询豆瓣信息...")
             
             # 1. 调用唯一的、简单的 imdbid 函数
@@ -233,13 +464,14 @@ class DoubanApi:
                     _, actual_douban_id = match.groups()
                     
                     # 3. ✨✨✨ 核心修正：直接使用从 Emby 传入的 mtype 作为最终类型 ✨✨✨
-                    final_mtype = 'tv' if mtype and mtype.lower() in ['series', 'tv'] else 'movie'
-                    
                     logger.trace(f"IMDBID '{actual_imdbid}' -> 豆瓣ID: {actual_douban_id}。将使用传入的类型: '{final_mtype}'")
                     
                     title = result_from_imdb.get("title", result_from_imdb.get("alt_title", name))
                     original_title = result_from_imdb.get("original_title")
                     year_from_api = str(result_from_imdb.get("year", "")).strip()
+                    DoubanApi._cache.update_subject(final_mtype, actual_douban_id, actual_imdbid, 'match', {
+                        "title": title, "original_title": original_title, "year": year_from_api or year
+                    })
                     
                     return {"id": actual_douban_id, "title": title, "original_title": original_title,
                             "year": year_from_api or year, "type": final_mtype, "source": "imdb_lookup"}
@@ -405,19 +637,28 @@ class DoubanApi:
         if not douban_subject_id or not final_mtype:
             return self._make_error_dict("missing_id_or_type", f"获取演职员信息前豆瓣ID或类型无效 (ID: {douban_subject_id}, Type: {final_mtype})", {"cast": []})
 
-        logger.info(f"  ➜ 获取豆瓣ID '{douban_subject_id}' (类型: {final_mtype}) 的演职员信息...")
-        response = None
-        if final_mtype == "tv": response = self.tv_celebrities(douban_subject_id)
-        elif final_mtype == "movie": response = self.movie_celebrities(douban_subject_id)
-        else: return self._make_error_dict("unknown_media_type", f"未知的媒体类型 '{final_mtype}'", {"cast": []})
+        if final_mtype not in ("tv", "movie"):
+            return self._make_error_dict("unknown_media_type", f"未知的媒体类型 '{final_mtype}'", {"cast": []})
+
+        cached = DoubanApi._cache.read_subject(final_mtype, douban_id=douban_subject_id)
+        if DoubanApi._cache.is_fresh(cached, 'celebrities') and cached.get("actors"):
+            logger.info(f"  ➜ 豆瓣ID '{douban_subject_id}' (类型: {final_mtype}) 的演职员信息命中本地缓存。")
+            actors_list = cached.get("actors")
+        else:
+            logger.info(f"  ➜ 获取豆瓣ID '{douban_subject_id}' (类型: {final_mtype}) 的演职员信息...")
+            if final_mtype == "tv": response = self.tv_celebrities(douban_subject_id)
+            else: response = self.movie_celebrities(douban_subject_id)
+
+            if not response or response.get("error"): # 检查错误
+                err_msg = response.get("message", "获取演职员信息失败") if response else "获取演职员信息无响应"
+                return self._make_error_dict(response.get("error", "api_error") if response else "no_response", err_msg, {"cast": []})
 
-        if not response or response.get("error"): # 检查错误
-            err_msg = response.get("message", "获取演职员信息失败") if response else "获取演职员信息无响应"
-            return self._make_error_dict(response.get("error", "api_error") if response else "no_response", err_msg, {"cast": []})
+            actors_list = response.get("celebrities", response.get("actors", []))
+            if actors_list is None: actors_list = []
+            # 以本地豆瓣数据的格式写回 (actors 字段)，后续处理可直接读取本地文件
+            DoubanApi._cache.update_subject(final_mtype, douban_subject_id, imdbid, 'celebrities', {"actors": actors_list})
 
         data: Dict[str, List[Dict[str, Any]]] = {"cast": []}
-        actors_list = response.get("celebrities", response.get("actors", []))
-        if actors_list is None: actors_list = []
 
         for idx, item in enumerate(actors_list):
             if not isinstance(item, dict): continue
@@ -461,9 +702,14 @@ class DoubanApi:
         if not celebrity_id or not str(celebrity_id).isdigit():
             return self._make_error_dict("invalid_param", f"无效的名人 celebrity_id: {celebrity_id}")
         
+        cached = DoubanApi._cache.read_celebrity(str(celebrity_id))
+        if cached:
+            return DoubanApi._cache.strip_meta(cached)
         detail_url = DoubanApi._urls["celebrity_detail"] % celebrity_id
         logger.debug(f"  ➜ 获取豆瓣演员详情: {detail_url}")
         details = self.__invoke(detail_url)
+        if not details.get("error"):
+            DoubanApi._cache.write_celebrity(str(celebrity_id), details)
         return details
     
     # ▼▼▼ 通过豆瓣链接获取其对应的IMDb ID ▼▼▼
@@ -7,6 +7,8 @@ import gc
 import json
 import base64
 import shutil
+import re
+import copy
 import time
 import threading
 from concurrent.futures import ThreadPoolExecutor, as_completed
@@ -17,7 +19,9 @@ from datetime import datetime, timedelta, timezone
 from collections import defaultdict
 
 import config_manager
+import atomic_io
 import constants
+import cache_events
 from typing import Optional, List, Dict, Any, Generator, Tuple, Set, Callable
 import logging
 logger = logging.getLogger(__name__)
@@ -81,6 +85,11 @@ class EmbyAPIClient:
             except Exception as e:
                 logger.error(f"Emby API 请求异常: {e} | URL: {url}")
                 raise
+            finally:
+                if method != "GET":
+                    # 对条目的写操作 (更新元数据、刷新、删除等) 完成后才使详情缓存失效 (并合并通知其它进程)，
+                    # 避免写入期间并发的读请求把旧数据重新放回缓存
+                    _invalidate_item_details_for_url(url)
 
     def get(self, url, **kwargs):
         return self.request("GET", url, **kwargs)
@@ -94,6 +103,114 @@ class EmbyAPIClient:
 # 初始化全局客户端实例
 emby_client = EmbyAPIClient()
 
+# ======================================================================
+# 项目详情读穿缓存 (get_emby_item_details / get_emby_items_by_id)
+# ======================================================================
+# 同一个条目常在几秒内被处理器、追剧钩子、打标签等反复读取 (例如一次入库 Webhook)，这里做短时缓存：
+# - 键为 (服务器, 用户范围, 条目 ID)，每个键下按请求的字段集合保存若干份数据，字段是已缓存集合子集的请求直接复用；
+# - 同一键 + 字段集合的并发未命中只发一次请求，其余调用方等待结果；
+# - 写请求、相关 Webhook 会使缓存失效；失败结果不缓存。
+ITEM_DETAILS_CACHE_TTL_SECONDS = 30
+ITEM_DETAILS_CACHE_MAX_KEYS = 2000
+# 批量查询超过这个数量时 (全库扫描等) 直接请求，不读写缓存，避免冲掉真正的热点
+ITEM_DETAILS_CACHE_MAX_BATCH = 100
+_ITEM_ID_IN_URL_PATTERN = re.compile(r"/(?:Items|Collections|FavoriteItems|PlayedItems)/([0-9A-Za-z-]+)")
+
+_item_details_cache: Dict[Tuple[str, str, str], List[Tuple[float, frozenset, Dict[str, Any]]]] = {}
+_item_details_inflight: Dict[Tuple[str, str, str, frozenset], threading.Event] = {}
+_item_details_lock = threading.Lock()
+
+def _normalize_fields(fields: str) -> frozenset:
+    return frozenset(f.strip() for f in fields.split(",") if f.strip())
+
+def _get_cached_item(key: Tuple[str, str, str], fields: frozenset) -> Optional[Dict[str, Any]]:
+    now = time.monotonic()
+    with _item_details_lock:
+        entries = _item_details_cache.get(key)
+        if not entries:
+            return None
+        entries[:] = [e for e in entries if e[0] > now]
+        if not entries:
+            del _item_details_cache[key]
+            return None
+        for _, cached_fields, data in entries:
+            if fields <= cached_fields:
+                return copy.deepcopy(data)
+    return None
+
+def _store_cached_item(key: Tuple[str, str, str], fields: frozenset, data: Dict[str, Any]):
+    expires_at = time.monotonic() + ITEM_DETAILS_CACHE_TTL_SECONDS
+    with _item_details_lock:
+        # 新数据覆盖字段集合是其子集的旧数据
+        entries = [e for e in _item_details_cache.pop(key, []) if not e[1] <= fields]
+        entries.append((expires_at, fields, data))
+        _item_details_cache[key] = entries
+        while len(_item_details_cache) > ITEM_DETAILS_CACHE_MAX_KEYS:
+            del _item_details_cache[next(iter(_item_details_cache))]
+
+def _clear_item_details(payload: Optional[Dict[str, Any]] = None):
+    """本地失效：payload 为 None 或不带 item_ids 时清空全部。"""
+    item_ids = set((payload or {}).get("item_ids") or [])
+    with _item_details_lock:
+        if not item_ids:
+            _item_details_cache.clear()
+            return
+        for key in [k for k in _item_details_cache if k[2] in item_ids]:
+            del _item_details_cache[key]
+
+def _invalidate_item_details_for_url(url: str):
+    item_ids = _ITEM_ID_IN_URL_PATTERN.findall(url)
+    if item_ids:
+        invalidate_item_details_cache(item_ids)
+
+def invalidate_item_details_cache(item_ids: Optional[List[str]] = None):
+    """
+    使条目详情缓存失效 (不传 item_ids 时清空全部)，并通知其它进程。
+    按条目失效在本进程立即生效，广播则与短时间内的其它写请求合并发出，批量写入时不会每次都占用一个数据库连接。
+    """
+    if not item_ids:
+        _clear_item_details()
+        cache_events.publish('emby_item_details')
+        return
+    item_ids = [str(i) for i in item_ids if i]
+    if not item_ids:
+        return
+    _clear_item_details({"item_ids": item_ids})
+    cache_events.publish_batched('emby_item_details', 'item_ids', item_ids)
+
+cache_events.subscribe('emby_item_details', _clear_item_details)
+
+def _fetch_item_once(key: Tuple[str, str, str], fields: frozenset, fetch: Callable[[], Optional[Dict[str, Any]]]) -> Optional[Dict[str, Any]]:
+    """缓存未命中时的单飞 (single-flight) 请求：同一条目、同一字段集合的并发请求只有一个真正发出。"""
+    flight_key = key + (fields,)
+    while True:
+        with _item_details_lock:
+            event = _item_details_inflight.get(flight_key)
+            if event is None:
+                event = threading.Event()
+                _item_details_inflight[flight_key] = event
+                is_leader = True
+            else:
+                is_leader = False
+        if is_leader:
+            break
+        event.wait(timeout=config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_EMBY_API_TIMEOUT, 60))
+        cached = _get_cached_item(key, fields)
+        if cached is not None:
+            return cached
+        # 领头的请求失败了，由当前调用方重新发起
+
+    try:
+        data = fetch()
+        if data is not None:
+            _store_cached_item(key, fields, data)
+            return copy.deepcopy(data)
+        return None
+    finally:
+        with _item_details_lock:
+            _item_details_inflight.pop(flight_key, None)
+        event.set()
+
 def get_running_tasks(base_url: str, api_key: str) -> List[Dict[str, Any]]:
     """
     获取当前正在运行的 Emby 后台任务
@@ -342,17 +459,26 @@ def get_item_count(base_url: str, api_key: str, user_id: Optional[str], item_typ
         return None
 
 # ✨✨✨ 获取Emby项目详情 ✨✨✨
+_DEFAULT_ITEM_DETAILS_FIELDS = "Type,ProviderIds,People,Path,OriginalTitle,DateCreated,PremiereDate,ProductionYear,ChildCount,RecursiveItemCount,Overview,CommunityRating,OfficialRating,Genres,Studios,Taglines,MediaStreams,TagItems,Tags"
+
 def get_emby_item_details(item_id: str, emby_server_url: str, emby_api_key: str, user_id: str, fields: Optional[str] = None, silent_404: bool = False) -> Optional[Dict[str, Any]]:
     if not all([item_id, emby_server_url, emby_api_key, user_id]):
         logger.error("获取Emby项目详情参数不足：缺少ItemID、服务器URL、API Key或UserID。")
         return None
 
-    url = f"{emby_server_url.rstrip('/')}/Users/{user_id}/Items/{item_id}"
+    fields_to_request = fields or _DEFAULT_ITEM_DETAILS_FIELDS
+    cache_key = (emby_server_url.rstrip('/'), str(user_id), str(item_id))
+    requested_fields = _normalize_fields(fields_to_request)
+    cached = _get_cached_item(cache_key, requested_fields)
+    if cached is not None:
+        return cached
+    return _fetch_item_once(
+        cache_key, requested_fields,
+        lambda: _request_emby_item_details(item_id, emby_server_url, emby_api_key, user_id, fields_to_request, silent_404)
+    )
 
-    if fields:
-        fields_to_request = fields
-    else:
-        fields_to_request = "Type,ProviderIds,People,Path,OriginalTitle,DateCreated,PremiereDate,ProductionYear,ChildCount,RecursiveItemCount,Overview,CommunityRating,OfficialRating,Genres,Studios,Taglines,MediaStreams,TagItems,Tags"
+def _request_emby_item_details(item_id: str, emby_server_url: str, emby_api_key: str, user_id: str, fields_to_request: str, silent_404: bool) -> Optional[Dict[str, Any]]:
+    url = f"{emby_server_url.rstrip('/')}/Users/{user_id}/Items/{item_id}"
 
     params = {
         "api_key": emby_api_key,
@@ -1165,8 +1291,8 @@ def download_emby_image(
         with emby_client.get(image_url, params=params, stream=True) as r:
             r.raise_for_status()
             os.makedirs(os.path.dirname(save_path), exist_ok=True)
-            with open(save_path, 'wb') as f:
-                shutil.copyfileobj(r.raw, f)
+            # 先写临时文件再原子替换，避免中途失败留下半截图片，也避免并发下载同一张图时互相覆盖
+            atomic_io.replace_atomically(save_path, lambda f: shutil.copyfileobj(r.raw, f), suffix=".part")
         logger.trace(f"成功下载图片并保存到: {save_path}")
         return True
     except requests.exceptions.RequestException as e:
@@ -1752,10 +1878,35 @@ def get_emby_items_by_id(
     - 核心变更: 适配 Emby 4.9+ API, 切换到 /Items 端点。
     - 关键修正: 在查询 Person 等全局项目时，不能传递 UserId，否则新版API会返回空结果。
       此函数现在不再将 UserId 传递给 API，以确保能获取到演员详情。
+    - 小批量查询走项目详情缓存，只请求未命中的 ID；结果按传入 ID 的顺序返回。
     """
     if not all([base_url, api_key]) or not item_ids: # UserId 不再是必须检查的参数
         return []
 
+    fields_to_request = fields or "ProviderIds,UserData,Name,ProductionYear,CommunityRating,DateCreated,PremiereDate,Type,RecursiveItemCount,SortName"
+    unique_ids = list(dict.fromkeys(str(i) for i in item_ids if i))
+    if len(unique_ids) > ITEM_DETAILS_CACHE_MAX_BATCH:
+        return _request_emby_items_by_id(base_url, api_key, item_ids, fields_to_request)
+
+    # 批量接口不带用户上下文，与 get_emby_item_details 的缓存分开存放
+    server = base_url.rstrip('/')
+    requested_fields = _normalize_fields(fields_to_request)
+    found = {}
+    missing_ids = []
+    for item_id in unique_ids:
+        cached = _get_cached_item((server, '', item_id), requested_fields)
+        if cached is not None:
+            found[item_id] = cached
+        else:
+            missing_ids.append(item_id)
+    if missing_ids:
+        for item in _request_emby_items_by_id(base_url, api_key, missing_ids, fields_to_request):
+            item_id = str(item.get('Id'))
+            _store_cached_item((server, '', item_id), requested_fields, item)
+            found[item_id] = copy.deepcopy(item)
+    return [found[i] for i in unique_ids if i in found]
+
+def _request_emby_items_by_id(base_url: str, api_key: str, item_ids: List[str], fields_to_request: str) -> List[Dict[str, Any]]:
     all_items = []
     # 定义一个安全的分批大小，比如每次请求100个ID
     BATCH_SIZE = 100
@@ -1774,7 +1925,7 @@ def get_emby_items_by_id(
         params = {
             "api_key": api_key,
             "Ids": ",".join(batch_ids), # 只使用当前批次的ID
-            "Fields": fields or "ProviderIds,UserData,Name,ProductionYear,CommunityRating,DateCreated,PremiereDate,Type,RecursiveItemCount,SortName"
+            "Fields": fields_to_request
             # ★★★ 核心修正: 不再传递 UserId。演员等Person对象是全局的，使用UserId会导致查询失败。★★★
         }
 
@@ -2103,73 +2254,103 @@ def get_all_emby_users_from_server(base_url: str, api_key: str) -> Optional[List
         return None
 
 # --- 获取指定用户的所有媒体的用户数据 ---
-def get_all_user_view_data(user_id: str, base_url: str, api_key: str) -> Optional[List[Dict[str, Any]]]:
+def _fetch_user_items_paged(api_url: str, params: Dict[str, Any], user_id: str, batch_size: int = 2000) -> Optional[List[Dict[str, Any]]]:
+    """分页拉取 /Items 的全部结果。任一批次失败则返回 None，避免调用方把不完整的数据当成全集。"""
+    items_collected = []
+    start_index = 0
+    while True:
+        request_params = params.copy()
+        request_params["StartIndex"] = start_index
+        request_params["Limit"] = batch_size
+        try:
+            response = emby_client.get(api_url, params=request_params)
+            response.raise_for_status()
+            items = response.json().get("Items", [])
+        except Exception as e:
+            logger.error(f"为用户 {user_id} 获取媒体数据时，处理批次 StartIndex={start_index} 失败: {e}", exc_info=True)
+            return None
+
+        items_collected.extend(items)
+        start_index += len(items)
+        if len(items) < batch_size:
+            break
+    return items_collected
+
+def get_all_user_view_data(user_id: str, base_url: str, api_key: str, min_date_last_saved: Optional[datetime] = None) -> Optional[List[Dict[str, Any]]]:
     """
-    【V5 - 魔法日志版】
-    - 增加 CRITICAL 级别的日志，用于打印从 Emby 获取到的最原始的 Item JSON 数据。
+    【V6 - 服务端过滤版】获取用户有播放状态的所有媒体项。
+    - 全量模式 (min_date_last_saved 为空)：分别用 Filters=IsPlayed / IsFavorite / IsResumable
+      让 Emby 在服务端筛选，再按 Id 去重合并，不再把整个媒体库拉回来在本地过滤。
+    - 增量模式：使用 MinDateLastSavedForUser 只拉取该用户数据在水位线之后变动过的条目，
+      此时不加状态过滤，这样"取消收藏 / 标记未看"之类的状态回退也能同步到。
+    请求失败返回 None。
     """
     if not all([user_id, base_url, api_key]):
         return None
 
-    all_items_with_data = []
-    item_types = "Movie,Series,Episode"
-    fields = "UserData,Type,SeriesId,ProviderIds,Name,LastPlayedDate,PlayCount" 
-    
     api_url = f"{base_url.rstrip('/')}/Items"
-    
-    params = {
+    base_params = {
         "api_key": api_key,
         "Recursive": "true",
-        "IncludeItemTypes": item_types,
-        "Fields": fields,
+        "IncludeItemTypes": "Movie,Series,Episode",
+        "Fields": "UserData,Type,SeriesId,ProviderIds,Name,LastPlayedDate,PlayCount",
         "UserId": user_id
     }
-    
-    start_index = 0
-    batch_size = 2000
 
-    # ★★★ 2. 设置一个计数器，我们不需要打印所有日志，有几个样本就够了 ★★★
-    log_counter = 0
-    LOG_LIMIT = 5 # 只打印前 5 个有用户数据的条目
+    if min_date_last_saved:
+        params = base_params.copy()
+        params["MinDateLastSavedForUser"] = min_date_last_saved.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+        logger.debug(f"开始为用户 {user_id} 增量获取 {params['MinDateLastSavedForUser']} 之后变动的用户数据")
+        items = _fetch_user_items_paged(api_url, params, user_id)
+        if items is not None:
+            logger.debug(f"为用户 {user_id} 的增量同步完成，共 {len(items)} 个变动的媒体项。")
+        return items
 
-    logger.debug(f"开始为用户 {user_id} 分批获取所有媒体的用户数据")
-    while True:
-        try:
-            request_params = params.copy()
-            request_params["StartIndex"] = start_index
-            request_params["Limit"] = batch_size
+    merged_items: Dict[str, Dict[str, Any]] = {}
+    for state_filter in ("IsPlayed", "IsFavorite", "IsResumable"):
+        params = base_params.copy()
+        params["Filters"] = state_filter
+        items = _fetch_user_items_paged(api_url, params, user_id)
+        if items is None:
+            return None
+        for item in items:
+            if item.get("Id"):
+                merged_items[item["Id"]] = item
 
-            response = emby_client.get(api_url, params=request_params)
-            response.raise_for_status()
-            data = response.json()
-            items = data.get("Items", [])
-            
-            if not items:
-                break
+    logger.debug(f"为用户 {user_id} 的全量同步完成，共找到 {len(merged_items)} 个有状态的媒体项。")
+    return list(merged_items.values())
 
-            for item in items:
-                user_data = item.get("UserData", {})
-                # 我们只关心那些确实有播放记录或收藏的条目
-                if user_data.get('Played') or user_data.get('IsFavorite') or user_data.get('PlaybackPositionTicks', 0) > 0:
-                    
-                    # ★★★ 3. 魔法日志：在这里把原始数据打印出来！★★★
-                    if log_counter < LOG_LIMIT:
-                        # 使用 CRITICAL 级别让它在日志里最显眼，并用 json.dumps 保证完整输出
-                        logger.critical(f"  ➜ [魔法日志] 捕获到原始 Emby Item 数据: {json.dumps(item, indent=2, ensure_ascii=False)}")
-                        log_counter += 1
+def get_user_series_view_data(user_id: str, series_ids: List[str], base_url: str, api_key: str) -> Optional[List[Dict[str, Any]]]:
+    """
+    获取指定剧集本身及其所有分集的用户数据。
+    增量同步时，只要某部剧有一集变动，就需要用这部剧全部分集重新聚合播放次数。
+    """
+    if not all([user_id, base_url, api_key]) or not series_ids:
+        return []
 
-                    all_items_with_data.append(item)
-            
-            start_index += len(items)
-            if len(items) < batch_size:
-                break
+    api_url = f"{base_url.rstrip('/')}/Items"
+    fields = "UserData,Type,SeriesId,ProviderIds,Name,LastPlayedDate,PlayCount"
+    all_items = []
 
-        except Exception as e:
-            logger.error(f"为用户 {user_id} 获取媒体数据时，处理批次 StartIndex={start_index} 失败: {e}", exc_info=True)
-            break
-            
-    logger.debug(f"为用户 {user_id} 的全量同步完成，共找到 {len(all_items_with_data)} 个有状态的媒体项。")
-    return all_items_with_data
+    for i in range(0, len(series_ids), 100):
+        chunk = series_ids[i:i + 100]
+        series_items = _fetch_user_items_paged(api_url, {
+            "api_key": api_key, "Ids": ",".join(chunk), "Fields": fields, "UserId": user_id
+        }, user_id)
+        if series_items is None:
+            return None
+        all_items.extend(series_items)
+
+    for series_id in series_ids:
+        episodes = _fetch_user_items_paged(api_url, {
+            "api_key": api_key, "ParentId": series_id, "Recursive": "true",
+            "IncludeItemTypes": "Episode", "Fields": fields, "UserId": user_id
+        }, user_id)
+        if episodes is None:
+            return None
+        all_items.extend(episodes)
+
+    return all_items
 
 # --- 在 Emby 中创建一个新用户 ---
 def create_user_with_policy(
@@ -2811,6 +2992,29 @@ def trigger_media_info_refresh(item_id: str, base_url: str, api_key: str, user_i
         return False
     
 # --- Playback Reporting 插件集成 ---
+def get_playback_reporting_rows(base_url: str, api_key: str, days: int, user_id: str = "", limit: int = 100000) -> Optional[list]:
+    """
+    获取 Playback Reporting 插件的原始 (未合并) 播放流水，user_id 为空表示全站。
+    插件未安装时返回 None，其它错误直接抛出。
+    """
+    if "/emby" not in base_url:
+        api_url = f"{base_url.rstrip('/')}/emby/user_usage_stats/UserPlaylist"
+    else:
+        api_url = f"{base_url.rstrip('/')}/user_usage_stats/UserPlaylist"
+    params = {
+        "api_key": api_key,
+        "days": days,
+        "user_id": user_id,
+        "include_stats": "true",
+        "limit": limit
+    }
+    response = emby_client.get(api_url, params=params, timeout=60)
+    if response.status_code == 404:
+        return None
+    response.raise_for_status()
+    raw_data = response.json()
+    return raw_data if isinstance(raw_data, list) else []
+
 def get_playback_reporting_data(base_url: str, api_key: str, user_id: str, days: int = 30) -> dict:
     """
     获取【个人】详细播放流水
@@ -2905,7 +3109,6 @@ def get_playback_reporting_data(base_url: str, api_key: str, user_id: str, days:
                 cleaned_data.append(normalized_item)
         
         if cleaned_data:
-            import json
             # 只打印第一条，防止日志刷屏
             logger.debug(f"  🔍 [UserPlaylist] 数据获取成功，Count: {len(cleaned_data)} | Sample: {json.dumps(cleaned_data[0], ensure_ascii=False)}")
         else:
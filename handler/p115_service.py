@@ -7,6 +7,7 @@ import json
 import re
 import threading
 import time
+from contextlib import contextmanager
 import config_manager
 import constants
 from database import settings_db
@@ -84,6 +85,71 @@ class P115CacheManager:
         except Exception as e:
             logger.error(f"  ❌ 清理 115 DB 缓存失败: {e}")
 
+    # --- 直链缓存 (多个反代工作进程共享) ---
+    # 任意固定的 64 位整数即可，仅用于 pg_advisory_lock 区分用途
+    DOWNLOAD_URL_FETCH_LOCK_ID = 11505758
+
+    @staticmethod
+    def get_download_url(cache_key):
+        """读取未过期的直链缓存"""
+        if not cache_key: return None
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(
+                        "SELECT url FROM p115_download_url_cache WHERE cache_key = %s AND expires_at > NOW()",
+                        (cache_key,)
+                    )
+                    row = cursor.fetchone()
+                    return row['url'] if row else None
+        except Exception as e:
+            logger.error(f"  ❌ 读取 115 直链缓存失败: {e}")
+            return None
+
+    @staticmethod
+    def save_download_url(cache_key, url, ttl_seconds):
+        """写入直链缓存，并顺带清理已过期的记录"""
+        if not cache_key or not url: return
+        try:
+            with get_db_connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        INSERT INTO p115_download_url_cache (cache_key, url, expires_at)
+                        VALUES (%s, %s, NOW() + make_interval(secs => %s))
+                        ON CONFLICT (cache_key)
+                        DO UPDATE SET url = EXCLUDED.url, expires_at = EXCLUDED.expires_at
+                    """, (cache_key, url, ttl_seconds))
+                    cursor.execute("DELETE FROM p115_download_url_cache WHERE expires_at < NOW() - INTERVAL '1 day'")
+                    conn.commit()
+        except Exception as e:
+            logger.error(f"  ❌ 写入 115 直链缓存失败: {e}")
+
+    @staticmethod
+    @contextmanager
+    def download_url_fetch_lock():
+        """跨进程的直链解析锁：多个反代工作进程同一时间只有一个在请求 115 API"""
+        conn = None
+        try:
+            conn = get_db_connection()
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s)", (P115CacheManager.DOWNLOAD_URL_FETCH_LOCK_ID,))
+        except Exception as e:
+            # 数据库不可用时退化为仅进程内加锁
+            logger.warning(f"  ⚠️ 获取 115 直链解析锁失败，跳过跨进程加锁: {e}")
+            if conn is not None:
+                conn.close()
+            conn = None
+        try:
+            yield
+        finally:
+            if conn is not None:
+                try:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT pg_advisory_unlock(%s)", (P115CacheManager.DOWNLOAD_URL_FETCH_LOCK_ID,))
+                finally:
+                    conn.close()
+
 def get_config():
     return config_manager.APP_CONFIG
 
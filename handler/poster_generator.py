@@ -161,8 +161,10 @@ def get_missing_poster(tmdb_id, status, poster_path, release_date=None):
     sub_y = main_y + main_h + 8
     draw.text((sub_x, sub_y), sub_text, font=font_sub, fill=accent_color)
 
-    # 5. 保存
-    img.convert('RGB').save(cache_path, "JPEG", quality=95)
+    # 5. 保存 (先写临时文件再替换，多个反代工作进程并发生成同一张海报时不会读到半截文件)
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    img.convert('RGB').save(tmp_path, "JPEG", quality=95)
+    os.replace(tmp_path, cache_path)
     return cache_path
 
 def sync_all_subscription_posters():
@@ -210,6 +210,21 @@ def get_tv_details(tv_id: int, api_key: str, append_to_response: Optional[str] =
 
     return details
 
+# --- 一次性获取条目详情与全部候选图片 ---
+def get_details_with_images(tmdb_id: int, item_type: str, api_key: str, include_image_language: str) -> Optional[Dict[str, Any]]:
+    """
+    只发起一次请求，获取电影/剧集详情 (含 seasons、backdrop_path) 及所有候选语言的图片，
+    由调用方在本地按语言偏好排序。不做英文名补充，避免额外请求。
+    """
+    endpoint = f"/movie/{tmdb_id}" if item_type == "Movie" else f"/tv/{tmdb_id}"
+    params = {
+        "language": DEFAULT_LANGUAGE,
+        "append_to_response": "images",
+        "include_image_language": include_image_language
+    }
+    logger.trace(f"  ➜ TMDb: 获取图片候选 (ID: {tmdb_id}, 语言: {include_image_language})")
+    return _tmdb_request(endpoint, api_key, params)
+
 # --- 获取电视剧某一季的详细信息 ---
 def get_season_details_tmdb(tv_id: int, season_number: int, api_key: str, append_to_response: Optional[str] = "credits", item_name: Optional[str] = None, language: Optional[str] = None) -> Optional[Dict[str, Any]]:
     """
@@ -434,6 +449,56 @@ def aggregate_full_series_data_from_tmdb(
     
     return final_aggregated_data
 
+# --- TMDb 变更流 (Changes API) ---
+# TMDb 的 /changes 接口只允许查询最近 14 天的变更
+TMDB_CHANGES_MAX_DAYS = 14
+
+def get_changed_tv_ids(api_key: str, start_date: str, end_date: Optional[str] = None, max_pages: int = 500) -> Optional[set]:
+    """
+    通过 /tv/changes 获取指定时间窗口内有变更的所有剧集 ID。
+    - start_date / end_date 格式为 YYYY-MM-DD，窗口不能超过 14 天。
+    - 返回 None 表示请求失败，调用方应回退到全量处理。
+    """
+    if not api_key or not start_date:
+        return None
+
+    changed_ids = set()
+    page = 1
+    total_pages = 1
+    while page <= total_pages and page <= max_pages:
+        params = {"start_date": start_date, "page": page}
+        if end_date:
+            params["end_date"] = end_date
+        data = _tmdb_request("/tv/changes", api_key, params, use_default_language=False)
+        if data is None:
+            logger.warning(f"  ➜ TMDb: 获取剧集变更列表失败 (第 {page} 页)，放弃本次变更检测。")
+            return None
+        for entry in data.get("results", []):
+            if entry.get("id"):
+                changed_ids.add(int(entry["id"]))
+        total_pages = data.get("total_pages", 1) or 1
+        page += 1
+
+    logger.debug(f"  ➜ TMDb: 自 {start_date} 起共有 {len(changed_ids)} 部剧集发生变更 (共 {total_pages} 页)。")
+    return changed_ids
+
+def get_tv_changes(tv_id: int, api_key: str, start_date: Optional[str] = None, end_date: Optional[str] = None) -> Optional[List[Dict[str, Any]]]:
+    """
+    通过 /tv/{id}/changes 获取单部剧集在时间窗口内的变更明细。
+    返回 TMDb 原始的 changes 列表 (每项包含 key 和 items)，失败返回 None。
+    """
+    if not tv_id or not api_key:
+        return None
+    params = {}
+    if start_date:
+        params["start_date"] = start_date
+    if end_date:
+        params["end_date"] = end_date
+    data = _tmdb_request(f"/tv/{tv_id}/changes", api_key, params, use_default_language=False)
+    if data is None:
+        return None
+    return data.get("changes", [])
+
 # --- 通过外部ID (如 IMDb ID) 在 TMDb 上查找人物 ---
 def find_person_by_external_id(external_id: str, api_key: str, source: str = "imdb_id",
                                names_for_verification: Optional[Dict[str, str]] = None) -> Optional[Dict[str, Any]]:
@@ -1,6 +1,9 @@
 # logger_setup.py
 import logging
 import sys
+import time
+import itertools
+import threading
 from collections import deque
 import constants
 import os
@@ -22,20 +25,180 @@ def trace(self, message, *args, **kws):
 logging.Logger.trace = trace
 # ★★★ 新增部分结束 ★★★
 
-# --- 前端队列和 Handler ---
-frontend_log_queue = deque(maxlen=100)
+# --- 前端日志流：结构化环形缓冲区和 Handler ---
+class FrontendLogBuffer:
+    """
+    前端实时日志的环形缓冲区。
+    - 每条记录都是结构化的 (序号、时间戳、级别、logger、任务 ID、消息)，只在被读取时才格式化；
+    - 序号单调递增，客户端持有游标 (最后读到的序号) 增量读取，不必每次拉取全部日志；
+    - 容量按消息大小限制，超出后丢弃最旧的记录，落后太多的游标会在读取结果中标记 truncated。
+    """
+    # 每条记录除消息文本外的大致内存开销
+    _RECORD_OVERHEAD_BYTES = 200
+
+    def __init__(self, max_bytes: int):
+        self._max_bytes = max_bytes
+        self._records = deque()
+        self._size_bytes = 0
+        self._last_seq = 0
+        self._task_id = 0
+        self._cond = threading.Condition()
+
+    @property
+    def current_task_id(self) -> int:
+        return self._task_id
+
+    @property
+    def last_seq(self) -> int:
+        return self._last_seq
+
+    def begin_task(self) -> int:
+        """开始一个新任务，之后的日志都归属于返回的任务 ID (取代原先提交任务时清空队列的做法)。"""
+        with self._cond:
+            self._task_id += 1
+            return self._task_id
+
+    def append(self, created: float, level: str, logger_name: str, message: str, task_id: int = None):
+        """task_id 为空时归属当前任务 (补写的汇总记录需要指定其原本所属的任务)。"""
+        with self._cond:
+            self._last_seq += 1
+            self._records.append({
+                "seq": self._last_seq, "ts": created, "level": level,
+                "logger": logger_name, "task_id": self._task_id if task_id is None else task_id, "message": message
+            })
+            self._size_bytes += len(message) + self._RECORD_OVERHEAD_BYTES
+            while self._size_bytes > self._max_bytes and len(self._records) > 1:
+                dropped = self._records.popleft()
+                self._size_bytes -= len(dropped["message"]) + self._RECORD_OVERHEAD_BYTES
+            self._cond.notify_all()
+
+    def read_since(self, cursor: int, limit: int = 500) -> dict:
+        """读取序号大于 cursor 的记录 (最多 limit 条)，返回 {records, cursor, truncated}。"""
+        with self._cond:
+            if cursor > self._last_seq:
+                cursor = 0 # 服务重启后序号从头开始，客户端的旧游标作废
+            oldest_seq = self._records[0]["seq"] if self._records else self._last_seq + 1
+            start = max(0, cursor + 1 - oldest_seq)
+            records = list(itertools.islice(self._records, start, start + limit))
+            truncated = cursor + 1 < oldest_seq and cursor < self._last_seq
+        return {
+            "records": records,
+            "cursor": records[-1]["seq"] if records else max(cursor, oldest_seq - 1),
+            "truncated": truncated,
+        }
+
+    def wait_for_records(self, cursor: int, timeout: float) -> bool:
+        """阻塞 (gevent 下为协作式) 等待序号大于 cursor 的新记录，超时返回 False。"""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._last_seq != cursor, timeout)
+
+    def tail_lines(self, limit: int = 100) -> list:
+        """当前任务最近 limit 条日志的文本形式，兼容 /api/status 原有的 logs 字段。"""
+        with self._cond:
+            task_id = self._task_id
+            tail = []
+            for record in reversed(self._records):
+                if record["task_id"] != task_id or len(tail) >= limit:
+                    break
+                tail.append(record)
+        return [format_frontend_record(r) for r in reversed(tail)]
+
+def format_frontend_record(record: dict) -> str:
+    return f"[{time.strftime('%H:%M:%S', time.localtime(record['ts']))}] {record['message']}"
+
+frontend_log_buffer = FrontendLogBuffer(constants.FRONTEND_LOG_BUFFER_SIZE_MB * 1024 * 1024)
 
 class FrontendQueueHandler(logging.Handler):
-    def __init__(self, *args, **kwargs):
+    """
+    把 INFO 及以上的日志写入 frontend_log_buffer。
+    对同一调用点 (文件:行号) 做按任务的限流采样：每个时间窗内最多推送 SAMPLE_BURST 条，
+    多出的只计数，下一条放行的日志会附带被省略的条数；如果之后再没有同类日志，
+    时间窗结束后由后台线程补写一条汇总记录。WARNING 及以上的日志不参与采样。
+    """
+    SAMPLE_WINDOW_SECONDS = 1.0
+    SAMPLE_BURST = 20
+    _MAX_TRACKED_SITES = 4096
+
+    def __init__(self, buffer: FrontendLogBuffer, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._buffer = buffer
+        self._sites = {} # (任务 ID, 调用点) -> [窗口开始时间, 窗口内已放行条数, 已省略条数, 最后一条被省略的记录]
+        self._sites_lock = threading.Lock()
+        self._flusher_running = False
+
+    def _admit(self, record) -> tuple:
+        """返回 (是否放行, 此前被省略的条数)。"""
+        # 从工作进程转发来的日志带有原始调用点，否则所有转发日志都会被算作同一个调用点
+        site = getattr(record, 'log_site', None) or (record.pathname, record.lineno)
+        key = (self._buffer.current_task_id, site)
+        now = record.created
+        with self._sites_lock:
+            state = self._sites.get(key)
+            if state is None:
+                if len(self._sites) >= self._MAX_TRACKED_SITES:
+                    self._flush_expired(force=True)
+                self._sites[key] = [now, 1, 0, None]
+                return True, 0
+            if now - state[0] >= self.SAMPLE_WINDOW_SECONDS:
+                suppressed = state[2]
+                state[:] = [now, 1, 0, None]
+                return True, suppressed
+            if state[1] < self.SAMPLE_BURST:
+                state[1] += 1
+                return True, 0
+            state[2] += 1
+            state[3] = record
+            start_flusher = not self._flusher_running
+            self._flusher_running = True
+        if start_flusher:
+            threading.Thread(target=self._flush_loop, name="frontend-log-sampler", daemon=True).start()
+        return False, 0
+
+    def _flush_expired(self, force: bool = False) -> bool:
+        """
+        (调用方需持有锁) 把时间窗已结束、仍有未报告省略条数的调用点写成汇总记录并移除；
+        force 时清空全部调用点。返回是否还有时间窗未结束的省略计数。
+        """
+        now = time.time()
+        pending = False
+        for key, state in list(self._sites.items()):
+            if force or now - state[0] >= self.SAMPLE_WINDOW_SECONDS:
+                if state[2]:
+                    last = state[3]
+                    self._buffer.append(last.created, last.levelname, last.name,
+                                        f"{last.getMessage()} (同类日志共省略 {state[2]} 条，此为最后一条)", task_id=key[0])
+                del self._sites[key]
+            elif state[2]:
+                pending = True
+        return pending
+
+    def _flush_loop(self):
+        """有被省略的日志时才运行，补写完所有汇总记录后退出。"""
+        while True:
+            time.sleep(self.SAMPLE_WINDOW_SECONDS)
+            with self._sites_lock:
+                try:
+                    pending = self._flush_expired()
+                except Exception:
+                    pending = False
+                if not pending:
+                    self._flusher_running = False
+                    return
 
     def emit(self, record):
+        # ★★★ 确保 TRACE / DEBUG 级别的日志不会进入前端 ★★★
+        if record.levelno < logging.INFO:
+            return
         try:
-            log_entry = self.format(record)
-            # ★★★ 新增部分 2: 确保 TRACE 级别的日志不会进入前端 ★★★
-            # 前端只应显示 INFO 及以上级别，所以这里加一个判断
-            if record.levelno >= logging.INFO:
-                frontend_log_queue.append(log_entry)
+            suppressed = 0
+            if record.levelno < logging.WARNING:
+                admitted, suppressed = self._admit(record)
+                if not admitted:
+                    return
+            message = record.getMessage()
+            if suppressed:
+                message = f"{message} (已省略同类日志 {suppressed} 条)"
+            self._buffer.append(record.created, record.levelname, record.name, message)
         except Exception:
             self.handleError(record)
 
@@ -79,12 +242,10 @@ console_formatter = logging.Formatter(
 stream_handler.setFormatter(console_formatter)
 logger.addHandler(stream_handler)
 
-# 2. 前端队列 Handler
+# 2. 前端日志流 Handler (不设置 Formatter，记录以结构化形式保存，读取时再格式化)
 try:
-    frontend_handler = FrontendQueueHandler()
+    frontend_handler = FrontendQueueHandler(frontend_log_buffer)
     frontend_handler.setLevel(logging.INFO)
-    frontend_formatter = logging.Formatter('[%(asctime)s] %(message)s', datefmt='%H:%M:%S')
-    frontend_handler.setFormatter(frontend_formatter)
     logger.addHandler(frontend_handler)
 except Exception as e:
     logging.error(f"Failed to add FrontendQueueHandler: {e}", exc_info=True)
@@ -0,0 +1,442 @@
+# metrics.py
+"""
+进程内指标采集 (Prometheus 文本格式)。
+
+设计目标是可以常驻开启：
+- 每个标签组合在第一次出现时创建一个子指标并缓存，之后的每次记录只是一次字典查找 + 计数器累加；
+- 热路径统一使用 `start = time.perf_counter()` + try/finally 的写法，不创建额外的上下文对象；
+- 队列深度等瞬时值使用回调型 Gauge，只在 /metrics 被抓取时才计算。
+"""
+import time
+import threading
+import logging
+from bisect import bisect_left
+from collections import deque
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+logger = logging.getLogger(__name__)
+
+# 默认延迟分桶 (秒)，覆盖从本地缓存命中到慢速外部 API 的范围
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# 后台任务耗时分桶 (秒)
+TASK_DURATION_BUCKETS = (1, 5, 15, 30, 60, 300, 900, 1800, 3600, 7200, 14400, 43200)
+
+_registry: List['_MetricFamily'] = []
+_registry_lock = threading.Lock()
+
+def _escape_label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(labelnames: Sequence[str], labelvalues: Sequence[str], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = [f'{name}="{_escape_label_value(value)}"' for name, value in zip(labelnames, labelvalues)]
+    if extra:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _format_value(value) -> str:
+    if isinstance(value, float):
+        if value == float('inf'): return "+Inf"
+        return repr(value)
+    return str(value)
+
+class _MetricFamily:
+    """指标族基类：按标签值缓存子指标。"""
+    metric_type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *labelvalues):
+        """获取 (必要时创建) 指定标签组合的子指标。调用方可以把返回值缓存起来，热路径上直接使用。"""
+        child = self._children.get(labelvalues)
+        if child is None:
+            if len(labelvalues) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要 {len(self.labelnames)} 个标签值，实际传入 {len(labelvalues)} 个")
+            with self._lock:
+                child = self._children.get(labelvalues)
+                if child is None:
+                    child = self._new_child()
+                    self._children[labelvalues] = child
+        return child
+
+    def _iter_children(self):
+        with self._lock:
+            items = list(self._children.items())
+        return items
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+class _CounterChild:
+    __slots__ = ('value', '_lock')
+
+    def __init__(self, lock):
+        self.value = 0
+        self._lock = lock
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+class Counter(_MetricFamily):
+    metric_type = "counter"
+
+    def _new_child(self):
+        return _CounterChild(self._lock)
+
+    def _render_samples(self):
+        return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(child.value)}"
+                for labelvalues, child in self._iter_children()]
+
+class _HistogramChild:
+    __slots__ = ('_upper_bounds', '_bucket_counts', 'sum', 'count', '_lock')
+
+    def __init__(self, upper_bounds, lock):
+        self._upper_bounds = upper_bounds
+        # 最后一个位置对应 +Inf；各桶独立计数，输出时再累加
+        self._bucket_counts = [0] * (len(upper_bounds) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = lock
+
+    def observe(self, value: float):
+        index = bisect_left(self._upper_bounds, value)
+        with self._lock:
+            self._bucket_counts[index] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self._bucket_counts), self.sum, self.count
+
+class Histogram(_MetricFamily):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(float(b) for b in buckets))
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets, self._lock)
+
+    def _render_samples(self):
+        lines = []
+        for labelvalues, child in self._iter_children():
+            bucket_counts, total_sum, total_count = child.snapshot()
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + (float('inf'),), bucket_counts):
+                cumulative += bucket_count
+                le = _format_value(upper_bound) if upper_bound != float('inf') else "+Inf"
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, labelvalues, ('le', le))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, labelvalues)} {_format_value(total_sum)}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, labelvalues)} {total_count}")
+        return lines
+
+class CallbackGauge(_MetricFamily):
+    """瞬时值指标，抓取时调用回调函数取值；回调返回数值，或 {标签值元组: 数值} 字典。"""
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._callback = callback
+
+    def _render_samples(self):
+        try:
+            value = self._callback()
+        except Exception as e:
+            logger.debug(f"  ➜ 指标 {self.name} 取值失败: {e}")
+            return []
+        if isinstance(value, dict):
+            return [f"{self.name}{_format_labels(self.labelnames, labelvalues)} {_format_value(v)}"
+                    for labelvalues, v in value.items()]
+        return [f"{self.name} {_format_value(value)}"]
+
+def register_gauge(name: str, documentation: str, callback: Callable, labelnames: Sequence[str] = ()) -> CallbackGauge:
+    """注册一个回调型 Gauge (重复注册同名指标时返回已有的那个)。"""
+    with _registry_lock:
+        for metric in _registry:
+            if metric.name == name:
+                return metric
+    return CallbackGauge(name, documentation, callback, labelnames)
+
+def render_latest() -> str:
+    """以 Prometheus 文本格式输出所有指标。"""
+    with _registry_lock:
+        metrics = list(_registry)
+    lines = []
+    for metric in metrics:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+def take_counter_deltas(baseline: Dict[Tuple[str, Tuple[str, ...]], float]) -> List[Tuple[str, Tuple[str, ...], float]]:
+    """返回自 baseline 以来各计数器的增量，并就地更新 baseline (用于工作进程把计数回传给主进程)。"""
+    with _registry_lock:
+        counters = [m for m in _registry if isinstance(m, Counter)]
+    deltas = []
+    for counter in counters:
+        for labelvalues, child in counter._iter_children():
+            key = (counter.name, labelvalues)
+            value = child.value
+            if value != baseline.get(key, 0):
+                deltas.append((counter.name, labelvalues, value - baseline.get(key, 0)))
+                baseline[key] = value
+    return deltas
+
+def apply_counter_deltas(deltas: List[Tuple[str, Tuple[str, ...], float]]):
+    """把 take_counter_deltas 的结果累加到当前进程的同名计数器上。"""
+    with _registry_lock:
+        counters = {m.name: m for m in _registry if isinstance(m, Counter)}
+    for name, labelvalues, delta in deltas:
+        counter = counters.get(name)
+        if counter is not None:
+            counter.labels(*labelvalues).inc(delta)
+
+def timed(histogram: Histogram, *labelvalues):
+    """函数耗时装饰器：标签在装饰时就解析好，每次调用只记录一次耗时。"""
+    child = histogram.labels(*labelvalues)
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+# ======================================================================
+# 内置指标
+# ======================================================================
+
+PROXY_REQUEST_SECONDS = Histogram(
+    "etk_proxy_request_duration_seconds",
+    "反向代理各拦截路由的处理耗时 (流式响应计到响应头返回为止)",
+    ("route",)
+)
+UPSTREAM_REQUEST_SECONDS = Histogram(
+    "etk_upstream_request_duration_seconds",
+    "外部 HTTP 调用耗时",
+    ("upstream",)
+)
+UPSTREAM_REQUESTS_TOTAL = Counter(
+    "etk_upstream_requests_total",
+    "外部 HTTP 调用次数，outcome 为 ok / http_error / exception",
+    ("upstream", "outcome")
+)
+DB_QUERY_SECONDS = Histogram(
+    "etk_db_query_duration_seconds",
+    "数据库语句执行耗时，按发起查询的模块与函数区分",
+    ("module", "function")
+)
+TASK_DURATION_SECONDS = Histogram(
+    "etk_task_duration_seconds",
+    "后台任务执行耗时",
+    ("task",),
+    buckets=TASK_DURATION_BUCKETS
+)
+TASK_RUNS_TOTAL = Counter(
+    "etk_task_runs_total",
+    "后台任务执行次数，outcome 为 completed / stopped / failed",
+    ("task", "outcome")
+)
+TASK_ITEMS_TOTAL = Counter(
+    "etk_task_items_processed_total",
+    "后台任务处理的媒体项数量",
+    ("task",)
+)
+
+EVENT_LOOP_STALLS_TOTAL = Counter(
+    "etk_event_loop_stalls_total",
+    "gevent 事件循环被阻塞超过阈值的次数",
+    ()
+)
+
+# --- 后台任务上下文 (由 task_manager 维护，用于给吞吐量计数打上任务标签) ---
+_current_task = "none"
+
+def set_current_task(task_label: Optional[str]):
+    global _current_task
+    _current_task = task_label or "none"
+
+def get_current_task() -> str:
+    return _current_task
+
+def record_items_processed(count: int = 1):
+    """记录当前后台任务处理了多少个项目。"""
+    TASK_ITEMS_TOTAL.labels(_current_task).inc(count)
+
+# --- 数据库查询计时 ---
+_db_children_by_code: Dict[object, _HistogramChild] = {}
+
+def observe_db_query(frame, elapsed: float):
+    """
+    记录一条数据库语句的耗时。
+    frame 为调用 cursor.execute 的栈帧；跳过 psycopg2 自身的封装 (如 execute_values)，
+    以真正发起查询的函数作为标签。子指标按代码对象缓存，热路径上没有字符串拼接。
+    """
+    while frame is not None and frame.f_globals.get('__name__', '').startswith('psycopg2'):
+        frame = frame.f_back
+    if frame is None:
+        return
+    code = frame.f_code
+    child = _db_children_by_code.get(code)
+    if child is None:
+        module_name = frame.f_globals.get('__name__', 'unknown')
+        child = DB_QUERY_SECONDS.labels(module_name, code.co_name)
+        _db_children_by_code[code] = child
+    child.observe(elapsed)
+
+# --- 外部 HTTP 调用计时 ---
+_upstream_host_labels: Dict[str, str] = {}
+_upstream_config_signature = None
+_http_instrumentation_installed = False
+
+_STATIC_UPSTREAM_RULES = (
+    ("themoviedb.org", "tmdb"),
+    ("tmdb.org", "tmdb"),
+    ("douban", "douban"),
+    ("115.com", "115"),
+    ("115cdn", "115"),
+    ("openai.com", "ai"),
+    ("bigmodel.cn", "ai"),
+    ("googleapis.com", "ai"),
+)
+
+def _host_of(url: str) -> str:
+    start = url.find("//")
+    start = start + 2 if start >= 0 else 0
+    end = url.find("/", start)
+    netloc = url[start:end] if end >= 0 else url[start:]
+    return netloc.rsplit("@", 1)[-1].lower()
+
+def _classify_upstream(url: str) -> str:
+    global _upstream_config_signature
+    import config_manager # config_manager 经 database.connection 导入了本模块
+    cfg = config_manager.APP_CONFIG
+    signature = (cfg.get("emby_server_url"), cfg.get("tmdb_api_base_url"), cfg.get("ai_base_url"))
+    if signature != _upstream_config_signature:
+        _upstream_host_labels.clear()
+        _upstream_config_signature = signature
+
+    host = _host_of(url)
+    label = _upstream_host_labels.get(host)
+    if label is None:
+        label = "other"
+        emby_url, tmdb_url, ai_url = signature
+        if emby_url and _host_of(emby_url) == host:
+            label = "emby"
+        elif tmdb_url and _host_of(tmdb_url) == host:
+            label = "tmdb"
+        elif ai_url and _host_of(ai_url) == host:
+            label = "ai"
+        else:
+            for keyword, rule_label in _STATIC_UPSTREAM_RULES:
+                if keyword in host:
+                    label = rule_label
+                    break
+        _upstream_host_labels[host] = label
+    return label
+
+def _record_upstream(upstream: str, outcome: str, elapsed: float):
+    UPSTREAM_REQUEST_SECONDS.labels(upstream).observe(elapsed)
+    UPSTREAM_REQUESTS_TOTAL.labels(upstream, outcome).inc()
+
+def install_http_instrumentation():
+    """
+    在传输层统一统计外部 HTTP 调用：
+    requests (Emby / TMDb / 豆瓣 等) 与 httpx (OpenAI / 智谱 / Gemini SDK 及 115 客户端) 的 send 入口。
+    只需在启动时调用一次。
+    """
+    global _http_instrumentation_installed
+    if _http_instrumentation_installed:
+        return
+    _http_instrumentation_installed = True
+
+    import requests # 在函数内部导入，metrics 模块本身不依赖第三方库
+
+    def _wrap_send(original_send, get_url):
+        @wraps(original_send)
+        def instrumented_send(self, request, *args, **kwargs):
+            upstream = _classify_upstream(get_url(request))
+            start = time.perf_counter()
+            try:
+                response = original_send(self, request, *args, **kwargs)
+            except Exception:
+                _record_upstream(upstream, "exception", time.perf_counter() - start)
+                raise
+            _record_upstream(upstream, "http_error" if response.status_code >= 400 else "ok", time.perf_counter() - start)
+            return response
+        return instrumented_send
+
+    requests.Session.send = _wrap_send(requests.Session.send, lambda req: req.url)
+
+    try:
+        import httpx
+        httpx.Client.send = _wrap_send(httpx.Client.send, lambda req: str(req.url))
+    except ImportError:
+        pass
+
+    logger.debug("  ➜ 外部 HTTP 调用指标采集已启用。")
+
+# --- 事件循环卡顿监控 ---
+_loop_stall_reports = deque(maxlen=100)
+_loop_stall_watchdog_installed = False
+
+def _on_gevent_event(event):
+    """在 gevent 的监控线程中被调用：只做入队，日志与计数交给事件循环里的 greenlet。"""
+    from gevent.events import EventLoopBlocked
+    if isinstance(event, EventLoopBlocked):
+        _loop_stall_reports.append((time.time(), event.blocking_time, list(event.info)))
+
+def _drain_loop_stall_reports():
+    import gevent
+    while True:
+        gevent.sleep(1)
+        while _loop_stall_reports:
+            reported_at, blocking_time, info = _loop_stall_reports.popleft()
+            EVENT_LOOP_STALLS_TOTAL.labels().inc()
+            stack = "\n".join(info)
+            logger.warning(
+                f"  ⚠️ 事件循环被阻塞超过 {blocking_time:.2f} 秒 "
+                f"({time.strftime('%H:%M:%S', time.localtime(reported_at))})，阻塞时的调用栈:\n{stack}"
+            )
+
+def install_loop_stall_watchdog(threshold_seconds: float = 0.5) -> bool:
+    """
+    启用 gevent 的监控线程：事件循环在单个 greenlet 中停留超过阈值时，
+    记录一次卡顿 (etk_event_loop_stalls_total) 并输出阻塞时的调用栈。
+    """
+    global _loop_stall_watchdog_installed
+    if _loop_stall_watchdog_installed:
+        return True
+    try:
+        import gevent
+        import zope.event
+    except ImportError:
+        return False
+    gevent.config.max_blocking_time = threshold_seconds
+    gevent.config.monitor_thread = True
+    gevent.get_hub().start_periodic_monitoring_thread()
+    zope.event.subscribers.append(_on_gevent_event)
+    gevent.spawn(_drain_loop_stall_reports)
+    _loop_stall_watchdog_installed = True
+    logger.debug(f"  ➜ 事件循环卡顿监控已启用 (阈值 {threshold_seconds} 秒)。")
+    return True
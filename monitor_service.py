@@ -12,6 +12,7 @@ from gevent import spawn_later
 import constants
 import config_manager
 import handler.emby as emby
+import metrics
 
 from typing import TYPE_CHECKING
 if TYPE_CHECKING:
@@ -25,6 +26,8 @@ QUEUE_LOCK = threading.Lock()
 DEBOUNCE_TIMER = None
 DEBOUNCE_DELAY = 3 # 防抖延迟秒数
 
+metrics.register_gauge("etk_monitor_file_queue_depth", "实时监控队列中等待处理的文件数", lambda: len(FILE_EVENT_QUEUE))
+
 class MediaFileHandler(FileSystemEventHandler):
     """
     文件系统事件处理器 (纯净版：仅监控新增和修改，忽略删除)
@@ -0,0 +1,108 @@
+# processed_items_cache.py
+"""
+已处理媒体项 (processed_log) 的紧凑内存缓存。
+
+大型媒体库里已处理记录可达数十万条，原先的 Dict[item_id, item_name] 要为每条记录常驻两个 Python 字符串。
+这里只保存 item_id 的 64 位摘要：
+- 主体是一个有序的 uint64 NumPy 数组 (可以直接是启动快照的内存映射)，用二分查找判断是否已处理；
+- 运行期间的增删先记在两个小集合里，累积到一定数量后再合并回有序数组；
+- 名称不再常驻内存，跳过已处理项目时日志只记录 ID。
+64 位摘要在百万级条目下的碰撞概率约为 1e-7 量级，误判的代价只是跳过一次处理，可以接受。
+"""
+import sys
+import hashlib
+import logging
+import threading
+from typing import Iterable, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 增量集合合并回有序数组的最小阈值
+_MIN_COMPACT_THRESHOLD = 1024
+# Python int 在集合中的大致开销 (对象本身 + 哈希表槽位)
+_SET_ENTRY_BYTES = 60
+
+def item_id_digest(item_id: str) -> int:
+    return int.from_bytes(hashlib.blake2b(str(item_id).encode('utf-8'), digest_size=8).digest(), 'little')
+
+def build_digest_array(item_ids: Iterable[str]) -> np.ndarray:
+    """把一批 item_id 转为去重后的有序摘要数组。"""
+    digests = np.fromiter((item_id_digest(i) for i in item_ids), dtype=np.uint64)
+    return np.unique(digests)
+
+class ProcessedItemsCache:
+    """线程安全；对外提供 in / len / add / discard / clear。"""
+
+    def __init__(self, digests: Optional[np.ndarray] = None):
+        self._lock = threading.Lock()
+        self._base = digests if digests is not None else np.empty(0, dtype=np.uint64)
+        self._added = set()
+        self._removed = set()
+
+    def _in_base(self, digest: int) -> bool:
+        index = np.searchsorted(self._base, np.uint64(digest))
+        return index < len(self._base) and int(self._base[index]) == digest
+
+    def __contains__(self, item_id) -> bool:
+        if not item_id:
+            return False
+        digest = item_id_digest(item_id)
+        with self._lock:
+            if digest in self._added:
+                return True
+            if digest in self._removed:
+                return False
+            return self._in_base(digest)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._base) + len(self._added) - len(self._removed)
+
+    def add(self, item_id: str):
+        digest = item_id_digest(item_id)
+        with self._lock:
+            self._removed.discard(digest)
+            if not self._in_base(digest):
+                self._added.add(digest)
+            self._maybe_compact()
+
+    def discard(self, item_id: str):
+        digest = item_id_digest(item_id)
+        with self._lock:
+            self._added.discard(digest)
+            if self._in_base(digest):
+                self._removed.add(digest)
+            self._maybe_compact()
+
+    def clear(self):
+        with self._lock:
+            self._base = np.empty(0, dtype=np.uint64)
+            self._added.clear()
+            self._removed.clear()
+
+    def _maybe_compact(self):
+        """增量集合过大时合并回有序数组 (调用方需持有锁)。"""
+        if len(self._added) + len(self._removed) < max(_MIN_COMPACT_THRESHOLD, len(self._base) // 8):
+            return
+        merged = self._base
+        if self._removed:
+            merged = np.setdiff1d(merged, np.fromiter(self._removed, dtype=np.uint64), assume_unique=True)
+        if self._added:
+            merged = np.union1d(merged, np.fromiter(self._added, dtype=np.uint64))
+        self._base = merged
+        self._added.clear()
+        self._removed.clear()
+
+    def memory_usage(self) -> dict:
+        """当前内存占用 (有序数组为内存映射时，其页面由操作系统按需换入，可与其它进程共享)。"""
+        with self._lock:
+            delta_bytes = sys.getsizeof(self._added) + sys.getsizeof(self._removed) \
+                + (len(self._added) + len(self._removed)) * _SET_ENTRY_BYTES
+            return {
+                "count": len(self._base) + len(self._added) - len(self._removed),
+                "array_bytes": int(self._base.nbytes),
+                "delta_bytes": delta_bytes,
+                "memory_mapped": isinstance(self._base, np.memmap),
+            }
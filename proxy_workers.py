@@ -0,0 +1,161 @@
+# proxy_workers.py
+"""
+多进程反代：把虚拟库反代 (reverse_proxy.proxy_app) 放到 N 个独立的工作进程中运行。
+
+单个 gevent 进程最多只能用满一个 CPU 核心，多户家庭同时浏览时反代会先于机器其它资源成为瓶颈。
+开启后 (proxy_worker_processes > 1)：
+- 每个工作进程以 SO_REUSEPORT 监听同一个内部端口，由内核在进程间分配连接；
+- 工作进程与管理后台之间不共享内存，缓存失效通过 cache_events (PostgreSQL NOTIFY) 广播，
+  115 直链缓存、Emby Server ID 存放在数据库中，海报缓存本身就在磁盘上；
+- 日志通过 Pipe 回传主进程统一输出；工作进程意外退出后由主进程自动重启。
+"""
+import os
+import time
+import socket
+import logging
+import threading
+import multiprocessing
+
+import config_manager
+from task_process_runner import PipeLogHandler, relay_log_message
+
+logger = logging.getLogger(__name__)
+
+_RESTART_DELAY_SECONDS = 5
+_LISTEN_BACKLOG = 1024
+
+def reuse_port_supported() -> bool:
+    """当前平台是否支持 SO_REUSEPORT (Linux 3.9+)。"""
+    return hasattr(socket, 'SO_REUSEPORT')
+
+def create_reuseport_listener(port: int) -> socket.socket:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+    sock.bind(('0.0.0.0', port))
+    sock.listen(_LISTEN_BACKLOG)
+    return sock
+
+# ======================================================================
+# 主进程侧
+# ======================================================================
+
+def start_proxy_workers(worker_count: int, port: int):
+    """启动 worker_count 个反代工作进程，每个进程由一个后台线程负责转发日志与崩溃重启。"""
+    for index in range(worker_count):
+        threading.Thread(
+            target=_supervise_worker, args=(index, port),
+            name=f"proxy-worker-supervisor-{index}", daemon=True
+        ).start()
+
+def _supervise_worker(index: int, port: int):
+    ctx = multiprocessing.get_context('spawn')
+    while True:
+        parent_conn, child_conn = ctx.Pipe(duplex=False)
+        process = ctx.Process(
+            target=_proxy_worker_main, args=(index, port, child_conn, os.getpid()),
+            name=f"proxy-worker-{index}", daemon=True
+        )
+        try:
+            process.start()
+        except Exception as e:
+            logger.error(f"  ➜ 启动反代工作进程 #{index} 失败: {e}", exc_info=True)
+            parent_conn.close()
+            child_conn.close()
+            time.sleep(_RESTART_DELAY_SECONDS)
+            continue
+        child_conn.close()
+        logger.debug(f"  ➜ 反代工作进程 #{index} 已启动 (PID: {process.pid})。")
+
+        try:
+            _relay_worker_logs(parent_conn, process)
+        finally:
+            parent_conn.close()
+        while process.is_alive():
+            time.sleep(0.5)
+        logger.warning(f"  ⚠️ 反代工作进程 #{index} 已退出 (exitcode: {process.exitcode})，{_RESTART_DELAY_SECONDS} 秒后重启。")
+        time.sleep(_RESTART_DELAY_SECONDS)
+
+def _relay_worker_logs(conn, process):
+    while True:
+        # Connection.poll 基于 selectors，在 gevent 下是协作式等待
+        if not conn.poll(1):
+            if not process.is_alive():
+                return
+            continue
+        try:
+            message = conn.recv()
+        except EOFError:
+            return
+        if message[0] == 'log':
+            relay_log_message(message)
+
+# ======================================================================
+# 工作进程侧
+# ======================================================================
+
+def _load_emby_server_id(payload=None):
+    import extensions
+    from database import settings_db
+    server_id = (payload or {}).get('server_id')
+    if not server_id:
+        try:
+            server_id = settings_db.get_setting("emby_server_id_cache")
+        except Exception:
+            server_id = None
+    if server_id:
+        extensions.EMBY_SERVER_ID = server_id
+
+def _reload_config(payload=None):
+    """管理后台保存配置后重新加载，反代与 302 相关设置无需重启容器即可生效。"""
+    config_manager.load_config()
+    logger.debug("  ➜ 反代工作进程已重新加载配置。")
+
+def _exit_when_orphaned(parent_pid: int):
+    """主进程被强杀时 daemon 子进程不会被自动回收，这里发现父进程变化后自行退出。"""
+    while True:
+        time.sleep(2)
+        if os.getppid() != parent_pid:
+            os._exit(0)
+
+def _proxy_worker_main(index: int, port: int, log_conn, parent_pid: int):
+    send_lock = threading.Lock()
+
+    def send(message: tuple):
+        with send_lock:
+            log_conn.send(message)
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(PipeLogHandler(send))
+
+    from gevent.pywsgi import WSGIServer
+    from geventwebsocket.handler import WebSocketHandler
+    import metrics
+    import cache_events
+    from database import connection
+    from reverse_proxy import proxy_app
+    from handler.custom_collection import RecommendationEngine
+
+    threading.Thread(target=_exit_when_orphaned, args=(parent_pid,), daemon=True).start()
+
+    config_manager.load_config()
+    metrics.install_http_instrumentation()
+    metrics.install_loop_stall_watchdog()
+    connection.enable_green_io()
+
+    _load_emby_server_id()
+    cache_events.subscribe('emby_server_id', _load_emby_server_id)
+    cache_events.subscribe('config', _reload_config)
+    cache_events.start_listener()
+    # 向量缓存是进程内的，每个工作进程各自维护一份
+    RecommendationEngine.start_auto_refresh_loop()
+
+    try:
+        listener = create_reuseport_listener(port)
+    except OSError as e:
+        logger.error(f"  ➜ 反代工作进程 #{index} 监听端口 {port} 失败: {e}")
+        raise
+    logger.info(f"  🚀 [虚拟库] 反代工作进程 #{index} 已就绪 (PID: {os.getpid()})。")
+    WSGIServer(listener, proxy_app, handler_class=WebSocketHandler).serve_forever()
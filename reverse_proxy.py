@@ -5,11 +5,13 @@ import requests
 import re
 import os
 import json
-from flask import Flask, request, Response
+from flask import Flask, request, Response, g
 from urllib.parse import urlparse, urlunparse
 from datetime import datetime, timedelta
 import time
 import uuid 
+import hashlib
+import threading
 from flask import send_file 
 from handler.poster_generator import get_missing_poster
 from gevent import spawn, joinall
@@ -19,6 +21,8 @@ from database.connection import get_db_connection
 from handler.custom_collection import RecommendationEngine
 import config_manager
 import constants
+import metrics
+import cache_events
 from routes.p115 import _get_cached_115_url
 
 import extensions
@@ -81,8 +85,8 @@ def _fetch_items_in_chunks(base_url, api_key, user_id, item_ids, fields):
     joinall(greenlets)
     
     all_items = []
-    for g in greenlets:
-        if g.value: all_items.extend(g.value)
+    for greenlet in greenlets:
+        if greenlet.value: all_items.extend(greenlet.value)
         
     return all_items
 
@@ -157,9 +161,157 @@ def _fetch_sorted_items_via_emby_proxy(user_id, item_ids, sort_by, sort_order, l
         logger.error(f"  ➜ Emby代理排序或内存回退时失败: {e}", exc_info=True)
         return {"Items": [], "TotalRecordCount": 0}
 
+# --- 主页视图 (Views) 缓存 ---
+# 虚拟库的 Guid / Etag / 封面 Tag 全部由内容派生，保证同一份数据每次返回完全一致，
+# 客户端才能缓存视图元数据和封面图片；封面重新生成或合集变动时统一失效。
+VIEWS_CACHE_TTL = 300
+_views_cache = {}   # {(user_id, 视图配置指纹): (过期时间, 响应体, ETag)}
+_views_cache_lock = threading.Lock()
+_cover_image_versions = {}  # {emby_item_id: 封面版本号}
+_cover_image_versions_lock = threading.Lock()
+
+def _clear_views_cache(payload=None):
+    with _views_cache_lock:
+        _views_cache.clear()
+
+def _apply_cover_image_version(payload):
+    """应用封面版本号的变更；payload 为 None 时 (事件监听重连) 丢弃全部记录。"""
+    if payload is None:
+        with _cover_image_versions_lock:
+            _cover_image_versions.clear()
+        _clear_views_cache()
+        return
+    item_id, version = payload.get('item_id'), payload.get('version')
+    with _cover_image_versions_lock:
+        if version:
+            changed = _cover_image_versions.get(item_id) != version
+            _cover_image_versions[item_id] = version
+        else:
+            changed = _cover_image_versions.pop(item_id, None) is not None
+    if changed:
+        _clear_views_cache()
+
+def _get_cover_image_versions(emby_collection_ids):
+    """
+    获取合集封面的版本号。
+    优先使用本程序上传封面时记录的内容哈希；没有记录的 (如程序重启后) 批量读取 Emby 自身的图片 Tag。
+    """
+    with _cover_image_versions_lock:
+        versions = {cid: _cover_image_versions[cid] for cid in emby_collection_ids if cid in _cover_image_versions}
+    missing_ids = [cid for cid in emby_collection_ids if cid not in versions]
+    admin_user_id = config_manager.APP_CONFIG.get('emby_user_id')
+    if missing_ids and admin_user_id:
+        try:
+            base_url, api_key = _get_real_emby_url_and_key()
+            for item in _fetch_items_in_chunks(base_url, api_key, admin_user_id, missing_ids, "ImageTags"):
+                primary_tag = (item.get('ImageTags') or {}).get('Primary')
+                if primary_tag:
+                    versions[item['Id']] = primary_tag
+            with _cover_image_versions_lock:
+                for cid in missing_ids:
+                    if cid in versions:
+                        _cover_image_versions.setdefault(cid, versions[cid])
+        except Exception as e:
+            logger.warning(f"  ➜ 批量获取合集封面 Tag 失败，将使用默认版本号: {e}")
+    return versions
+
+def _build_cover_image_tag(real_emby_collection_id, version):
+    # 封面代理通过 tag 中 '?' 之前的部分定位真实合集 ID
+    return f"{real_emby_collection_id}?v={version or '0'}"
+
+def _get_collection_type(definition):
+    item_type_from_db = definition.get('item_type', 'Movie')
+    collection_type = "mixed"
+    if not (isinstance(item_type_from_db, list) and len(item_type_from_db) > 1):
+         authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
+         collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
+    return collection_type
+
+def _build_views_payload(user_id, real_server_id):
+    """构建指定用户的主页视图响应体 (已序列化的 JSON 字符串)。"""
+    # 1. 获取原生库
+    user_visible_native_libs = emby.get_emby_libraries(
+        config_manager.APP_CONFIG.get("emby_server_url", ""),
+        config_manager.APP_CONFIG.get("emby_api_key", ""),
+        user_id
+    )
+    if user_visible_native_libs is None: user_visible_native_libs = []
+
+    # 2. 生成虚拟库
+    collections = custom_collection_db.get_all_active_custom_collections()
+    visible_collections = []
+    for coll in collections:
+        # 物理检查：库在Emby里有实体吗？
+        if not coll.get('emby_collection_id'):
+            continue
+
+        # 权限检查：如果设置了 allowed_user_ids，则检查
+        allowed_users = coll.get('allowed_user_ids')
+        if allowed_users and isinstance(allowed_users, list):
+            if user_id not in allowed_users:
+                continue
+        visible_collections.append(coll)
+
+    cover_versions = _get_cover_image_versions([coll['emby_collection_id'] for coll in visible_collections])
+    fake_views_items = []
+
+    for coll in visible_collections:
+        real_emby_collection_id = coll['emby_collection_id']
+        db_id = coll['id']
+        mimicked_id = to_mimicked_id(db_id)
+        image_tag = _build_cover_image_tag(real_emby_collection_id, cover_versions.get(real_emby_collection_id))
+        collection_type = _get_collection_type(coll.get('definition_json') or {})
+        child_count = coll.get('in_library_count', 1)
+        view_etag = hashlib.md5(
+            f"{db_id}|{coll['name']}|{collection_type}|{child_count}|{image_tag}".encode('utf-8')
+        ).hexdigest()
+
+        fake_view = {
+            "Name": coll['name'], "ServerId": real_server_id, "Id": mimicked_id,
+            "Guid": str(uuid.uuid5(uuid.NAMESPACE_URL, f"emby-toolkit/custom-collection/{db_id}")), "Etag": view_etag,
+            "DateCreated": "2025-01-01T00:00:00.0000000Z", "CanDelete": False, "CanDownload": False,
+            "SortName": coll['name'], "ExternalUrls": [], "ProviderIds": {}, "IsFolder": True,
+            "ParentId": "2", "Type": "CollectionFolder",
+            "PresentationUniqueKey": str(uuid.uuid5(uuid.NAMESPACE_URL, f"emby-toolkit/custom-view/{db_id}")),
+            "DisplayPreferencesId": f"custom-{db_id}", "ForcedSortName": coll['name'],
+            "Taglines": [], "RemoteTrailers": [],
+            "UserData": {"PlaybackPositionTicks": 0, "IsFavorite": False, "Played": False},
+            "ChildCount": child_count,
+            "PrimaryImageAspectRatio": 1.7777777777777777, 
+            "CollectionType": collection_type, "ImageTags": {"Primary": image_tag}, "BackdropImageTags": [], 
+            "LockedFields": [], "LockData": False
+        }
+        fake_views_items.append(fake_view)
+    
+    # 3. 合并与排序
+    native_views_items = []
+    should_merge_native = config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True)
+    if should_merge_native:
+        all_native_views = user_visible_native_libs
+        raw_selection = config_manager.APP_CONFIG.get('proxy_native_view_selection', '')
+        selected_native_view_ids = [x.strip() for x in raw_selection.split(',') if x.strip()] if isinstance(raw_selection, str) else raw_selection
+        
+        if selected_native_view_ids:
+            native_views_items = [view for view in all_native_views if view.get("Id") in selected_native_view_ids]
+        else:
+            native_views_items = []
+    
+    final_items = []
+    native_order = config_manager.APP_CONFIG.get('proxy_native_view_order', 'before')
+    if native_order == 'after':
+        final_items.extend(fake_views_items)
+        final_items.extend(native_views_items)
+    else:
+        final_items.extend(native_views_items)
+        final_items.extend(fake_views_items)
+
+    final_response = {"Items": final_items, "TotalRecordCount": len(final_items)}
+    return json.dumps(final_response, ensure_ascii=False)
+
 def handle_get_views():
     """
     获取用户的主页视图列表。
+    结果按用户缓存，并带上由内容计算的 ETag，客户端携带 If-None-Match 且内容未变时直接返回 304。
     """
     real_server_id = extensions.EMBY_SERVER_ID
     if not real_server_id:
@@ -171,83 +323,30 @@ def handle_get_views():
             return "Could not determine user from request path", 400
         user_id = user_id_match.group(1)
 
-        # 1. 获取原生库
-        user_visible_native_libs = emby.get_emby_libraries(
-            config_manager.APP_CONFIG.get("emby_server_url", ""),
-            config_manager.APP_CONFIG.get("emby_api_key", ""),
-            user_id
-        )
-        if user_visible_native_libs is None: user_visible_native_libs = []
-
-        # 2. 生成虚拟库
-        collections = custom_collection_db.get_all_active_custom_collections()
-        fake_views_items = []
-        
-        for coll in collections:
-            # 物理检查：库在Emby里有实体吗？
-            real_emby_collection_id = coll.get('emby_collection_id')
-            if not real_emby_collection_id:
-                continue
-
-            # 权限检查：如果设置了 allowed_user_ids，则检查
-            allowed_users = coll.get('allowed_user_ids')
-            if allowed_users and isinstance(allowed_users, list):
-                if user_id not in allowed_users:
-                    continue
-            
-            # 生成虚拟库对象
-            db_id = coll['id']
-            mimicked_id = to_mimicked_id(db_id)
-            # 使用时间戳强制刷新封面
-            image_tags = {"Primary": f"{real_emby_collection_id}?timestamp={int(time.time())}"}
-            definition = coll.get('definition_json') or {}
-            
-            item_type_from_db = definition.get('item_type', 'Movie')
-            collection_type = "mixed"
-            if not (isinstance(item_type_from_db, list) and len(item_type_from_db) > 1):
-                 authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
-                 collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
-
-            fake_view = {
-                "Name": coll['name'], "ServerId": real_server_id, "Id": mimicked_id,
-                "Guid": str(uuid.uuid4()), "Etag": f"{db_id}{int(time.time())}",
-                "DateCreated": "2025-01-01T00:00:00.0000000Z", "CanDelete": False, "CanDownload": False,
-                "SortName": coll['name'], "ExternalUrls": [], "ProviderIds": {}, "IsFolder": True,
-                "ParentId": "2", "Type": "CollectionFolder", "PresentationUniqueKey": str(uuid.uuid4()),
-                "DisplayPreferencesId": f"custom-{db_id}", "ForcedSortName": coll['name'],
-                "Taglines": [], "RemoteTrailers": [],
-                "UserData": {"PlaybackPositionTicks": 0, "IsFavorite": False, "Played": False},
-                "ChildCount": coll.get('in_library_count', 1),
-                "PrimaryImageAspectRatio": 1.7777777777777777, 
-                "CollectionType": collection_type, "ImageTags": image_tags, "BackdropImageTags": [], 
-                "LockedFields": [], "LockData": False
-            }
-            fake_views_items.append(fake_view)
-        
-        # 3. 合并与排序
-        native_views_items = []
-        should_merge_native = config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True)
-        if should_merge_native:
-            all_native_views = user_visible_native_libs
-            raw_selection = config_manager.APP_CONFIG.get('proxy_native_view_selection', '')
-            selected_native_view_ids = [x.strip() for x in raw_selection.split(',') if x.strip()] if isinstance(raw_selection, str) else raw_selection
-            
-            if selected_native_view_ids:
-                native_views_items = [view for view in all_native_views if view.get("Id") in selected_native_view_ids]
-            else:
-                native_views_items = []
-        
-        final_items = []
-        native_order = config_manager.APP_CONFIG.get('proxy_native_view_order', 'before')
-        if native_order == 'after':
-            final_items.extend(fake_views_items)
-            final_items.extend(native_views_items)
+        # 视图相关配置也纳入缓存键，修改配置后无需等待缓存过期
+        config_fingerprint = json.dumps([
+            real_server_id,
+            config_manager.APP_CONFIG.get('proxy_merge_native_libraries', True),
+            config_manager.APP_CONFIG.get('proxy_native_view_selection', ''),
+            config_manager.APP_CONFIG.get('proxy_native_view_order', 'before'),
+        ], sort_keys=True, default=str)
+        cache_key = (user_id, config_fingerprint)
+
+        with _views_cache_lock:
+            entry = _views_cache.get(cache_key)
+        if entry and entry[0] > time.time():
+            body, etag = entry[1], entry[2]
         else:
-            final_items.extend(native_views_items)
-            final_items.extend(fake_views_items)
-
-        final_response = {"Items": final_items, "TotalRecordCount": len(final_items)}
-        return Response(json.dumps(final_response), mimetype='application/json')
+            body = _build_views_payload(user_id, real_server_id)
+            etag = f'"{hashlib.md5(body.encode("utf-8")).hexdigest()}"'
+            with _views_cache_lock:
+                _views_cache[cache_key] = (time.time() + VIEWS_CACHE_TTL, body, etag)
+
+        cache_headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in [t.strip() for t in if_none_match.split(',')]:
+            return Response(status=304, headers=cache_headers)
+        return Response(body, mimetype='application/json', headers=cache_headers)
         
     except Exception as e:
         logger.error(f"[PROXY] 获取视图数据时出错: {e}", exc_info=True)
@@ -261,14 +360,12 @@ def handle_get_mimicked_library_details(user_id, mimicked_id):
 
         real_server_id = extensions.EMBY_SERVER_ID
         real_emby_collection_id = coll.get('emby_collection_id')
-        image_tags = {"Primary": real_emby_collection_id} if real_emby_collection_id else {}
+        image_tags = {}
+        if real_emby_collection_id:
+            cover_versions = _get_cover_image_versions([real_emby_collection_id])
+            image_tags = {"Primary": _build_cover_image_tag(real_emby_collection_id, cover_versions.get(real_emby_collection_id))}
         
-        definition = coll.get('definition_json') or {}
-        item_type_from_db = definition.get('item_type', 'Movie')
-        collection_type = "mixed"
-        if not (isinstance(item_type_from_db, list) and len(item_type_from_db) > 1):
-             authoritative_type = item_type_from_db[0] if isinstance(item_type_from_db, list) and item_type_from_db else item_type_from_db if isinstance(item_type_from_db, str) else 'Movie'
-             collection_type = "tvshows" if authoritative_type == 'Series' else "movies"
+        collection_type = _get_collection_type(coll.get('definition_json') or {})
 
         fake_library_details = {
             "Name": coll['name'], "ServerId": real_server_id, "Id": mimicked_id,
@@ -591,6 +688,27 @@ def handle_get_mimicked_library_items(user_id, mimicked_id, params):
         logger.error(f"处理虚拟库 '{mimicked_id}' 失败: {e}", exc_info=True)
         return Response(json.dumps({"Items": [], "TotalRecordCount": 0}), mimetype='application/json')
 
+# --- 全局“最新”结果的短期缓存 ---
+# 客户端每次启动都会请求“最新”行，缓存每个用户的合并结果 (只缓存 ID，详情仍实时获取以保证播放状态准确)
+LATEST_FEED_CACHE_TTL = 60
+_latest_feed_cache = {}
+_latest_feed_cache_lock = threading.Lock()
+
+def _get_cached_latest_ids(user_id, limit):
+    with _latest_feed_cache_lock:
+        entry = _latest_feed_cache.get((user_id, limit))
+        if entry and entry[0] > time.time():
+            return entry[1]
+    return None
+
+def _set_cached_latest_ids(user_id, limit, latest_ids):
+    with _latest_feed_cache_lock:
+        _latest_feed_cache[(user_id, limit)] = (time.time() + LATEST_FEED_CACHE_TTL, latest_ids)
+
+def _clear_latest_feed_cache(payload=None):
+    with _latest_feed_cache_lock:
+        _latest_feed_cache.clear()
+
 def handle_get_latest_items(user_id, params):
     """
     获取最新项目。
@@ -660,50 +778,33 @@ def handle_get_latest_items(user_id, params):
 
         # 场景二：全局最新 (所有可见合集的聚合)
         elif not virtual_library_id:
-            # 获取所有开启了“显示最新”的合集 ID
-            included_collection_ids = custom_collection_db.get_active_collection_ids_for_latest_view()
-            if not included_collection_ids:
-                return Response(json.dumps([]), mimetype='application/json')
-            
-            all_latest = []
-            for coll_id in included_collection_ids:
-                coll = custom_collection_db.get_custom_collection_by_id(coll_id)
-                if not coll: continue
-                
-                # 检查权限
-                allowed_users = coll.get('allowed_user_ids')
-                if allowed_users and user_id not in allowed_users: continue
-
-                # --- 修复核心：获取 ID 过滤器 ---
-                tmdb_ids_filter = get_collection_filter_ids(coll)
-                if tmdb_ids_filter is not None and (len(tmdb_ids_filter) == 0 or tmdb_ids_filter == ["-1"]):
-                    continue
-
-                definition = coll.get('definition_json')
-                items, _ = queries_db.query_virtual_library_items(
-                    rules=definition.get('rules', []),
-                    logic=definition.get('logic', 'AND'),
-                    user_id=user_id,
-                    limit=limit, 
-                    offset=0,
-                    sort_by='DateCreated',
-                    sort_order='Descending',
-                    item_types=definition.get('item_type', ['Movie']),
-                    target_library_ids=definition.get('target_library_ids', []),
-                    tmdb_ids=tmdb_ids_filter # <--- 传入 TMDb ID 限制
-                )
-                all_latest.extend(items)
-            
-            # 去重并获取详情
-            unique_ids = list({i['Id'] for i in all_latest})
-            if not unique_ids: return Response(json.dumps([]), mimetype='application/json')
-            
-            # 批量获取详情
-            items_details = _fetch_items_in_chunks(base_url, api_key, user_id, unique_ids, "DateCreated")
-            # 内存排序
-            items_details.sort(key=lambda x: x.get('DateCreated', ''), reverse=True)
-            # 截取
-            latest_ids = [i['Id'] for i in items_details[:limit]]
+            latest_ids = _get_cached_latest_ids(user_id, limit)
+            if latest_ids is None:
+                collection_scopes = []
+                for coll in custom_collection_db.get_active_collections_for_latest_view():
+                    # 检查权限
+                    allowed_users = coll.get('allowed_user_ids')
+                    if allowed_users and user_id not in allowed_users: continue
+
+                    # --- 修复核心：获取 ID 过滤器 ---
+                    tmdb_ids_filter = get_collection_filter_ids(coll)
+                    if tmdb_ids_filter is not None and (len(tmdb_ids_filter) == 0 or tmdb_ids_filter == ["-1"]):
+                        continue
+
+                    definition = coll.get('definition_json') or {}
+                    if isinstance(definition, str): definition = json.loads(definition)
+                    collection_scopes.append({
+                        'rules': definition.get('rules', []),
+                        'logic': definition.get('logic', 'AND'),
+                        'item_types': definition.get('item_type', ['Movie']),
+                        'target_library_ids': definition.get('target_library_ids', []),
+                        'tmdb_ids': tmdb_ids_filter
+                    })
+
+                # 所有合集的规则编译成一条 OR 查询，由数据库直接按入库时间排序截取
+                items = queries_db.query_latest_items_across_collections(collection_scopes, user_id, limit)
+                latest_ids = list(dict.fromkeys(i['Id'] for i in items))
+                _set_cached_latest_ids(user_id, limit, latest_ids)
 
         else:
             # 原生库请求，直接转发
@@ -731,13 +832,27 @@ def handle_get_latest_items(user_id, params):
         logger.error(f"  ➜ 处理最新媒体时发生未知错误: {e}", exc_info=True)
         return Response(json.dumps([]), mimetype='application/json')
 
+# 失效事件 (cache_events.invalidate_views_cache 等，来自本进程或其它进程)
+cache_events.subscribe('views', _clear_views_cache)
+cache_events.subscribe('cover_version', _apply_cover_image_version)
+cache_events.subscribe('latest_feed', _clear_latest_feed_cache)
+
 proxy_app = Flask(__name__)
 
 @proxy_app.route('/', defaults={'path': ''})
 @proxy_app.route('/<path:path>', methods=['GET', 'POST', 'PUT', 'DELETE', 'HEAD', 'OPTIONS'])
 def proxy_all(path):
+    start = time.perf_counter()
+    try:
+        return _dispatch_proxy_request(path)
+    finally:
+        # 各拦截分支通过 g.proxy_route 标记自己，未标记的即为兜底转发
+        metrics.PROXY_REQUEST_SECONDS.labels(g.get('proxy_route', 'fallback')).observe(time.perf_counter() - start)
+
+def _dispatch_proxy_request(path):
     # --- 1. WebSocket 代理逻辑 ---
     if 'Upgrade' in request.headers and request.headers.get('Upgrade', '').lower() == 'websocket':
+        g.proxy_route = 'websocket'
         ws_client = request.environ.get('wsgi.websocket')
         if not ws_client: return "WebSocket upgrade failed", 400
 
@@ -827,6 +942,7 @@ def proxy_all(path):
                                     
                                     # 如果是 PlaybackInfo 请求 (客户端起播前的嗅探)，需要特殊伪装
                                     if 'PlaybackInfo' in full_path:
+                                         g.proxy_route = 'playback_info'
                                          # 骗过 Emby 客户端，告诉它这是一个外部直接播放流
                                          fake_info = {
                                              "MediaSources": [{
@@ -845,6 +961,7 @@ def proxy_all(path):
                                          return Response(json.dumps(fake_info), mimetype='application/json')
                                     
                                     # 真正的视频流请求，直接 302 甩出去
+                                    g.proxy_route = 'stream_302'
                                     return redirect(real_url, code=302)
             except Exception as e:
                 logger.error(f"  ❌ 反代拦截解析直链出错，回退原生处理: {e}")
@@ -867,18 +984,21 @@ def proxy_all(path):
                 )
                 
                 if img_file_path and os.path.exists(img_file_path):
+                    g.proxy_route = 'missing_poster'
                     resp = send_file(img_file_path, mimetype='image/jpeg')
                     resp.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
                     return resp
 
         # --- 拦截 B: 视图列表 (Views) ---
         if path.endswith('/Views') and path.startswith('emby/Users/'):
+            g.proxy_route = 'views'
             return handle_get_views()
 
         # --- 拦截 C: 最新项目 (Latest) ---
         if path.endswith('/Items/Latest'):
             user_id_match = re.search(r'/emby/Users/([^/]+)/', full_path)
             if user_id_match:
+                g.proxy_route = 'latest'
                 return handle_get_latest_items(user_id_match.group(1), request.args)
 
         # --- 拦截 D: 虚拟库详情 ---
@@ -886,12 +1006,14 @@ def proxy_all(path):
         if details_match:
             user_id = details_match.group(1)
             mimicked_id = details_match.group(2)
+            g.proxy_route = 'mimicked_details'
             return handle_get_mimicked_library_details(user_id, mimicked_id)
 
         # --- 拦截 E: 虚拟库图片 ---
         if path.startswith('emby/Items/') and '/Images/' in path:
             item_id = path.split('/')[2]
             if is_mimicked_id(item_id):
+                g.proxy_route = 'mimicked_image'
                 return handle_get_mimicked_library_image(path)
         
         # --- 拦截 F: 虚拟库内容浏览 (Items) ---
@@ -899,15 +1021,18 @@ def proxy_all(path):
         if parent_id and is_mimicked_id(parent_id):
             # 处理元数据请求
             if any(path.endswith(endpoint) for endpoint in UNSUPPORTED_METADATA_ENDPOINTS + ['/Items/Prefixes', '/Genres', '/Studios', '/Tags', '/OfficialRatings', '/Years']):
+                g.proxy_route = 'mimicked_metadata'
                 return handle_mimicked_library_metadata_endpoint(path, parent_id, request.args)
             
             # 处理内容列表请求
             user_id_match = re.search(r'emby/Users/([^/]+)/Items', path)
             if user_id_match:
                 user_id = user_id_match.group(1)
+                g.proxy_route = 'mimicked_items'
                 return handle_get_mimicked_library_items(user_id, parent_id, request.args)
 
         # 兜底逻辑
+        g.proxy_route = 'fallback'
         base_url, api_key = _get_real_emby_url_and_key()
         target_url = f"{base_url}/{path.lstrip('/')}"
         
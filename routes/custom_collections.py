@@ -9,6 +9,7 @@ import pytz
 from datetime import datetime
 from database import custom_collection_db, user_db, connection, settings_db
 import config_manager
+import cache_events
 import handler.emby as emby
 from tasks.helpers import is_movie_subscribable
 from extensions import admin_required, any_login_required, DELETING_COLLECTIONS
@@ -139,6 +140,11 @@ def api_get_all_custom_collections():
         logger.error(f"获取所有自定义合集时出错: {e}", exc_info=True)
         return jsonify({"error": "服务器内部错误"}), 500
 
+def _invalidate_proxy_views_cache():
+    """合集定义变动后清空反代层的主页视图与全局最新缓存，让客户端立即看到变化。"""
+    cache_events.invalidate_views_cache()
+    cache_events.invalidate_latest_feed_cache()
+
 # --- 创建一个新的自定义合集定义 ---
 @custom_collections_bp.route('', methods=['POST'])
 @admin_required
@@ -162,6 +168,7 @@ def api_create_custom_collection():
     try:
         collection_id = custom_collection_db.create_custom_collection(name, type, definition_json, allowed_user_ids_json)
         new_collection = custom_collection_db.get_custom_collection_by_id(collection_id)
+        _invalidate_proxy_views_cache()
         return jsonify(new_collection), 201
     except psycopg2.IntegrityError:
         return jsonify({"error": f"创建失败：名为 '{name}' 的合集已存在。"}), 409
@@ -196,6 +203,7 @@ def api_update_custom_collection(collection_id):
         )
         
         if success:
+            _invalidate_proxy_views_cache()
             updated_collection = custom_collection_db.get_custom_collection_by_id(collection_id)
             return jsonify(updated_collection)
         else:
@@ -219,6 +227,7 @@ def api_update_custom_collections_order():
     try:
         success = custom_collection_db.update_custom_collections_order(ordered_ids)
         if success:
+            _invalidate_proxy_views_cache()
             return jsonify({"message": "合集顺序已成功更新。"}), 200
         else:
             return jsonify({"error": "数据库操作失败，无法更新顺序。"}), 500
@@ -273,6 +282,7 @@ def api_delete_custom_collection(collection_id):
         )
 
         if db_success:
+            _invalidate_proxy_views_cache()
             from handler.poster_generator import cleanup_placeholder
             for tid in tmdb_to_clean:
                 cleanup_placeholder(tid) 
@@ -465,6 +475,12 @@ def api_fix_media_match_in_custom_collection(collection_id):
         )
         
         if corrected_item:
+            # 旧的匹配是错的，清除指向它的标题匹配记忆，避免其他榜单继续复用
+            if old_tmdb_id:
+                try:
+                    custom_collection_db.invalidate_title_match_memos(tmdb_id=str(old_tmdb_id))
+                except Exception as e_memo:
+                    logger.warning(f"清除标题匹配记忆失败: {e_memo}")
             return jsonify({
                 "message": "修正成功！",
                 "corrected_item": corrected_item
@@ -475,6 +491,38 @@ def api_fix_media_match_in_custom_collection(collection_id):
         logger.error(f"修正合集 {collection_id} 媒体匹配时出错: {e}", exc_info=True)
         return jsonify({"error": f"服务器内部错误: {str(e)}"}), 500
 
+# --- 清除标题匹配记忆 (榜单导入时的 标题 -> TMDb 匹配缓存) ---
+@custom_collections_bp.route('/match_memo/invalidate', methods=['POST'])
+@admin_required
+def api_invalidate_title_match_memo():
+    """
+    清除错误或过期的标题匹配记忆。
+    请求体支持: tmdb_id / title (+ item_type) / expired_only / all。
+    """
+    from handler.custom_collection import normalize_title_for_memo
+    data = request.json or {}
+    tmdb_id = data.get('tmdb_id')
+    title = data.get('title')
+    item_type = data.get('item_type')
+    expired_only = bool(data.get('expired_only'))
+    clear_all = bool(data.get('all'))
+
+    if not (tmdb_id or title or expired_only or clear_all):
+        return jsonify({"error": "请求无效: 必须提供 tmdb_id、title、expired_only 或 all 之一"}), 400
+
+    try:
+        deleted = custom_collection_db.invalidate_title_match_memos(
+            tmdb_id=str(tmdb_id) if tmdb_id else None,
+            normalized_title=normalize_title_for_memo(title) if title else None,
+            item_type=item_type,
+            expired_only=expired_only,
+            clear_all=clear_all
+        )
+        return jsonify({"message": f"已清除 {deleted} 条匹配记忆。", "deleted": deleted})
+    except Exception as e:
+        logger.error(f"清除标题匹配记忆时出错: {e}", exc_info=True)
+        return jsonify({"error": "服务器内部错误"}), 500
+
 # --- 筛选器用的标签列表 ---
 @custom_collections_bp.route('/config/tags', methods=['GET'])
 @admin_required
@@ -5,6 +5,7 @@ from extensions import task_lock_required, processor_ready_required
 
 import task_manager
 from tasks.cleanup import task_execute_cleanup, task_scan_for_cleanup_issues
+from tasks.version_ranking import invalidate_rules_cache
 from database import cleanup_db, settings_db
 from database.connection import get_db_connection
 import logging
@@ -261,6 +262,7 @@ def save_cleanup_settings():
         settings_db.save_setting('media_cleanup_library_ids', library_ids)
         settings_db.save_setting('media_cleanup_keep_one_per_res', bool(keep_one_per_res))
         settings_db.save_setting('media_cleanup_delete_delay', int(delete_delay or 0))
+        invalidate_rules_cache()
         
         return jsonify({"message": "清理设置已成功保存！"}), 200
     except Exception as e:
@@ -0,0 +1,37 @@
+# routes/metrics.py
+
+from flask import Blueprint, Response, request
+from functools import wraps
+import hmac
+import logging
+
+import metrics
+import constants
+import config_manager
+from extensions import admin_required
+
+metrics_bp = Blueprint('metrics_bp', __name__)
+logger = logging.getLogger(__name__)
+
+def metrics_token_or_admin_required(f):
+    """配置了抓取令牌时，携带正确令牌的请求直接放行；否则按后台管理 API 的规则校验管理员权限。"""
+    admin_view = admin_required(f)
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        token = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_METRICS_TOKEN, "")
+        auth_header = request.headers.get('Authorization', '')
+        if token and auth_header.startswith('Bearer ') and hmac.compare_digest(auth_header[7:].strip().encode('utf-8'), token.encode('utf-8')):
+            return f(*args, **kwargs)
+        return admin_view(*args, **kwargs)
+    return decorated_function
+
+@metrics_bp.route('/metrics', methods=['GET'])
+@metrics_token_or_admin_required
+def get_metrics():
+    """以 Prometheus 文本格式输出进程内指标，供 Prometheus 等采集器抓取。"""
+    try:
+        return Response(metrics.render_latest(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        logger.error(f"生成指标数据时出错: {e}", exc_info=True)
+        return Response("# metrics unavailable\n", status=500, mimetype='text/plain')
@@ -10,9 +10,10 @@ import time
 from flask import Blueprint, jsonify, request, redirect
 from extensions import admin_required
 from database import settings_db
-from handler.p115_service import P115Service, get_config
+from handler.p115_service import P115Service, P115CacheManager, get_config
 import constants
-from functools import lru_cache, wraps
+import hashlib
+from functools import wraps
 p115_bp = Blueprint('p115_bp', __name__, url_prefix='/api/p115')
 logger = logging.getLogger(__name__)
 
@@ -168,16 +169,52 @@ def handle_sorting_rules():
 # 实例化限流器：建议 2 秒内最多允许 3 次解析请求（针对 115 比较稳妥）
 api_limiter = RateLimiter(max_requests=3, period=2)
 # 全局解析锁：确保同一时间只有一个线程在请求 115 API，防止并发冲突
-fetch_lock = threading.Lock()    
-@lru_cache(maxsize=2048)
+fetch_lock = threading.Lock()
+
+# 直链缓存：进程内一级缓存 + 数据库二级缓存 (多个反代工作进程共享，避免同一个 pick_code 被每个进程各解析一次)
+DOWNLOAD_URL_CACHE_TTL = 1800
+_LOCAL_URL_CACHE_MAX = 2048
+_local_url_cache = {}  # {cache_key: (过期时间, 直链)}
+_local_url_cache_lock = threading.Lock()
+
+def _get_local_cached_url(cache_key):
+    with _local_url_cache_lock:
+        entry = _local_url_cache.get(cache_key)
+        if entry and entry[0] > time.time():
+            return entry[1]
+        _local_url_cache.pop(cache_key, None)
+        return None
+
+def _set_local_cached_url(cache_key, url):
+    with _local_url_cache_lock:
+        if len(_local_url_cache) >= _LOCAL_URL_CACHE_MAX:
+            now = time.time()
+            for key in [k for k, (expires_at, _) in _local_url_cache.items() if expires_at <= now]:
+                del _local_url_cache[key]
+            if len(_local_url_cache) >= _LOCAL_URL_CACHE_MAX:
+                _local_url_cache.clear()
+        _local_url_cache[cache_key] = (time.time() + DOWNLOAD_URL_CACHE_TTL, url)
+
 def _get_cached_115_url(pick_code, user_agent, client_ip=None):
     """
     带缓存的 115 直链获取器
     """
+    cache_key = hashlib.md5(f"{pick_code}|{user_agent}|{client_ip or ''}".encode('utf-8')).hexdigest()
+    real_url = _get_local_cached_url(cache_key) or P115CacheManager.get_download_url(cache_key)
+    if real_url:
+        _set_local_cached_url(cache_key, real_url)
+        return real_url
+
     client = P115Service.get_client()
     if not client: return None
-    # 使用锁：即使缓存失效，多个请求同时进来，也只有一个能去查 115 API
-    with fetch_lock:
+    # 使用锁：即使缓存失效，多个请求同时进来，也只有一个能去查 115 API (进程内 + 跨进程)
+    with fetch_lock, P115CacheManager.download_url_fetch_lock():
+        # 等锁期间其它进程可能已经解析过同一个直链
+        real_url = P115CacheManager.get_download_url(cache_key)
+        if real_url:
+            _set_local_cached_url(cache_key, real_url)
+            return real_url
+
         # 这里的限流逻辑：如果令牌不足，直接等待或返回
         if not api_limiter.consume():
             logger.warning(f"  ⚠️ [流控] 请求过快，已拦截 pick_code: {pick_code}")
@@ -188,11 +225,16 @@ def _get_cached_115_url(pick_code, user_agent, client_ip=None):
             time.sleep(0.1) 
             url_obj = client.download_url(pick_code, user_agent=user_agent)
             logger.info(f"  🎬 获取[115]直链成功: {url_obj.name}")
-            return str(url_obj) if url_obj else None
+            real_url = str(url_obj) if url_obj else None
         except Exception as e:
             logger.error(f"  ❌ 获取 115 直链 API 报错: {e}")
             return None
 
+        if real_url:
+            _set_local_cached_url(cache_key, real_url)
+            P115CacheManager.save_download_url(cache_key, real_url, DOWNLOAD_URL_CACHE_TTL)
+        return real_url
+
 @p115_bp.route('/play/<pick_code>', methods=['GET', 'HEAD']) # 允许 HEAD 请求，加速客户端嗅探
 def play_115_video(pick_code):
     """
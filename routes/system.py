@@ -8,7 +8,7 @@ import requests
 import docker
 # 导入底层模块
 import task_manager
-from logger_setup import frontend_log_queue
+from logger_setup import frontend_log_buffer
 import config_manager
 import handler.emby as emby
 # 导入共享模块
@@ -29,9 +29,55 @@ logger = logging.getLogger(__name__)
 @system_bp.route('/status', methods=['GET'])
 def api_get_task_status():
     status_data = task_manager.get_task_status()
-    status_data['logs'] = list(frontend_log_queue)
+    status_data['log_task_id'] = frontend_log_buffer.current_task_id
+    status_data['log_cursor'] = frontend_log_buffer.last_seq
+    # 已通过日志流订阅的客户端传 logs=0，省去每次轮询都格式化日志
+    if request.args.get('logs', '1') != '0':
+        status_data['logs'] = frontend_log_buffer.tail_lines()
+    if extensions.media_processor_instance:
+        status_data['processed_items_cache'] = extensions.media_processor_instance.processed_items_cache.memory_usage()
     return jsonify(status_data)
 
+# --- 实时日志 (按游标增量读取) ---
+LOG_STREAM_BATCH_SIZE = 500
+LOG_STREAM_HEARTBEAT_SECONDS = 15
+
+@system_bp.route('/status/logs', methods=['GET'])
+def api_get_task_logs():
+    """增量读取前端日志：返回序号大于 cursor 的结构化记录及新的游标。"""
+    cursor = request.args.get('cursor', 0, type=int)
+    limit = min(request.args.get('limit', LOG_STREAM_BATCH_SIZE, type=int), LOG_STREAM_BATCH_SIZE)
+    result = frontend_log_buffer.read_since(cursor, limit=limit)
+    result['task_id'] = frontend_log_buffer.current_task_id
+    return jsonify(result)
+
+@system_bp.route('/status/logs/stream', methods=['GET'])
+def api_stream_task_logs():
+    """
+    以 SSE 推送前端日志。每个事件携带一批记录，事件 ID 即游标，
+    浏览器断线重连时会通过 Last-Event-ID 自动从断点继续。
+    """
+    cursor = request.headers.get('Last-Event-ID', type=int)
+    if cursor is None:
+        cursor = request.args.get('cursor', 0, type=int)
+
+    def generate(cursor):
+        while True:
+            result = frontend_log_buffer.read_since(cursor, limit=LOG_STREAM_BATCH_SIZE)
+            if result['records'] or result['truncated']:
+                cursor = result['cursor']
+                result['task_id'] = frontend_log_buffer.current_task_id
+                yield f"id: {cursor}\ndata: {json.dumps(result, ensure_ascii=False)}\n\n"
+                continue
+            cursor = result['cursor']
+            if not frontend_log_buffer.wait_for_records(cursor, LOG_STREAM_HEARTBEAT_SECONDS):
+                yield ": keep-alive\n\n"
+
+    return Response(
+        stream_with_context(generate(cursor)), mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 @system_bp.route('/trigger_stop_task', methods=['POST'])
 def api_handle_trigger_stop_task():
     logger.debug("API (Blueprint): Received request to stop current task.")
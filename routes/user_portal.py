@@ -3,12 +3,13 @@ import logging
 import requests
 import re
 import threading
+import time
 from flask import Blueprint, jsonify, session, request
 from datetime import datetime, timedelta
 from collections import defaultdict
 
 from extensions import emby_login_required 
-from database import user_db, settings_db, media_db, request_db
+from database import user_db, settings_db, media_db, request_db, playback_db
 import config_manager     
 import constants
 import handler.tmdb as tmdb
@@ -18,6 +19,8 @@ from routes.discover import check_and_replenish_pool
 import task_manager
 import extensions
 from tasks.subscriptions import task_manual_subscribe_batch
+from tasks.playback import is_warehouse_ready, playback_range_start
+import cache_events
 
 # 1. 创建一个新的蓝图
 user_portal_bp = Blueprint('user_portal_bp', __name__, url_prefix='/api/portal')
@@ -335,27 +338,42 @@ def get_playback_report():
     config = config_manager.APP_CONFIG
     
     # ==================================================
-    # 1. 获取 个人数据
+    # 1. 获取 个人数据 (优先读取本地播放流水仓库)
     # ==================================================
-    personal_res = emby.get_playback_reporting_data(
-        config['emby_server_url'], config['emby_api_key'], emby_user_id, days
-    )
-    
-    if "error" in personal_res:
-        if personal_res["error"] == "plugin_not_installed":
-            return jsonify({"status": "error", "message": "服务端未安装 Playback Reporting 插件"}), 404
-        return jsonify({"status": "error", "message": "获取数据失败"}), 500
+    local_totals = None
+    if is_warehouse_ready():
+        local_history = playback_db.get_user_playback_history(
+            emby_user_id, playback_range_start(days),
+            item_type=None if media_type_filter == 'all' else media_type_filter
+        )
+        local_totals = (local_history["total_count"], local_history["total_minutes"])
+        raw_activity = [{
+            "Name": row["item_name"] or "未知影片",
+            "Date": row["played_at"].strftime('%Y-%m-%d %H:%M:%S'),
+            "PlayDuration": row["duration_sec"],
+            "ItemType": row["item_type"],
+            "ItemId": row["emby_item_id"],
+        } for row in local_history["recent"]]
+    else:
+        personal_res = emby.get_playback_reporting_data(
+            config['emby_server_url'], config['emby_api_key'], emby_user_id, days
+        )
         
-    raw_activity = personal_res.get("data", [])
+        if "error" in personal_res:
+            if personal_res["error"] == "plugin_not_installed":
+                return jsonify({"status": "error", "message": "服务端未安装 Playback Reporting 插件"}), 404
+            return jsonify({"status": "error", "message": "获取数据失败"}), 500
+            
+        raw_activity = personal_res.get("data", [])
 
-    # 个人数据类型过滤
-    if media_type_filter != 'all':
-        filtered_activity = []
-        for item in raw_activity:
-            item_type = item.get("ItemType") or item.get("item_type") or "Video"
-            if item_type == media_type_filter:
-                filtered_activity.append(item)
-        raw_activity = filtered_activity
+        # 个人数据类型过滤
+        if media_type_filter != 'all':
+            filtered_activity = []
+            for item in raw_activity:
+                item_type = item.get("ItemType") or item.get("item_type") or "Video"
+                if item_type == media_type_filter:
+                    filtered_activity.append(item)
+            raw_activity = filtered_activity
 
     # ==================================================
     # 2. 统一收集 Episode ID 进行批量回查
@@ -395,9 +413,12 @@ def get_playback_report():
         "history_list": [] 
     }
     
-    for item in raw_activity:
-        duration_sec = item.get("PlayDuration") or item.get("Duration") or 0
-        personal_stats["total_minutes"] += int(duration_sec / 60)
+    if local_totals:
+        personal_stats["total_count"], personal_stats["total_minutes"] = local_totals
+    else:
+        for item in raw_activity:
+            duration_sec = item.get("PlayDuration") or item.get("Duration") or 0
+            personal_stats["total_minutes"] += int(duration_sec / 60)
 
     # 辅助函数：智能格式化标题
     def format_episode_title(item_id, item_type, original_title, details_map):
@@ -467,14 +488,81 @@ def get_playback_report():
         "personal": personal_stats,
     })
 
+# --- 仪表盘统计缓存 (按统计天数区分) ---
+# 播放流水导入完成后统一失效，其余时间同一时间范围的请求直接复用结果。
+DASHBOARD_CACHE_TTL = 300
+_dashboard_cache = {}  # {days: (过期时间, 统计结果)}
+_dashboard_cache_lock = threading.Lock()
+
+def _clear_dashboard_cache(payload=None):
+    with _dashboard_cache_lock:
+        _dashboard_cache.clear()
+
+# 由 cache_events.invalidate_dashboard_cache() 触发 (本进程或其它进程)
+cache_events.subscribe('playback_stats', _clear_dashboard_cache)
+
 @user_portal_bp.route('/dashboard-stats', methods=['GET'])
 @emby_login_required
 def get_dashboard_stats():
     """
-    获取仪表盘综合统计数据 (修复版：增强字段兼容性)
+    获取仪表盘综合统计数据。
+    播放流水仓库就绪后直接读取预聚合表，否则回退为实时拉取插件流水并在内存中聚合。
     """
-    # 1. 参数处理
     days = request.args.get('days', 30, type=int)
+
+    with _dashboard_cache_lock:
+        entry = _dashboard_cache.get(days)
+    if entry and entry[0] > time.time():
+        return jsonify(entry[1])
+
+    if is_warehouse_ready():
+        try:
+            stats = _build_dashboard_stats_from_warehouse(days)
+        except Exception as e:
+            logger.error(f"读取播放统计仓库失败: {e}", exc_info=True)
+            return jsonify({"status": "error", "message": str(e)}), 500
+    else:
+        stats, error = _build_dashboard_stats_live(days)
+        if error:
+            return jsonify({"status": "error", "message": error}), 500
+
+    with _dashboard_cache_lock:
+        _dashboard_cache[days] = (time.time() + DASHBOARD_CACHE_TTL, stats)
+    return jsonify(stats)
+
+def _build_dashboard_stats_from_warehouse(days):
+    config = config_manager.APP_CONFIG
+    rollups = playback_db.get_dashboard_rollups(playback_range_start(days))
+    totals = rollups["totals"]
+
+    return {
+        "total_plays": int(totals["total_plays"]),
+        "total_duration_hours": round(float(totals["total_duration_sec"]) / 3600, 2),
+        "active_users": totals["active_users"],
+        "watched_items": rollups["watched_items"],
+        "media_rank": [{
+            "id": row["target_emby_id"],
+            "name": row["target_name"],
+            "type": row["target_type"],
+            "poster_path": row["target_poster_path"],
+            "count": int(row["plays"])
+        } for row in rollups["media"]],
+        "hourly_heat": {row["play_hour"]: int(row["plays"]) for row in rollups["hourly"]},
+        "emby_url": config.get('emby_public_url') or config.get('emby_server_url'),
+        "emby_server_id": extensions.EMBY_SERVER_ID,
+        "chart_trend": {
+            "dates": [row["play_date"].isoformat() for row in rollups["trend"]],
+            "counts": [int(row["plays"]) for row in rollups["trend"]],
+            "hours": [round(float(row["duration_sec"]) / 3600, 1) for row in rollups["trend"]]
+        },
+        "chart_users": {
+            "names": [row["user_name"] for row in rollups["users"]],
+            "hours": [round(float(row["duration_sec"]) / 3600, 1) for row in rollups["users"]]
+        },
+    }
+
+def _build_dashboard_stats_live(days):
+    """实时拉取插件全站流水并在内存中聚合 (修复版：增强字段兼容性)。返回 (统计结果, 错误信息)。"""
     config = config_manager.APP_CONFIG
     
     # 2. 从 Emby 获取全站原始流水
@@ -496,7 +584,7 @@ def get_dashboard_stats():
         raw_data = response.json()
     except Exception as e:
         logger.error(f"获取仪表盘数据失败: {e}")
-        return jsonify({"status": "error", "message": str(e)}), 500
+        return None, str(e)
 
     # 3. 数据聚合
     server_id = extensions.EMBY_SERVER_ID
@@ -621,4 +709,4 @@ def get_dashboard_stats():
     sorted_media = sorted(media_counter.values(), key=lambda x: x["count"], reverse=True)
     stats["media_rank"] = sorted_media[:20]
 
-    return jsonify(stats)
\ No newline at end of file
+    return stats, None
\ No newline at end of file
@@ -17,6 +17,8 @@ import constants
 import utils
 import handler.telegram as telegram
 import extensions
+import metrics
+import cache_events
 from extensions import SYSTEM_UPDATE_MARKERS, SYSTEM_UPDATE_LOCK, RECURSION_SUPPRESSION_WINDOW, DELETING_COLLECTIONS, UPDATING_IMAGES, UPDATING_METADATA
 from core_processor import MediaProcessor
 from tasks.watchlist import task_process_watchlist
@@ -53,6 +55,9 @@ STREAM_CHECK_MAX_RETRIES = 60   # 最大重试次数
 STREAM_CHECK_INTERVAL = 10      # 每次轮询间隔(秒)
 STREAM_CHECK_SEMAPHORE = Semaphore(5) # 限制并发预检的数量，防止大量入库时查挂 Emby
 
+metrics.register_gauge("etk_webhook_batch_queue_depth", "Webhook 批量处理队列中等待处理的事件数", lambda: len(WEBHOOK_BATCH_QUEUE))
+metrics.register_gauge("etk_webhook_update_debounce_pending", "等待防抖合并的元数据/图片更新事件数", lambda: len(UPDATE_DEBOUNCE_TIMERS))
+
 def _handle_full_processing_flow(processor: 'MediaProcessor', item_id: str, force_full_update: bool, new_episode_ids: Optional[List[str]] = None, is_new_item: bool = True):
     """
     【Webhook 统一入口】
@@ -380,8 +385,7 @@ def _process_batch_webhook_events():
                 logger.info(f"  ➜ ⚠️ 缓存命中 '{parent_name}'，但数据库标记为离线/缺失。清除缓存，触发重新入库流程。")
                 
                 # 从内存缓存中移除
-                if parent_id in extensions.media_processor_instance.processed_items_cache:
-                    del extensions.media_processor_instance.processed_items_cache[parent_id]
+                extensions.media_processor_instance.forget_processed_item(parent_id)
                 
                 # 标记为未处理，后续逻辑会把它当作“新入库”来执行完整的数据库修复
                 is_already_processed = False
@@ -509,6 +513,20 @@ def _wait_for_stream_data_and_enqueue(item_id, item_name, item_type):
     logger.warning(f"  ➜ [预检] 超时！在 {STREAM_CHECK_MAX_RETRIES * STREAM_CHECK_INTERVAL} 秒内未提取到 '{item_name}' 的视频流数据。强制加入队列。")
     _enqueue_webhook_event(item_id, item_name, item_type)
 
+# 这些事件意味着 Emby 中条目 (或其所属剧集、合集) 的详情已经变化
+ITEM_DETAILS_INVALIDATING_EVENTS = {
+    "item.add", "item.update", "library.new", "library.deleted", "deep.delete",
+    "metadata.update", "image.update", "collection.items.added", "collection.items.removed",
+    "item.markfavorite", "item.unmarkfavorite", "item.markplayed", "item.markunplayed", "item.rate",
+}
+
+def _invalidate_item_details_cache(data):
+    """丢弃 Webhook 涉及条目 (及其所属剧集、季) 的 Emby 详情缓存。"""
+    item = (data or {}).get("Item") or {}
+    item_ids = [item.get(key) for key in ("Id", "SeriesId", "SeasonId", "ParentId")]
+    if any(item_ids):
+        emby.invalidate_item_details_cache(item_ids)
+
 # --- Webhook 路由 ---
 @webhook_bp.route('/webhook/emby', methods=['POST'])
 @extensions.processor_ready_required
@@ -530,6 +548,8 @@ def emby_webhook():
     # ★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★★
     event_type = data.get("Event") # Emby
     mp_event_type = data.get("type") # MP
+    if event_type in ITEM_DETAILS_INVALIDATING_EVENTS:
+        _invalidate_item_details_cache(data)
     # ======================================================================
     # ★★★ 处理神医插件的 deep.delete (深度删除) 事件 ★★★
     # ======================================================================
@@ -554,6 +574,7 @@ def emby_webhook():
                     item_type=original_item_type,
                     series_id_from_webhook=series_id_from_webhook
                 )
+                cache_events.invalidate_latest_feed_cache()
                 # 刷新向量缓存
                 if config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PROXY_ENABLED) and config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_AI_VECTOR):
                     if original_item_type in ['Movie', 'Series']:
@@ -723,6 +744,9 @@ def emby_webhook():
         if not updated_user_id:
             return jsonify({"status": "event_ignored_no_user_id"}), 200
 
+        # 用户权限变化会影响可见的原生媒体库
+        cache_events.invalidate_views_cache()
+
         # --- 立即反查并更新本地 Policy ---
         try:
             def _update_local_policy_task():
@@ -919,6 +943,11 @@ def emby_webhook():
         if event_type == "image.update" and original_item_id in UPDATING_IMAGES:
             logger.debug(f"  ➜ Webhook: 忽略项目 '{original_item_name}' 的图片更新通知 (系统生成的封面)。")
             return jsonify({"status": "ignored_self_triggered_update"}), 200
+
+        # 合集封面在 Emby 侧被外部修改，主页视图中的封面 Tag 需要随之更新
+        if event_type == "image.update" and original_item_type == "BoxSet":
+            cache_events.forget_cover_image_version(original_item_id)
+            cache_events.invalidate_views_cache()
         
         # --- 【拦截 2】如果是系统正在更新元数据，直接拦截 ---
         if event_type == "metadata.update" and original_item_id in UPDATING_METADATA:
@@ -951,6 +980,7 @@ def emby_webhook():
                 return jsonify({"status": "ignored_library"}), 200
 
     if event_type in ["item.add", "library.new"]:
+        cache_events.invalidate_latest_feed_cache()
         spawn(_wait_for_stream_data_and_enqueue, original_item_id, original_item_name, original_item_type)
         
         logger.info(f"  ➜ Webhook: 收到入库事件 '{original_item_name}'，已分派预检任务。")
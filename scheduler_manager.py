@@ -3,6 +3,7 @@
 import logging
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
+from apscheduler.triggers.interval import IntervalTrigger
 from apscheduler.jobstores.base import JobLookupError
 import pytz
 from datetime import datetime
@@ -15,6 +16,7 @@ import constants      # 导入常量以获取时区
 import extensions     # 导入 extensions 以获取共享的处理器实例
 import task_manager   # 导入 task_manager 以提交任务
 from tasks.core import get_task_registry
+from tasks.playback import sync_playback_history
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +25,7 @@ logger = logging.getLogger(__name__)
 HIGH_FREQ_CHAIN_JOB_ID = 'high_freq_task_chain_job'
 LOW_FREQ_CHAIN_JOB_ID = 'low_freq_task_chain_job'
 DAILY_THEME_JOB_ID = 'daily_theme_job'
+PLAYBACK_HISTORY_JOB_ID = 'playback_history_sync_job'
 
 
 # --- 友好的CRON日志翻译函数 (保持不变) ---
@@ -219,6 +222,7 @@ class SchedulerManager:
         self.update_high_freq_task_chain_job()
         self.update_low_freq_task_chain_job()
         self.update_daily_theme_job()
+        self.update_playback_history_job()
 
     def _update_single_task_chain_job(self, job_id: str, job_name: str, task_key: str, enabled_key: str, cron_key: str, sequence_key: str, runtime_key: str):
         """
@@ -352,5 +356,42 @@ class SchedulerManager:
         except ValueError as e:
             logger.error(f"设置'{task_description}'任务失败：CRON表达式 '{cron_str}' 无效。错误: {e}")
 
+    def update_playback_history_job(self):
+        """
+        设置播放流水的定时增量导入。
+        导入本身很轻 (只拉取最近几天的插件数据)，直接在调度线程中执行，不占用任务队列。
+        """
+        if not self.scheduler.running:
+            return
+
+        try:
+            self.scheduler.remove_job(PLAYBACK_HISTORY_JOB_ID)
+        except JobLookupError:
+            pass
+
+        interval_minutes = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PLAYBACK_HISTORY_SYNC_INTERVAL, 15) or 0
+        if interval_minutes <= 0:
+            logger.debug("  ➜ 播放统计定时导入未启用。")
+            return
+
+        def scheduled_playback_history_wrapper():
+            config = config_manager.APP_CONFIG
+            try:
+                sync_playback_history(config.get(constants.CONFIG_OPTION_EMBY_SERVER_URL), config.get(constants.CONFIG_OPTION_EMBY_API_KEY))
+            except Exception as e:
+                logger.error(f"  ⚠️ 播放统计定时导入失败: {e}", exc_info=True)
+
+        self.scheduler.add_job(
+            func=scheduled_playback_history_wrapper,
+            trigger=IntervalTrigger(minutes=interval_minutes),
+            id=PLAYBACK_HISTORY_JOB_ID,
+            name="播放统计增量导入",
+            next_run_time=datetime.now(pytz.timezone(constants.TIMEZONE)),
+            max_instances=1,
+            coalesce=True,
+            replace_existing=True
+        )
+        logger.trace(f"  ➜ 已设置播放统计增量导入，每 {interval_minutes} 分钟执行一次。")
+
 # 创建一个全局单例，方便在其他地方调用
 scheduler_manager = SchedulerManager()
\ No newline at end of file
@@ -11,6 +11,7 @@ from typing import Dict, Any, List, Tuple, Optional
 from gevent import spawn_later
 from database import custom_collection_db, queries_db
 import config_manager
+import cache_events
 import handler.emby as emby 
 from extensions import UPDATING_IMAGES
 from .styles.style_single_1 import create_style_single_1
@@ -536,6 +537,7 @@ class CoverGeneratorService:
             response = requests.post(upload_url, data=image_data, headers=headers, timeout=30)
             response.raise_for_status()
             logger.debug(f"  ➜ 成功上传封面到媒体库 '{library['Name']}'。")
+            cache_events.record_cover_image_version(library_id, image_data)
             return True
         except requests.exceptions.RequestException as e:
             logger.error(f"  ➜ 上传封面到媒体库 '{library['Name']}' 时发生网络错误: {e}")
@@ -1,6 +1,7 @@
 # task_manager.py (V2 - 精确调度版)
 import threading
 import logging
+import time
 from queue import Queue
 from typing import Optional, Callable, Union, Literal
 
@@ -9,6 +10,8 @@ from core_processor import MediaProcessor
 from watchlist_processor import WatchlistProcessor
 from actor_subscription_processor import ActorSubscriptionProcessor
 import extensions
+import metrics
+import task_process_runner
 
 logger = logging.getLogger(__name__)
 
@@ -30,11 +33,25 @@ task_queue = Queue()
 task_worker_thread: Optional[threading.Thread] = None
 task_worker_lock = threading.Lock()
 
+# 状态转发：在独立工作进程中执行任务时，由 task_process_runner 设置，把进度回传给主进程
+_status_sink: Optional[Callable[[int, str], None]] = None
+
+# 任务自行捕获异常时只会上报 progress=-1 的状态，据此判断任务是否失败
+_last_status_failed = False
+
+def set_status_sink(sink: Optional[Callable[[int, str], None]]):
+    global _status_sink
+    _status_sink = sink
+
 def update_status_from_thread(progress: int, message: str):
     """由处理器或任务函数调用，用于更新任务状态。"""
+    global _last_status_failed
+    _last_status_failed = progress < 0
     if progress >= 0:
         background_task_status["progress"] = progress
     background_task_status["message"] = message
+    if _status_sink:
+        _status_sink(progress, message)
 
 def get_task_status() -> dict:
     """获取当前后台任务的状态。"""
@@ -46,7 +63,7 @@ def is_task_running() -> bool:
 
 def _execute_task_with_lock(task_function: Callable, task_name: str, processor: Union[MediaProcessor, WatchlistProcessor, ActorSubscriptionProcessor], *args, **kwargs):
     """【工人专用】通用后台任务执行器。"""
-    global background_task_status
+    global background_task_status, _last_status_failed
     
     with task_lock:
         if not processor:
@@ -54,6 +71,7 @@ def _execute_task_with_lock(task_function: Callable, task_name: str, processor:
             return
 
         processor.clear_stop_signal()
+        _last_status_failed = False
 
         background_task_status.update({
             "is_running": True, "current_action": task_name, "last_action": task_name,
@@ -62,13 +80,18 @@ def _execute_task_with_lock(task_function: Callable, task_name: str, processor:
         logger.info(f"  ➜ 后台任务 '{task_name}' 开始执行")
 
         task_completed_normally = False
+        # 任务名里常带有媒体名称，指标统一使用任务函数名作为标签，避免标签无限增长
+        task_label = getattr(task_function, '__name__', 'unknown')
+        metrics.set_current_task(task_label)
+        task_started_at = time.perf_counter()
         try:
             if processor.is_stop_requested():
                 raise InterruptedError("任务被取消")
 
-            task_function(processor, *args, **kwargs)
+            if not task_process_runner.try_run_in_worker_process(task_function, task_name, processor, args, kwargs):
+                task_function(processor, *args, **kwargs)
             
-            if not processor.is_stop_requested():
+            if not processor.is_stop_requested() and not _last_status_failed:
                 task_completed_normally = True
         finally:
             final_message = "未知结束状态"
@@ -76,11 +99,22 @@ def _execute_task_with_lock(task_function: Callable, task_name: str, processor:
 
             if processor.is_stop_requested():
                 final_message = "任务已成功中断。"
+                task_outcome = "stopped"
             elif task_completed_normally:
                 final_message = "处理完成。"
                 current_progress = 100
+                task_outcome = "completed"
+            else:
+                # 任务抛出异常，或自行捕获异常后上报了失败状态 (保留其失败信息)
+                if _last_status_failed:
+                    final_message = background_task_status["message"]
+                task_outcome = "failed"
             
             update_status_from_thread(current_progress, final_message)
+
+            metrics.TASK_DURATION_SECONDS.labels(task_label).observe(time.perf_counter() - task_started_at)
+            metrics.TASK_RUNS_TOTAL.labels(task_label, task_outcome).inc()
+            metrics.set_current_task(None)
             logger.info(f"  ✅ 后台任务 '{task_name}' 结束，最终状态: {final_message}")
 
             background_task_status.update({
@@ -124,6 +158,8 @@ def task_worker_function():
         except Exception as e:
             logger.error(f"通用工人线程发生未知错误: {e}", exc_info=True)
 
+metrics.register_gauge("etk_task_queue_depth", "通用任务队列中等待执行的任务数", lambda: task_queue.qsize())
+
 def start_task_worker_if_not_running():
     """安全地启动通用工人线程。"""
     global task_worker_thread
@@ -140,15 +176,15 @@ def submit_task(task_function: Callable, task_name: str, processor_type: Process
     【V2 - 公共接口】将一个任务提交到通用队列中。
     新增 processor_type 参数，用于精确指定任务所需的处理器。
     """
-    from logger_setup import frontend_log_queue # 延迟导入以避免循环
+    from logger_setup import frontend_log_buffer # 延迟导入以避免循环
 
     with task_lock:
         if background_task_status["is_running"]:
             logger.warning(f"任务 '{task_name}' 提交失败：已有任务正在运行。")
             return False
 
-        frontend_log_queue.clear()
-        logger.trace(f"  ➜ 任务 '{task_name}' 已提交到队列，并已清空前端日志。")
+        log_task_id = frontend_log_buffer.begin_task()
+        logger.trace(f"  ➜ 任务 '{task_name}' 已提交到队列，前端日志切换到任务 #{log_task_id}。")
         
         # ★★★ 核心修复：将 processor_type 加入任务信息元组 ★★★
         task_info = (task_function, task_name, processor_type, args, kwargs)
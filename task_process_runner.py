@@ -0,0 +1,218 @@
+# task_process_runner.py
+"""
+在独立工作进程中执行 CPU 密集型后台任务。
+
+主进程同时承载 gevent 反代与管理后台，封面渲染、大批量 JSON 解析等纯 Python 计算会长时间占用 GIL，
+导致所有请求卡顿。这里把 tasks/core 注册表中标记为进程隔离的任务放到 spawn 出的子进程里执行：
+- 子进程通过 Pipe 回传进度 ('status')、日志 ('log') 与计数器增量 ('metrics')，主进程写入 task_manager 状态、日志队列和指标；
+- 主进程的停止信号通过 multiprocessing.Event 传给子进程，由子进程转成处理器的 signal_stop()；
+- 任务结束时子进程回传 ('done', 'ok' | 'error', 错误信息)。
+"""
+import sys
+import time
+import pickle
+import logging
+import threading
+import traceback
+import multiprocessing
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import constants
+import config_manager
+import metrics
+import cache_events
+
+logger = logging.getLogger(__name__)
+
+_STOP_POLL_INTERVAL = 0.5
+_WORKER_EXIT_GRACE_SECONDS = 15
+_METRICS_FLUSH_INTERVAL = 5
+
+# ======================================================================
+# 主进程侧
+# ======================================================================
+
+def try_run_in_worker_process(task_function: Callable, task_name: str, processor: Any,
+                              args: Tuple, kwargs: Dict[str, Any]) -> bool:
+    """
+    如果任务适合在独立进程中执行，则在子进程中运行并阻塞 (协作式) 等待其结束，返回 True；
+    否则返回 False，由调用方在当前进程中直接执行。
+    """
+    if multiprocessing.current_process().name != 'MainProcess':
+        return False # 已经在工作进程中 (例如任务链里的子任务)
+    if not config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_TASK_PROCESS_ISOLATION, True):
+        return False
+
+    from tasks.core import get_process_isolated_task_key
+    task_key = get_process_isolated_task_key(task_function)
+    if not task_key:
+        return False
+    try:
+        pickle.dumps((args, kwargs))
+    except Exception:
+        logger.debug(f"  ➜ 任务 '{task_name}' 的参数无法跨进程传递，改为在主进程中执行。")
+        return False
+
+    _run_in_worker_process(task_key, task_name, processor, args, kwargs)
+    return True
+
+def _run_in_worker_process(task_key: str, task_name: str, processor: Any, args: Tuple, kwargs: Dict[str, Any]):
+    import task_manager
+
+    ctx = multiprocessing.get_context('spawn')
+    parent_conn, child_conn = ctx.Pipe(duplex=False)
+    stop_event = ctx.Event()
+    process = ctx.Process(
+        target=_worker_main, args=(child_conn, stop_event, task_key, metrics.get_current_task(), args, kwargs),
+        name=f"task-worker-{task_key}", daemon=True
+    )
+    process.start()
+    child_conn.close()
+    logger.info(f"  ➜ 任务 '{task_name}' 已交给独立工作进程执行 (PID: {process.pid})。")
+
+    outcome: Optional[tuple] = None
+    try:
+        while True:
+            if processor.is_stop_requested() and not stop_event.is_set():
+                logger.info(f"  ➜ 正在把停止信号传递给工作进程 (PID: {process.pid})...")
+                stop_event.set()
+            # Connection.poll 基于 selectors，在 gevent 下是协作式等待
+            if not parent_conn.poll(_STOP_POLL_INTERVAL):
+                if not process.is_alive():
+                    break
+                continue
+            try:
+                message = parent_conn.recv()
+            except EOFError:
+                break
+
+            kind = message[0]
+            if kind == 'status':
+                task_manager.update_status_from_thread(message[1], message[2])
+            elif kind == 'log':
+                relay_log_message(message)
+            elif kind == 'metrics':
+                metrics.apply_counter_deltas(message[1])
+            elif kind == 'done':
+                outcome = message
+                break
+    finally:
+        parent_conn.close()
+        deadline = time.time() + _WORKER_EXIT_GRACE_SECONDS
+        while process.is_alive() and time.time() < deadline:
+            time.sleep(0.2)
+        if process.is_alive():
+            logger.warning(f"  ➜ 工作进程 (PID: {process.pid}) 未能按时退出，强制终止。")
+            process.terminate()
+
+    if outcome is None:
+        raise RuntimeError(f"工作进程异常退出 (exitcode: {process.exitcode})")
+    if outcome[1] == 'error':
+        raise RuntimeError(f"工作进程中的任务执行失败: {outcome[2]}")
+
+# ======================================================================
+# 子进程侧
+# ======================================================================
+
+class PipeLogHandler(logging.Handler):
+    """把子进程的日志记录发回主进程，由主进程的日志配置统一输出 (控制台、文件、前端队列)。"""
+    def __init__(self, send: Callable[[tuple], None]):
+        super().__init__(level=logging.NOTSET)
+        self._send = send
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            text = record.getMessage()
+            if record.exc_info:
+                text = f"{text}\n{''.join(traceback.format_exception(*record.exc_info))}"
+            self._send(('log', record.name, record.levelno, text, f"{record.pathname}:{record.lineno}"))
+        except Exception:
+            pass
+
+def relay_log_message(message: tuple):
+    """在主进程中重新输出 PipeLogHandler 发来的一条日志，保留原始调用点供前端日志采样使用。"""
+    _, logger_name, levelno, text, log_site = message
+    logging.getLogger(logger_name).log(levelno, "%s", text, extra={'log_site': log_site})
+
+def _initialize_worker_processors(task_key: str):
+    """加载配置，只创建该任务用得到的处理器实例 (不探测 Emby Server ID，直接使用主进程缓存的值)。"""
+    from tasks.core import get_required_processor_types
+    config_manager.load_config()
+    # spawn 模式下主模块 (web_app) 已作为 __mp_main__ 加载，直接复用其初始化逻辑
+    main_module = sys.modules.get('__mp_main__')
+    initialize_processors = getattr(main_module, 'initialize_processors', None)
+    if initialize_processors is None:
+        from web_app import initialize_processors
+    initialize_processors(processor_types=get_required_processor_types(task_key, config_manager.APP_CONFIG))
+
+def _worker_main(conn, stop_event, task_key: str, task_label: str, args: Tuple, kwargs: Dict[str, Any]):
+    send_lock = threading.Lock()
+
+    def send(message: tuple):
+        with send_lock:
+            conn.send(message)
+
+    # 计数器 (如 etk_task_items_processed_total) 只在子进程里累加，定期把增量回传给主进程
+    metrics.set_current_task(task_label)
+    counter_baseline = {}
+    metrics_lock = threading.Lock()
+
+    def flush_metrics():
+        with metrics_lock:
+            deltas = metrics.take_counter_deltas(counter_baseline)
+            if deltas:
+                send(('metrics', deltas))
+
+    root_logger = logging.getLogger()
+    for handler in list(root_logger.handlers):
+        root_logger.removeHandler(handler)
+    root_logger.addHandler(PipeLogHandler(send))
+
+    finished = threading.Event()
+    try:
+        from database import connection
+        connection.enable_green_io()
+        _initialize_worker_processors(task_key)
+
+        import extensions
+        import task_manager
+        from tasks.core import get_task_registry
+
+        task_function, _, processor_type = get_task_registry(context='all')[task_key][:3]
+        processor = {
+            'media': extensions.media_processor_instance,
+            'watchlist': extensions.watchlist_processor_instance,
+            'actor': extensions.actor_subscription_processor_instance,
+        }.get(processor_type)
+        if not processor:
+            raise RuntimeError(f"工作进程中类型为 '{processor_type}' 的处理器未初始化")
+
+        task_manager.set_status_sink(lambda progress, message: send(('status', progress, message)))
+
+        def stop_watcher():
+            while not finished.is_set():
+                if stop_event.is_set():
+                    processor.signal_stop()
+                    return
+                time.sleep(_STOP_POLL_INTERVAL)
+        threading.Thread(target=stop_watcher, daemon=True).start()
+
+        def metrics_flusher():
+            while not finished.wait(_METRICS_FLUSH_INTERVAL):
+                flush_metrics()
+        threading.Thread(target=metrics_flusher, daemon=True).start()
+
+        task_function(processor, *args, **kwargs)
+        flush_metrics()
+        cache_events.flush_batched()
+        send(('done', 'ok', None))
+    except Exception as e:
+        logging.getLogger(__name__).error(f"工作进程执行任务 '{task_key}' 失败: {e}", exc_info=True)
+        try:
+            flush_metrics()
+            cache_events.flush_batched()
+        except Exception: pass
+        send(('done', 'error', str(e)))
+    finally:
+        finished.set()
+        conn.close()
@@ -10,6 +10,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 from database.connection import get_db_connection
 from database import actor_db
 import constants
+import metrics
 import handler.emby as emby
 import task_manager
 import utils
@@ -502,6 +503,7 @@ def task_merge_duplicate_actors(processor):
             if processor.is_stop_requested():
                 logger.warning("  🚫 合并操作被用户中止。")
                 break
+            metrics.record_items_processed()
             
             keeper = plan['keeper']
             deletee = plan['deletee']
@@ -678,6 +680,7 @@ def task_purge_ghost_actors(processor):
             if processor.is_stop_requested():
                 logger.warning("  🚫 删除操作被用户中止。")
                 break
+            metrics.record_items_processed()
             
             person_id = person.get("Id")
             person_name = person.get("Name")
@@ -817,6 +820,7 @@ def task_purge_unregistered_actors(processor):
             if processor.is_stop_requested():
                 logger.warning("  🚫 任务被用户中止。")
                 break
+            metrics.record_items_processed()
             
             person_id = person.get("Id")
             person_name = person.get("Name")
@@ -3,259 +3,18 @@
 
 import logging
 import time
-from functools import cmp_to_key
-from typing import List, Dict, Any, Optional
+from typing import List
 from psycopg2 import sql
 from collections import defaultdict
 import task_manager
+import metrics
 import handler.emby as emby
 from database import connection, cleanup_db, settings_db, maintenance_db, queries_db
 from .media import task_populate_metadata_cache
+from .version_ranking import get_version_properties, get_cleanup_rules, pick_best_version_id, annotate_version_rank
 
 logger = logging.getLogger(__name__)
 
-# ======================================================================
-# 核心逻辑：版本比较与决策
-# ======================================================================
-
-def _get_properties_for_comparison(version: Dict) -> Dict:
-    """
-    从 asset_details_json 的单个版本条目中，提取用于比较的标准化属性。
-    包含：特效、分辨率、质量、文件大小、码率、色深、帧率、时长、字幕语言数量。
-    """
-    if not version or not isinstance(version, dict):
-        return {
-            'id': None, 'quality': 'unknown', 'resolution': 'unknown', 'effect': 'sdr', 'filesize': 0,
-            'video_bitrate_mbps': 0, 'bit_depth': 8, 'frame_rate': 0, 'runtime_minutes': 0,
-            'codec': 'unknown', 'subtitle_count': 0, 'subtitle_languages': []
-        }
-
-    # ★★★ 核心修改：直接读取数据库中已有的分析结果，不再重复造轮子 ★★★
-    
-    # 1. 获取字幕语言列表 (例如 ['chi', 'eng'])
-    # parse_full_asset_details 已经帮我们生成了这个字段
-    subtitle_langs = version.get('subtitle_languages_raw', [])
-    
-    # 2. 获取字幕数量
-    # 优先使用 raw 列表的长度，如果列表为空但有 display 字符串，尝试解析一下（兜底）
-    subtitle_count = len(subtitle_langs)
-    if subtitle_count == 0:
-        # 尝试从原始 subtitles 列表获取长度 (如果存在)
-        raw_subs = version.get('subtitles', [])
-        if raw_subs:
-            subtitle_count = len(raw_subs)
-
-    # 3. 获取其他标准化属性 (直接读，或者做简单的归一化)
-    quality = str(version.get("quality_display", "未知")).lower().replace("bluray", "blu-ray").replace("webdl", "web-dl")
-    resolution = version.get("resolution_display", "未知")
-    
-    # 特效处理：数据库里存的是 display 格式 (如 "DoVi_P8")，我们需要转成小写 (如 "dovi_p8") 以便比较
-    effect_raw = version.get("effect_display", "SDR")
-    # 兼容旧数据可能是列表的情况
-    if isinstance(effect_raw, list):
-        effect_raw = effect_raw[0] if effect_raw else "SDR"
-    effect = str(effect_raw).lower()
-
-    codec = version.get("codec_display", "未知")
-
-    raw_id = version.get("emby_item_id")
-    int_id = int(raw_id) if raw_id and str(raw_id).isdigit() else 0
-
-    return {
-        "id": version.get("emby_item_id"),
-        "path": version.get("path"),
-        
-        "quality": quality,
-        "resolution": resolution,
-        "effect": effect,
-        "codec": codec,
-        
-        "filesize": version.get("size_bytes", 0),
-        "video_bitrate_mbps": version.get("video_bitrate_mbps") or 0,
-        "bit_depth": version.get("bit_depth") or 8,
-        "frame_rate": version.get("frame_rate") or 0,
-        "runtime_minutes": version.get("runtime_minutes") or 0,
-        "date_added": version.get("date_added_to_library") or "",
-        "int_id": int_id,
-        "subtitle_count": subtitle_count,
-        "subtitle_languages": subtitle_langs
-    }
-
-def _compare_versions(v1: Dict[str, Any], v2: Dict[str, Any], rules: List[Dict[str, Any]]) -> int:
-    """
-    比较两个版本 v1 和 v2。
-    返回: 1 (v1优), -1 (v2优), 0 (相当)
-    """
-    for rule in rules:
-        if not rule.get('enabled'):
-            continue
-            
-        rule_type = rule.get('id')
-        # 获取偏好设置，默认为 'desc' (降序，即大/高优先)
-        preference = rule.get('priority', 'desc')
-        
-        # --- 1. 按码率 (Bitrate) ---
-        if rule_type == 'bitrate':
-            br1 = v1.get('video_bitrate_mbps') or 0
-            br2 = v2.get('video_bitrate_mbps') or 0
-            if abs(br1 - br2) > 1.0: # 1Mbps 容差
-                if preference == 'asc':
-                    return 1 if br1 < br2 else -1 # 保留低码率
-                else:
-                    return 1 if br1 > br2 else -1 # 保留高码率 (默认)
-
-        # --- 2. 按色深 (Bit Depth) ---
-        elif rule_type == 'bit_depth':
-            bd1 = v1.get('bit_depth') or 8
-            bd2 = v2.get('bit_depth') or 8
-            if bd1 != bd2:
-                if preference == 'asc':
-                    return 1 if bd1 < bd2 else -1 # 保留低色深 (8bit)
-                else:
-                    return 1 if bd1 > bd2 else -1 # 保留高色深 (10bit)
-
-        # --- 3. 按帧率 (Frame Rate) ---
-        elif rule_type == 'frame_rate':
-            fr1 = v1.get('frame_rate') or 0
-            fr2 = v2.get('frame_rate') or 0
-            if abs(fr1 - fr2) > 2.0: # 2fps 容差
-                if preference == 'asc':
-                    return 1 if fr1 < fr2 else -1 # 保留低帧率 (24fps)
-                else:
-                    return 1 if fr1 > fr2 else -1 # 保留高帧率 (60fps)
-
-        # --- 4. 按时长 (Runtime) ---
-        elif rule_type == 'runtime':
-            rt1 = v1.get('runtime_minutes') or 0
-            rt2 = v2.get('runtime_minutes') or 0
-            if abs(rt1 - rt2) > 2: # 2分钟容差
-                if preference == 'asc':
-                    return 1 if rt1 < rt2 else -1 # 保留短时长
-                else:
-                    return 1 if rt1 > rt2 else -1 # 保留长时长
-
-        # --- 5. 按文件大小 ---
-        elif rule_type == 'filesize':
-            fs1 = v1.get('filesize') or 0
-            fs2 = v2.get('filesize') or 0
-            # 文件大小通常差异明显，直接比
-            if fs1 != fs2:
-                if preference == 'asc':
-                    return 1 if fs1 < fs2 else -1 # 保留小体积
-                else:
-                    return 1 if fs1 > fs2 else -1 # 保留大体积
-
-        # --- 6. 按列表优先级 (分辨率, 质量, 特效, 编码) ---
-        elif rule_type in ['resolution', 'quality', 'effect', 'codec']:
-            val1 = v1.get(rule_type)
-            val2 = v2.get(rule_type)
-            priority_list = rule.get("priority", [])
-            
-            # 标准化处理
-            if rule_type == "resolution":
-                def normalize_res(res):
-                    s = str(res).lower()
-                    if s == '2160p': return '4k'
-                    return s
-                priority_list = [normalize_res(p) for p in priority_list]
-                val1 = normalize_res(val1)
-                val2 = normalize_res(val2)
-
-            elif rule_type == "quality":
-                priority_list = [str(p).lower().replace("bluray", "blu-ray").replace("webdl", "web-dl") for p in priority_list]
-            
-            elif rule_type == "effect":
-                priority_list = [str(p).lower().replace(" ", "_") for p in priority_list]
-
-            elif rule_type == "codec":
-                def normalize_codec(c):
-                    s = str(c).upper()
-                    if s in ['H265', 'X265']: return 'HEVC'
-                    if s in ['H264', 'X264', 'AVC']: return 'H.264'
-                    return s
-                priority_list = [normalize_codec(p) for p in priority_list]
-                val1 = normalize_codec(val1)
-                val2 = normalize_codec(val2)
-
-            try:
-                idx1 = priority_list.index(val1) if val1 in priority_list else 999
-                idx2 = priority_list.index(val2) if val2 in priority_list else 999
-                if idx1 != idx2:
-                    return 1 if idx1 < idx2 else -1 # 索引越小优先级越高
-            except (ValueError, TypeError):
-                continue
-        
-        # --- 7. ★★★ 新增：按字幕 (Subtitle) ★★★ ---
-        elif rule_type == 'subtitle':
-            # 优先比较是否有中文字幕
-            has_chi1 = 'chi' in v1.get('subtitle_languages', []) or 'yue' in v1.get('subtitle_languages', [])
-            has_chi2 = 'chi' in v2.get('subtitle_languages', []) or 'yue' in v2.get('subtitle_languages', [])
-            
-            if has_chi1 != has_chi2:
-                # 有中文的优先
-                return 1 if has_chi1 else -1
-            return 0
-
-        # --- 8. 按入库时间 (Date Added / ID) ---
-        elif rule_type == 'date_added':
-            # 1. 优先比较日期字符串 (ISO格式字符串可以直接比较大小)
-            d1 = v1.get('date_added')
-            d2 = v2.get('date_added')
-            
-            if d1 and d2 and d1 != d2:
-                if preference == 'asc':
-                    return 1 if d1 < d2 else -1 # 保留最早入库 (Oldest)
-                else:
-                    return 1 if d1 > d2 else -1 # 保留最新入库 (Newest)
-            
-            # 2. 如果日期相同或无效，使用 ID 进行兜底比较
-            id1 = v1.get('int_id')
-            id2 = v2.get('int_id')
-            
-            if id1 != id2:
-                if preference == 'asc':
-                    return 1 if id1 < id2 else -1 # 保留ID小的 (最早)
-                else:
-                    return 1 if id1 > id2 else -1 # 保留ID大的 (最新)
-
-    return 0
-
-def _determine_best_version_by_rules(versions: List[Dict[str, Any]]) -> Optional[str]:
-    """
-    根据规则决定最佳版本，返回最佳版本的 ID。
-    """
-    # 获取规则，如果没有则使用默认全集
-    rules = settings_db.get_setting('media_cleanup_rules')
-    if not rules:
-        rules = [
-            {"id": "runtime", "enabled": True}, # 时长优先
-            {"id": "effect", "enabled": True, "priority": ["dovi_p8", "dovi_p7", "dovi_p5", "dovi_other", "hdr10+", "hdr", "sdr"]},
-            {"id": "resolution", "enabled": True, "priority": ["4k", "1080p", "720p", "480p"]},
-            {"id": "bit_depth", "enabled": True}, # 色深
-            {"id": "bitrate", "enabled": True},   # 码率
-            {"id": "codec", "enabled": True, "priority": ["AV1", "HEVC", "H.264", "VP9"]},
-            {"id": "quality", "enabled": True, "priority": ["remux", "blu-ray", "web-dl", "hdtv"]},
-            # ★★★ 新增默认规则：字幕 ★★★
-            {"id": "subtitle", "enabled": True, "priority": "desc"}, # 字幕多的/有中文的优先
-            {"id": "frame_rate", "enabled": False}, # 帧率默认关闭
-            {"id": "filesize", "enabled": True},
-            {"id": "date_added", "enabled": True, "priority": "asc"}
-        ]
-
-    # 提取属性
-    version_properties = [_get_properties_for_comparison(v) for v in versions if v]
-
-    # 使用自定义比较函数排序
-    # cmp_to_key 需要一个返回负数、0、正数的函数，逻辑与我们的 _compare_versions (1, -1) 相反
-    # 我们定义的 _compare_versions: 1 (v1优), -1 (v2优)
-    # sort(reverse=True): 大的排前面。所以 v1 优于 v2 时，cmp 应返回 1
-    def compare_wrapper(v1, v2):
-        return _compare_versions(v1, v2, rules)
-
-    sorted_versions = sorted(version_properties, key=cmp_to_key(compare_wrapper), reverse=True)
-    
-    return sorted_versions[0]['id'] if sorted_versions else None
-
 # ======================================================================
 # 任务函数
 # ======================================================================
@@ -323,8 +82,24 @@ def task_scan_for_cleanup_issues(processor):
         #    - 如果是 Episode，检查其 parent_series_tmdb_id 是否在 allowed_series_tmdb_ids 中
         #    这样就完美继承了 Series 的目录权限
         
+        #    最佳版本直接在 SQL 中按预先计算的排序键 (rank_key) 选出；
+        #    只有排序键缺失或规则已变化的条目才回退到 Python 现场计算。
+        rules, rules_hash = get_cleanup_rules()
         sql_query = sql.SQL("""
-            SELECT t.tmdb_id, t.item_type, t.asset_details_json
+            SELECT 
+                t.tmdb_id, t.item_type, t.title, t.asset_details_json,
+                md5(t.asset_details_json::text) AS asset_hash,
+                (
+                    SELECT v.elem->>'emby_item_id'
+                    FROM jsonb_array_elements(t.asset_details_json) WITH ORDINALITY AS v(elem, ord)
+                    ORDER BY v.elem->'rank_key' DESC NULLS LAST, v.ord ASC
+                    LIMIT 1
+                ) AS ranked_best_id,
+                NOT EXISTS (
+                    SELECT 1 FROM jsonb_array_elements(t.asset_details_json) AS v(elem)
+                    WHERE v.elem->>'rank_rules_hash' IS DISTINCT FROM %(rules_hash)s
+                       OR jsonb_typeof(v.elem->'rank_key') IS DISTINCT FROM 'array'
+                ) AS rank_keys_fresh
             FROM media_metadata AS t
             WHERE 
                 t.in_library = TRUE 
@@ -338,7 +113,8 @@ def task_scan_for_cleanup_issues(processor):
         
         params = {
             'movie_ids': allowed_movie_tmdb_ids,
-            'series_ids': allowed_series_tmdb_ids
+            'series_ids': allowed_series_tmdb_ids,
+            'rules_hash': rules_hash
         }
 
         with connection.get_db_connection() as conn:
@@ -352,19 +128,25 @@ def task_scan_for_cleanup_issues(processor):
             task_manager.update_status_from_thread(100, "扫描完成：未发现任何多版本媒体。")
             return
 
+        # 排序键过期的条目：重新计算并回写，下次扫描即可完全走 SQL
+        stale_items = [item for item in multi_version_items if not item['rank_keys_fresh']]
+        if stale_items:
+            logger.info(f"  ➜ {len(stale_items)} 组媒体的版本排序键缺失或规则已变化，正在重新计算...")
+            rank_key_updates = []
+            for item in stale_items:
+                for v in item['asset_details_json'] or []:
+                    annotate_version_rank(v, rules, rules_hash)
+                rank_key_updates.append((item['tmdb_id'], item['item_type'], item['asset_hash'], item['asset_details_json']))
+            cleanup_db.batch_update_asset_rank_keys(rank_key_updates)
+
         task_manager.update_status_from_thread(10, f"发现 {total_items} 组多版本媒体，开始分析...")
         
         cleanup_index_entries = []
         for i, item in enumerate(multi_version_items):
-            progress = 10 + int((i / total_items) * 80)
-            # 获取标题用于日志
-            with connection.get_db_connection() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute("SELECT title FROM media_metadata WHERE tmdb_id = %s AND item_type = %s", (item['tmdb_id'], item['item_type']))
-                    title_row = cursor.fetchone()
-                    display_title = title_row['title'] if title_row else '未知媒体'
-            
-            task_manager.update_status_from_thread(progress, f"({i+1}/{total_items}) 正在分析: {display_title}")
+            if i % 200 == 0:
+                progress = 10 + int((i / total_items) * 80)
+                display_title = item.get('title') or '未知媒体'
+                task_manager.update_status_from_thread(progress, f"({i+1}/{total_items}) 正在分析: {display_title}")
 
             versions_from_db = item['asset_details_json']
             raw_versions = item['asset_details_json']
@@ -391,14 +173,14 @@ def task_scan_for_cleanup_issues(processor):
                 res_groups = defaultdict(list)
                 for v in versions_from_db:
                     # 获取标准化后的分辨率 (例如 "4K", "1080p")
-                    props = _get_properties_for_comparison(v)
+                    props = get_version_properties(v)
                     res_key = props.get('resolution', 'unknown')
                     res_groups[res_key].append(v)
                 
                 # 2. 在每组内选出最佳
                 best_ids_set = set()
                 for res, group_versions in res_groups.items():
-                    best_in_group = _determine_best_version_by_rules(group_versions)
+                    best_in_group = pick_best_version_id(group_versions, rules, rules_hash)
                     if best_in_group:
                         best_ids_set.add(best_in_group)
                 
@@ -412,12 +194,16 @@ def task_scan_for_cleanup_issues(processor):
                 
             else:
                 # --- 模式 B: 传统模式 (只留一个) ---
-                best_id_or_ids = _determine_best_version_by_rules(versions_from_db)
+                # 排序键新鲜时直接采用 SQL 选出的最佳版本
+                if item['rank_keys_fresh'] and item['ranked_best_id']:
+                    best_id_or_ids = item['ranked_best_id']
+                else:
+                    best_id_or_ids = pick_best_version_id(versions_from_db, rules, rules_hash)
 
             # 构建前端展示用的精简信息
             versions_for_frontend = []
             for v in versions_from_db:
-                props = _get_properties_for_comparison(v)
+                props = get_version_properties(v)
                 versions_for_frontend.append({
                     'id': v.get('emby_item_id'),
                     'path': v.get('path'),
@@ -485,6 +271,7 @@ def task_execute_cleanup(processor, task_ids: List[int], **kwargs):
             if processor.is_stop_requested():
                 logger.warning("  🚫 任务被用户中止。")
                 break
+            metrics.record_items_processed()
             
             with connection.get_db_connection() as conn:
                 with conn.cursor() as cursor:
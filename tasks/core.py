@@ -4,6 +4,7 @@
 import time
 import threading
 import logging
+from typing import Optional, Set
 
 import constants
 import extensions
@@ -21,6 +22,7 @@ from .subscriptions import task_auto_subscribe, task_manual_subscribe_batch
 from .covers import task_generate_all_covers, task_generate_all_custom_collection_covers
 from .cleanup import task_scan_for_cleanup_issues 
 from .users import task_sync_all_user_data, task_check_expired_users
+from .playback import task_sync_playback_history
 from .discover import task_update_daily_theme
 from .resubscribe import task_update_resubscribe_cache, task_resubscribe_library
 from .vector_tasks import task_generate_embeddings
@@ -29,6 +31,20 @@ from handler.p115_service import task_scan_and_organize_115, task_sync_115_direc
 
 logger = logging.getLogger(__name__)
 
+# 在独立工作进程中执行的任务 (CPU 密集：图片渲染、大批量 JSON 解析、资产解析等)。
+# 这些任务只通过数据库/文件/Emby 产生副作用；已处理记录的变化通过 cache_events 同步回主进程。
+PROCESS_ISOLATED_TASK_KEYS = {
+    'task-chain-high-freq', 'task-chain-low-freq',
+    'populate-metadata', 'generate-all-covers', 'generate-custom-collection-covers',
+    'custom-collections', 'process_all_custom_collections', 'update-resubscribe-cache',
+    'scan-cleanup-issues', 'restore-cache-from-db', 'generate_embeddings',
+}
+# 任务链 -> 其任务序列的配置键
+CHAIN_SEQUENCE_CONFIG_KEYS = {
+    'task-chain-high-freq': constants.CONFIG_OPTION_TASK_CHAIN_SEQUENCE,
+    'task-chain-low-freq': constants.CONFIG_OPTION_TASK_CHAIN_LOW_FREQ_SEQUENCE,
+}
+
 def _task_run_chain_internal(processor, task_name: str, sequence_config_key: str, max_runtime_config_key: str):
     """
     【V10 - 内部通用任务链执行器】
@@ -198,6 +214,7 @@ def get_task_registry(context: str = 'all'):
         'purge-ghost-actors': (task_purge_ghost_actors, "删除幽灵演员", 'media', True),
         'sync-all-user-data': (task_sync_all_user_data, "同步用户数据", 'media', True),
         'check-expired-users': (task_check_expired_users, "检查过期用户", 'media', True),
+        'sync-playback-history': (task_sync_playback_history, "同步播放统计", 'media', True),
         'generate_embeddings': (task_generate_embeddings, "生成媒体向量", 'media', True),
         'sync_ratings_to_emby': (task_sync_ratings_to_emby, "同步分级数据", 'media', True),
         'refresh_completed_series': (task_refresh_completed_series, "全量刷新剧集", 'watchlist', True),
@@ -233,4 +250,19 @@ def get_task_registry(context: str = 'all'):
     return {
         key: (info[0], info[1], info[2]) 
         for key, info in full_registry.items()
-    }
\ No newline at end of file
+    }
+
+def get_required_processor_types(task_key: str, config: dict) -> Set[str]:
+    """工作进程执行该任务需要初始化的处理器类型 (任务链按其任务序列汇总，且总是需要 media)。"""
+    registry = get_task_registry(context='all')
+    task_keys = [task_key]
+    if task_key in CHAIN_SEQUENCE_CONFIG_KEYS:
+        task_keys += list(config.get(CHAIN_SEQUENCE_CONFIG_KEYS[task_key]) or [])
+    return {registry[key][2] for key in task_keys if key in registry and len(registry[key]) >= 3}
+
+def get_process_isolated_task_key(task_function) -> Optional[str]:
+    """如果任务函数属于需要在独立进程中执行的任务，返回其注册 Key，否则返回 None。"""
+    for key, info in get_task_registry(context='all').items():
+        if info[0] is task_function and key in PROCESS_ISOLATED_TASK_KEYS:
+            return key
+    return None
\ No newline at end of file
@@ -6,6 +6,7 @@ import logging
 # 导入需要的底层模块和共享实例
 import handler.emby as emby
 import task_manager
+import metrics
 from database import custom_collection_db, settings_db
 from services.cover_generator import CoverGeneratorService
 from .custom_collections import _get_cover_badge_text_for_collection
@@ -83,6 +84,7 @@ def task_generate_all_covers(processor):
 
         for i, library in enumerate(libraries_to_process):
             if processor.is_stop_requested(): break
+            metrics.record_items_processed()
             
             progress = 10 + int((i / total) * 90)
             task_manager.update_status_from_thread(progress, f"({i+1}/{total}) 正在处理: {library.get('Name')}")
@@ -168,6 +170,7 @@ def task_generate_all_custom_collection_covers(processor):
         
         for i, collection_db_info in enumerate(collections_to_process):
             if processor.is_stop_requested(): break
+            metrics.record_items_processed()
             
             collection_name = collection_db_info.get('name')
             emby_collection_id = collection_db_info.get('emby_collection_id')
@@ -5,8 +5,10 @@ import json
 import logging
 import pytz
 import time
+import threading
+import concurrent.futures
 from datetime import datetime
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 
 # 导入需要的底层模块和共享实例
 import handler.emby as emby
@@ -19,6 +21,7 @@ from handler.poster_generator import cleanup_placeholder, sync_all_subscription_
 from tasks.helpers import process_subscription_items_and_update_db
 import constants
 import config_manager
+import cache_events
 
 logger = logging.getLogger(__name__)
 
@@ -102,6 +105,275 @@ def _get_cover_badge_text_for_collection(collection_db_info: Dict[str, Any]) ->
     return item_count_to_pass
 
 # ★★★ 一键生成所有合集的后台任务 (重构版) ★★★
+# --- 并发刷新配置 ---
+COLLECTION_REFRESH_MAX_WORKERS = 4
+# 各类榜单源的并发上限 (猫眼需要串行并保持间隔，豆瓣/AI 容易触发风控)
+SOURCE_CONCURRENCY_LIMITS = {'maoyan': 1, 'douban': 1, 'ai': 1, 'tmdb': 3, 'rss': 2}
+
+def _get_collection_source_kinds(collection: Dict[str, Any]) -> List[str]:
+    """识别合集涉及的榜单源类型，用于获取对应的并发名额。"""
+    if collection['type'] == 'ai_recommendation_global':
+        return ['ai']
+    raw_url = (collection.get('definition_json') or {}).get('url', '')
+    urls = raw_url if isinstance(raw_url, list) else [raw_url]
+    kinds = set()
+    for url in urls:
+        if not isinstance(url, str) or not url:
+            continue
+        if url.startswith('maoyan://'):
+            kinds.add('maoyan')
+        elif 'douban.com' in url:
+            kinds.add('douban')
+        elif 'themoviedb.org' in url:
+            kinds.add('tmdb')
+        else:
+            kinds.add('rss')
+    # 固定顺序获取信号量，避免多个合集交叉持有导致死锁
+    return sorted(kinds)
+
+def _get_stored_items(collection: Dict[str, Any]) -> List[Dict[str, Any]]:
+    stored = collection.get('generated_media_info_json') or []
+    if isinstance(stored, str):
+        try: stored = json.loads(stored)
+        except Exception: stored = []
+    return stored if isinstance(stored, list) else []
+
+def _remap_stored_items(stored_items: List[Dict[str, Any]], tmdb_to_emby_item_map: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """上游榜单未变化时复用上次的匹配结果，只按当前媒体库重新映射 Emby ID。"""
+    items, ordered_emby_ids = [], []
+    for stored in stored_items:
+        item = dict(stored)
+        if item.get('season_tmdb_id'):
+            key = f"{item['season_tmdb_id']}_Season"
+        else:
+            key = f"{item.get('tmdb_id')}_{item.get('media_type')}"
+        entry = tmdb_to_emby_item_map.get(key) if item.get('tmdb_id') else None
+        item['emby_id'] = entry['Id'] if entry else None
+        items.append(item)
+        if item['emby_id']:
+            ordered_emby_ids.append(item['emby_id'])
+    return items, ordered_emby_ids
+
+def _refresh_single_list_collection(processor, collection: Dict[str, Any], context: Dict[str, Any]) -> str:
+    """
+    刷新单个榜单/全局AI合集，返回处理结果: 'unchanged' / 'remapped' / 'updated' / 'emptied'。
+    - 上游指纹未变：跳过 TMDb 匹配与拆季，复用上次结果；
+    - 最终在库成员未变：跳过 Emby 实体合集重写与封面重新生成。
+    """
+    collection_id = collection['id']
+    collection_name = collection['name']
+    collection_type = collection['type']
+    definition = collection['definition_json']
+    tmdb_to_emby_item_map = context['tmdb_to_emby_item_map']
+
+    stored_items = _get_stored_items(collection)
+    previous_emby_ids = [i.get('emby_id') for i in stored_items if i.get('emby_id')]
+
+    # 1. 抓取上游并计算指纹
+    if collection_type == 'list':
+        importer = ListImporter(processor.tmdb_api_key)
+        fetched_sources = importer.fetch_sources(definition)
+        source_fingerprint = ListImporter.fingerprint_sources(definition, fetched_sources)
+    else:
+        # ai_recommendation_global
+        from handler.custom_collection import RecommendationEngine
+        rec_engine = RecommendationEngine(processor.tmdb_api_key)
+        ai_items = rec_engine.generate(definition)
+        fetched_sources = [{'url': 'ai_recommendation_global', 'items': ai_items or []}]
+        source_fingerprint = ListImporter.fingerprint_sources(definition, fetched_sources)
+
+    source_unchanged = bool(stored_items) and source_fingerprint == collection.get('source_fingerprint')
+
+    if source_unchanged:
+        logger.info(f"  ➜ 合集 '{collection_name}' 的上游榜单未变化，跳过 TMDb 匹配，复用上次结果。")
+        tmdb_items, global_ordered_emby_ids = _remap_stored_items(stored_items, tmdb_to_emby_item_map)
+    else:
+        if collection_type == 'list':
+            raw_tmdb_items, _ = importer.match_sources(definition, fetched_sources)
+        else:
+            raw_tmdb_items = ai_items
+
+        # ==============================================================================
+        # ★★★ 新增逻辑：如果源数据为空，则删除合集并跳过 ★★★
+        # ==============================================================================
+        if not raw_tmdb_items:
+            logger.info(f"  ➜ 合集 '{collection_name}' 的外部源未返回任何数据 (真空壳)。")
+            logger.info(f"  ➜ 正在尝试从 Emby 中移除该合集 (如果存在)...")
+            
+            # 调用 Emby 模块删除合集
+            is_deleted = emby.delete_collection_by_name(
+                collection_name=collection_name,
+                base_url=processor.emby_url,
+                api_key=processor.emby_api_key,
+                user_id=processor.emby_user_id
+            )
+            
+            # 更新数据库状态为 0
+            update_data = {
+                "emby_collection_id": None, # ID 置空
+                "last_synced_at": datetime.now(pytz.utc),
+                "in_library_count": 0,
+                "generated_media_info_json": json.dumps([], ensure_ascii=False),
+                "source_fingerprint": None
+            }
+            custom_collection_db.update_custom_collection_sync_results(collection_id, update_data)
+            
+            if is_deleted:
+                logger.info(f"  ✅ 合集 '{collection_name}' 已清理完毕。")
+            else:
+                logger.info(f"  ➜ 合集 '{collection_name}' 在 Emby 中不存在，无需清理。")
+            return 'emptied'
+
+        # 应用修正
+        raw_tmdb_items, corrected_id_to_original_id_map = _apply_id_corrections(raw_tmdb_items, definition, collection_name)
+        
+        # 映射 Emby ID
+        tmdb_items = []
+        global_ordered_emby_ids = [] # 用于同步给 Emby 实体合集 (封面素材)
+        for item in raw_tmdb_items:
+            tmdb_id = str(item.get('id')) if item.get('id') else None
+            media_type = item.get('type')
+            
+            # ★★★ 新增：如果是 Series 且没有指定季，尝试拆解 ★★★
+            if media_type == 'Series' and 'season' not in item:
+                # 尝试获取详情以拆解季
+                try:
+                    # 只有当它是榜单类时才拆解，AI推荐类通常不需要这么细
+                    if collection_type == 'list':
+                        series_details = tmdb.get_tv_details(tmdb_id, processor.tmdb_api_key)
+                        if series_details and 'seasons' in series_details:
+                            seasons = series_details['seasons']
+                            series_name = series_details.get('name')
+                            
+                            # 标记是否已添加至少一个季
+                            added_season = False
+                            
+                            for season in seasons:
+                                s_num = season.get('season_number')
+                                if s_num is None or s_num == 0: continue
+                                
+                                s_id = str(season.get('id'))
+                                
+                                # 检查该季是否在库
+                                emby_id = None
+                                key = f"{s_id}_Season"
+                                if key in tmdb_to_emby_item_map:
+                                    emby_id = tmdb_to_emby_item_map[key]['Id']
+                                
+                                # 构造季条目 (记录季的 TMDb ID，便于上游未变化时重新映射)
+                                season_item = {
+                                    'tmdb_id': tmdb_id,
+                                    'media_type': 'Series',
+                                    'emby_id': emby_id,
+                                    'title': series_name,
+                                    'season': s_num,
+                                    'season_tmdb_id': s_id
+                                }
+                                tmdb_items.append(season_item)
+                                if emby_id: global_ordered_emby_ids.append(emby_id)
+                                added_season = True
+                            
+                            if added_season:
+                                continue # 如果成功拆解了季，就跳过原始 Series 条目
+                except Exception as e_split:
+                    logger.warning(f"拆解剧集 {tmdb_id} 失败，将保留原条目: {e_split}")
+            emby_id = item.get('emby_id')
+            
+            if not emby_id and tmdb_id:
+                key = f"{tmdb_id}_{media_type}"
+                if key in tmdb_to_emby_item_map:
+                    emby_id = tmdb_to_emby_item_map[key]['Id']
+            
+            processed_item = {
+                'tmdb_id': tmdb_id,
+                'media_type': media_type,
+                'emby_id': emby_id,
+                'title': item.get('title'),
+                **({'season': item['season']} if 'season' in item and item.get('season') is not None else {})
+            }
+            tmdb_items.append(processed_item)
+            
+            if emby_id:
+                global_ordered_emby_ids.append(emby_id)
+
+    # 执行健康检查 (榜单类和全局AI推荐都需要)
+    # 作用：对比 TMDB 列表和本地库，自动订阅缺失的媒体 (上游未变化时也要检查，缺失项可能已入库或被删除)
+    subscription_source = {
+        "type": "custom_collection",
+        "id": collection_id,
+        "name": collection_name
+    }
+    process_subscription_items_and_update_db(
+        tmdb_items=tmdb_items, 
+        tmdb_to_emby_item_map=tmdb_to_emby_item_map, 
+        subscription_source=subscription_source,
+        tmdb_api_key=processor.tmdb_api_key
+    )
+
+    # 榜单/全局AI类需要全量存储，因为反向代理层无法实时爬虫
+    items_for_db = tmdb_items
+    total_count = len(global_ordered_emby_ids)
+
+    # 2. 在库成员未变化且 Emby 实体合集仍在：无需重写合集和封面
+    # 记录的合集 ID 必须仍存在于 Emby 中，否则 (合集已在 Emby 中被删除) 走下面的重建流程
+    emby_collection_id = collection.get('emby_collection_id')
+    existing_collection = context['prefetched_collection_map'].get(collection_name.lower())
+    collection_still_exists = bool(existing_collection) and existing_collection.get('Id') == emby_collection_id
+    if emby_collection_id and collection_still_exists and global_ordered_emby_ids == previous_emby_ids:
+        update_data = {
+            "last_synced_at": datetime.now(pytz.utc),
+            "source_fingerprint": source_fingerprint
+        }
+        if not source_unchanged:
+            update_data["generated_media_info_json"] = json.dumps(items_for_db, ensure_ascii=False)
+        custom_collection_db.update_custom_collection_sync_results(collection_id, update_data)
+        logger.info(f"  ➜ 合集 '{collection_name}' 在库成员未变化，跳过 Emby 合集同步与封面生成。")
+        return 'unchanged'
+
+    # 3. 更新 Emby 实体合集 (用于封面)
+    emby_collection_id = emby.create_or_update_collection_with_emby_ids(
+        collection_name=collection_name, 
+        emby_ids_in_library=global_ordered_emby_ids,
+        base_url=processor.emby_url, 
+        api_key=processor.emby_api_key, 
+        user_id=processor.emby_user_id,
+        prefetched_collection_map=context['prefetched_collection_map'],
+        allow_empty=True  # 榜单/全局AI 允许空合集
+    )
+
+    # 4. 更新数据库状态
+    update_data = {
+        "emby_collection_id": emby_collection_id,
+        "item_type": json.dumps(definition.get('item_type', ['Movie'])),
+        "last_synced_at": datetime.now(pytz.utc),
+        "in_library_count": total_count, # 保存真实总数
+        "generated_media_info_json": json.dumps(items_for_db, ensure_ascii=False),
+        "source_fingerprint": source_fingerprint
+    }
+    custom_collection_db.update_custom_collection_sync_results(collection_id, update_data)
+
+    # 5. 封面生成 (封面绘制共用一个服务实例，串行执行)
+    cover_service = context['cover_service']
+    if cover_service and emby_collection_id:
+        try:
+            library_info = emby.get_emby_item_details(emby_collection_id, processor.emby_url, processor.emby_api_key, processor.emby_user_id)
+            if library_info:
+                # 重新获取一次最新的 info 以确保 count 准确
+                latest_collection_info = custom_collection_db.get_custom_collection_by_id(collection_id)
+                item_count_to_pass = _get_cover_badge_text_for_collection(latest_collection_info)
+                with context['cover_lock']:
+                    cover_service.generate_for_library(
+                        emby_server_id='main_emby', 
+                        library=library_info,
+                        item_count=item_count_to_pass, 
+                        content_types=definition.get('item_type', ['Movie']),
+                        custom_collection_data=latest_collection_info  
+                    )
+        except Exception as e_cover:
+            logger.error(f"为合集 '{collection_name}' 生成封面时出错: {e_cover}", exc_info=True)
+
+    return 'remapped' if source_unchanged else 'updated'
+
 def task_process_all_custom_collections(processor):
     """
     一键生成所有合集的后台任务 (轻量化版 - 仅刷新外部数据源)。
@@ -146,211 +418,53 @@ def task_process_all_custom_collections(processor):
         except Exception: pass
 
         total_collections = len(active_collections)
+        context = {
+            'tmdb_to_emby_item_map': tmdb_to_emby_item_map,
+            'prefetched_collection_map': prefetched_collection_map,
+            'cover_service': cover_service,
+            'cover_lock': threading.Lock(),
+        }
+        source_semaphores = {kind: threading.BoundedSemaphore(limit) for kind, limit in SOURCE_CONCURRENCY_LIMITS.items()}
+        progress_lock = threading.Lock()
+        outcome_counts = {'unchanged': 0, 'remapped': 0, 'updated': 0, 'emptied': 0, 'failed': 0}
+        finished = [0]
 
-        for i, collection in enumerate(active_collections):
-            if processor.is_stop_requested(): break
-
-            collection_id = collection['id']
+        def _worker(collection):
             collection_name = collection['name']
-            collection_type = collection['type']
-            definition = collection['definition_json']
-            
-            progress = 20 + int((i / total_collections) * 75)
-            task_manager.update_status_from_thread(progress, f"({i+1}/{total_collections}) 正在处理: {collection_name}")
-
+            if processor.is_stop_requested():
+                return
+            source_kinds = _get_collection_source_kinds(collection)
+            for kind in source_kinds:
+                source_semaphores[kind].acquire()
             try:
-                global_ordered_emby_ids = [] # 用于同步给 Emby 实体合集 (封面素材)
-                items_for_db = []            # 用于存入 generated_media_info_json
-                total_count = 0              # 用于角标
-
-                # 榜单/推荐类 (List/AI Global) - 全量模式
-                raw_tmdb_items = []
-                if collection_type == 'list':
-                    importer = ListImporter(processor.tmdb_api_key)
-                    raw_tmdb_items, _ = importer.process(definition)
-                else:
-                    # ai_recommendation_global
-                    from handler.custom_collection import RecommendationEngine
-                    rec_engine = RecommendationEngine(processor.tmdb_api_key)
-                    raw_tmdb_items = rec_engine.generate(definition)
-
-                # ==============================================================================
-                # ★★★ 新增逻辑：如果源数据为空，则删除合集并跳过 ★★★
-                # ==============================================================================
-                if not raw_tmdb_items:
-                    logger.info(f"  ➜ 合集 '{collection_name}' 的外部源未返回任何数据 (真空壳)。")
-                    logger.info(f"  ➜ 正在尝试从 Emby 中移除该合集 (如果存在)...")
-                    
-                    # 调用 Emby 模块删除合集
-                    is_deleted = emby.delete_collection_by_name(
-                        collection_name=collection_name,
-                        base_url=processor.emby_url,
-                        api_key=processor.emby_api_key,
-                        user_id=processor.emby_user_id
-                    )
-                    
-                    # 更新数据库状态为 0
-                    update_data = {
-                        "emby_collection_id": None, # ID 置空
-                        "last_synced_at": datetime.now(pytz.utc),
-                        "in_library_count": 0,
-                        "generated_media_info_json": json.dumps([], ensure_ascii=False)
-                    }
-                    custom_collection_db.update_custom_collection_sync_results(collection_id, update_data)
-                    
-                    if is_deleted:
-                        logger.info(f"  ✅ 合集 '{collection_name}' 已清理完毕。")
-                    else:
-                        logger.info(f"  ➜ 合集 '{collection_name}' 在 Emby 中不存在，无需清理。")
-                        
-                    continue # 跳过本次循环，处理下一个合集
-
-                # 应用修正
-                raw_tmdb_items, corrected_id_to_original_id_map = _apply_id_corrections(raw_tmdb_items, definition, collection_name)
-                
-                # 映射 Emby ID
-                tmdb_items = []
-                for item in raw_tmdb_items:
-                    tmdb_id = str(item.get('id')) if item.get('id') else None
-                    media_type = item.get('type')
-                    
-                    # ★★★ 新增：如果是 Series 且没有指定季，尝试拆解 ★★★
-                    if media_type == 'Series' and 'season' not in item:
-                        # 尝试获取详情以拆解季
-                        try:
-                            # 只有当它是榜单类时才拆解，AI推荐类通常不需要这么细
-                            if collection_type == 'list':
-                                series_details = tmdb.get_tv_details(tmdb_id, processor.tmdb_api_key)
-                                if series_details and 'seasons' in series_details:
-                                    seasons = series_details['seasons']
-                                    series_name = series_details.get('name')
-                                    
-                                    # 标记是否已添加至少一个季
-                                    added_season = False
-                                    
-                                    for season in seasons:
-                                        s_num = season.get('season_number')
-                                        if s_num is None or s_num == 0: continue
-                                        
-                                        s_id = str(season.get('id'))
-                                        
-                                        # 检查该季是否在库
-                                        emby_id = None
-                                        key = f"{s_id}_Season"
-                                        if key in tmdb_to_emby_item_map:
-                                            emby_id = tmdb_to_emby_item_map[key]['Id']
-                                        
-                                        # 构造季条目
-                                        season_item = {
-                                            'tmdb_id': tmdb_id,
-                                            'media_type': 'Series',
-                                            'emby_id': emby_id,
-                                            'title': series_name,
-                                            'season': s_num
-                                        }
-                                        tmdb_items.append(season_item)
-                                        if emby_id: global_ordered_emby_ids.append(emby_id)
-                                        added_season = True
-                                    
-                                    if added_season:
-                                        continue # 如果成功拆解了季，就跳过原始 Series 条目
-                        except Exception as e_split:
-                            logger.warning(f"拆解剧集 {tmdb_id} 失败，将保留原条目: {e_split}")
-                    emby_id = item.get('emby_id')
-                    
-                    if not emby_id and tmdb_id:
-                        key = f"{tmdb_id}_{media_type}"
-                        if key in tmdb_to_emby_item_map:
-                            emby_id = tmdb_to_emby_item_map[key]['Id']
-                    
-                    processed_item = {
-                        'tmdb_id': tmdb_id,
-                        'media_type': media_type,
-                        'emby_id': emby_id,
-                        'title': item.get('title'),
-                        **({'season': item['season']} if 'season' in item and item.get('season') is not None else {})
-                    }
-                    tmdb_items.append(processed_item)
-                    
-                    if emby_id:
-                        global_ordered_emby_ids.append(emby_id)
-
-                # 榜单/全局AI类需要全量存储，因为反向代理层无法实时爬虫
-                items_for_db = tmdb_items
-                total_count = len(global_ordered_emby_ids)
-
-                # 执行健康检查 (榜单类和全局AI推荐都需要)
-                # 作用：对比 TMDB 列表和本地库，自动订阅缺失的媒体
-                if collection_type in ['list', 'ai_recommendation_global']:
-                    # ★★★ 修复：构造 subscription_source 并适配新签名 ★★★
-                    subscription_source = {
-                        "type": "custom_collection",
-                        "id": collection_id,
-                        "name": collection_name
-                    }
-                    process_subscription_items_and_update_db(
-                        tmdb_items=tmdb_items, 
-                        tmdb_to_emby_item_map=tmdb_to_emby_item_map, 
-                        subscription_source=subscription_source,
-                        tmdb_api_key=processor.tmdb_api_key
-                    )
-
-                # 后续处理
-                # 1. 更新 Emby 实体合集 (用于封面)
-                should_allow_empty = (collection_type in ['list', 'ai_recommendation_global'])
-                
-                emby_collection_id = emby.create_or_update_collection_with_emby_ids(
-                    collection_name=collection_name, 
-                    emby_ids_in_library=global_ordered_emby_ids,
-                    base_url=processor.emby_url, 
-                    api_key=processor.emby_api_key, 
-                    user_id=processor.emby_user_id,
-                    prefetched_collection_map=prefetched_collection_map,
-                    allow_empty=should_allow_empty  # <--- 传入修改后的标志
-                )
-
-                # 2. 更新数据库状态
-                update_data = {
-                    "emby_collection_id": emby_collection_id,
-                    "item_type": json.dumps(definition.get('item_type', ['Movie'])),
-                    "last_synced_at": datetime.now(pytz.utc),
-                    "in_library_count": total_count, # 保存真实总数
-                    "generated_media_info_json": json.dumps(items_for_db, ensure_ascii=False)
-                }
-                custom_collection_db.update_custom_collection_sync_results(collection_id, update_data)
-
-                # 3. 封面生成
-                if cover_service and emby_collection_id:
-                    try:
-                        library_info = emby.get_emby_item_details(emby_collection_id, processor.emby_url, processor.emby_api_key, processor.emby_user_id)
-                        if library_info:
-                            # 重新获取一次最新的 info 以确保 count 准确
-                            latest_collection_info = custom_collection_db.get_custom_collection_by_id(collection_id)
-                            item_count_to_pass = _get_cover_badge_text_for_collection(latest_collection_info)
-                            cover_service.generate_for_library(
-                                emby_server_id='main_emby', 
-                                library=library_info,
-                                item_count=item_count_to_pass, 
-                                content_types=definition.get('item_type', ['Movie']),
-                                custom_collection_data=latest_collection_info  
-                            )
-                    except Exception as e_cover:
-                        logger.error(f"为合集 '{collection_name}' 生成封面时出错: {e_cover}", exc_info=True)
-
-                # 防封控休眠 (仅针对猫眼榜单)
-                is_maoyan = False
-                raw_url = definition.get('url', '')
-                urls = raw_url if isinstance(raw_url, list) else [str(raw_url)]
-                for u in urls:
-                    if isinstance(u, str) and u.startswith('maoyan://'):
-                        is_maoyan = True
-                        break
-                if collection_type == 'list' and is_maoyan:
+                if processor.is_stop_requested():
+                    return
+                try:
+                    outcome = _refresh_single_list_collection(processor, collection, context)
+                except Exception as e_coll:
+                    logger.error(f"处理合集 '{collection_name}' (ID: {collection['id']}) 时发生错误: {e_coll}", exc_info=True)
+                    outcome = 'failed'
+
+                # 防封控休眠 (仅针对猫眼榜单，持有猫眼名额期间休眠以保证间隔)
+                if 'maoyan' in source_kinds:
                     time.sleep(10)
-                
-            except Exception as e_coll:
-                logger.error(f"处理合集 '{collection_name}' (ID: {collection_id}) 时发生错误: {e_coll}", exc_info=True)
-                continue
+            finally:
+                for kind in reversed(source_kinds):
+                    source_semaphores[kind].release()
+
+            with progress_lock:
+                outcome_counts[outcome] += 1
+                finished[0] += 1
+                progress = 20 + int((finished[0] / total_collections) * 75)
+                task_manager.update_status_from_thread(progress, f"({finished[0]}/{total_collections}) 已处理: {collection_name}")
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=COLLECTION_REFRESH_MAX_WORKERS) as executor:
+            list(executor.map(_worker, active_collections))
+
+        logger.info(
+            f"  ➜ 合集刷新统计: 重建 {outcome_counts['updated']} 个，上游未变仅重新映射 {outcome_counts['remapped']} 个，"
+            f"无变化跳过 {outcome_counts['unchanged']} 个，清空 {outcome_counts['emptied']} 个，失败 {outcome_counts['failed']} 个。"
+        )
         
         final_message = "所有外部源合集(List/Global AI)均已处理完毕！"
         if processor.is_stop_requested(): final_message = "任务已中止。"
@@ -363,6 +477,7 @@ def task_process_all_custom_collections(processor):
         except Exception as e:
             logger.error(f"全量同步占位海报失败: {e}")
 
+        cache_events.invalidate_views_cache()
         task_manager.update_status_from_thread(100, final_message)
         logger.info(f"--- '{task_name}' 任务成功完成 ---")
 
@@ -646,6 +761,7 @@ def process_single_custom_collection(processor, custom_collection_id: int):
         except Exception as e:
             logger.error(f"全量同步占位海报失败: {e}")
 
+        cache_events.invalidate_views_cache()
         task_manager.update_status_from_thread(100, "自建合集及海报同步完毕！")
         logger.info(f"--- '{task_name}' 任务成功完成 ---")
 
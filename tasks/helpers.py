@@ -4,12 +4,16 @@
 import os
 import re
 import json
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import Optional, Dict, Tuple, List, Set, Any
 import logging
 from datetime import datetime, timedelta, timezone
 
 from handler.tmdb import get_movie_details, get_tv_details, get_tv_season_details, search_tv_shows, get_tv_season_details
 from database import settings_db, connection, request_db, media_db
+from .version_ranking import annotate_version_rank
 from ai_translator import AITranslator
 import utils
 
@@ -31,6 +35,19 @@ AUDIO_SUBTITLE_KEYWORD_MAP = {
 AUDIO_DISPLAY_MAP = {'chi': '国语', 'yue': '粤语', 'eng': '英语', 'jpn': '日语', 'kor': '韩语'}
 SUB_DISPLAY_MAP = {'chi': '简体', 'yue': '繁体', 'eng': '英文', 'jpn': '日文', 'kor': '韩文'}
 
+# 预先小写化的语言关键词表：[(标准语言键, (小写关键词, ...)), ...]
+_LANG_KEYWORDS_LOWER = [
+    (lang_key.replace('sub_', ''), tuple(k.lower() for k in keywords))
+    for lang_key, keywords in AUDIO_SUBTITLE_KEYWORD_MAP.items()
+]
+_STANDARD_LANG_CODES = {
+    'chi': {'chi', 'zho', 'chs', 'zh-cn', 'zh-hans', 'zh-sg', 'cmn'},
+    'yue': {'yue', 'cht'},
+    'eng': {'eng'},
+    'jpn': {'jpn'},
+    'kor': {'kor'},
+}
+
 RELEASE_GROUPS: Dict[str, List[str]] = {
     "0ff": ['FF(?:(?:A|WE)B|CD|E(?:DU|B)|TV)'],
     "1pt": [],
@@ -101,17 +118,37 @@ RELEASE_GROUPS: Dict[str, List[str]] = {
     "ubits": ['UB(?:its|WEB|TV)'],
 }
 
+def _compile_release_group_matchers() -> List[Tuple[str, Optional[re.Pattern], str]]:
+    """
+    将 RELEASE_GROUPS 预编译为 [(组名, 合并后的别名正则, 组名大写), ...]，模块加载时只构建一次。
+    同一组的别名合并为一个 OR 正则，匹配语义与逐个 re.search 一致。
+    """
+    matchers = []
+    for group_name, alias_list in RELEASE_GROUPS.items():
+        valid_aliases = []
+        for alias in alias_list:
+            try:
+                re.compile(alias)
+                valid_aliases.append(alias)
+            except re.error as e:
+                logger.warning(f"RELEASE_GROUPS 中存在无效的正则表达式: '{alias}' for group '{group_name}'. Error: {e}")
+        pattern = re.compile(f"(?:{'|'.join(valid_aliases)})", re.IGNORECASE) if valid_aliases else None
+        matchers.append((group_name, pattern, group_name.upper()))
+    return matchers
+
+_RELEASE_GROUP_MATCHERS = _compile_release_group_matchers()
+
+# 全角数字、字母、冒号、空格 -> 半角 的转换表
+_FULL_WIDTH_TRANSLATION = str.maketrans(
+    "０１２３４５６７８９ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ：　",
+    "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz: "
+)
+
 def normalize_full_width_chars(text: str) -> str:
     """将字符串中的全角字符（数字、字母、冒号）转换为半角。"""
     if not text:
         return ""
-    # 全角空格
-    text = text.replace('\u3000', ' ')
-    # 全角数字、字母、冒号的转换表
-    full_width = "０１２３４５６７８９ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺａｂｃｄｅｆｇｈｉｊｋｌｍｎｏｐｑｒｓｔｕｖｗｘｙｚ： "
-    half_width = "0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz: "
-    translation_table = str.maketrans(full_width, half_width)
-    return text.translate(translation_table)
+    return text.translate(_FULL_WIDTH_TRANSLATION)
 
 def _extract_exclusion_keywords_from_filename(filename: str) -> List[str]:
     """
@@ -123,21 +160,13 @@ def _extract_exclusion_keywords_from_filename(filename: str) -> List[str]:
         return []
     # 我们需要原始大小写的文件名（不含扩展名）来进行正则匹配
     name_part = os.path.splitext(filename)[0]
+    name_part_upper = name_part.upper()
 
-    for group_name, alias_list in RELEASE_GROUPS.items():
-        for alias in alias_list:
-            try:
-                # 核心修复：使用 re.search 来正确评估正则表达式
-                # re.IGNORECASE 可以在匹配时忽略大小写
-                if re.search(alias, name_part, re.IGNORECASE):
-                    return [group_name]
-            except re.error as e:
-                # 如果正则表达式本身有语法错误，记录日志并跳过
-                logger.warning(f"RELEASE_GROUPS 中存在无效的正则表达式: '{alias}' for group '{group_name}'. Error: {e}")
-                continue
-        
+    for group_name, pattern, group_name_upper in _RELEASE_GROUP_MATCHERS:
+        if pattern is not None and pattern.search(name_part):
+            return [group_name]
         # 保留对组名本身的检查（例如 "MTeam"）
-        if group_name.upper() in name_part.upper():
+        if group_name_upper in name_part_upper:
             return [group_name]
 
     return []
@@ -261,38 +290,65 @@ def _get_detected_languages_from_streams(
     stream_type: str
 ) -> set:
     detected_langs = set()
-    standard_codes = {
-        'chi': {'chi', 'zho', 'chs', 'zh-cn', 'zh-hans', 'zh-sg', 'cmn'}, 
-        'yue': {'yue', 'cht'}, 
-        'eng': {'eng'},
-        'jpn': {'jpn'},
-        'kor': {'kor'},
-    }
     
     for stream in media_streams:
         if stream.get('Type') == stream_type:
             # 检查 Language 字段
             if lang_code := str(stream.get('Language', '')).lower():
-                for key, codes in standard_codes.items():
+                for key, codes in _STANDARD_LANG_CODES.items():
                     if lang_code in codes:
                         detected_langs.add(key)
             
             # 检查标题字段
-            title_string = (stream.get('Title', '') + stream.get('DisplayTitle', '')).lower()
+            title_string = ((stream.get('Title') or '') + (stream.get('DisplayTitle') or '')).lower()
             if not title_string: continue
-            for lang_key, keywords in AUDIO_SUBTITLE_KEYWORD_MAP.items():
-                normalized_lang_key = lang_key.replace('sub_', '')
-                if any(keyword.lower() in title_string for keyword in keywords):
+            for normalized_lang_key, keywords in _LANG_KEYWORDS_LOWER:
+                if normalized_lang_key in detected_langs: continue
+                if any(keyword in title_string for keyword in keywords):
                     detected_langs.add(normalized_lang_key)
     return detected_langs
 
+# 资产解析缓存：键为 (路径, 大小, 修改时间, 媒体流指纹)，文件与媒体流均未变化时直接复用解析结果。
+# 元数据同步、洗版、多版本清理会反复解析同一批资产。
+_ASSET_ANALYSIS_CACHE_MAX = 20000
+_asset_analysis_cache: "OrderedDict[tuple, Dict[str, Any]]" = OrderedDict()
+_asset_analysis_cache_lock = threading.Lock()
+
+def _media_streams_fingerprint(media_streams: List[dict]) -> str:
+    raw = json.dumps(media_streams or [], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+def _copy_analysis(result: Dict[str, Any]) -> Dict[str, Any]:
+    return {k: (list(v) if isinstance(v, list) else v) for k, v in result.items()}
+
+def _analyze_media_asset_cached(file_path: str, media_streams: List[dict],
+                                size_bytes: Any = None, date_modified: Any = None) -> dict:
+    """带缓存的资产解析，缓存命中时跳过文件名正则与媒体流分析。"""
+    cache_key = (file_path or '', size_bytes, date_modified, _media_streams_fingerprint(media_streams))
+    with _asset_analysis_cache_lock:
+        cached = _asset_analysis_cache.get(cache_key)
+        if cached is not None:
+            _asset_analysis_cache.move_to_end(cache_key)
+            return _copy_analysis(cached)
+
+    result = _analyze_media_streams(file_path, media_streams)
+    with _asset_analysis_cache_lock:
+        _asset_analysis_cache[cache_key] = result
+        if len(_asset_analysis_cache) > _ASSET_ANALYSIS_CACHE_MAX:
+            _asset_analysis_cache.popitem(last=False)
+    return _copy_analysis(result)
+
 def analyze_media_asset(item_details: dict) -> dict:
     """视频流分析引擎"""
     if not item_details:
         return {}
+    return _analyze_media_asset_cached(
+        item_details.get('Path', ''), item_details.get('MediaStreams', []),
+        item_details.get('Size'), item_details.get('DateModified')
+    )
 
-    media_streams = item_details.get('MediaStreams', [])
-    file_path = item_details.get('Path', '')
+def _analyze_media_streams(file_path: str, media_streams: List[dict]) -> dict:
+    media_streams = media_streams or []
     file_name = os.path.basename(file_path) if file_path else ""
     file_name_lower = file_name.lower()
 
@@ -342,27 +398,6 @@ def analyze_media_asset(item_details: dict) -> dict:
                 codec_str = val
                 break
 
-    detected_audio_langs = _get_detected_languages_from_streams(media_streams, 'Audio')
-    audio_str = ', '.join(sorted([AUDIO_DISPLAY_MAP.get(lang, lang) for lang in detected_audio_langs]))
-    
-    # ★★★ 核心修改：增强音频 (Audio) 的文件名兜底 ★★★
-    # 如果 Emby 没分析出音轨，尝试从文件名提取常见音频格式作为展示
-    if not audio_str:
-        audio_keywords = {
-            'truehd': 'TrueHD', 'atmos': 'Atmos', 
-            'dts-hd': 'DTS-HD', 'dts': 'DTS', 
-            'ac3': 'AC3', 'eac3': 'EAC3', 'dd+': 'Dolby Digital+',
-            'aac': 'AAC', 'flac': 'FLAC'
-        }
-        found_audios = []
-        for k, v in audio_keywords.items():
-            if k in file_name_lower:
-                found_audios.append(v)
-        if found_audios:
-            audio_str = " | ".join(found_audios) # 用竖线分隔，表示这是文件名猜的
-        else:
-            audio_str = '无' # 真的猜不到了
-
     detected_audio_langs = _get_detected_languages_from_streams(media_streams, 'Audio')
     audio_str = ', '.join(sorted([AUDIO_DISPLAY_MAP.get(lang, lang) for lang in detected_audio_langs])) or '无'
 
@@ -485,11 +520,16 @@ def parse_full_asset_details(item_details: dict, id_to_parent_map: dict = None,
     # 如果要彻底修复 display 字段，建议把 analyze_media_asset 也改一下，
     # 或者简单点，构造一个伪造的 item_details 传给它：
     
-    fake_details_for_analysis = item_details.copy()
-    fake_details_for_analysis['MediaStreams'] = media_streams # 注入正确的流
-    
-    display_tags = analyze_media_asset(fake_details_for_analysis)
+    display_tags = _analyze_media_asset_cached(
+        item_details.get("Path", ""), media_streams, size_bytes, item_details.get("DateModified")
+    )
     asset.update(display_tags)
+
+    # 按当前清理规则预先计算版本排序键，多版本清理扫描可直接在 SQL 中选出最佳版本
+    try:
+        annotate_version_rank(asset)
+    except Exception as e:
+        logger.debug(f"  ➜ 计算版本排序键失败 (将在扫描时现场计算): {e}")
     
     return asset
 
@@ -663,6 +703,19 @@ def check_series_completion(tmdb_id: int, api_key: str, season_number: Optional[
     
     return False
 
+_ROMAN_SEASON_MAP = {'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6, 'VII': 7, 'VIII': 8, 'IX': 9, 'X': 10}
+_CHINESE_SEASON_MAP = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10}
+_SEASON_TITLE_PATTERNS = [
+    # 模式1: 最优先匹配 "第X季" 或 "Season X"
+    re.compile(r'^(.*?)\s*(?:第([一二三四五六七八九十\d]+)季|Season\s*(\d+))', re.IGNORECASE),
+
+    # 模式2: 匹配年份 (如 "2024")
+    re.compile(r'^(.*?)\s+((?:19|20)\d{2})$'),
+
+    # 模式3: 中文数字(带前缀) 或 罗马/阿拉伯数字
+    re.compile(r'^(.*?)\s*(?:[第部]\s*([一二三四五六七八九十])|([IVX\d]+))(?:[:\s-]|$)')
+]
+
 def parse_series_title_and_season(title: str, api_key: str = None) -> Tuple[Optional[str], Optional[int]]:
     """
     从一个可能包含季号的剧集标题中，解析出基础剧名和季号。
@@ -722,21 +775,10 @@ def parse_series_title_and_season(title: str, api_key: str = None) -> Tuple[Opti
     # 如果上面的逻辑没返回，说明它不是 "主标题之副标题" 格式，或者校验失败。
     # 此时 normalized_title 依然是完整的 "亦舞之城"，我们继续检查它是否包含 "S2", "第2季" 等标准标记。
     
-    roman_map = {'I': 1, 'II': 2, 'III': 3, 'IV': 4, 'V': 5, 'VI': 6, 'VII': 7, 'VIII': 8, 'IX': 9, 'X': 10}
-    chinese_map = {'一': 1, '二': 2, '三': 3, '四': 4, '五': 5, '六': 6, '七': 7, '八': 8, '九': 9, '十': 10}
-
-    patterns = [
-        # 模式1: 最优先匹配 "第X季" 或 "Season X"
-        re.compile(r'^(.*?)\s*(?:第([一二三四五六七八九十\d]+)季|Season\s*(\d+))', re.IGNORECASE),
-        
-        # 模式2: 匹配年份 (如 "2024")
-        re.compile(r'^(.*?)\s+((?:19|20)\d{2})$'),
-        
-        # 模式3: 中文数字(带前缀) 或 罗马/阿拉伯数字
-        re.compile(r'^(.*?)\s*(?:[第部]\s*([一二三四五六七八九十])|([IVX\d]+))(?:[:\s-]|$)')
-    ]
+    roman_map = _ROMAN_SEASON_MAP
+    chinese_map = _CHINESE_SEASON_MAP
 
-    for pattern in patterns:
+    for pattern in _SEASON_TITLE_PATTERNS:
         match = pattern.match(normalized_title)
         if not match: continue
         
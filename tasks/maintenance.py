@@ -35,7 +35,7 @@ def _prepare_data_for_insert(table_name: str, table_data: List[Dict[str, Any]])
             'watchlist_next_episode_json', 'watchlist_missing_info_json', 'asset_details_json',
             'overview_embedding'
         },
-        'actor_subscriptions': {'config_genres_include_json', 'config_genres_exclude_json', 'last_scanned_tmdb_ids_json'},
+        'actor_subscriptions': {'config_genres_include_json', 'config_genres_exclude_json', 'last_scanned_tmdb_ids_json', 'last_scanned_credits_json'},
         'resubscribe_rules': {
             'scope_rules', 'resubscribe_audio_missing_languages',
             'resubscribe_subtitle_missing_languages', 'resubscribe_quality_include',
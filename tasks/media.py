@@ -15,6 +15,7 @@ from gevent import spawn_later
 import task_manager
 import utils
 import constants
+import metrics
 import handler.tmdb as tmdb
 import handler.emby as emby
 import handler.telegram as telegram
@@ -1381,6 +1382,7 @@ def task_bulk_auto_tag(processor, library_ids: List[str], tags: List[str], ratin
 
             for i, item in enumerate(items):
                 if processor.is_stop_requested(): return
+                metrics.record_items_processed()
                 
                 item_name = item.get('Name', '未知')
                 
@@ -1448,6 +1450,7 @@ def task_bulk_remove_tags(processor, library_ids: List[str], tags: List[str], ra
 
             for i, item in enumerate(items):
                 if processor.is_stop_requested(): return
+                metrics.record_items_processed()
                 
                 item_name = item.get('Name', '未知')
 
@@ -1763,30 +1766,155 @@ def task_scan_monitor_folders(processor):
     task_manager.update_status_from_thread(100, f"扫描完成，处理了 {trigger_count} 个新项目")
 
 # --- 从数据库恢复本地覆盖缓存 ---
+# 服务端游标每次取回的行数 (同时也是演员 / 分季分集批量预取的粒度)
+RESTORE_FETCH_BATCH_SIZE = 500
+# 并发生成 override 文件的工作线程数
+RESTORE_WRITE_MAX_WORKERS = 4
+# 只取重建 override 所需的列，避免把向量、资产详情等大字段读进内存
+_RESTORE_ITEM_COLUMNS = """
+    tmdb_id, item_type, title, original_title, overview, original_language, watchlist_tmdb_status,
+    backdrop_path, poster_path, homepage, release_date, last_air_date, runtime_minutes, total_episodes,
+    rating, genres_json, production_companies_json, networks_json, directors_json, countries_json,
+    keywords_json, official_rating_json, actors_json
+"""
+
+def _prefetch_restore_batch(cursor, items: List[dict]):
+    """
+    为一批待恢复项目预取关联数据，每类数据只查一次库：
+    - 演员详情 (按 tmdb_id 合并去重)
+    - 剧集的分季 / 分集
+    返回 (每个项目的有序演员列表, {剧集 tmdb_id: (分季列表, 分集字典)})。
+    """
+    actor_links_by_item = {}
+    all_actor_ids = set()
+    for item in items:
+        links = []
+        raw_actors = item.get('actors_json')
+        if raw_actors:
+            try:
+                parsed = json.loads(raw_actors) if isinstance(raw_actors, str) else raw_actors
+                links = [link for link in parsed or [] if isinstance(link, dict) and link.get('tmdb_id')]
+            except Exception as e_actor:
+                logger.warning(f"  ⚠️ 解析演员数据失败 ({item.get('title', item['tmdb_id'])}): {e_actor}")
+        actor_links_by_item[(item['tmdb_id'], item['item_type'])] = links
+        for link in links:
+            try:
+                all_actor_ids.add(int(link['tmdb_id']))
+            except (ValueError, TypeError):
+                continue
+
+    actor_map = {}
+    if all_actor_ids:
+        cursor.execute("""
+            SELECT am.tmdb_id, am.original_name, am.profile_path, pim.primary_name AS name
+            FROM actor_metadata am
+            LEFT JOIN person_identity_map pim ON am.tmdb_id = pim.tmdb_person_id
+            WHERE am.tmdb_id = ANY(%s)
+        """, (list(all_actor_ids),))
+        actor_map = {row['tmdb_id']: dict(row) for row in cursor.fetchall()}
+
+    actors_by_item = {}
+    for key, links in actor_links_by_item.items():
+        db_actors = []
+        for link in links:
+            try:
+                actor = actor_map.get(int(link['tmdb_id']))
+            except (ValueError, TypeError):
+                actor = None
+            if actor:
+                full_actor = actor.copy()
+                full_actor['character'] = link.get('character')
+                full_actor['order'] = link.get('order')
+                db_actors.append(full_actor)
+        db_actors.sort(key=lambda x: x.get('order') if x.get('order') is not None else 999)
+        actors_by_item[key] = db_actors
+
+    children_by_series = {}
+    series_ids = [item['tmdb_id'] for item in items if item['item_type'] == 'Series']
+    if series_ids:
+        cursor.execute("""
+            SELECT parent_series_tmdb_id, item_type, tmdb_id, title, overview,
+                   season_number, episode_number, release_date, rating, poster_path
+            FROM media_metadata
+            WHERE parent_series_tmdb_id = ANY(%s) AND item_type IN ('Season', 'Episode')
+        """, (series_ids,))
+        for row in cursor.fetchall():
+            seasons_data, episodes_data = children_by_series.setdefault(row['parent_series_tmdb_id'], ([], {}))
+            child_id = int(row['tmdb_id']) if row['tmdb_id'].isdigit() else 0
+            air_date = str(row['release_date']) if row['release_date'] else None
+            if row['item_type'] == 'Season':
+                seasons_data.append({
+                    "id": child_id,
+                    "name": row['title'],
+                    "overview": row['overview'],
+                    "season_number": row['season_number'],
+                    "air_date": air_date,
+                    "poster_path": row['poster_path']
+                })
+            else:
+                s_num, e_num = row['season_number'], row['episode_number']
+                episodes_data[f"S{s_num}E{e_num}"] = {
+                    "id": child_id,
+                    "name": row['title'],
+                    "overview": row['overview'],
+                    "season_number": s_num,
+                    "episode_number": e_num,
+                    "air_date": air_date,
+                    "vote_average": row['rating'],
+                }
+
+    return actors_by_item, children_by_series
+
+def _restore_single_item(processor, item: dict, db_actors: List[dict], children) -> bool:
+    """重建单个项目的 override 文件 (在工作线程中执行)。"""
+    if processor.is_stop_requested():
+        return False
+    tmdb_id = item['tmdb_id']
+    item_type = item['item_type']
+    title = item.get('title') or tmdb_id
+    try:
+        payload = reconstruct_metadata_from_db(item, db_actors)
+        if item_type == "Series" and children:
+            seasons_data, episodes_data = children
+            if seasons_data: payload['seasons_details'] = seasons_data
+            if episodes_data: payload['episodes_details'] = episodes_data
+
+        # 构造上下文对象 (Id='pending' 避免触发 Emby API 请求)
+        fake_item_details = {
+            "Id": "pending", 
+            "Name": title, 
+            "Type": item_type, 
+            "ProviderIds": {"Tmdb": tmdb_id}
+        }
+        processor.sync_item_metadata(
+            item_details=fake_item_details,
+            tmdb_id=tmdb_id,
+            metadata_override=payload
+        )
+        return True
+    except Exception as e_item:
+        logger.error(f"  🚫 恢复项目 '{title}' 失败: {e_item}")
+        return False
+
 def task_restore_local_cache_from_db(processor):
     """
     【灾难恢复】从数据库读取元数据，重新生成本地 override JSON 文件。
     用于误删 cache 目录或迁移环境后的数据恢复。
+    - 服务端游标分批流式读取，只取需要的列，内存占用与总条数无关；
+    - 每批的演员详情、分季分集各用一条查询预取；
+    - override 文件由线程池并发生成，文件写入为原子替换。
     """
     task_name = "恢复覆盖缓存"
     logger.trace(f"--- 开始执行 '{task_name}' ---")
     
+    where_clause = "WHERE item_type IN ('Movie', 'Series') AND tmdb_id IS NOT NULL AND tmdb_id != '0'"
     try:
-        # 1. 获取所有顶层项目 (Movie, Series)
         task_manager.update_status_from_thread(5, "正在读取数据库...")
-        
-        items_to_restore = []
         with connection.get_db_connection() as conn:
             cursor = conn.cursor()
-            cursor.execute("""
-                SELECT * FROM media_metadata 
-                WHERE item_type IN ('Movie', 'Series') 
-                  AND tmdb_id IS NOT NULL 
-                  AND tmdb_id != '0'
-            """)
-            items_to_restore = [dict(row) for row in cursor.fetchall()]
+            cursor.execute(f"SELECT COUNT(*) AS total FROM media_metadata {where_clause}")
+            total = cursor.fetchone()['total']
 
-        total = len(items_to_restore)
         if total == 0:
             task_manager.update_status_from_thread(100, "数据库中没有可恢复的项目。")
             return
@@ -1794,128 +1922,41 @@ def task_restore_local_cache_from_db(processor):
         logger.info(f"  ➜ 发现 {total} 个项目需要恢复缓存。")
         
         success_count = 0
-        
-        for i, item in enumerate(items_to_restore):
-            if processor.is_stop_requested():
-                logger.warning("  🚫 任务被中止。")
-                break
+        processed_count = 0
 
-            # 每处理50个文件，暂停 0.01 秒，防止 IO/CPU 100% 卡死系统
-            if i % 50 == 0:
-                time.sleep(0.01)
+        with connection.get_db_connection() as stream_conn, \
+             connection.get_db_connection() as lookup_conn, \
+             concurrent.futures.ThreadPoolExecutor(max_workers=RESTORE_WRITE_MAX_WORKERS, thread_name_prefix="restore_cache") as executor:
+            stream_cursor = stream_conn.cursor(name='restore_override_cache')
+            stream_cursor.itersize = RESTORE_FETCH_BATCH_SIZE
+            stream_cursor.execute(f"SELECT {_RESTORE_ITEM_COLUMNS} FROM media_metadata {where_clause}")
+            lookup_cursor = lookup_conn.cursor()
+
+            while True:
+                if processor.is_stop_requested():
+                    logger.warning("  🚫 任务被中止。")
+                    break
+                batch = [dict(row) for row in stream_cursor.fetchmany(RESTORE_FETCH_BATCH_SIZE)]
+                if not batch:
+                    break
 
-            tmdb_id = item['tmdb_id']
-            item_type = item['item_type']
-            title = item.get('title', tmdb_id)
-            
-            # 更新进度
-            if i % 5 == 0:
-                progress = int((i / total) * 100)
-                task_manager.update_status_from_thread(progress, f"正在恢复 ({i+1}/{total}): {title}")
+                actors_by_item, children_by_series = _prefetch_restore_batch(lookup_cursor, batch)
+                futures = [
+                    executor.submit(
+                        _restore_single_item, processor, item,
+                        actors_by_item.get((item['tmdb_id'], item['item_type']), []),
+                        children_by_series.get(item['tmdb_id']) if item['item_type'] == 'Series' else None
+                    )
+                    for item in batch
+                ]
+                for future in concurrent.futures.as_completed(futures):
+                    if future.result():
+                        success_count += 1
+                processed_count += len(batch)
 
-            try:
-                # --- A. 准备演员数据 ---
-                db_actors = []
-                if item.get('actors_json'):
-                    try:
-                        raw_actors = item['actors_json']
-                        actors_link = json.loads(raw_actors) if isinstance(raw_actors, str) else raw_actors
-                        
-                        actor_tmdb_ids = [a['tmdb_id'] for a in actors_link if 'tmdb_id' in a]
-                        
-                        if actor_tmdb_ids:
-                            with connection.get_db_connection() as conn:
-                                cursor = conn.cursor()
-                                # 批量查询演员详情
-                                placeholders = ','.join(['%s'] * len(actor_tmdb_ids))
-                                sql = f"""
-                                    SELECT am.*, pim.primary_name as name
-                                    FROM actor_metadata am
-                                    LEFT JOIN person_identity_map pim ON am.tmdb_id = pim.tmdb_person_id
-                                    WHERE am.tmdb_id IN ({placeholders})
-                                """
-                                cursor.execute(sql, tuple(actor_tmdb_ids))
-                                actor_rows = cursor.fetchall()
-                                actor_map = {r['tmdb_id']: dict(r) for r in actor_rows}
-                                
-                                # 组装回有序列表
-                                for link in actors_link:
-                                    tid = link.get('tmdb_id')
-                                    if tid in actor_map:
-                                        full_actor = actor_map[tid].copy()
-                                        full_actor['character'] = link.get('character')
-                                        full_actor['order'] = link.get('order')
-                                        db_actors.append(full_actor)
-                                        
-                                db_actors.sort(key=lambda x: x.get('order', 999))
-                    except Exception as e_actor:
-                        logger.warning(f"  ⚠️ 解析演员数据失败 ({title}): {e_actor}")
-
-                # --- B. 重建主 Payload ---
-                payload = reconstruct_metadata_from_db(item, db_actors)
-
-                # --- C. 如果是剧集，注入分季/分集数据 ---
-                if item_type == "Series":
-                    with connection.get_db_connection() as conn:
-                        cursor = conn.cursor()
-                        
-                        # 查分季
-                        cursor.execute("SELECT * FROM media_metadata WHERE parent_series_tmdb_id = %s AND item_type = 'Season'", (tmdb_id,))
-                        seasons_rows = cursor.fetchall()
-                        seasons_data = []
-                        for s_row in seasons_rows:
-                            s_data = {
-                                "id": int(s_row['tmdb_id']) if s_row['tmdb_id'].isdigit() else 0,
-                                "name": s_row['title'],
-                                "overview": s_row['overview'],
-                                "season_number": s_row['season_number'],
-                                "air_date": str(s_row['release_date']) if s_row['release_date'] else None,
-                                "poster_path": s_row['poster_path']
-                            }
-                            seasons_data.append(s_data)
-                        
-                        # 查分集
-                        cursor.execute("SELECT * FROM media_metadata WHERE parent_series_tmdb_id = %s AND item_type = 'Episode'", (tmdb_id,))
-                        episodes_rows = cursor.fetchall()
-                        episodes_data = {} 
-                        
-                        for e_row in episodes_rows:
-                            s_num = e_row['season_number']
-                            e_num = e_row['episode_number']
-                            key = f"S{s_num}E{e_num}"
-                            
-                            e_data = {
-                                "id": int(e_row['tmdb_id']) if e_row['tmdb_id'].isdigit() else 0,
-                                "name": e_row['title'],
-                                "overview": e_row['overview'],
-                                "season_number": s_num,
-                                "episode_number": e_num,
-                                "air_date": str(e_row['release_date']) if e_row['release_date'] else None,
-                                "vote_average": e_row['rating'],
-                            }
-                            episodes_data[key] = e_data
-
-                        if seasons_data: payload['seasons_details'] = seasons_data
-                        if episodes_data: payload['episodes_details'] = episodes_data
-
-                # --- D. 写入文件 ---
-                # 构造上下文对象 (Id='pending' 避免触发 Emby API 请求)
-                fake_item_details = {
-                    "Id": "pending", 
-                    "Name": title, 
-                    "Type": item_type, 
-                    "ProviderIds": {"Tmdb": tmdb_id}
-                }
-                
-                processor.sync_item_metadata(
-                    item_details=fake_item_details,
-                    tmdb_id=tmdb_id,
-                    metadata_override=payload
-                )
-                success_count += 1
-                
-            except Exception as e_item:
-                logger.error(f"  🚫 恢复项目 '{title}' 失败: {e_item}")
+                progress = 5 + int((processed_count / total) * 94)
+                task_manager.update_status_from_thread(progress, f"正在恢复 ({processed_count}/{total})，成功 {success_count} 个...")
+            stream_cursor.close()
 
         final_msg = f"恢复完成！成功生成 {success_count}/{total} 个项目的本地缓存文件。"
         logger.info(f"  ✅ {final_msg}")
@@ -0,0 +1,177 @@
+# tasks/playback.py
+# 播放流水仓库：增量导入 Playback Reporting 插件数据并维护预聚合表
+
+import hashlib
+import logging
+import threading
+from datetime import date, datetime, timedelta
+from typing import Optional, Dict, Any
+
+import pytz
+
+import constants
+import cache_events
+import handler.emby as emby
+import task_manager
+from database import playback_db, settings_db, user_db, media_db
+
+logger = logging.getLogger(__name__)
+
+INGEST_STATE_SETTING_KEY = "playback_history_ingest_state"
+# 首次导入回溯的天数
+INITIAL_BACKFILL_DAYS = 365
+# 每次增量导入与上次最新记录重叠的天数 (插件会在播放过程中刷新时长)
+INCREMENTAL_OVERLAP_DAYS = 2
+# 入库时尚未同步到本地媒体库的条目，在这个天数内每次导入都会重试解析
+UNRESOLVED_RETRY_DAYS = 30
+# 单次向插件请求的最大流水条数 (插件接口不支持分页)
+PLAYBACK_ROWS_LIMIT = 100000
+
+_ingest_lock = threading.Lock()
+
+def _local_today():
+    return datetime.now(pytz.timezone(constants.TIMEZONE)).date()
+
+def playback_range_start(days: int) -> date:
+    """“最近 N 天” 统计范围的起始日期 (按服务器时区)。"""
+    return _local_today() - timedelta(days=max(1, days))
+
+def _parse_duration_seconds(raw_duration) -> int:
+    """插件返回的时长可能是秒数 (数字或数字字符串)，也可能是 'HH:MM:SS'。"""
+    try:
+        return max(0, int(float(raw_duration)))
+    except (ValueError, TypeError):
+        pass
+    if isinstance(raw_duration, str) and ":" in raw_duration:
+        try:
+            parts = [int(p) for p in raw_duration.split(':')]
+            if len(parts) == 3:
+                return parts[0] * 3600 + parts[1] * 60 + parts[2]
+            if len(parts) == 2:
+                return parts[0] * 60 + parts[1]
+        except ValueError:
+            return 0
+    return 0
+
+def _parse_played_at(item: Dict[str, Any]) -> Optional[datetime]:
+    date_str = str(item.get("DateCreated") or item.get("Date") or item.get("date") or "").strip()
+    time_str = str(item.get("time") or "").strip()
+    if not date_str:
+        return None
+    if time_str and " " not in date_str and "T" not in date_str:
+        date_str = f"{date_str} {time_str}"
+    date_str = date_str.replace("T", " ")
+    for fmt, length in (("%Y-%m-%d %H:%M:%S", 19), ("%Y-%m-%d %H:%M", 16), ("%Y-%m-%d", 10)):
+        try:
+            return datetime.strptime(date_str[:length], fmt)
+        except ValueError:
+            continue
+    return None
+
+def normalize_playback_row(item: Dict[str, Any], user_ids_by_name: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """把插件返回的一条原始流水 (字段名在不同版本间并不统一) 规整为 playback_events 的一行。"""
+    played_at = _parse_played_at(item)
+    if not played_at:
+        return None
+
+    user_name = item.get("UserName") or item.get("User") or item.get("user_name") or item.get("user") or "Unknown"
+    emby_user_id = item.get("UserId") or item.get("user_id") or user_ids_by_name.get(user_name)
+    raw_item_id = item.get("ItemId") or item.get("item_id")
+    emby_item_id = str(raw_item_id) if raw_item_id else None
+    raw_duration = item.get("PlayDuration") or item.get("duration") or item.get("play_duration") or item.get("Duration") or item.get("total_time") or 0
+
+    # 去重键只用插件原样返回的用户名：用户 ID 可能要等用户同步后才能解析出来，用它做键会让重叠区间的流水被重复计入
+    key_source = f"{played_at.isoformat()}|{user_name}|{emby_item_id or ''}"
+    return {
+        "event_key": hashlib.md5(key_source.encode('utf-8')).hexdigest(),
+        "played_at": played_at,
+        "emby_user_id": emby_user_id,
+        "user_name": user_name,
+        "emby_item_id": emby_item_id,
+        "item_name": item.get("item_name") or item.get("Name") or item.get("ItemName"),
+        "item_type": item.get("Type") or item.get("ItemType") or item.get("item_type") or "Video",
+        "duration_sec": _parse_duration_seconds(raw_duration),
+    }
+
+def is_warehouse_ready() -> bool:
+    """至少完成过一次导入后，仪表盘与个人报告才改为读取本地仓库。"""
+    try:
+        return bool(settings_db.get_setting(INGEST_STATE_SETTING_KEY))
+    except Exception:
+        return False
+
+def sync_playback_history(emby_url: str, emby_key: str) -> Optional[int]:
+    """
+    增量导入播放流水并更新预聚合表。
+    - 只向插件请求“上次最新记录 - 重叠天数”以来的数据，首次导入回溯 INITIAL_BACKFILL_DAYS 天。
+    - 返回写入 / 更新的流水条数；插件未安装或另一个导入正在进行时返回 None。
+    """
+    if not emby_url or not emby_key:
+        return None
+    if not _ingest_lock.acquire(blocking=False):
+        logger.debug("  ➜ 播放流水导入正在进行中，跳过本次触发。")
+        return None
+    try:
+        state = settings_db.get_setting(INGEST_STATE_SETTING_KEY)
+        today = _local_today()
+        days = INITIAL_BACKFILL_DAYS
+        if state and state.get("last_played_at"):
+            last_played_date = datetime.fromisoformat(state["last_played_at"]).date()
+            days = max(1, min(INITIAL_BACKFILL_DAYS, (today - last_played_date).days + INCREMENTAL_OVERLAP_DAYS))
+
+        raw_rows = emby.get_playback_reporting_rows(emby_url, emby_key, days=days, limit=PLAYBACK_ROWS_LIMIT)
+        if raw_rows is None:
+            logger.debug("  ➜ 服务端未安装 Playback Reporting 插件，跳过播放流水导入。")
+            return None
+        if len(raw_rows) >= PLAYBACK_ROWS_LIMIT:
+            logger.warning(f"  ➜ 插件返回的播放流水达到单次上限 ({PLAYBACK_ROWS_LIMIT} 条)，最近 {days} 天中超出上限的部分未能导入，相关统计可能偏低。")
+
+        user_ids_by_name = {u['name']: u['id'] for u in user_db.get_all_emby_users() if u.get('name')}
+        events_by_key: Dict[str, Dict[str, Any]] = {}
+        for item in raw_rows:
+            event = normalize_playback_row(item, user_ids_by_name)
+            if event:
+                events_by_key[event["event_key"]] = event # 同一批次内去重，保留最后一次出现的时长
+        events = list(events_by_key.values())
+
+        affected_dates = playback_db.upsert_playback_events(events)
+
+        # 解析聚合目标：本批新增的 + 近期仍未解析的 (当时媒体尚未入库)
+        unresolved_ids = playback_db.get_unresolved_item_ids(today - timedelta(days=UNRESOLVED_RETRY_DAYS))
+        if not state:
+            unresolved_ids = list(set(unresolved_ids) | {e["emby_item_id"] for e in events if e["emby_item_id"] and e["item_type"] in playback_db.DASHBOARD_ITEM_TYPES})
+        if unresolved_ids:
+            affected_dates |= playback_db.apply_item_resolutions(media_db.get_dashboard_aggregation_map(unresolved_ids))
+
+        playback_db.rebuild_rollups(affected_dates)
+
+        latest_played_at = max((e["played_at"] for e in events), default=None)
+        if state and state.get("last_played_at"):
+            previous = datetime.fromisoformat(state["last_played_at"])
+            latest_played_at = max(latest_played_at, previous) if latest_played_at else previous
+        settings_db.save_setting(INGEST_STATE_SETTING_KEY, {
+            "last_played_at": (latest_played_at or datetime.combine(today, datetime.min.time())).isoformat(),
+            "last_run_at": datetime.now(pytz.utc).isoformat(),
+        })
+
+        if affected_dates:
+            cache_events.invalidate_dashboard_cache()
+        logger.debug(f"  ➜ 播放流水导入完成：请求 {days} 天，{len(events)} 条流水，{len(affected_dates)} 天的统计已更新。")
+        return len(events)
+    finally:
+        _ingest_lock.release()
+
+# ★★★ 播放流水同步任务 ★★★
+def task_sync_playback_history(processor):
+    """手动 / 任务链触发一次增量导入 (调度器也会按配置的间隔自动执行)。"""
+    task_name = "同步播放统计"
+    try:
+        task_manager.update_status_from_thread(10, "正在从 Playback Reporting 插件拉取播放流水...")
+        count = sync_playback_history(processor.emby_url, processor.emby_api_key)
+        if count is None:
+            task_manager.update_status_from_thread(100, "未安装 Playback Reporting 插件或导入正在进行，已跳过。")
+            return
+        task_manager.update_status_from_thread(100, f"任务完成：已导入 {count} 条播放流水。")
+    except Exception as e:
+        logger.error(f"执行 '{task_name}' 任务失败: {e}", exc_info=True)
+        task_manager.update_status_from_thread(-1, f"任务失败: {e}")
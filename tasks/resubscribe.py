@@ -5,6 +5,7 @@ import re
 import time
 import logging
 import json
+import hashlib
 from typing import List, Dict, Optional, Any, Set
 from concurrent.futures import ThreadPoolExecutor, as_completed 
 from collections import defaultdict
@@ -15,6 +16,7 @@ import handler.emby as emby
 import handler.moviepilot as moviepilot
 import handler.nullbr as nullbr_handler
 import constants  
+import metrics
 from database import resubscribe_db, settings_db, maintenance_db, request_db, queries_db, media_db
 
 # 从 helpers 导入的辅助函数和常量
@@ -96,6 +98,87 @@ def _fetch_candidates_for_rule(rule: dict) -> List[Dict[str, Any]]:
     # 去重并返回
     return [{'tmdb_id': tid} for tid in set(tmdb_ids)]
 
+def _build_eval_input_hash(*parts) -> str:
+    """把规则指纹、资产内容摘要及相关元数据合成一个判定输入哈希。"""
+    raw = "|".join("" if p is None else str(p) for p in parts)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+def _evaluate_season(series: dict, tmdb_id: str, season_num: int, eps_in_season: List[dict],
+                     rule: dict, compiled_rule: dict, missing_info_updates: Dict[str, List[int]]) -> tuple[str, str]:
+    """
+    对单季执行完整判定 (缺集 / 评分 / 洗版 / 一致性)，返回 (status, reason)，status 为 'ok' 表示无需处理。
+    缺集信息会顺带写入 missing_info_updates。
+    """
+    # --- 1. 计算缺集 ---
+    missing_episodes = []
+    has_gaps = False
+    
+    valid_eps = [e for e in eps_in_season if e.get('episode_number')]
+    if valid_eps:
+        existing_ep_nums = set(e['episode_number'] for e in valid_eps)
+        max_ep = max(existing_ep_nums)
+        for i in range(1, max_ep):
+            if i not in existing_ep_nums:
+                missing_episodes.append(i)
+        
+        if missing_episodes:
+            has_gaps = True
+            missing_episodes.sort()
+
+    # 跳过多版本
+    for ep in eps_in_season:
+        ep_ids = ep.get('emby_item_ids_json')
+        if ep_ids and len(ep_ids) > 1:
+            return 'ok', ""
+    
+    eps_in_season.sort(key=lambda x: x.get('episode_number') or 0)
+    rep_ep = eps_in_season[0]
+    season_tmdb_id = rep_ep.get('season_tmdb_id')
+    assets = rep_ep.get('asset_details_json')
+    if not assets: return 'ok', ""
+
+    if season_tmdb_id:
+        missing_info_updates[season_tmdb_id] = missing_episodes
+
+    current_season_wrapper = {
+        'title': series['title'],
+        'tmdb_id': tmdb_id,
+        'item_type': 'Season',
+        'original_language': series.get('original_language'),
+        'rating': series.get('rating'),
+        'season_number': int(season_num),
+        'has_gaps': has_gaps,
+        'missing_episodes': missing_episodes
+    }
+
+    # --- 2. 评分检查 ---
+    season_display_name = f"{series['title']} - 第{season_num}季"
+    should_skip, rating_needed, rating_reason = _evaluate_rating_rule(
+        rule, 
+        current_season_wrapper.get('rating'), 
+        season_display_name
+    )
+    if should_skip: return 'ok', ""
+    if rating_needed:
+        return 'needed', rating_reason
+
+    # --- 3. 常规洗版检查 ---
+    needs_upgrade, upgrade_reason = _item_needs_resubscribe(assets[0], rule, current_season_wrapper, compiled_rule)
+    if needs_upgrade:
+        return 'needed', upgrade_reason
+
+    # --- 4. 一致性检查 (连载中的剧集跳过) ---
+    if rule.get('consistency_check_enabled') and not series.get('watchlist_is_airing', False):
+        needs_fix, fix_reason = _check_season_consistency(eps_in_season, rule)
+        if needs_fix:
+            return 'needed', fix_reason
+
+    # --- 5. 缺集检查 ---
+    if rule.get("filter_missing_episodes_enabled") and has_gaps:
+        return 'needed', f"缺失集数: {','.join(map(str, missing_episodes[:5]))}{'...' if len(missing_episodes)>5 else ''}"
+
+    return 'ok', ""
+
 # ======================================================================
 # 核心任务：刷新媒体整理
 # ======================================================================
@@ -120,6 +203,7 @@ def task_update_resubscribe_cache(processor):
             all_keys = resubscribe_db.get_all_resubscribe_index_keys()
             if all_keys:
                 resubscribe_db.delete_resubscribe_index_by_keys(list(all_keys))
+            resubscribe_db.clear_resubscribe_eval_cache()
             task_manager.update_status_from_thread(100, "任务完成：规则为空，已清理所有索引。")
             return
 
@@ -148,6 +232,27 @@ def task_update_resubscribe_cache(processor):
 
         index_update_batch = []
         current_statuses = resubscribe_db.get_current_index_statuses()
+
+        # 上次的判定结果 (按输入哈希增量复用)
+        eval_cache = resubscribe_db.get_resubscribe_eval_cache()
+        eval_cache_updates = []
+        evaluated_count = 0
+        reused_count = 0
+
+        def _record_needed(tmdb_id, item_type, season_number, reason, display_name, rule_name, rule_id):
+            """把命中规则的项目加入待入库批次，并保留用户已操作过的状态。"""
+            existing_status = current_statuses.get((tmdb_id, item_type, season_number))
+            if existing_status in ['subscribed', 'auto_subscribed', 'ignored']:
+                final_status = existing_status
+            else:
+                logger.info(f"  ➜ 《{display_name}》命中规则 '{rule_name}'。原因: {reason}")
+                final_status = 'needed'
+
+            keys_to_keep_in_db.add(tmdb_id if item_type == 'Movie' else f"{tmdb_id}-S{season_number}")
+            index_update_batch.append({
+                "tmdb_id": tmdb_id, "item_type": item_type, "season_number": season_number,
+                "status": final_status, "reason": reason, "matched_rule_id": rule_id
+            })
         
         # --- 步骤 3: 按规则遍历处理 ---
         total_rules = len(all_enabled_rules)
@@ -214,7 +319,11 @@ def task_update_resubscribe_cache(processor):
                 elif tid in series_map:
                     candidate_series_ids.append(tid)
 
+            compiled_rule = _compile_rule(rule)
+            rule_id = rule.get('id')
+
             # ====== 3a. 处理电影 ======
+            movies_to_evaluate = []
             for tmdb_id in candidate_movie_ids:
                 movie = movies_map[tmdb_id]
                 processed_tmdb_ids.add(tmdb_id) # 标记已处理
@@ -224,8 +333,28 @@ def task_update_resubscribe_cache(processor):
                 if emby_ids and len(emby_ids) > 1:
                     continue
                 
-                assets = movie.get('asset_details_json')
+                if not movie.get('asset_hash'): continue
+
+                # 输入未变化 (资产内容、评分、语言、规则定义均相同)：直接复用上次的判定结果
+                input_hash = _build_eval_input_hash(
+                    compiled_rule['rule_hash'], movie['asset_hash'], movie.get('rating'), movie.get('original_language')
+                )
+                cached = eval_cache.get((tmdb_id, "Movie", -1))
+                if cached and cached['input_hash'] == input_hash:
+                    reused_count += 1
+                    if cached['needs_action']:
+                        _record_needed(tmdb_id, "Movie", -1, cached['reason'], movie['title'], rule_name, rule_id)
+                    continue
+
+                movies_to_evaluate.append((tmdb_id, input_hash))
+
+            # 只为输入发生变化的电影取回完整资产详情
+            movie_assets_map = resubscribe_db.fetch_movie_assets_batch([tid for tid, _ in movies_to_evaluate])
+            for tmdb_id, input_hash in movies_to_evaluate:
+                movie = movies_map[tmdb_id]
+                assets = movie_assets_map.get(tmdb_id)
                 if not assets: continue
+                evaluated_count += 1
                 
                 # ==================== 1. 评分预检查 ====================
                 should_skip, rating_needed, rating_reason = _evaluate_rating_rule(
@@ -234,189 +363,80 @@ def task_update_resubscribe_cache(processor):
                     movie.get('title', '未知电影')
                 )
                 
-                if should_skip: continue
-                
-                # 计算物理状态
-                needs, reason = _item_needs_resubscribe(assets[0], rule, movie)
-                if rating_needed:
-                    needs = True
-                    reason = rating_reason
-                
-                item_key_tuple = (tmdb_id, "Movie", -1)
-                existing_status = current_statuses.get(item_key_tuple)
-
-                if not needs:
-                    continue
-
-                final_status = 'needed'
-                if existing_status in ['subscribed', 'auto_subscribed']:
-                    final_status = existing_status
-                elif existing_status == 'ignored':
-                    final_status = 'ignored'
-                else:
-                    logger.info(f"  ➜ 《{movie['title']}》命中规则 '{rule_name}'。原因: {reason}")
-                    final_status = 'needed'
-
-                keys_to_keep_in_db.add(item_key_tuple[0])
-                index_update_batch.append({
-                    "tmdb_id": tmdb_id, "item_type": "Movie", "season_number": -1,
-                    "status": final_status, "reason": reason, "matched_rule_id": rule.get('id')
+                needs, reason = False, ""
+                if not should_skip:
+                    # 计算物理状态
+                    needs, reason = _item_needs_resubscribe(assets[0], rule, movie, compiled_rule)
+                    if rating_needed:
+                        needs = True
+                        reason = rating_reason
+
+                eval_cache_updates.append({
+                    "tmdb_id": tmdb_id, "item_type": "Movie", "season_number": -1, "input_hash": input_hash,
+                    "matched_rule_id": rule_id, "needs_action": needs, "reason": reason
                 })
+                if needs:
+                    _record_needed(tmdb_id, "Movie", -1, reason, movie['title'], rule_name, rule_id)
 
             # ====== 3b. 处理剧集 ======
-            if candidate_series_ids:
-                # 批量获取这些剧集的分集信息
-                all_episodes_simple = resubscribe_db.fetch_episodes_simple_batch(candidate_series_ids)
+            series_to_check = []
+            for tmdb_id in candidate_series_ids:
+                processed_tmdb_ids.add(tmdb_id) # 标记已处理
+                # 追更保护
+                watching_status = series_map[tmdb_id].get('watching_status', 'NONE')
+                if watching_status in ['Watching', 'Paused', 'Pending']:
+                    continue
+                series_to_check.append(tmdb_id)
+
+            if series_to_check:
+                # 先在数据库侧计算每季的内容摘要，摘要未变的季直接复用上次判定结果
+                season_digests = resubscribe_db.fetch_season_digests_batch(series_to_check)
+                seasons_to_evaluate = {}
+                for (tmdb_id, season_num), content_hash in season_digests.items():
+                    if season_num == 0: continue
+                    series = series_map[tmdb_id]
+                    input_hash = _build_eval_input_hash(
+                        compiled_rule['rule_hash'], content_hash, series.get('rating'),
+                        series.get('original_language'), series.get('watchlist_is_airing', False)
+                    )
+                    cached = eval_cache.get((tmdb_id, "Season", season_num))
+                    if cached and cached['input_hash'] == input_hash:
+                        reused_count += 1
+                        if cached['needs_action']:
+                            _record_needed(tmdb_id, "Season", season_num, cached['reason'], f"{series['title']} - 第{season_num}季", rule_name, rule_id)
+                        continue
+                    seasons_to_evaluate[(tmdb_id, season_num)] = input_hash
+
+                # 批量获取需要重新判定的剧集的分集信息
+                all_episodes_simple = resubscribe_db.fetch_episodes_simple_batch(
+                    list({tmdb_id for tmdb_id, _ in seasons_to_evaluate})
+                ) if seasons_to_evaluate else []
                 
                 episodes_map = defaultdict(list)
                 for ep in all_episodes_simple:
-                    episodes_map[str(ep['parent_series_tmdb_id'])].append(ep)
+                    season_key = (str(ep['parent_series_tmdb_id']), ep.get('season_number'))
+                    if season_key in seasons_to_evaluate:
+                        episodes_map[season_key].append(ep)
                 
-                for tmdb_id in candidate_series_ids:
+                for (tmdb_id, season_num), input_hash in seasons_to_evaluate.items():
+                    eps_in_season = episodes_map.get((tmdb_id, season_num))
+                    if not eps_in_season: continue
                     series = series_map[tmdb_id]
-                    processed_tmdb_ids.add(tmdb_id) # 标记已处理
-
-                    # 追更保护
-                    watching_status = series.get('watching_status', 'NONE')
-                    if watching_status in ['Watching', 'Paused', 'Pending']:
-                        continue
+                    evaluated_count += 1
 
-                    episodes = episodes_map.get(tmdb_id)
-                    if not episodes: continue
-
-                    episodes_by_season = defaultdict(list)
-                    for ep in episodes:
-                        episodes_by_season[ep.get('season_number')].append(ep)
-
-                    series_meta_wrapper = {
-                        'title': series['title'],
-                        'tmdb_id': tmdb_id,
-                        'item_type': 'Series',
-                        'original_language': series.get('original_language'),
-                        'rating': series.get('rating')
-                    }
-
-                    for season_num, eps_in_season in episodes_by_season.items():
-                        if season_num is None: continue
-                        if int(season_num) == 0: continue
-
-                        # --- 1. 计算缺集 (逻辑保持不变) ---
-                        missing_episodes = []
-                        has_gaps = False
-                        
-                        valid_eps = [e for e in eps_in_season if e.get('episode_number')]
-                        if valid_eps:
-                            existing_ep_nums = set(e['episode_number'] for e in valid_eps)
-                            max_ep = max(existing_ep_nums)
-                            for i in range(1, max_ep):
-                                if i not in existing_ep_nums:
-                                    missing_episodes.append(i)
-                            
-                            if missing_episodes:
-                                has_gaps = True
-                                missing_episodes.sort()
-
-                        # 跳过多版本
-                        has_multi_version = False
-                        for ep in eps_in_season:
-                            ep_ids = ep.get('emby_item_ids_json')
-                            if ep_ids and len(ep_ids) > 1:
-                                has_multi_version = True
-                                break
-                        if has_multi_version: continue
-                        
-                        eps_in_season.sort(key=lambda x: x.get('episode_number', 0))
-                        rep_ep = eps_in_season[0]
-                        season_tmdb_id = rep_ep.get('season_tmdb_id')
-                        assets = rep_ep.get('asset_details_json')
-                        if not assets: continue
-
-                        if season_tmdb_id:
-                            missing_info_updates[season_tmdb_id] = missing_episodes
-
-                        current_season_wrapper = series_meta_wrapper.copy()
-                        current_season_wrapper.update({
-                            'item_type': 'Season',
-                            'season_number': int(season_num),
-                            'has_gaps': has_gaps,
-                            'missing_episodes': missing_episodes
-                        })
-
-                        # --- 初始化计算状态 ---
-                        status_calculated = 'ok'
-                        reason_calculated = ""
-
-                        # 1. 评分检查
-                        season_display_name = f"{series['title']} - 第{season_num}季"
-                        should_skip, rating_needed, rating_reason = _evaluate_rating_rule(
-                            rule, 
-                            current_season_wrapper.get('rating'), 
-                            season_display_name
-                        )
-
-                        if should_skip: continue
-                        if rating_needed:
-                            status_calculated = 'needed'
-                            reason_calculated = rating_reason
-
-                        # 2. 常规洗版检查
-                        if status_calculated == 'ok':
-                            needs_upgrade, upgrade_reason = _item_needs_resubscribe(assets[0], rule, current_season_wrapper)
-                            if needs_upgrade:
-                                status_calculated = 'needed'
-                                reason_calculated = upgrade_reason
-
-                        # 3. 一致性检查
-                        is_airing = series.get('watchlist_is_airing', False)
-                        
-                        if status_calculated == 'ok' and rule.get('consistency_check_enabled'):
-                            if not is_airing:
-                                needs_fix, fix_reason = _check_season_consistency(eps_in_season, rule)
-                                if needs_fix:
-                                    status_calculated = 'needed'
-                                    reason_calculated = fix_reason
-                            else:
-                                # 可选：打印调试日志
-                                # logger.debug(f"  ➜ [一致性检查] 《{series['title']}》正在连载中，跳过一致性检查。")
-                                pass
-
-                        item_key_tuple = (tmdb_id, "Season", int(season_num))
-                        existing_status = current_statuses.get(item_key_tuple)
-                        
-                        # 4. 缺集检查
-                        if status_calculated == 'ok' and rule.get("filter_missing_episodes_enabled"):
-                            if has_gaps:
-                                status_calculated = 'needed'
-                                # ★★★ 确保原因被赋值 ★★★
-                                reason_calculated = f"缺失集数: {','.join(map(str, missing_episodes[:5]))}{'...' if len(missing_episodes)>5 else ''}"
-                            else:
-                                # 如果规则只开启了“缺集筛选”，而当前季不缺集，
-                                # 且没有命中上面的评分/画质规则，那么它就是 ok 的，不应该被加入 index_update_batch
-                                pass
-
-                        # ★★★ 修复 3: 只有 status_calculated != 'ok' 才入库 ★★★
-                        # 如果状态是 ok，说明它不符合任何洗版/删除条件，直接跳过
-                        if status_calculated == 'ok': 
-                            continue
-
-                        # ... (后续入库逻辑) ...
-                        item_key_tuple = (tmdb_id, "Season", int(season_num))
-                        existing_status = current_statuses.get(item_key_tuple)
-
-                        final_status = 'needed'
-                        if existing_status in ['subscribed', 'auto_subscribed']:
-                            final_status = existing_status
-                        elif existing_status == 'ignored':
-                            final_status = 'ignored'
-                        else:
-                            logger.info(f"  ➜ 《{series['title']} - 第{season_num}季》命中规则 '{rule_name}'。原因: {reason_calculated}")
-                            final_status = 'needed'
+                    status_calculated, reason_calculated = _evaluate_season(
+                        series, tmdb_id, season_num, eps_in_season, rule, compiled_rule, missing_info_updates
+                    )
+                    needs = status_calculated != 'ok'
+                    eval_cache_updates.append({
+                        "tmdb_id": tmdb_id, "item_type": "Season", "season_number": season_num, "input_hash": input_hash,
+                        "matched_rule_id": rule_id, "needs_action": needs, "reason": reason_calculated
+                    })
+                    # 只有 status_calculated != 'ok' 才入库
+                    if needs:
+                        _record_needed(tmdb_id, "Season", season_num, reason_calculated, f"{series['title']} - 第{season_num}季", rule_name, rule_id)
 
-                        keys_to_keep_in_db.add(f"{tmdb_id}-S{season_num}")
-                        index_update_batch.append({
-                            "tmdb_id": tmdb_id, "item_type": "Season", "season_number": season_num,
-                            "status": final_status, "reason": reason_calculated, "matched_rule_id": rule.get('id')
-                        })
+        logger.info(f"  ➜ 规则判定完成：重新判定 {evaluated_count} 项，输入未变化直接复用 {reused_count} 项。")
 
         # --- 步骤 4: 执行数据库更新与清理 ---
         
@@ -425,12 +445,16 @@ def task_update_resubscribe_cache(processor):
             task_manager.update_status_from_thread(90, f"正在更新 {len(missing_info_updates)} 条缺集记录...")
             resubscribe_db.batch_update_missing_info(missing_info_updates)
 
-        # 4.1 更新有效记录
+        # 4.1 保存本次判定结果，供下次增量复用
+        if eval_cache_updates:
+            resubscribe_db.upsert_resubscribe_eval_cache_batch(eval_cache_updates)
+
+        # 4.2 更新有效记录
         if index_update_batch:
             task_manager.update_status_from_thread(95, f"正在保存 {len(index_update_batch)} 条结果...")
             resubscribe_db.upsert_resubscribe_index_batch(index_update_batch)
         
-        # 4.2 清理陈旧记录 (ok 的，或者已删除的，或者不再命中任何规则的)
+        # 4.3 清理陈旧记录 (ok 的，或者已删除的，或者不再命中任何规则的)
         all_db_keys = resubscribe_db.get_all_resubscribe_index_keys()
         keys_to_purge = all_db_keys - keys_to_keep_in_db
         
@@ -465,229 +489,157 @@ def task_resubscribe_batch(processor, item_ids: List[str]):
 # ======================================================================
 # 内部辅助函数
 # ======================================================================
-def _item_needs_resubscribe(asset_details: dict, rule: dict, media_metadata: Optional[dict]) -> tuple[bool, str]:
+# --- 等级金字塔 (数字越大，等级越高) ---
+RESOLUTION_ORDER = {"4k": 4, "1080p": 3, "720p": 2, "480p": 1, "未知": 0}
+QUALITY_HIERARCHY = {'remux': 6, 'bluray': 5, 'web-dl': 4, 'webrip': 3, 'hdtv': 2, 'dvdrip': 1, '未知': 0}
+# 严格对应 helpers.py 中 _get_standardized_effect 的输出
+EFFECT_HIERARCHY = {"dovi_p8": 7, "dovi_p7": 6, "dovi_p5": 5, "dovi_other": 4, "hdr10+": 3, "hdr": 2, "sdr": 1}
+# 为常见别名设置相同等级，增强兼容性
+CODEC_HIERARCHY = {'hevc': 2, 'h265': 2, 'h264': 1, 'avc': 1, '未知': 0}
+
+# 规则中不影响判定结果的字段，不参与规则指纹计算
+_RULE_HASH_IGNORED_FIELDS = {'name', 'sort_order', 'enabled'}
+
+def _compile_rule(rule: dict) -> dict:
     """
-    完全依赖 asset_details 中预先分析好的数据进行判断，不再进行任何二次解析。
+    把一条规则预编译为可直接比较的阈值：各类“最高目标等级”、文件大小阈值等只算一次，
+    不再在每个项目上重复解析规则。同时计算规则指纹，用于增量判定。
     """
-    item_name = media_metadata.get('title', '未知项目')
-    reasons = []
+    compiled = {'rule_hash': hashlib.md5(json.dumps(
+        {k: v for k, v in rule.items() if k not in _RULE_HASH_IGNORED_FIELDS},
+        sort_keys=True, ensure_ascii=False, default=str
+    ).encode('utf-8')).hexdigest()}
 
-    # --- 1. 分辨率检查 (直接使用 resolution_display) ---
+    # 1. 分辨率
+    compiled['resolution_tier'] = None
     try:
         if rule.get("resubscribe_resolution_enabled"):
-            # 定义清晰度等级的顺序
-            RESOLUTION_ORDER = {
-                "4k": 4,
-                "1080p": 3,
-                "720p": 2,
-                "480p": 1,
-                "未知": 0,
-            }
-            
-            # 获取当前媒体的清晰度等级
-            current_res_str = asset_details.get('resolution_display', '未知')
-            current_tier = RESOLUTION_ORDER.get(current_res_str, 1)
-
-            # 获取规则要求的清晰度等级
             required_width = int(rule.get("resubscribe_resolution_threshold", 1920))
             required_tier = 1
             if required_width >= 3800: required_tier = 4
             elif required_width >= 1900: required_tier = 3
             elif required_width >= 1200: required_tier = 2
             elif required_width >= 700: required_tier = 1
-
-            if current_tier < required_tier:
-                reasons.append("分辨率不达标")
+            compiled['resolution_tier'] = required_tier
     except (ValueError, TypeError) as e:
         logger.warning(f"  ➜ [分辨率检查] 处理时发生错误: {e}")
 
-    # --- 2. 质量检查 (直接使用 quality_display) ---
+    # 2~4. 质量 / 特效 / 编码：计算规则要求的“最高目标等级”
+    #      例如规则是 ['BluRay', 'WEB-DL']，那么目标就是达到 BluRay (等级5)
+    def _highest_tier(enabled_key, include_key, hierarchy):
+        required = rule.get(include_key) or []
+        if not rule.get(enabled_key) or not required:
+            return None
+        try:
+            return max(hierarchy.get(str(v).lower(), 0) for v in required)
+        except Exception as e:
+            logger.warning(f"  ➜ [规则编译] 解析 '{include_key}' 时发生错误: {e}")
+            return None
+
+    compiled['quality_tier'] = _highest_tier("resubscribe_quality_enabled", "resubscribe_quality_include", QUALITY_HIERARCHY)
+    compiled['effect_tier'] = _highest_tier("resubscribe_effect_enabled", "resubscribe_effect_include", EFFECT_HIERARCHY)
+    compiled['codec_tier'] = _highest_tier("resubscribe_codec_enabled", "resubscribe_codec_include", CODEC_HIERARCHY)
+
+    # 5. 文件大小
+    compiled['filesize'] = None
     try:
-        # 检查规则是否启用了质量洗版
-        if rule.get("resubscribe_quality_enabled"):
-            # 获取规则中要求的质量列表，例如 ['BluRay', 'WEB-DL']
-            required_qualities = rule.get("resubscribe_quality_include", [])
-            
-            # 仅当规则中明确配置了要求时，才执行检查
-            if required_qualities:
-                # 1. 定义权威的“质量金字塔”等级（数字越大，等级越高）
-                QUALITY_HIERARCHY = {
-                    'remux': 6,
-                    'bluray': 5,
-                    'web-dl': 4,
-                    'webrip': 3,
-                    'hdtv': 2,
-                    'dvdrip': 1,
-                    '未知': 0
-                }
-
-                # 2. 计算规则要求的“最高目标等级”
-                #    例如，如果规则是 ['BluRay', 'WEB-DL']，那么目标就是达到 BluRay (等级5)
-                highest_required_tier = 0
-                for req_quality in required_qualities:
-                    highest_required_tier = max(highest_required_tier, QUALITY_HIERARCHY.get(req_quality.lower(), 0))
-
-                # 3. 获取当前文件经过分析后得出的“质量标签”
-                current_quality_tag = asset_details.get('quality_display', '未知').lower()
-                
-                # 4. 计算当前文件所处的“实际质量等级”
-                current_actual_tier = QUALITY_HIERARCHY.get(current_quality_tag, 0)
+        if rule.get("resubscribe_filesize_enabled"):
+            compiled['filesize'] = (
+                rule.get("resubscribe_filesize_operator", 'lt'),
+                float(rule.get("resubscribe_filesize_threshold_gb", 10.0))
+            )
+    except (ValueError, TypeError) as e:
+        logger.warning(f"  ➜ [文件大小检查] 处理时发生错误: {e}")
 
-                # 5. 最终裁决：如果文件的实际等级 < 规则的最高目标等级，则判定为不达标
-                if current_actual_tier < highest_required_tier:
-                    reasons.append("质量不符")
-    except Exception as e:
-        logger.warning(f"  ➜ [质量检查] 处理时发生错误: {e}")
+    # 6~7. 音轨 / 字幕
+    compiled['audio_langs'] = (rule.get("resubscribe_audio_missing_languages") or []) if rule.get("resubscribe_audio_enabled") else []
+    compiled['subtitle_langs'] = (rule.get("resubscribe_subtitle_missing_languages") or []) if rule.get("resubscribe_subtitle_enabled") else []
+    compiled['subtitle_skip_if_audio'] = bool(rule.get("resubscribe_subtitle_skip_if_audio_exists", False))
+    compiled['missing_episodes'] = bool(rule.get("filter_missing_episodes_enabled"))
+    return compiled
 
-    # --- 3. 特效检查 (直接使用 effect_display) ---
-    try:
-        # 检查规则是否启用了特效洗版
-        if rule.get("resubscribe_effect_enabled"):
-            # 获取规则中要求的特效列表，例如 ['dovi_p8', 'hdr10+']
-            required_effects = rule.get("resubscribe_effect_include", [])
-            
-            # 仅当规则中明确配置了要求时，才执行检查
-            if required_effects:
-                # 1. 定义权威的“特效金字塔”等级（数字越大，等级越高）
-                #    这个层级严格对应 helpers.py 中 _get_standardized_effect 的输出
-                EFFECT_HIERARCHY = {
-                    "dovi_p8": 7,
-                    "dovi_p7": 6,
-                    "dovi_p5": 5,
-                    "dovi_other": 4,
-                    "hdr10+": 3,
-                    "hdr": 2,
-                    "sdr": 1
-                }
+def _item_needs_resubscribe(asset_details: dict, rule: dict, media_metadata: Optional[dict], compiled: Optional[dict] = None) -> tuple[bool, str]:
+    """
+    完全依赖 asset_details 中预先分析好的数据进行判断，不再进行任何二次解析。
+    compiled 为 _compile_rule 的结果，批量判定时由调用方传入以避免重复编译。
+    """
+    if compiled is None:
+        compiled = _compile_rule(rule)
+    item_name = media_metadata.get('title', '未知项目')
+    reasons = []
 
-                # 2. 计算规则要求的“最高目标等级”
-                #    例如，如果规则是 ['hdr', 'dovi_p5']，那么目标就是达到 d_p5 (等级5)
-                highest_required_tier = 0
-                for req_effect in required_effects:
-                    highest_required_tier = max(highest_required_tier, EFFECT_HIERARCHY.get(req_effect.lower(), 0))
+    # --- 1. 分辨率检查 (直接使用 resolution_display) ---
+    if compiled['resolution_tier'] is not None:
+        current_tier = RESOLUTION_ORDER.get(asset_details.get('resolution_display', '未知'), 1)
+        if current_tier < compiled['resolution_tier']:
+            reasons.append("分辨率不达标")
 
-                # 3. 获取当前文件经过 helpers.py 分析后得出的“权威特效标识”
-                #    asset_details['effect_display'] 现在存储的是 'dovi_p8' 这样的精确字符串
-                current_effect_tag = asset_details.get('effect_display', 'sdr')
-                
-                # 4. 计算当前文件所处的“实际特效等级”
-                current_actual_tier = EFFECT_HIERARCHY.get(current_effect_tag.lower(), 1) # 默认为sdr等级
+    # --- 2. 质量检查 (直接使用 quality_display) ---
+    if compiled['quality_tier'] is not None:
+        current_quality_tag = str(asset_details.get('quality_display') or '未知').lower()
+        if QUALITY_HIERARCHY.get(current_quality_tag, 0) < compiled['quality_tier']:
+            reasons.append("质量不符")
 
-                # 5. 最终裁决：如果文件的实际等级 < 规则的最高目标等级，则判定为不达标
-                if current_actual_tier < highest_required_tier:
-                    reasons.append("特效不达标")
-    except Exception as e:
-        logger.warning(f"  ➜ [特效检查] 处理时发生错误: {e}")
+    # --- 3. 特效检查 (effect_display 存储的是 'dovi_p8' 这样的精确字符串) ---
+    if compiled['effect_tier'] is not None:
+        current_effect_tag = str(asset_details.get('effect_display') or 'sdr').lower()
+        if EFFECT_HIERARCHY.get(current_effect_tag, 1) < compiled['effect_tier']: # 默认为sdr等级
+            reasons.append("特效不达标")
 
     # --- 4. 编码检查 ---
-    try:
-        # 检查规则是否启用了编码洗版
-        if rule.get("resubscribe_codec_enabled"):
-            # 获取规则中要求的编码列表，例如 ['hevc']
-            required_codecs = rule.get("resubscribe_codec_include", [])
-            
-            if required_codecs:
-                # 1. 定义“编码金字塔”等级（数字越大，等级越高）
-                #    为常见别名设置相同等级，增强兼容性
-                CODEC_HIERARCHY = {
-                    'hevc': 2, 'h265': 2,
-                    'h264': 1, 'avc': 1,
-                    '未知': 0
-                }
+    if compiled['codec_tier'] is not None:
+        current_codec_tag = str(asset_details.get('codec_display') or '未知').lower()
+        if CODEC_HIERARCHY.get(current_codec_tag, 0) < compiled['codec_tier']:
+            reasons.append("编码不符")
 
-                # 2. 计算规则要求的“最高目标等级”
-                highest_required_tier = 0
-                for req_codec in required_codecs:
-                    highest_required_tier = max(highest_required_tier, CODEC_HIERARCHY.get(req_codec.lower(), 0))
-
-                # 3. 获取当前文件经过分析后得出的“编码标签”
-                current_codec_tag = asset_details.get('codec_display', '未知').lower()
-                
-                # 4. 计算当前文件所处的“实际编码等级”
-                current_actual_tier = CODEC_HIERARCHY.get(current_codec_tag, 0)
-
-                # 5. 最终裁决：如果文件的实际等级 < 规则的最高目标等级，则判定为不达标
-                if current_actual_tier < highest_required_tier:
-                    reasons.append("编码不符")
-    except Exception as e:
-        logger.warning(f"  ➜ [编码检查] 处理时发生错误: {e}")
-
-    # --- 4. 文件大小检查 (直接使用 size_bytes) ---
+    # --- 5. 文件大小检查 (直接使用 size_bytes) ---
     try:
-        if rule.get("resubscribe_filesize_enabled"):
+        if compiled['filesize'] is not None:
             file_size_bytes = asset_details.get('size_bytes')
             if file_size_bytes:
-                operator = rule.get("resubscribe_filesize_operator", 'lt')
-                threshold_gb = float(rule.get("resubscribe_filesize_threshold_gb", 10.0))
+                operator, threshold_gb = compiled['filesize']
                 file_size_gb = file_size_bytes / (1024**3)
-                needs_resubscribe = False
-                reason_text = ""
                 if operator == 'lt' and file_size_gb < threshold_gb:
-                    needs_resubscribe = True
-                    reason_text = f"文件 < {threshold_gb} GB"
+                    reasons.append(f"文件 < {threshold_gb} GB")
                 elif operator == 'gt' and file_size_gb > threshold_gb:
-                    needs_resubscribe = True
-                    reason_text = f"文件 > {threshold_gb} GB"
-                if needs_resubscribe:
-                    reasons.append(reason_text)
-    except (ValueError, TypeError, IndexError) as e:
+                    reasons.append(f"文件 > {threshold_gb} GB")
+    except (ValueError, TypeError) as e:
         logger.warning(f"  ➜ [文件大小检查] 处理时发生错误: {e}")
 
-    # --- 5. 音轨检查 (V3 - 集成通用豁免) ---
+    # --- 6. 音轨检查 (集成通用豁免) ---
     try:
-        if rule.get("resubscribe_audio_enabled"):
-            required_langs = rule.get("resubscribe_audio_missing_languages", [])
-            if required_langs:
-                existing_audio_codes = set(asset_details.get('audio_languages_raw', []))
-                
-                for lang_code in required_langs:
-                    # ★★★ 核心修改：在循环内部调用新的豁免函数 ★★★
-                    if _is_exempted_from_language_check(media_metadata, lang_code):
-                        continue
-                    
-                    if lang_code not in existing_audio_codes:
-                        display_name = AUDIO_DISPLAY_MAP.get(lang_code, lang_code)
-                        reasons.append(f"缺{display_name}音轨")
+        if compiled['audio_langs']:
+            existing_audio_codes = set(asset_details.get('audio_languages_raw', []))
+            for lang_code in compiled['audio_langs']:
+                if _is_exempted_from_language_check(media_metadata, lang_code):
+                    continue
+                if lang_code not in existing_audio_codes:
+                    display_name = AUDIO_DISPLAY_MAP.get(lang_code, lang_code)
+                    reasons.append(f"缺{display_name}音轨")
     except Exception as e:
         logger.warning(f"  ➜ [音轨检查] 处理时发生未知错误: {e}")
 
-    # --- 6. 字幕检查 (V3 - 集成通用豁免) ---
+    # --- 7. 字幕检查 (集成通用豁免) ---
     try:
-        if rule.get("resubscribe_subtitle_enabled"):
-            required_langs = rule.get("resubscribe_subtitle_missing_languages", [])
-            if required_langs:
-                existing_subtitle_codes = set(asset_details.get('subtitle_languages_raw', []))
-                
-                for lang_code in required_langs:
-                    # ★★★ 核心修改：在循环内部调用新的豁免函数 ★★★
-                    if _is_exempted_from_language_check(media_metadata, lang_code):
-                        continue
-                    
-                    # ★★★ 新功能逻辑开始 ★★★
-                    # 检查规则是否开启了“音轨豁免”功能
-                    if rule.get("resubscribe_subtitle_skip_if_audio_exists", False):
-                        # 获取已存在的音轨语言代码
-                        existing_audio_codes = asset_details.get('audio_languages_raw', [])
-                        # 如果要求的字幕语言 (如 'chi') 已经存在于音轨中
-                        if lang_code in existing_audio_codes:
-                            continue # 则跳过对这条字幕的检查，相当于豁免
-                    # ★★★ 新功能逻辑结束 ★★★
-                    
-                    # 如果未被豁免，且字幕确实不存在
-                    if lang_code not in existing_subtitle_codes:
-                        display_name = SUB_DISPLAY_MAP.get(lang_code, lang_code)
-                        reasons.append(f"缺{display_name}字幕")
+        if compiled['subtitle_langs']:
+            existing_subtitle_codes = set(asset_details.get('subtitle_languages_raw', []))
+            existing_audio_codes = asset_details.get('audio_languages_raw', [])
+            for lang_code in compiled['subtitle_langs']:
+                if _is_exempted_from_language_check(media_metadata, lang_code):
+                    continue
+                # 规则开启了“音轨豁免”：要求的字幕语言已存在于音轨中，则跳过
+                if compiled['subtitle_skip_if_audio'] and lang_code in existing_audio_codes:
+                    continue
+                if lang_code not in existing_subtitle_codes:
+                    display_name = SUB_DISPLAY_MAP.get(lang_code, lang_code)
+                    reasons.append(f"缺{display_name}字幕")
     except Exception as e:
         logger.warning(f"  ➜ [字幕检查] 处理时发生未知错误: {e}")
 
-    # --- 6.缺集检查 (仅限剧集) ---
-    try:
-        if rule.get("filter_missing_episodes_enabled") and media_metadata.get('item_type') == 'Season':
-            if media_metadata.get('has_gaps'):
-                reasons.append("存在中间缺集")
-                    
-    except Exception as e:
-        logger.warning(f"  ➜ [缺集检查] 处理时发生错误: {e}")
+    # --- 8. 缺集检查 (仅限剧集) ---
+    if compiled['missing_episodes'] and media_metadata.get('item_type') == 'Season':
+        if media_metadata.get('has_gaps'):
+            reasons.append("存在中间缺集")
                  
     if reasons:
         final_reason = "; ".join(sorted(list(set(reasons))))
@@ -989,6 +941,7 @@ def _execute_resubscribe(processor, task_name: str, target):
 
     for i, item in enumerate(items_to_subscribe):
         if processor.is_stop_requested(): break
+        metrics.record_items_processed()
         
         current_quota = settings_db.get_subscription_quota()
         if current_quota <= 0:
@@ -9,6 +9,7 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 # 导入需要的底层模块和共享实例
 import config_manager
 import constants
+import metrics
 import handler.tmdb as tmdb
 import handler.moviepilot as moviepilot
 import handler.nullbr as nullbr_handler
@@ -653,6 +654,7 @@ def task_auto_subscribe(processor):
         # 2. 遍历待办列表，逐一处理
         for i, item in enumerate(wanted_items):
             if processor.is_stop_requested(): break
+            metrics.record_items_processed()
             
             task_manager.update_status_from_thread(
                 int(10 + (i / len(wanted_items)) * 85),
@@ -4,16 +4,24 @@
 import time
 import json
 import logging
+from datetime import datetime, timezone, timedelta
+from typing import Optional, List, Dict, Any
 from concurrent.futures import ThreadPoolExecutor, as_completed
 
 # 导入需要的底层模块和共享实例
 import handler.emby as emby
 import task_manager
+import metrics
 from database import connection, user_db
 from extensions import SYSTEM_UPDATE_MARKERS, SYSTEM_UPDATE_LOCK
 
 logger = logging.getLogger(__name__)
 
+# 用户媒体状态同步的并发数 (每个用户一个工作线程)
+USER_SYNC_MAX_WORKERS = 4
+# 超过这个天数没有成功同步的用户，重新走一次全量同步以纠正漂移
+USER_SYNC_FULL_RESYNC_DAYS = 7
+
 # ★★★ 用户数据全量同步任务 ★★★
 def task_sync_all_user_data(processor):
     """
@@ -83,97 +91,163 @@ def task_sync_all_user_data(processor):
         task_manager.update_status_from_thread(8, "正在同步用户注册时间与扩展状态...")
         user_db.upsert_emby_users_extended_batch_sync(all_users_basic)
         
-        # 步骤 4: 循环同步每个用户的媒体播放状态
+        # 步骤 4: 并发同步每个用户的媒体播放状态 (增量 + 服务端过滤)
         total_users = len(all_users_basic)
-        logger.info(f"  ➜ 共找到 {total_users} 个Emby用户，将逐一同步其数据...")
+        watermarks = user_db.get_user_data_sync_watermarks()
+        logger.info(f"  ➜ 共找到 {total_users} 个Emby用户，将以 {USER_SYNC_MAX_WORKERS} 并发同步其数据...")
+
+        finished_count = 0
+        failed_users = []
+        with ThreadPoolExecutor(max_workers=USER_SYNC_MAX_WORKERS) as executor:
+            future_to_user = {
+                executor.submit(_sync_single_user_data, processor, user, emby_url, emby_key, watermarks.get(user.get('Id'))): user
+                for user in all_users_basic if user.get('Id')
+            }
+            for future in as_completed(future_to_user):
+                user = future_to_user[future]
+                finished_count += 1
+                try:
+                    if not future.result():
+                        failed_users.append(user.get('Name'))
+                except Exception as e:
+                    failed_users.append(user.get('Name'))
+                    logger.error(f"  ➜ 同步用户 '{user.get('Name')}' 的媒体状态时出错: {e}", exc_info=True)
 
-        for i, user in enumerate(all_users_basic):
-            user_id = user.get('Id')
-            user_name = user.get('Name')
-            if not user_id: continue
-            if processor.is_stop_requested(): break
+                progress = 10 + int((finished_count / total_users) * 90)
+                task_manager.update_status_from_thread(progress, f"({finished_count}/{total_users}) 已同步用户: {user.get('Name')}")
+
+        final_message = f"任务完成！已成功为 {total_users - len(failed_users)}/{total_users} 个用户同步数据。"
+        if processor.is_stop_requested(): final_message = "任务已中断。"
+        task_manager.update_status_from_thread(100, final_message)
 
-            progress = 10 + int((i / total_users) * 90)
-            task_manager.update_status_from_thread(progress, f"({i+1}/{total_users}) 正在同步用户: {user_name}")
+    except Exception as e:
+        logger.error(f"执行 '{task_name}' 任务时发生严重错误: {e}", exc_info=True)
+        task_manager.update_status_from_thread(-1, f"任务失败: {e}")
 
-            user_items_with_data = emby.get_all_user_view_data(user_id, emby_url, emby_key)
-            if not user_items_with_data:
-                continue
+def _has_user_state(item: Dict[str, Any]) -> bool:
+    """条目是否带有需要记录的用户状态 (已播放 / 收藏 / 有播放进度)。"""
+    user_data = item.get('UserData', {})
+    return bool(user_data.get('Played') or user_data.get('IsFavorite') or user_data.get('PlaybackPositionTicks', 0) > 0)
+
+def _aggregate_user_items(user_items_with_data: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    将 Emby 返回的条目聚合为入库记录：电影用自身ID，分集聚合到剧集ID。
+    """
+    final_data_map = {}
+    for item in user_items_with_data:
+        item_type = item.get('Type')
+        item_id = item.get('Id')
+        # 聚合逻辑：电影用自身ID，分集聚合到剧集ID
+        target_id = item_id if item_type in ['Movie', 'Series'] else item.get('SeriesId')
+        if not target_id: continue
+
+        new_user_data = item.get('UserData', {})
+        
+        # =========================================================
+        # ★★★ 核心修复：播放次数兜底逻辑 ★★★
+        # =========================================================
+        raw_play_count = new_user_data.get('PlayCount', 0)
+        is_played = new_user_data.get('Played', False)
+        
+        # 如果 Emby 说“已播放”但次数是 0，强制修正为 1
+        if is_played and raw_play_count == 0:
+            current_play_count = 1
+        else:
+            current_play_count = raw_play_count
+        # =========================================================
+
+        if target_id not in final_data_map:
+            # --- 初始化新条目 ---
+            final_data_map[target_id] = item
+            if item_type == 'Episode':
+                final_data_map[target_id]['Id'] = target_id
             
-            final_data_map = {}
-            for item in user_items_with_data:
-                item_type = item.get('Type')
-                item_id = item.get('Id')
-                # 聚合逻辑：电影用自身ID，分集聚合到剧集ID
-                target_id = item_id if item_type in ['Movie', 'Series'] else item.get('SeriesId')
-                if not target_id: continue
-
-                new_user_data = item.get('UserData', {})
-                
-                # =========================================================
-                # ★★★ 核心修复：播放次数兜底逻辑 ★★★
-                # =========================================================
-                raw_play_count = new_user_data.get('PlayCount', 0)
-                is_played = new_user_data.get('Played', False)
-                
-                # 如果 Emby 说“已播放”但次数是 0，强制修正为 1
-                if is_played and raw_play_count == 0:
-                    current_play_count = 1
-                else:
-                    current_play_count = raw_play_count
-                # =========================================================
-
-                if target_id not in final_data_map:
-                    # --- 初始化新条目 ---
-                    final_data_map[target_id] = item
-                    if item_type == 'Episode':
-                        final_data_map[target_id]['Id'] = target_id
-                    
-                    # 确保 UserData 字典存在
-                    if 'UserData' not in final_data_map[target_id]:
-                        final_data_map[target_id]['UserData'] = {}
-                    
-                    # 初始化 PlayCount
-                    final_data_map[target_id]['UserData']['PlayCount'] = current_play_count
-                    
-                    # 初始化 Played 状态 (如果是电影，直接用自己的；如果是分集，稍后聚合)
-                    if 'Played' not in final_data_map[target_id]['UserData']:
-                         final_data_map[target_id]['UserData']['Played'] = is_played
-
-                else:
-                    # --- 聚合到已存在的条目 (主要是剧集) ---
-                    existing_item = final_data_map[target_id]
-                    existing_ud = existing_item.get('UserData', {})
-                    
-                    # 1. 更新播放进度 (取最新的)
-                    if 'PlaybackPositionTicks' in new_user_data:
-                        existing_ud['PlaybackPositionTicks'] = new_user_data['PlaybackPositionTicks']
-                    
-                    # 2. 更新已播放状态 (逻辑：只要有一集是 Played，剧集记录就可能被更新，具体看 Emby 返回的 Series 自身状态，这里做累加辅助)
-                    if 'Played' in new_user_data:
-                        # 如果当前分集是已播放，或者之前的记录已经是已播放，则保持 true
-                        existing_ud['Played'] = existing_ud.get('Played', False) or is_played
-                    
-                    # 3. ★★★ 累加播放次数 ★★★
-                    if 'PlayCount' not in existing_ud:
-                        existing_ud['PlayCount'] = 0
-                    
-                    existing_ud['PlayCount'] += current_play_count
+            # 确保 UserData 字典存在
+            if 'UserData' not in final_data_map[target_id]:
+                final_data_map[target_id]['UserData'] = {}
+            
+            # 初始化 PlayCount
+            final_data_map[target_id]['UserData']['PlayCount'] = current_play_count
             
-            # 将 map 转换为 list 准备入库
-            final_data_to_upsert = list(final_data_map.values())
+            # 初始化 Played 状态 (如果是电影，直接用自己的；如果是分集，稍后聚合)
+            if 'Played' not in final_data_map[target_id]['UserData']:
+                 final_data_map[target_id]['UserData']['Played'] = is_played
+
+        else:
+            # --- 聚合到已存在的条目 (主要是剧集) ---
+            existing_item = final_data_map[target_id]
+            existing_ud = existing_item.get('UserData', {})
             
-            user_db.upsert_user_media_data_batch(user_id, final_data_to_upsert)
+            # 1. 更新播放进度 (取最新的)
+            if 'PlaybackPositionTicks' in new_user_data:
+                existing_ud['PlaybackPositionTicks'] = new_user_data['PlaybackPositionTicks']
             
-            logger.info(f"  ➜ 成功为用户 '{user_name}' 同步了 {len(final_data_to_upsert)} 条媒体状态。")
+            # 2. 更新已播放状态 (逻辑：只要有一集是 Played，剧集记录就可能被更新，具体看 Emby 返回的 Series 自身状态，这里做累加辅助)
+            if 'Played' in new_user_data:
+                # 如果当前分集是已播放，或者之前的记录已经是已播放，则保持 true
+                existing_ud['Played'] = existing_ud.get('Played', False) or is_played
+            
+            # 3. ★★★ 累加播放次数 ★★★
+            if 'PlayCount' not in existing_ud:
+                existing_ud['PlayCount'] = 0
+            
+            existing_ud['PlayCount'] += current_play_count
 
-        final_message = f"任务完成！已成功为 {total_users} 个用户同步数据。"
-        if processor.is_stop_requested(): final_message = "任务已中断。"
-        task_manager.update_status_from_thread(100, final_message)
+    return list(final_data_map.values())
 
-    except Exception as e:
-        logger.error(f"执行 '{task_name}' 任务时发生严重错误: {e}", exc_info=True)
-        task_manager.update_status_from_thread(-1, f"任务失败: {e}")
+def _sync_single_user_data(processor, user: Dict[str, Any], emby_url: str, emby_key: str, watermark: Optional[datetime]) -> bool:
+    """
+    同步单个用户的媒体状态。
+    - 有新鲜水位线时走增量：只拉取水位线之后变动的条目，涉及的剧集整部重新聚合。
+    - 否则走全量：服务端过滤出所有有状态的条目，并重置本地已失去状态的记录。
+    成功返回 True；只有成功时才推进水位线。
+    """
+    user_id = user.get('Id')
+    user_name = user.get('Name')
+    if processor.is_stop_requested():
+        return False
+
+    sync_started_at = datetime.now(timezone.utc)
+    is_incremental = bool(watermark) and (sync_started_at - watermark) < timedelta(days=USER_SYNC_FULL_RESYNC_DAYS)
+
+    if is_incremental:
+        # 往前多取一点，抵消 Emby 与本机的时钟误差
+        changed_items = emby.get_all_user_view_data(
+            user_id, emby_url, emby_key, min_date_last_saved=watermark - timedelta(minutes=5)
+        )
+        if changed_items is None:
+            return False
+
+        movie_items = [item for item in changed_items if item.get('Type') == 'Movie']
+        series_ids = {item.get('SeriesId') for item in changed_items if item.get('Type') == 'Episode' and item.get('SeriesId')}
+        series_ids.update(item.get('Id') for item in changed_items if item.get('Type') == 'Series')
+
+        series_related_items = []
+        if series_ids:
+            fetched = emby.get_user_series_view_data(user_id, list(series_ids), emby_url, emby_key)
+            if fetched is None:
+                return False
+            # 剧集本身总是保留 (用于同步状态回退)，分集只保留有状态的
+            series_related_items = [item for item in fetched if item.get('Type') == 'Series' or _has_user_state(item)]
+
+        final_data_to_upsert = _aggregate_user_items(movie_items + series_related_items)
+        changed_count = user_db.upsert_user_media_data_batch(user_id, final_data_to_upsert)
+        logger.info(f"  ➜ 用户 '{user_name}' 增量同步：{len(changed_items)} 个条目有变动，实际写入 {changed_count} 条媒体状态。")
+    else:
+        user_items_with_data = emby.get_all_user_view_data(user_id, emby_url, emby_key)
+        if user_items_with_data is None:
+            return False
+
+        final_data_to_upsert = _aggregate_user_items(user_items_with_data)
+        changed_count = user_db.upsert_user_media_data_batch(user_id, final_data_to_upsert)
+        reset_count = user_db.reset_user_media_data_not_in(user_id, [item['Id'] for item in final_data_to_upsert])
+        logger.info(
+            f"  ➜ 用户 '{user_name}' 全量同步：共 {len(final_data_to_upsert)} 条媒体状态，"
+            f"实际写入 {changed_count} 条，重置 {reset_count} 条已失效状态。"
+        )
+
+    user_db.update_user_data_sync_watermark(user_id, sync_started_at)
+    return True
 
 # ★★★ 检查并禁用过期用户 ★★★
 def task_check_expired_users(processor):
@@ -221,6 +295,7 @@ def task_check_expired_users(processor):
         if processor.is_stop_requested():
             logger.warning("  🚫 任务被用户中止。")
             break
+        metrics.record_items_processed()
 
         user_id = user_info['emby_user_id']
         user_name = user_info.get('name') or user_id # 如果join失败，用ID作为备用名
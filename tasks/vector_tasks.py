@@ -6,6 +6,7 @@ from database import connection
 from ai_translator import AITranslator
 import config_manager
 import constants
+import metrics
 import task_manager
 
 logger = logging.getLogger(__name__)
@@ -87,6 +88,7 @@ def task_generate_embeddings(processor):
             # 处理当前批次
             for i, item in enumerate(items_to_process):
                 if processor.is_stop_requested(): break
+                metrics.record_items_processed()
                 
                 tmdb_id = item['tmdb_id']
                 overview = item['overview']
@@ -0,0 +1,246 @@
+# tasks/version_ranking.py
+# 多版本排序键：按清理规则为每个版本预先计算一个可直接比较的排序键
+
+import re
+import json
+import time
+import hashlib
+import logging
+import threading
+from typing import List, Dict, Any, Optional, Tuple
+
+from database import settings_db
+
+logger = logging.getLogger(__name__)
+
+# 版本排序键写入 asset_details_json 的字段名
+RANK_KEY_FIELD = "rank_key"
+RANK_RULES_HASH_FIELD = "rank_rules_hash"
+
+DEFAULT_CLEANUP_RULES = [
+    {"id": "runtime", "enabled": True}, # 时长优先
+    {"id": "effect", "enabled": True, "priority": ["dovi_p8", "dovi_p7", "dovi_p5", "dovi_other", "hdr10+", "hdr", "sdr"]},
+    {"id": "resolution", "enabled": True, "priority": ["4k", "1080p", "720p", "480p"]},
+    {"id": "bit_depth", "enabled": True}, # 色深
+    {"id": "bitrate", "enabled": True},   # 码率
+    {"id": "codec", "enabled": True, "priority": ["AV1", "HEVC", "H.264", "VP9"]},
+    {"id": "quality", "enabled": True, "priority": ["remux", "blu-ray", "web-dl", "hdtv"]},
+    {"id": "subtitle", "enabled": True, "priority": "desc"}, # 有中文字幕的优先
+    {"id": "frame_rate", "enabled": False}, # 帧率默认关闭
+    {"id": "filesize", "enabled": True},
+    {"id": "date_added", "enabled": True, "priority": "asc"}
+]
+
+# 连续数值的分桶宽度，对应原先两两比较时的容差
+_BUCKET_WIDTHS = {'bitrate': 1.0, 'frame_rate': 2.0, 'runtime': 2.0}
+# 不在优先级列表中的取值统一排在最后
+_UNLISTED_INDEX = 999
+# 入库时间缺失的版本在日期这一项上排在最后 (低于任何 -YYYYMMDDHHMMSS)
+_MISSING_DATE_KEY = -10 ** 14
+# 排序键的计算方式变化时递增，使已写入的排序键随规则指纹一起失效
+_RANK_KEY_VERSION = 2
+
+# 规则缓存：资产解析是高频路径，避免每个版本都查一次设置表
+_RULES_CACHE_TTL = 60
+_rules_cache: Optional[Tuple[float, List[Dict[str, Any]], str]] = None
+_rules_cache_lock = threading.Lock()
+
+# ======================================================================
+# 属性提取与标准化
+# ======================================================================
+
+def get_version_properties(version: Dict) -> Dict:
+    """
+    从 asset_details_json 的单个版本条目中，提取用于比较的标准化属性。
+    包含：特效、分辨率、质量、文件大小、码率、色深、帧率、时长、字幕语言数量。
+    """
+    if not version or not isinstance(version, dict):
+        return {
+            'id': None, 'quality': 'unknown', 'resolution': 'unknown', 'effect': 'sdr', 'filesize': 0,
+            'video_bitrate_mbps': 0, 'bit_depth': 8, 'frame_rate': 0, 'runtime_minutes': 0,
+            'codec': 'unknown', 'subtitle_count': 0, 'subtitle_languages': []
+        }
+
+    # 1. 获取字幕语言列表 (例如 ['chi', 'eng'])，parse_full_asset_details 已经生成了这个字段
+    subtitle_langs = version.get('subtitle_languages_raw', [])
+
+    # 2. 获取字幕数量：优先使用 raw 列表的长度，为空时回退到原始 subtitles 列表
+    subtitle_count = len(subtitle_langs)
+    if subtitle_count == 0:
+        raw_subs = version.get('subtitles', [])
+        if raw_subs:
+            subtitle_count = len(raw_subs)
+
+    # 3. 获取其他标准化属性
+    quality = _normalize_quality(version.get("quality_display", "未知"))
+    resolution = version.get("resolution_display", "未知")
+
+    # 特效：数据库里存的是 display 格式 (如 "DoVi_P8")，转成小写 (如 "dovi_p8") 以便比较
+    effect_raw = version.get("effect_display", "SDR")
+    # 兼容旧数据可能是列表的情况
+    if isinstance(effect_raw, list):
+        effect_raw = effect_raw[0] if effect_raw else "SDR"
+    effect = str(effect_raw).lower()
+
+    codec = version.get("codec_display", "未知")
+
+    raw_id = version.get("emby_item_id")
+    int_id = int(raw_id) if raw_id and str(raw_id).isdigit() else 0
+
+    return {
+        "id": version.get("emby_item_id"),
+        "path": version.get("path"),
+
+        "quality": quality,
+        "resolution": resolution,
+        "effect": effect,
+        "codec": codec,
+
+        "filesize": version.get("size_bytes", 0),
+        "video_bitrate_mbps": version.get("video_bitrate_mbps") or 0,
+        "bit_depth": version.get("bit_depth") or 8,
+        "frame_rate": version.get("frame_rate") or 0,
+        "runtime_minutes": version.get("runtime_minutes") or 0,
+        "date_added": version.get("date_added_to_library") or "",
+        "int_id": int_id,
+        "subtitle_count": subtitle_count,
+        "subtitle_languages": subtitle_langs
+    }
+
+def _normalize_resolution(res: Any) -> str:
+    s = str(res).lower()
+    return '4k' if s == '2160p' else s
+
+def _normalize_quality(quality: Any) -> str:
+    return str(quality).lower().replace("bluray", "blu-ray").replace("webdl", "web-dl")
+
+def _normalize_effect(effect: Any) -> str:
+    return str(effect).lower().replace(" ", "_")
+
+def _normalize_codec(codec: Any) -> str:
+    s = str(codec).upper()
+    if s in ['H265', 'X265']: return 'HEVC'
+    if s in ['H264', 'X264', 'AVC']: return 'H.264'
+    return s
+
+_LIST_NORMALIZERS = {
+    'resolution': _normalize_resolution,
+    'quality': _normalize_quality,
+    'effect': _normalize_effect,
+    'codec': _normalize_codec,
+}
+
+def _date_to_number(date_str: str) -> int:
+    """把 ISO 日期字符串转成可比较的整数 (YYYYMMDDHHMMSS)，无效时为 0。"""
+    digits = re.sub(r'\D', '', str(date_str or '')[:19])
+    return int(digits) if digits else 0
+
+# ======================================================================
+# 规则编译与排序键
+# ======================================================================
+
+def compute_rules_hash(rules: List[Dict[str, Any]]) -> str:
+    raw = json.dumps([_RANK_KEY_VERSION, rules], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()[:16]
+
+def get_cleanup_rules() -> Tuple[List[Dict[str, Any]], str]:
+    """获取当前生效的清理规则及其指纹 (带短时缓存)。"""
+    global _rules_cache
+    now = time.monotonic()
+    with _rules_cache_lock:
+        if _rules_cache and now - _rules_cache[0] < _RULES_CACHE_TTL:
+            return _rules_cache[1], _rules_cache[2]
+
+    rules = settings_db.get_setting('media_cleanup_rules') or DEFAULT_CLEANUP_RULES
+    rules_hash = compute_rules_hash(rules)
+    with _rules_cache_lock:
+        _rules_cache = (now, rules, rules_hash)
+    return rules, rules_hash
+
+def invalidate_rules_cache():
+    """清理规则保存后调用，使新规则立即生效。"""
+    global _rules_cache
+    with _rules_cache_lock:
+        _rules_cache = None
+
+def build_rank_key(props: Dict[str, Any], rules: List[Dict[str, Any]]) -> List[float]:
+    """
+    按规则顺序为一个版本生成排序键，数值越大越优先。
+    - 连续数值按容差分桶，asc 偏好取负；
+    - 列表优先级取负的位置索引；
+    - 字幕规则之后的规则不再参与比较 (与原先两两比较的语义一致)；
+    - 入库时间缺失时，原先的两两比较会跳过日期、直接比较 ID，这种“跳过”无法表达为全序的排序键，
+      现改为缺失日期的版本在日期一项上排在最后，日期相同时仍按 ID 兜底。
+    同一套规则生成的键长度相同，可直接逐元素比较 (Python 列表或 PostgreSQL jsonb 数组均可)。
+    """
+    key: List[float] = []
+    for rule in rules:
+        if not rule.get('enabled'):
+            continue
+        rule_type = rule.get('id')
+        preference = rule.get('priority', 'desc')
+        sign = -1 if preference == 'asc' else 1
+
+        if rule_type in ('bitrate', 'frame_rate', 'runtime'):
+            field = {'bitrate': 'video_bitrate_mbps', 'frame_rate': 'frame_rate', 'runtime': 'runtime_minutes'}[rule_type]
+            try:
+                value = float(props.get(field) or 0)
+            except (TypeError, ValueError):
+                value = 0.0
+            key.append(sign * int(value // _BUCKET_WIDTHS[rule_type]))
+
+        elif rule_type == 'bit_depth':
+            key.append(sign * int(props.get('bit_depth') or 8))
+
+        elif rule_type == 'filesize':
+            key.append(sign * int(props.get('filesize') or 0))
+
+        elif rule_type in _LIST_NORMALIZERS:
+            normalize = _LIST_NORMALIZERS[rule_type]
+            priority_list = preference if isinstance(preference, list) else []
+            # 质量属性在提取时已标准化，其它列表型属性在此统一标准化
+            value = props.get(rule_type)
+            value = value if rule_type == 'quality' else normalize(value)
+            normalized_priority = [normalize(p) for p in priority_list]
+            idx = normalized_priority.index(value) if value in normalized_priority else _UNLISTED_INDEX
+            key.append(-idx)
+
+        elif rule_type == 'subtitle':
+            langs = props.get('subtitle_languages') or []
+            key.append(1 if ('chi' in langs or 'yue' in langs) else 0)
+            break
+
+        elif rule_type == 'date_added':
+            date_number = _date_to_number(props.get('date_added'))
+            key.append(sign * date_number if date_number else _MISSING_DATE_KEY)
+            key.append(sign * int(props.get('int_id') or 0))
+
+    return key
+
+def rank_key_for_version(version: Dict[str, Any], rules: List[Dict[str, Any]], rules_hash: str) -> List[float]:
+    """读取版本上预先计算的排序键；规则已变化或尚未计算时现场计算。"""
+    if version.get(RANK_RULES_HASH_FIELD) == rules_hash and isinstance(version.get(RANK_KEY_FIELD), list):
+        return version[RANK_KEY_FIELD]
+    return build_rank_key(get_version_properties(version), rules)
+
+def annotate_version_rank(asset: Dict[str, Any], rules: Optional[List[Dict[str, Any]]] = None,
+                          rules_hash: Optional[str] = None) -> Dict[str, Any]:
+    """在资产详情上写入排序键与规则指纹 (原地修改并返回)。"""
+    if not asset or not isinstance(asset, dict):
+        return asset
+    if rules is None or rules_hash is None:
+        rules, rules_hash = get_cleanup_rules()
+    asset[RANK_KEY_FIELD] = build_rank_key(get_version_properties(asset), rules)
+    asset[RANK_RULES_HASH_FIELD] = rules_hash
+    return asset
+
+def pick_best_version_id(versions: List[Dict[str, Any]], rules: Optional[List[Dict[str, Any]]] = None,
+                         rules_hash: Optional[str] = None) -> Optional[str]:
+    """在一组版本中选出排序键最大的版本 ID (相同时保留靠前的版本)。"""
+    versions = [v for v in versions if v]
+    if not versions:
+        return None
+    if rules is None or rules_hash is None:
+        rules, rules_hash = get_cleanup_rules()
+    best = max(versions, key=lambda v: rank_key_for_version(v, rules, rules_hash))
+    return best.get('emby_item_id')
@@ -5,12 +5,13 @@ import json
 import os
 import concurrent.futures
 from typing import Optional, Dict, Any, List
-from datetime import datetime, timezone
+from datetime import datetime, timezone, timedelta
 import threading
 from collections import defaultdict
 # 导入我们需要的辅助模块
 from database import connection, media_db, request_db, watchlist_db, user_db, settings_db
 import constants
+import metrics
 import utils
 from ai_translator import AITranslator
 import handler.tmdb as tmdb
@@ -40,6 +41,15 @@ STATUS_WATCHING = 'Watching'
 STATUS_PAUSED = 'Paused'
 STATUS_COMPLETED = 'Completed'
 STATUS_PENDING = 'Pending'
+# ★★★ TMDb 变更检测：全局水位线的存储键，以及被视为"需要刷新"的变更字段 ★★★
+TMDB_CHANGES_WATERMARK_KEY = 'watchlist_tmdb_changes_watermark'
+TMDB_RELEVANT_CHANGE_KEYS = {
+    'season', 'episode', 'status', 'type', 'name', 'original_name', 'overview',
+    'air_date', 'first_air_date', 'last_air_date', 'episode_number', 'season_number',
+    'number_of_episodes', 'number_of_seasons', 'in_production', 'next_episode_to_air'
+}
+# 上一集播出后多少天内，即使 TMDb 无变化也照常处理 (覆盖疑似大结局的 7 天安全锁解除当天)
+RECENTLY_AIRED_RECHECK_DAYS = 8
 def translate_status(status: str) -> str:
     """一个简单的辅助函数，用于翻译状态，如果找不到翻译则返回原文。"""
     return TMDB_STATUS_TRANSLATION.get(status, status)
@@ -137,7 +147,13 @@ class WatchlistProcessor:
                     WHERE watching_status IN ('{STATUS_WATCHING}', '{STATUS_PENDING}', '{STATUS_PAUSED}')
                 """
 
+            run_started_at = datetime.now(timezone.utc)
             active_series = self._get_series_to_process(where_clause, tmdb_id=tmdb_id)
+
+            # 批量模式下，先用 TMDb 变更流筛掉自上次检查以来没有变化的剧集
+            if active_series and not tmdb_id:
+                self.progress_callback(2, f"正在通过 TMDb 变更流筛选 {len(active_series)} 部剧集...")
+                active_series = self._filter_series_by_tmdb_changes(active_series, run_started_at)
             
             if active_series:
                 total = len(active_series)
@@ -172,13 +188,16 @@ class WatchlistProcessor:
 
                         with lock:
                             processed_count += 1
+                        metrics.record_items_processed()
                         
                         progress = 5 + int((processed_count / total) * 95)
                         self.progress_callback(progress, f"剧集处理: {processed_count}/{total} - {series_info['item_name'][:15]}...")
                 
                 if not self.is_stop_requested():
+                    if not tmdb_id: self._save_tmdb_changes_watermark(run_started_at)
                     self.progress_callback(100, "追剧检查完成。")
             else:
+                if not tmdb_id: self._save_tmdb_changes_watermark(run_started_at)
                 self.progress_callback(100, "没有需要处理的剧集，任务完成。")
             
         except Exception as e:
@@ -205,9 +224,16 @@ class WatchlistProcessor:
             # 默认回溯 365 天
             revival_check_days = int(watchlist_cfg.get('revival_check_days', 365))
             
+            run_started_at = datetime.now(timezone.utc)
             completed_series = self._get_series_to_process(f"WHERE watching_status = '{STATUS_COMPLETED}' AND force_ended = FALSE")
+            if completed_series:
+                self.progress_callback(5, f"正在通过 TMDb 变更流筛选 {len(completed_series)} 部已完结剧集...")
+                completed_series = self._filter_series_by_tmdb_changes(
+                    completed_series, run_started_at, watermark_key=f"{TMDB_CHANGES_WATERMARK_KEY}_completed"
+                )
             total = len(completed_series)
             if not completed_series:
+                self._save_tmdb_changes_watermark(run_started_at, key=f"{TMDB_CHANGES_WATERMARK_KEY}_completed")
                 self.progress_callback(100, "没有需要检查的已完结剧集。")
                 return
 
@@ -219,6 +245,7 @@ class WatchlistProcessor:
 
             for i, series in enumerate(completed_series):
                 if self.is_stop_requested(): break
+                metrics.record_items_processed()
                 progress = 10 + int(((i + 1) / total) * 90)
                 series_name = series['item_name']
                 tmdb_id = series['tmdb_id']
@@ -272,6 +299,7 @@ class WatchlistProcessor:
                         # 3. 决策：如果没有新内容，直接跳过后续所有逻辑
                         if not has_new_content:
                             skipped_count += 1
+                            watchlist_db.touch_series_last_checked([tmdb_id])
                             logger.info(f"  💤 《{series_name}》无新内容，跳过全量刷新。")
                             continue 
                         
@@ -291,6 +319,7 @@ class WatchlistProcessor:
                 refresh_result = self._refresh_series_metadata(tmdb_id, series_name, item_id)
                 if not refresh_result: 
                     continue
+                watchlist_db.touch_series_last_checked([tmdb_id])
                 
                 # 解包返回结果，供后续复活判定逻辑使用
                 tmdb_details, _, emby_seasons_state = refresh_result
@@ -375,6 +404,8 @@ class WatchlistProcessor:
                 
                 time.sleep(0.5) # 稍微减少一点 sleep，因为轻量检查很快
             
+            if not self.is_stop_requested():
+                self._save_tmdb_changes_watermark(run_started_at, key=f"{TMDB_CHANGES_WATERMARK_KEY}_completed")
             final_message = f"复活检查完成。共扫描 {total} 部，跳过远古剧 {skipped_count} 部，复活 {revived_count} 部。"
             self.progress_callback(100, final_message)
 
@@ -430,6 +461,159 @@ class WatchlistProcessor:
             tmdb_id=tmdb_id
         )
 
+    # --- TMDb 变更检测 ---
+    def _filter_series_by_tmdb_changes(self, series_list: List[Dict[str, Any]], run_started_at: datetime,
+                                       watermark_key: str = TMDB_CHANGES_WATERMARK_KEY) -> List[Dict[str, Any]]:
+        """
+        利用 TMDb 变更流筛选出真正需要全量聚合的剧集。
+        - 全局水位线 (上次成功运行的开始时间) 之后的 /tv/changes 覆盖了所有"检查时间晚于水位线"的剧集。
+        - 检查时间早于水位线的剧集 (例如上次处理失败)，单独查询 /tv/{id}/changes 确认。
+        - 从未检查过、或超出 TMDb 14 天变更窗口的剧集，一律全量处理。
+        - 确认无变化的剧集只推进 watchlist_last_checked_at，不再请求 TMDb 聚合数据。
+        任何环节失败都回退为返回原列表 (即全量处理)。
+        """
+        watchlist_cfg = settings_db.get_setting('watchlist_config') or {}
+        if not watchlist_cfg.get('tmdb_change_detection', True) or not series_list or not self.tmdb_api_key:
+            return series_list
+
+        window_floor = run_started_at - timedelta(days=tmdb.TMDB_CHANGES_MAX_DAYS - 1)
+        watermark = None
+        try:
+            watermark_str = (settings_db.get_setting(watermark_key) or {}).get('last_synced_at')
+            if watermark_str:
+                watermark = datetime.fromisoformat(watermark_str)
+        except Exception as e:
+            logger.warning(f"  ➜ [变更检测] 读取水位线失败: {e}")
+
+        if not watermark or watermark < window_floor:
+            logger.info("  ➜ [变更检测] 没有有效的水位线 (首次运行或已超出 TMDb 14 天变更窗口)，本次执行全量处理。")
+            return series_list
+
+        changed_ids = tmdb.get_changed_tv_ids(
+            self.tmdb_api_key,
+            start_date=watermark.date().isoformat(),
+            end_date=run_started_at.date().isoformat()
+        )
+        if changed_ids is None:
+            return series_list
+
+        today = datetime.now().date()
+        auto_pause_days = int(watchlist_cfg.get('auto_pause', 0) or 0)
+        due_series = []
+        unchanged_ids = []
+        needs_detail_check = []
+
+        for series in series_list:
+            tmdb_id = series['tmdb_id']
+            last_checked = series.get('last_checked_at')
+
+            if self._is_time_sensitive_series(series, today, auto_pause_days):
+                due_series.append(series)
+                continue
+            if not last_checked or last_checked < window_floor or not str(tmdb_id).isdigit():
+                due_series.append(series)
+                continue
+            if last_checked >= watermark and int(tmdb_id) not in changed_ids:
+                unchanged_ids.append(tmdb_id)
+                continue
+            needs_detail_check.append(series)
+
+        # 对变更流命中 (或未被变更流覆盖) 的剧集，并发确认是否存在"有意义"的变更
+        if needs_detail_check:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
+                future_to_series = {
+                    executor.submit(self._has_relevant_tmdb_changes, s['tmdb_id'], s['last_checked_at'], run_started_at): s
+                    for s in needs_detail_check
+                }
+                for future in concurrent.futures.as_completed(future_to_series):
+                    series = future_to_series[future]
+                    try:
+                        has_changes = future.result()
+                    except Exception as e:
+                        logger.warning(f"  ➜ [变更检测] 查询《{series.get('item_name')}》变更明细失败: {e}")
+                        has_changes = True
+                    if has_changes:
+                        due_series.append(series)
+                    else:
+                        unchanged_ids.append(series['tmdb_id'])
+
+        if unchanged_ids:
+            watchlist_db.touch_series_last_checked(unchanged_ids, run_started_at)
+
+        logger.info(
+            f"  ➜ [变更检测] 共 {len(series_list)} 部剧集，{len(due_series)} 部需要刷新，"
+            f"{len(unchanged_ids)} 部自上次检查以来无变化，已跳过 TMDb 聚合。"
+        )
+        return due_series
+
+    def _has_relevant_tmdb_changes(self, tmdb_id: str, since: datetime, until: datetime) -> bool:
+        """查询单部剧集的变更明细，只要 since 之后出现了与追剧相关的字段变更就返回 True。"""
+        changes = tmdb.get_tv_changes(
+            tmdb_id, self.tmdb_api_key,
+            start_date=since.date().isoformat(),
+            end_date=until.date().isoformat()
+        )
+        if changes is None:
+            return True
+
+        for change in changes:
+            if change.get('key') not in TMDB_RELEVANT_CHANGE_KEYS:
+                continue
+            for item in change.get('items', []):
+                try:
+                    changed_at = datetime.strptime(item.get('time', ''), '%Y-%m-%d %H:%M:%S UTC').replace(tzinfo=timezone.utc)
+                except ValueError:
+                    return True
+                if changed_at >= since:
+                    return True
+        return False
+
+    def _is_time_sensitive_series(self, series: Dict[str, Any], today, auto_pause_days: int = 0) -> bool:
+        """
+        即使 TMDb 没有变化，以下剧集的状态也会随时间推移而改变，必须照常处理：
+        - 待定中的剧集 (自动待定的新剧保护期会随时间结束)。
+        - 暂停期已到的剧集。
+        - 记录中的下一集已到播出日期，或距播出仍超过自动暂停阈值 (应转为暂停) 的剧集。
+        - 上一集刚播出不久的剧集 (疑似大结局的安全锁按播出天数解除，到期后需要重新判定是否完结)。
+        """
+        if series.get('watching_status') == STATUS_PENDING:
+            return True
+
+        paused_until = series.get('paused_until')
+        if series.get('watching_status') == STATUS_PAUSED and paused_until and paused_until <= today:
+            return True
+
+        def air_date_of(episode_json):
+            if isinstance(episode_json, str):
+                try: episode_json = json.loads(episode_json)
+                except ValueError: return None
+            if not isinstance(episode_json, dict) or not episode_json.get('air_date'):
+                return None
+            try:
+                return datetime.strptime(episode_json['air_date'], '%Y-%m-%d').date()
+            except ValueError:
+                return today # 日期格式异常时按“需要处理”对待
+
+        next_air_date = air_date_of(series.get('next_episode_to_air_json'))
+        if next_air_date:
+            if next_air_date <= today:
+                return True
+            if series.get('watching_status') == STATUS_WATCHING and auto_pause_days > 0 \
+                    and (next_air_date - today).days >= auto_pause_days:
+                return True
+
+        last_air_date = air_date_of(series.get('last_episode_to_air_json'))
+        if last_air_date and (today - last_air_date).days <= RECENTLY_AIRED_RECHECK_DAYS:
+            return True
+        return False
+
+    def _save_tmdb_changes_watermark(self, run_started_at: datetime, key: str = TMDB_CHANGES_WATERMARK_KEY):
+        """记录本次成功运行的开始时间，作为下次拉取 TMDb 变更流的起点。"""
+        try:
+            settings_db.save_setting(key, {'last_synced_at': run_started_at.isoformat()})
+        except Exception as e:
+            logger.warning(f"  ➜ [变更检测] 保存水位线失败: {e}")
+
     def _save_local_json(self, relative_path: str, new_data: Dict[str, Any]):
         """
         保存数据到本地 JSON 缓存文件 (智能合并模式)。
@@ -1573,6 +1757,7 @@ class WatchlistProcessor:
             if self.is_stop_requested():
                 logger.info("  🚫 追剧列表更新任务被中止。")
                 break
+            metrics.record_items_processed()
             
             if self.progress_callback:
                 progress = 10 + int(((i + 1) / total) * 90)
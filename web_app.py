@@ -13,11 +13,15 @@ from watchlist_processor import WatchlistProcessor
 from datetime import datetime
 from handler.emby import get_emby_server_info 
 import task_manager
+import metrics
+import cache_events
+import proxy_workers
 from tasks.core import get_task_registry 
-from typing import Dict, Any
+from typing import Dict, Any, Optional, Set
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
 import atexit # 用于应用退出处理
+import multiprocessing
 from ai_translator import AITranslator
 from core_processor import MediaProcessor
 from actor_subscription_processor import ActorSubscriptionProcessor
@@ -51,10 +55,11 @@ from routes.user_portal import user_portal_bp
 from routes.discover import discover_bp
 from routes.nullbr import nullbr_bp
 from routes.p115 import p115_bp
+from routes.metrics import metrics_bp
 # --- 核心模块导入 ---
 import constants # 你的常量定义\
 import logging
-from logger_setup import frontend_log_queue, add_file_handler # 日志记录器和前端日志队列
+from logger_setup import frontend_log_buffer, add_file_handler # 日志记录器和前端日志缓冲区
 import config_manager
 from database import connection, settings_db
 
@@ -141,8 +146,15 @@ def save_config_and_reload(new_config: Dict[str, Any]):
         raise
 
 # --- 初始化所有需要的处理器实例 ---
-def initialize_processors():
-    """初始化所有处理器，并将实例赋值给 extensions 模块中的全局变量。"""
+def initialize_processors(processor_types: Optional[Set[str]] = None):
+    """
+    初始化所有处理器，并将实例赋值给 extensions 模块中的全局变量。
+    任务工作进程传入 processor_types，只额外创建任务用得到的处理器 (核心处理器总是创建)，
+    Emby Server ID 直接取主进程缓存的值。
+    """
+    def wants(processor_type: str) -> bool:
+        return processor_types is None or processor_type in processor_types
+
     if not config_manager.APP_CONFIG:
         logger.error("无法初始化处理器：全局配置 APP_CONFIG 为空。")
         return
@@ -183,7 +195,8 @@ def initialize_processors():
             
             shared_douban_api = DoubanApi(
                 cooldown_seconds=douban_cooldown,
-                user_cookie=douban_cookie
+                user_cookie=douban_cookie,
+                local_data_path=current_config.get(constants.CONFIG_OPTION_LOCAL_DATA_PATH)
             )
             logger.debug("  ✅ DoubanApi 共享实例已初始化。")
         except Exception as e:
@@ -194,7 +207,9 @@ def initialize_processors():
     emby_url = current_config.get("emby_server_url")
     emby_key = current_config.get("emby_api_key")
     
-    if emby_url and emby_key:
+    if processor_types is not None:
+        server_id_local = settings_db.get_setting("emby_server_id_cache")
+    elif emby_url and emby_key:
         # --- 优化启动逻辑：优先检查缓存，决定超时策略 ---
         cached_id = settings_db.get_setting("emby_server_id_cache")
         
@@ -236,24 +251,26 @@ def initialize_processors():
         media_processor_instance_local = None
 
     # 初始化 watchlist_processor_instance_local
-    try:
-        watchlist_processor_instance_local = WatchlistProcessor(
-            config=current_config, 
-            ai_translator=shared_ai_translator,
-            douban_api=shared_douban_api
-        )
-        logger.trace("WatchlistProcessor 实例已成功初始化。")
-    except Exception as e:
-        logger.error(f"创建 WatchlistProcessor 实例失败: {e}", exc_info=True)
-        watchlist_processor_instance_local = None
+    watchlist_processor_instance_local = None
+    if wants('watchlist'):
+        try:
+            watchlist_processor_instance_local = WatchlistProcessor(
+                config=current_config, 
+                ai_translator=shared_ai_translator,
+                douban_api=shared_douban_api
+            )
+            logger.trace("WatchlistProcessor 实例已成功初始化。")
+        except Exception as e:
+            logger.error(f"创建 WatchlistProcessor 实例失败: {e}", exc_info=True)
 
     # 初始化 actor_subscription_processor_instance_local
-    try:
-        actor_subscription_processor_instance_local = ActorSubscriptionProcessor(config=current_config)
-        logger.trace("ActorSubscriptionProcessor 实例已成功初始化。")
-    except Exception as e:
-        logger.error(f"创建 ActorSubscriptionProcessor 实例失败: {e}", exc_info=True)
-        actor_subscription_processor_instance_local = None
+    actor_subscription_processor_instance_local = None
+    if wants('actor'):
+        try:
+            actor_subscription_processor_instance_local = ActorSubscriptionProcessor(config=current_config)
+            logger.trace("ActorSubscriptionProcessor 实例已成功初始化。")
+        except Exception as e:
+            logger.error(f"创建 ActorSubscriptionProcessor 实例失败: {e}", exc_info=True)
 
 
     # --- ✨✨✨ 简化为“单一赋值” ✨✨✨ ---
@@ -262,6 +279,9 @@ def initialize_processors():
     extensions.watchlist_processor_instance = watchlist_processor_instance_local
     extensions.actor_subscription_processor_instance = actor_subscription_processor_instance_local
     extensions.EMBY_SERVER_ID = server_id_local
+    # 任务工作进程 (spawn 子进程) 也会调用本函数，只由主进程广播
+    if server_id_local and multiprocessing.current_process().name == 'MainProcess':
+        cache_events.publish('emby_server_id', {'server_id': server_id_local}) # 通知反代工作进程
 
 # --- 生成Nginx配置 ---
 def ensure_nginx_config():
@@ -380,7 +400,9 @@ def application_exit_handler():
     scheduler_manager.shutdown()
     
     logger.info("atexit 清理操作执行完毕。")
-atexit.register(application_exit_handler)
+# spawn 出的子进程 (任务工作进程、反代工作进程) 会以 __mp_main__ 重新导入本模块，清理逻辑只属于主进程
+if multiprocessing.current_process().name == 'MainProcess':
+    atexit.register(application_exit_handler)
 
 # --- 反代监控 ---
 @app.route('/api/health')
@@ -421,10 +443,10 @@ app.register_blueprint(user_portal_bp)
 app.register_blueprint(discover_bp)
 app.register_blueprint(nullbr_bp)
 app.register_blueprint(p115_bp)
+app.register_blueprint(metrics_bp)
 
 def main_app_start():
     """将主应用启动逻辑封装成一个函数"""
-    global monitor_service_instance # 声明使用全局变量
     from gevent.pywsgi import WSGIServer
     from geventwebsocket.handler import WebSocketHandler
     import gevent
@@ -442,20 +464,42 @@ def main_app_start():
         log_backups = constants.DEFAULT_LOG_ROTATION_BACKUPS
     add_file_handler(log_directory=config_manager.LOG_DIRECTORY, log_size_mb=log_size, log_backups=log_backups)
     
-    connection.init_db()
+    metrics.install_http_instrumentation()
+    metrics.install_loop_stall_watchdog()
+    connection.enable_green_io()
+    connection.ensure_db_schema()
+    cache_events.start_listener()
 
-    ensure_cover_generator_fonts()
     initialize_processors()
     task_manager.start_task_worker_if_not_running()
     scheduler_manager.start()
 
-    # ★★★ 新增：启动实时监控服务 ★★★
-    try:
-        if extensions.media_processor_instance:
-            monitor_service_instance = MonitorService(config_manager.APP_CONFIG, extensions.media_processor_instance)
-            monitor_service_instance.start()
-    except Exception as e:
-        logger.error(f"启动实时监控服务失败: {e}", exc_info=True)
+    # 非关键的预热放到反代开始接受连接之后执行，容器重启 (例如更新) 时反代能尽快恢复服务
+    deferred_warmups_started = False
+
+    def run_deferred_warmups():
+        nonlocal deferred_warmups_started
+        if deferred_warmups_started:
+            return
+        deferred_warmups_started = True
+        global monitor_service_instance
+
+        ensure_cover_generator_fonts()
+
+        # ★★★ 新增：启动实时监控服务 ★★★
+        try:
+            if extensions.media_processor_instance:
+                monitor_service_instance = MonitorService(config_manager.APP_CONFIG, extensions.media_processor_instance)
+                monitor_service_instance.start()
+        except Exception as e:
+            logger.error(f"启动实时监控服务失败: {e}", exc_info=True)
+
+        if config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PROXY_ENABLED):
+            # 这行代码会启动一个后台死循环，每隔 4 小时刷新一次数据
+            # 且第一次会立即执行 (优先读取本地快照)，起到“预热”的作用
+            RecommendationEngine.start_auto_refresh_loop()
+        else:
+            logger.debug("  ❌ 虚拟库功能未启用，跳过向量预加载以节省内存。")
 
     def warmup_vector_cache():
         try:
@@ -468,25 +512,31 @@ def main_app_start():
         except Exception as e:
             logger.warning(f"  ⚠️ 向量预加载失败 (不影响启动): {e}")
 
-    if config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PROXY_ENABLED):
-        # 这行代码会启动一个后台死循环，每隔 30 分钟刷新一次数据
-        # 且第一次会立即执行，起到“预热”的作用
-        RecommendationEngine.start_auto_refresh_loop()
-    else:
-        logger.debug("  ❌ 虚拟库功能未启用，跳过向量预加载以节省内存。")
-    
     def run_proxy_server():
         if config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PROXY_ENABLED):
             try:
                 internal_proxy_port = 7758
                 external_port = config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PROXY_PORT, 8097)
-                logger.info(f"  🚀 [虚拟库] 服务器已启动 (容器监听端口: {external_port})")
+                worker_count = int(config_manager.APP_CONFIG.get(constants.CONFIG_OPTION_PROXY_WORKER_PROCESSES, 1) or 1)
+                if worker_count > 1:
+                    if proxy_workers.reuse_port_supported():
+                        proxy_workers.start_proxy_workers(worker_count, internal_proxy_port)
+                        logger.info(f"  🚀 [虚拟库] 已启动 {worker_count} 个反代工作进程 (容器监听端口: {external_port})")
+                        gevent.spawn(run_deferred_warmups)
+                        return
+                    logger.warning("  ⚠️ 当前平台不支持 SO_REUSEPORT，反代回退为主进程内单进程运行。")
                 proxy_server = WSGIServer(('0.0.0.0', internal_proxy_port), proxy_app, handler_class=WebSocketHandler)
+                proxy_server.start() # 先完成监听，再开始预热
+                logger.info(f"  🚀 [虚拟库] 服务器已启动 (容器监听端口: {external_port})")
+                gevent.spawn(run_deferred_warmups)
                 proxy_server.serve_forever()
             except Exception as e:
                 logger.error(f"启动虚拟库服务失败: {e}", exc_info=True)
+            finally:
+                gevent.spawn(run_deferred_warmups)
         else:
             logger.info("虚拟库未在配置中启用。")
+            gevent.spawn(run_deferred_warmups)
 
     gevent.spawn(run_proxy_server)
 